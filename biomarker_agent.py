@@ -1,102 +1,452 @@
 from google.adk import Agent
 from google.genai import types
+import io
 import json
 import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from tools.census_catalog import get_census_catalog
+from tools.clients import HTTP_TIMEOUT, get_client_registry
+from tools.pagination import compact, decode_cursor, page_json
+from tools.rate_limiter import ncbi_rate_limiter
+from tools.result_cache import cached_query, get_query_cache, normalize_query
 
 # Placeholder imports - these will be used when the packages are installed
+# (cellxgene_census is used by tools/census_catalog.py to build the catalog snapshot)
 try:
-    from pysradb.sraweb import SRAweb
     from Bio import Entrez
-    import cellxgene_census
 except ImportError:
     # Allow code to load even if dependencies aren't installed yet (for initial setup)
-    SRAweb = None
     Entrez = None
-    cellxgene_census = None
 
-def search_sra_metadata(query: str) -> str:
+# Rows per page returned by the SRA and Cell x Gene searches (GEO pages hold GEO_RETMAX)
+PAGE_SIZE = int(os.environ.get("BIOMARKER_PAGE_SIZE", "5"))
+
+# GEO paging: ID lists up to GEO_ID_BATCH_SIZE are summarized in one esummary call by ID;
+# larger result sets are paged from the history server in GEO_ESUMMARY_PAGE_SIZE chunks
+GEO_RETMAX = int(os.environ.get("GEO_RETMAX", "5"))
+GEO_ID_BATCH_SIZE = int(os.environ.get("GEO_ID_BATCH_SIZE", "200"))
+GEO_ESUMMARY_PAGE_SIZE = int(os.environ.get("GEO_ESUMMARY_PAGE_SIZE", "500"))
+NCBI_EUTILS_URL = os.environ.get("NCBI_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+
+def _eutils(tool: str, limiter, **params) -> object:
     """
-    Searches the Sequence Read Archive (SRA) for metadata relevant to the query.
-    Useful for finding microbiome or other high-throughput sequencing data.
+    Runs one rate-limited E-utilities request over the shared keep-alive HTTP session and
+    parses the response with Biopython. Searches GEO DataSets unless `db` is given.
+    """
+    params.setdefault("db", "gds")
+    params.update(tool="biopython", email=os.environ.get("ENTREZ_EMAIL", "user@example.com"))
+    if os.environ.get("NCBI_API_KEY"):
+        params["api_key"] = os.environ["NCBI_API_KEY"]
+    limiter.acquire()
+    with get_client_registry().http() as session:
+        # POST so long ID lists never hit URL length limits
+        response = session.post(f"{NCBI_EUTILS_URL}/{tool}.fcgi", data=params, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+    return Entrez.read(io.BytesIO(response.content))
+
+_GSE = re.compile(r"\bGSE\d+\b")
+
+def _sra_row(summary: dict) -> dict:
+    """The fields kept from an SRA experiment summary (its ExpXml and Runs XML fragments)."""
+    exp = ET.fromstring(f"<ExpXml>{summary['ExpXml']}</ExpXml>")
+    stats = exp.find("Summary/Statistics")
+    layout = exp.find("Library_descriptor/LIBRARY_LAYOUT")
+    bases = int(stats.get("total_bases") or 0) if stats is not None else 0
+    return {
+        "experiment": exp.find("Experiment").get("acc") if exp.find("Experiment") is not None else None,
+        "study": exp.find("Study").get("acc") if exp.find("Study") is not None else None,
+        "title": exp.findtext("Summary/Title"),
+        "organism": exp.find("Organism").get("ScientificName") if exp.find("Organism") is not None else None,
+        "strategy": exp.findtext("Library_descriptor/LIBRARY_STRATEGY"),
+        "source": exp.findtext("Library_descriptor/LIBRARY_SOURCE"),
+        "layout": layout[0].tag if layout is not None and len(layout) else None,
+        "platform": exp.findtext("Summary/Platform"),
+        "bioproject": exp.findtext("Bioproject"),
+        "runs": int(stats.get("total_runs") or 0) if stats is not None else None,
+        "gbases": round(bases / 1e9, 2) if bases else None,
+        "geo": sorted(set(_GSE.findall(summary["ExpXml"]))),
+    }
+
+def _sra_page(query: str, offset: int = 0, page_size: int = PAGE_SIZE) -> tuple:
+    """
+    One page of SRA experiments: an esearch for the page's IDs and one esummary for them,
+    so only the page's summaries are transferred.
+
+    Returns:
+        (rows, total)
+    """
+    limiter = ncbi_rate_limiter()
+    record = _eutils("esearch", limiter, db="sra", term=query, retstart=offset, retmax=page_size)
+    id_list = list(record["IdList"])
+    total = int(record.get("Count", offset + len(id_list)))
+    if not id_list:
+        return [], total
+    return [_sra_row(item) for item in _eutils("esummary", limiter, db="sra", id=",".join(id_list))], total
+
+def _geo_summaries(id_list: list, webenv: str, query_key: str, limiter, offset: int = 0) -> list:
+    """Document summaries for the esearch hits, in as few esummary calls as possible."""
+    if len(id_list) <= GEO_ID_BATCH_SIZE or not (webenv and query_key):
+        return list(_eutils("esummary", limiter, id=",".join(id_list)))
+    summaries = []
+    for start in range(0, len(id_list), GEO_ESUMMARY_PAGE_SIZE):
+        page_size = min(GEO_ESUMMARY_PAGE_SIZE, len(id_list) - start)
+        # The history holds every match, not just this page
+        summaries.extend(_eutils("esummary", limiter, webenv=webenv, query_key=query_key,
+                                 retstart=offset + start, retmax=page_size))
+    return summaries
+
+def _geo_page(query: str, offset: int = 0, retmax: int = GEO_RETMAX) -> tuple:
+    """
+    One page of GEO datasets, each with the SRA projects holding its reads.
+
+    Returns:
+        (rows, total)
+    """
+    limiter = ncbi_rate_limiter()
+    record = _eutils("esearch", limiter, term=query, retstart=offset, retmax=retmax, usehistory="y")
+    id_list = list(record["IdList"])
+    total = int(record.get("Count", offset + len(id_list)))
+    if not id_list:
+        return [], total
+    rows = []
+    for item in _geo_summaries(id_list, record.get("WebEnv"), record.get("QueryKey"), limiter, offset):
+        rows.append({
+            "accession": str(item["Accession"]),
+            # GDS summaries name the field "title"
+            "title": str(item.get("title", item.get("Title", ""))),
+            "taxon": item.get("taxon"),
+            "type": item.get("gdsType"),
+            "samples": int(item["n_samples"]) if item.get("n_samples") else None,
+            "sra": sorted(str(relation["TargetObject"]) for relation in item.get("ExtRelations", [])
+                          if relation.get("RelationType") == "SRA" and relation.get("TargetObject")),
+        })
+    return rows, total
+
+def _format_terms(terms: str, limit: int = 60) -> str:
+    return terms if len(terms) <= limit else terms[:limit].rsplit("; ", 1)[0] + "; ..."
+
+def _cellxgene_page(query: str, offset: int = 0, page_size: int = PAGE_SIZE) -> tuple:
+    """
+    One page of the ranked search over the local catalog snapshot; the census itself is
+    only opened when the snapshot is (re)built.
+
+    Returns:
+        (rows, has_more)
+    """
+    hits = get_census_catalog().search(query, limit=offset + page_size + 1)
+    rows = [{
+        "dataset_id": hit["dataset_id"], "title": hit["dataset_title"], "collection": hit["collection_name"],
+        "cells": hit["cell_count"], "tissue": _format_terms(hit["tissue"]), "disease": _format_terms(hit["disease"]),
+        "assay": _format_terms(hit["assay"]), "score": hit["score"],
+    } for hit in hits[offset:offset + page_size]]
+    return rows, len(hits) > offset + page_size
+
+def _page(repository: str, label: str, query: str, cursor: str, fetch) -> str:
+    """
+    Runs `fetch(offset)` for the page a cursor points at (the first page without one)
+    and formats it with page_json().
     """
     try:
-        db = SRAweb()
-        df = db.search_sra(query, detailed=True)
-        if df is None or df.empty:
-            return "No results found in SRA."
-        # Return top 5 results as a string representation
-        return df.head(5).to_string()
+        offset = 0
+        if cursor:
+            cursor_query, offset = decode_cursor(cursor, repository)
+            if normalize_query(cursor_query) != normalize_query(query):
+                return f"Error searching {label}: the cursor belongs to the search for '{cursor_query}'."
+        rows, total, has_more = fetch(offset)
+        if not rows and offset == 0:
+            return f"No results found in {label}."
+        return page_json(repository, query, rows, offset, total, has_more)
     except Exception as e:
-        return f"Error searching SRA: {e}"
+        return f"Error searching {label}: {e}"
+
+def _search_sra(query: str, cursor: str = "", page_size: int = PAGE_SIZE) -> str:
+    return _page("sra", "SRA", query, cursor, lambda offset: (*_sra_page(query, offset, page_size), None))
+
+def _search_geo(query: str, retmax: int = GEO_RETMAX, cursor: str = "") -> str:
+    return _page("geo", "GEO", query, cursor, lambda offset: (*_geo_page(query, offset, retmax), None))
+
+def _search_cellxgene(query: str, cursor: str = "", page_size: int = PAGE_SIZE) -> str:
+    def fetch(offset):
+        rows, has_more = _cellxgene_page(query, offset, page_size)
+        return rows, None, has_more
+    return _page("cellxgene", "Cell x Gene Census", query, cursor, fetch)
+
+def _sra_records(query: str, limit: int = 5) -> list:
+    """SRA studies matching the query (grouped from a page of experiments), with the GEO series they name."""
+    rows, _ = _sra_page(query, 0, min(100, limit * 4))
+    studies = {}
+    for row in rows:
+        accession = row["study"] or row["experiment"]
+        if accession not in studies:
+            if len(studies) == limit:
+                continue
+            studies[accession] = {"repository": "SRA", "accession": accession, "title": row["title"] or "",
+                                  "organism": row["organism"], "strategy": row["strategy"], "runs": 0, "links": set()}
+        studies[accession]["runs"] += row["runs"] or 0
+        studies[accession]["links"].update(row["geo"])
+    for study in studies.values():
+        organism, strategy, runs = study.pop("organism"), study.pop("strategy"), study.pop("runs")
+        study["details"] = "; ".join([value for value in (organism, strategy) if value] +
+                                     [f"{runs} run{'s' if runs != 1 else ''}"])
+    return list(studies.values())
+
+def _geo_records(query: str, limit: int = 5) -> list:
+    rows, _ = _geo_page(query, 0, limit)
+    records = []
+    for row in rows:
+        details = [value for value in (row["taxon"], row["type"]) if value]
+        if row["samples"]:
+            details.append(f"{row['samples']} samples")
+        records.append({"repository": "GEO", "accession": row["accession"], "title": row["title"],
+                        "details": "; ".join(details), "links": set(row["sra"])})
+    return records
+
+def _cellxgene_records(query: str, limit: int = 5) -> list:
+    rows, _ = _cellxgene_page(query, 0, limit)
+    records = []
+    for row in rows:
+        details = [row["collection"], f"{row['cells']:,} cells"]
+        details += [_format_terms(row[field], 40) for field in ("tissue", "disease") if row[field]]
+        records.append({"repository": "Cell x Gene", "accession": row["dataset_id"], "title": row["title"],
+                        "details": "; ".join(details), "links": set()})
+    return records
+
+# Federated search: per-backend timeouts in seconds (FEDERATED_TIMEOUT_<BACKEND>)
+FEDERATED_TIMEOUTS = {
+    backend: float(os.environ.get(f"FEDERATED_TIMEOUT_{backend.upper()}", default))
+    for backend, default in (("sra", "30"), ("geo", "20"), ("cellxgene", "10"))
+}
+# Reciprocal rank fusion constant: larger values flatten the gap between ranks
+FEDERATED_RRF_K = 10
+# Threads shared by all federated searches, including backends still running after their timeout
+FEDERATED_MAX_WORKERS = int(os.environ.get("FEDERATED_MAX_WORKERS", "12"))
+
+_federated_executor = None
+_federated_lock = threading.Lock()
+# Backend searches given up on after their timeout: in total, and those still running
+_federated_abandoned = {"abandoned": 0, "running": 0}
+
+def get_federated_executor() -> ThreadPoolExecutor:
+    """The thread pool shared by federated searches, capped at FEDERATED_MAX_WORKERS threads."""
+    global _federated_executor
+    with _federated_lock:
+        if _federated_executor is None:
+            _federated_executor = ThreadPoolExecutor(max_workers=max(1, FEDERATED_MAX_WORKERS),
+                                                     thread_name_prefix="federated-search")
+        return _federated_executor
+
+def _abandoned_search_finished(future):
+    with _federated_lock:
+        _federated_abandoned["running"] -= 1
+
+def _abandon(future):
+    """Counts a backend search nobody waits for any more until its thread finishes."""
+    with _federated_lock:
+        _federated_abandoned["abandoned"] += 1
+        _federated_abandoned["running"] += 1
+    future.add_done_callback(_abandoned_search_finished)
 
-def search_geo_metadata(query: str) -> str:
+def federated_search_stats() -> dict:
+    """Backend searches abandoned after a timeout, those still holding a thread, and the thread cap."""
+    with _federated_lock:
+        return dict(_federated_abandoned, max_workers=FEDERATED_MAX_WORKERS)
+
+def _merge_records(results: dict) -> list:
+    """
+    Merges per-repository results into ranked rows.
+
+    Records naming the same accession, or linked to each other (a GEO series and the SRA
+    project holding its reads), become one row. Rows are ranked by reciprocal rank fusion:
+    each repository contributes 1 / (FEDERATED_RRF_K + rank), so datasets found in several
+    repositories, and near the top of each, come first.
+    """
+    rows, by_accession = [], {}
+    for records in results.values():
+        for rank, record in enumerate(records, start=1):
+            keys = [record["accession"], *sorted(record["links"])]
+            row = next((by_accession[key] for key in keys if key in by_accession), None)
+            if row is None:
+                row = {"accessions": [], "repositories": [], "title": record["title"], "details": [],
+                       "links": [], "score": 0.0}
+                rows.append(row)
+            if record["accession"] not in row["accessions"]:
+                row["accessions"].append(record["accession"])
+            if record["repository"] not in row["repositories"]:
+                row["repositories"].append(record["repository"])
+            if record["details"]:
+                row["details"].append(record["details"])
+            row["links"] += [link for link in sorted(record["links"]) if link not in row["links"]]
+            row["score"] += 1.0 / (FEDERATED_RRF_K + rank)
+            for key in keys:
+                by_accession.setdefault(key, row)
+    for row in rows:
+        row["links"] = [link for link in row["links"] if link not in row["accessions"]]
+    return sorted(rows, key=lambda row: -row["score"])
+
+def _federated_search(query: str, limit: int = 5, timeout: float = None) -> str:
+    backends = {
+        "sra": ("SRA", lambda: _sra_records(query, limit)),
+        "geo": ("GEO", lambda: _geo_records(query, limit)),
+        "cellxgene": ("Cell x Gene", lambda: _cellxgene_records(query, limit)),
+    }
+    start = time.monotonic()
+    executor = get_federated_executor()
+    futures = {backend: executor.submit(search) for backend, (_, search) in backends.items()}
+    results, notes = {}, []
+    for backend, future in futures.items():
+        label = backends[backend][0]
+        backend_timeout = FEDERATED_TIMEOUTS[backend] if timeout is None else timeout
+        try:
+            results[backend] = future.result(timeout=max(0.0, start + backend_timeout - time.monotonic()))
+        except FuturesTimeoutError:
+            # A backend still queued is dropped; a running one finishes in the background, counted
+            if not future.cancel():
+                _abandon(future)
+            notes.append(f"Error searching {label}: no answer within {backend_timeout:g}s; results are incomplete.")
+        except Exception as e:
+            notes.append(f"Error searching {label}: {e}")
+
+    rows = [{"accessions": row["accessions"], "repositories": row["repositories"], "title": row["title"],
+             "details": " / ".join(row["details"]), "linked": row["links"], "score": round(row["score"], 3)}
+            for row in _merge_records(results)]
+    summary = {"query": query, "found": {backends[backend][0]: len(records) for backend, records in results.items()},
+               "seconds": round(time.monotonic() - start, 1), "rows": [compact(row) for row in rows]}
+    # Errors go on their own lines after the JSON
+    return "\n".join([json.dumps(summary, separators=(",", ":"), ensure_ascii=False)] + notes)
+
+# Repository searches are memoized per tool, normalized query and page (tools/result_cache.py);
+# results past QUERY_CACHE_TTL are served stale while they are refreshed in the background.
+# Results are compact JSON pages; pass "next_cursor" back as `cursor` for the next page.
+
+def search_sra_metadata(query: str, cursor: str = "", page_size: int = PAGE_SIZE) -> str:
+    """
+    Searches the Sequence Read Archive (SRA) for metadata relevant to the query.
+    Useful for finding microbiome or other high-throughput sequencing data.
+
+    Args:
+        query: Search terms.
+        cursor: "next_cursor" of a previous page of the same search, to get the next page.
+        page_size: Experiments per page (default 5).
+
+    Returns:
+        JSON with one row per experiment (experiment, study, title, organism, strategy,
+        source, layout, platform, bioproject, runs, gbases, geo) and "next_cursor".
+    """
+    return cached_query("sra", {"query": normalize_query(query), "cursor": cursor, "page_size": page_size},
+                        lambda: _search_sra(query, cursor, page_size))
+
+def search_geo_metadata(query: str, retmax: int = GEO_RETMAX, cursor: str = "") -> str:
     """
     Searches the Gene Expression Omnibus (GEO) for datasets.
     Useful for finding RNA-seq or microarray data.
+
+    Args:
+        query: Search terms.
+        retmax: Datasets per page (default 5).
+        cursor: "next_cursor" of a previous page of the same search, to get the next page.
+
+    Returns:
+        JSON with one row per dataset (accession, title, taxon, type, samples, sra),
+        the total number of matches and "next_cursor".
     """
-    try:
-        Entrez.email = os.environ.get("ENTREZ_EMAIL", "user@example.com")  # Configure via environment variable
-        handle = Entrez.esearch(db="gds", term=query, retmax=5)
-        record = Entrez.read(handle)
-        handle.close()
-        
-        id_list = record["IdList"]
-        if not id_list:
-            return "No results found in GEO."
-            
-        results = []
-        for geo_id in id_list:
-            summary_handle = Entrez.esummary(db="gds", id=geo_id)
-            summary_record = Entrez.read(summary_handle)
-            summary_handle.close()
-            for item in summary_record:
-                results.append(f"ID: {item['Id']}, Title: {item['Title']}, Accession: {item['Accession']}")
-                
-        return "\n".join(results)
-    except Exception as e:
-        return f"Error searching GEO: {e}"
+    return cached_query("geo", {"query": normalize_query(query), "retmax": retmax, "cursor": cursor},
+                        lambda: _search_geo(query, retmax, cursor))
 
-def search_cellxgene_data(query: str) -> str:
+def search_cellxgene_data(query: str, cursor: str = "", page_size: int = PAGE_SIZE) -> str:
     """
     Searches the CZ Cell x Gene Census for single-cell data.
+
+    Args:
+        query: Search terms.
+        cursor: "next_cursor" of a previous page of the same search, to get the next page.
+        page_size: Datasets per page (default 5).
+
+    Returns:
+        JSON with one row per dataset (dataset_id, title, collection, cells, tissue,
+        disease, assay, score), best match first, and "next_cursor".
     """
-    try:
-        # This is a simplified search. Real usage might involve more complex filtering.
-        # For now, we'll just list available datasets or try to filter if the API allows simple text search
-        # The census API is more about opening data. We might need to use the metadata to search.
-        
-        census = cellxgene_census.open_soma()
-        datasets_df = census["census_info"]["datasets"].read().concat().to_pandas()
-        
-        # Simple case-insensitive filter on title or description
-        mask = datasets_df['dataset_title'].str.contains(query, case=False, na=False)
-        filtered_df = datasets_df[mask]
-        
-        if filtered_df.empty:
-             return "No results found in Cell x Gene Census."
-             
-        # Return top 5 results
-        return filtered_df[['dataset_id', 'dataset_title', 'collection_name']].head(5).to_string()
+    return cached_query("cellxgene", {"query": normalize_query(query), "cursor": cursor, "page_size": page_size},
+                        lambda: _search_cellxgene(query, cursor, page_size))
 
-    except Exception as e:
-        return f"Error searching Cell x Gene: {e}"
+def search_all_repositories(query: str, limit: int = 5) -> str:
+    """
+    Searches SRA, GEO and CZ Cell x Gene at the same time and returns one ranked list.
+    Datasets present in several repositories (e.g. a GEO series and the SRA project with
+    its reads) are merged into one row. Use this first when the data type does not point
+    to a single repository.
+
+    Args:
+        query: Search terms.
+        limit: Maximum results per repository (default 5).
+
+    Returns:
+        JSON with the number of results per repository and the merged rows (accessions,
+        repositories, title, details, linked accessions, score), best first.
+    """
+    # Partial results (a backend failed or timed out) contain an error line and are not cached
+    return cached_query("federated", {"query": normalize_query(query), "limit": limit},
+                        lambda: _federated_search(query, limit))
+
+def biomarker_cache_stats() -> str:
+    """
+    Reports how the repository search cache is doing: entries, size, hits (fresh and
+    stale), misses, background refreshes and hit rate.
+    """
+    cache = get_query_cache()
+    if cache is None:
+        return "The repository search cache is disabled (QUERY_CACHE_TTL=0)."
+    stats = cache.stats()
+    return (f"Repository search cache ({cache.path}): {stats['entries']} entries, {stats['bytes'] / 1024:.1f} KB; "
+            f"{stats['hits']} hits, {stats['stale_hits']} stale hits, {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.0%}); {stats['refreshes']} background refreshes, "
+            f"{stats['refresh_errors']} failed.")
+
+def biomarker_client_stats() -> str:
+    """
+    Reports how the shared repository clients are reused: clients created vs. handed out
+    and, for the HTTP session, connections opened vs. requests sent.
+    """
+    lines = []
+    for name, stats in sorted(get_client_registry().stats().items()):
+        line = (f"{name}: {stats['created']} created, {stats['acquired']} uses "
+                f"(reuse rate {stats['reuse_rate']:.0%}), {stats['open']} open, {stats['in_use']} in use")
+        if "connection_reuse_rate" in stats:
+            line += (f"; {stats['connections']} connections for {stats['requests']} requests "
+                     f"(connection reuse rate {stats['connection_reuse_rate']:.0%})")
+        if stats["waits"]:
+            line += f"; waited for a free client {stats['waits']} times"
+        lines.append(line)
+    federated = federated_search_stats()
+    if federated["abandoned"]:
+        lines.append(f"federated search: {federated['abandoned']} backend searches abandoned after a timeout, "
+                     f"{federated['running']} still running (at most {federated['max_workers']} threads)")
+    return "\n".join(lines) or "No repository clients have been created yet."
 
 def create_biomarker_agent(model_name: str) -> Agent:
     return Agent(
         name="biomarker_specialist",
         model=model_name,
-        tools=[search_sra_metadata, search_geo_metadata, search_cellxgene_data],
+        tools=[search_all_repositories, search_sra_metadata, search_geo_metadata, search_cellxgene_data,
+               biomarker_cache_stats, biomarker_client_stats],
         instruction="""You are a Biomarker Data Specialist.
 Your goal is to find high-dimensional biomarker datasets from public repositories.
 You have access to:
+- All repositories at once (via search_all_repositories): Queries SRA, GEO and Cell x Gene concurrently and returns one merged, ranked list.
 - SRA/ENA (via search_sra_metadata): Good for raw sequencing data, microbiome, metagenomics.
 - GEO (via search_geo_metadata): Good for gene expression data (RNA-seq, microarray).
 - CZ Cell x Gene (via search_cellxgene_data): Good for single-cell transcriptomics data.
 
 When asked to find data, choose the most appropriate tool based on the data type requested.
+If the data type is broad or unclear (e.g. "datasets for IBD"), use search_all_repositories in a single call instead of searching each repository in turn.
 If the user asks for "microbiome" or "sequencing" data, check SRA.
 If the user asks for "expression" or "RNA-seq", check GEO.
 If the user asks for "single cell", check Cell x Gene.
+Results come back as JSON pages. When the user needs more than the first page, call the same tool again with the same query and cursor set to the page's "next_cursor".
 Always summarize the findings clearly for the user, providing IDs or Accession numbers where possible.
+If the user asks how the search cache is performing, call biomarker_cache_stats; for how repository clients and connections are reused, call biomarker_client_stats.
 """
     )
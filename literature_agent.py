@@ -1,21 +1,120 @@
+import asyncio
+import os
+import re
+import time
 from google.adk import Agent
-from google.adk.tools.mcp_tool import McpToolset, StdioConnectionParams
+from google.adk.tools.function_tool import FunctionTool
+from google.adk.tools.mcp_tool import McpToolset, StdioConnectionParams, StreamableHTTPConnectionParams
 from mcp import StdioServerParameters
+from tools.mcp_server import get_literature_mcp_server
+from tools.effect_sizes import get_effect_size_registry, record_effect_size
+from tools.paper_store import extract_papers, get_paper_store
 
-def create_literature_agent(model: str = "gemini-2.0-flash-exp") -> Agent:
+# LITERATURE_MCP_URL points at an already running server; LITERATURE_MCP_SHARED=0 goes back
+# to one stdio server process per toolset session
+LITERATURE_MCP_URL = os.environ.get("LITERATURE_MCP_URL")
+LITERATURE_MCP_SHARED = os.environ.get("LITERATURE_MCP_SHARED", "1") == "1"
+
+_call_started = {}
+
+# Single-source searches (search_pubmed, search_arxiv, ...) the paper store can answer
+_SEARCH_TOOL = re.compile(r"^(?:literature_)?search_(arxiv|pubmed|biorxiv|medrxiv|google_scholar|semantic)$")
+_SERVED_FROM_STORE = "local paper store"
+# Function tools answered in this process; only MCP tool calls are timed as server calls
+_LOCAL_TOOLS = {"record_effect_size", "paper_store_stats", "literature_server_stats"}
+
+def _serve_from_store(tool, args, tool_context):
+    """Answers a search from the local paper store when it already holds enough matching papers."""
+    store = get_paper_store()
+    match = _SEARCH_TOOL.match(tool.name)
+    # Searches with extra options (sorting, year filters) always go to the server
+    if store is None or match is None or not set(args) <= {"query", "max_results"}:
+        return None
+    papers = store.answer(str(args.get("query", "")), int(args.get("max_results", 10)), source=match.group(1))
+    if papers is None:
+        return None
+    return {"result": papers, "served_from": _SERVED_FROM_STORE}
+
+def _store_papers(tool, args, tool_context, tool_response):
     """
-    Creates and returns the Literature Review Agent with MCP toolset.
+    Persists the papers returned by the server in the local paper store, and the effect
+    sizes stated in their abstracts in the effect size registry (under the search query).
     """
-    # Configure MCP server connection
-    # The paper-search-mcp server is launched as a subprocess
+    if not isinstance(tool_response, dict) or tool_response.get("served_from") == _SERVED_FROM_STORE:
+        return None
+    papers = extract_papers(tool_response)
+    if not papers:
+        return None
+    store = get_paper_store()
+    if store is not None:
+        match = _SEARCH_TOOL.match(tool.name)
+        store.add(papers, source=match.group(1) if match else None)
+    if args.get("query"):
+        get_effect_size_registry().add_from_papers(str(args["query"]), papers)
+    return None
+
+def _start_call_timer(tool, args, tool_context):
+    if getattr(tool, "name", None) not in _LOCAL_TOOLS:
+        _call_started[tool_context.function_call_id] = time.monotonic()
+    return None
+
+def _record_call(tool, args, tool_context, tool_response):
+    started = _call_started.pop(tool_context.function_call_id, None)
+    if started is not None:
+        error = isinstance(tool_response, dict) and bool(tool_response.get("isError") or tool_response.get("error"))
+        get_literature_mcp_server().record_call(time.monotonic() - started, error=error)
+    return None
+
+def _record_call_error(tool, args, tool_context, error):
+    started = _call_started.pop(tool_context.function_call_id, None)
+    if started is not None:
+        get_literature_mcp_server().record_call(time.monotonic() - started, error=True)
+    return None
+
+async def _ensure_server(readonly_context) -> dict:
+    """Starts the shared server before a session connects (and restarts it if it died)."""
+    await asyncio.to_thread(get_literature_mcp_server().ensure_running)
+    return {}
+
+def _connection_params():
+    if LITERATURE_MCP_URL:
+        return StreamableHTTPConnectionParams(url=LITERATURE_MCP_URL), None
+    if LITERATURE_MCP_SHARED:
+        return StreamableHTTPConnectionParams(url=get_literature_mcp_server().url), _ensure_server
+    # The paper-search-mcp server is launched as a subprocess per session
     server_params = StdioServerParameters(
         command="python3",
         args=["-m", "paper_search_mcp.server"],
     )
-    
-    mcp_connection = StdioConnectionParams(
-        server_params=server_params
-    )
+    return StdioConnectionParams(server_params=server_params), None
+
+def literature_server_stats() -> str:
+    """Reports the shared literature MCP server's state, restarts, startup time and call latencies."""
+    stats = get_literature_mcp_server().stats()
+    startup = "not started" if stats["startup_seconds"] is None else f"last startup {stats['startup_seconds']:.2f}s"
+    latency = ("no calls yet" if stats["call_seconds_mean"] is None else
+               f"{stats['calls']} calls, mean {stats['call_seconds_mean']:.2f}s, p95 {stats['call_seconds_p95']:.2f}s, "
+               f"{stats['errors']} errors")
+    return (f"Literature MCP server ({stats['url']}): {'running' if stats['running'] else 'stopped'}; "
+            f"{stats['starts']} starts, {stats['restarts']} restarts, {startup}; {latency}.")
+
+def paper_store_stats() -> str:
+    """Reports the size of the local paper store and how many searches it answered."""
+    store = get_paper_store()
+    if store is None:
+        return "Local paper store is disabled."
+    stats = store.stats()
+    return (f"Local paper store: {stats['papers']} papers ({stats['added']} added, {stats['merged']} merged "
+            f"duplicates); {stats['local_hits']} searches answered locally, {stats['remote_searches']} sent to "
+            f"the server ({stats['local_hit_rate']:.0%} local).")
+
+def create_literature_agent(model: str = "gemini-2.0-flash-exp") -> Agent:
+    """
+    Creates and returns the Literature Review Agent with MCP toolset.
+    """
+    # Connect to the shared, long-lived paper-search MCP server (tools/mcp_server.py), which
+    # is started on the first tool listing or call rather than once per session
+    mcp_connection, header_provider = _connection_params()
     
     # Create MCP toolset
     # This will connect to the paper-search-mcp server and expose its tools
@@ -23,12 +122,19 @@ def create_literature_agent(model: str = "gemini-2.0-flash-exp") -> Agent:
     literature_toolset = McpToolset(
         connection_params=mcp_connection,
         tool_name_prefix="literature_",  # Prefix tools with "literature_"
+        header_provider=header_provider,
     )
     
     agent = Agent(
         name="literature_review_agent",
         model=model,
-        tools=[literature_toolset],
+        tools=[literature_toolset, FunctionTool(func=record_effect_size), FunctionTool(func=paper_store_stats),
+               FunctionTool(func=literature_server_stats)],
+        # Searches are answered from the local paper store when possible; everything the
+        # server returns is added to it
+        before_tool_callback=[_serve_from_store, _start_call_timer],
+        after_tool_callback=[_store_papers, _record_call],
+        on_tool_error_callback=_record_call_error,
         instruction="""You are a specialized agent for literature review and research synthesis.
 Your goal is to help researchers find relevant scientific papers, extract effect sizes, and understand study designs.
 
@@ -53,9 +159,22 @@ For power analysis support:
 - When asked about typical effect sizes, search for meta-analyses and systematic reviews
 - Extract Cohen's d, odds ratios, or other effect size measures
 - Note the context and population for the effect sizes
+- Record every effect size you extract with `record_effect_size` (one call per study and outcome, under a
+  short topic such as "probiotics alpha diversity"), including the 95% CI and n when reported. Record
+  ratios in one direction per topic (exposure vs. control; invert a ratio reported the other way round).
+  The power analysis agent uses the pooled estimates by topic.
+- Effect sizes stated in search-result abstracts are kept as unpooled candidates; record the ones that
+  match the topic's outcome with `record_effect_size` so they are pooled.
+
+Search results marked "served_from": "local paper store" are papers retrieved earlier for related
+questions; each lists every database it was found in under "sources".
+If the user asks how much the local paper store holds or how many searches it answered, call
+`paper_store_stats`.
 
 Be specific about which database you're searching and why.
 If initial searches don't yield good results, try alternative keywords or databases.
+If the user asks how the literature server is performing (startup time, call latency, restarts), call
+`literature_server_stats`.
 """
     )
     return agent
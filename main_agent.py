@@ -1,5 +1,6 @@
+import asyncio
 import os
-import sys
+import time
 from google.adk import Agent, Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
@@ -9,6 +10,48 @@ from proposal_agent import create_proposal_agent
 from biomarker_agent import create_biomarker_agent
 from criticism_agent import create_criticism_agent
 from microbiome_agent import create_microbiome_agent
+from tools.context_compaction import ContextCompactor, budgets_from_env
+from tools.effect_sizes import get_effect_size_registry
+from tools.event_stream import new_collector
+
+# Seconds each concurrently run specialist step may take before its partial output is used
+PROPOSAL_STEP_TIMEOUT = float(os.environ.get("PROPOSAL_STEP_TIMEOUT", "300"))
+
+async def _run_step(name: str, runner, user_id: str, session_id: str, message, timeout: float) -> dict:
+    """
+    Runs one specialist through its async runner, keeping whatever text arrived
+    before a timeout or error so the workflow can continue with a partial result.
+    """
+    # Concurrent steps are printed once finished, not streamed to the terminal
+    collector = new_collector(name, terminal=False)
+    error = None
+    try:
+        await asyncio.wait_for(collector.collect_async(
+            runner.run_async(user_id=user_id, session_id=session_id, new_message=message)), timeout)
+    except asyncio.TimeoutError:
+        error = f"timed out after {timeout:.0f}s"
+    except Exception as e:
+        error = str(e)
+    stats = collector.stats()
+    return {"name": name, "text": collector.text, "elapsed": stats["seconds"], "error": error, "stats": stats}
+
+async def run_steps_concurrently(steps, user_id: str, timeout: float = PROPOSAL_STEP_TIMEOUT) -> list:
+    """
+    Runs independent specialist steps at the same time.
+
+    Args:
+        steps: (name, runner, session_id, message) tuples. Each step should have its own
+               session so the concurrent conversations do not interleave.
+        timeout: Per-step timeout in seconds.
+
+    Returns:
+        One dict per step with its text, elapsed seconds, error (None on success) and
+        stream timings (see EventCollector.stats()).
+    """
+    return await asyncio.gather(*[
+        _run_step(name, runner, user_id, session_id, message, timeout)
+        for name, runner, session_id, message in steps
+    ])
 
 def main():
     # Initialize the model name
@@ -65,13 +108,20 @@ If the user asks for a "proposal", "protocol", or "study design", initiate the p
     user_id = "user_1"
     session_id = "session_1"
     
-    # Create a session in the session service using async create_session
-    import asyncio
-    asyncio.run(session_service.create_session(
-        app_name=app_name,
-        user_id=user_id,
-        session_id=session_id
-    ))
+    # The proposal workflow runs literature search and power analysis concurrently,
+    # each in its own session so the two conversations do not interleave
+    lit_session_id = f"{session_id}_literature"
+    power_session_id = f"{session_id}_power"
+
+    # Create the sessions in the session service using async create_session
+    async def create_sessions():
+        for sid in (session_id, lit_session_id, power_session_id):
+            await session_service.create_session(app_name=app_name, user_id=user_id, session_id=sid)
+    asyncio.run(create_sessions())
+
+    # Hand-offs between proposal workflow steps are compacted to per-step token budgets
+    compactor = ContextCompactor(budgets_from_env())
+    workflow_runs = 0
     
     # Simple REPL loop
     while True:
@@ -92,43 +142,63 @@ If the user asks for a "proposal", "protocol", or "study design", initiate the p
             if "proposal" in user_lower or "protocol" in user_lower:
                 # Orchestration Mode: Proposal Generation
                 print(f"Agent (Lead): Initiating Research Proposal Generation Workflow...", flush=True)
+                # The proposal and review steps get fresh sessions per run, so their prompts do
+                # not carry the history of earlier runs and of the other specialists
+                workflow_runs += 1
+                proposal_session_id = f"{session_id}_proposal_{workflow_runs}"
+                criticism_session_id = f"{session_id}_criticism_{workflow_runs}"
+
+                async def create_workflow_sessions():
+                    for sid in (proposal_session_id, criticism_session_id):
+                        await session_service.create_session(app_name=app_name, user_id=user_id, session_id=sid)
+                asyncio.run(create_workflow_sessions())
                 
-                # Step 1: Literature Search (Context Gathering)
-                print(f"\n[Step 1/3] Agent (Literature Specialist): Searching for context...", flush=True)
-                lit_context = ""
-                try:
-                    # Create a specific prompt for the literature agent based on the user's request
-                    lit_prompt = types.Content(role="user", parts=[types.Part(text=f"Find key papers and effect sizes relevant to: {user_input}")])
-                    for event in literature_runner.run(user_id=user_id, session_id=session_id, new_message=lit_prompt):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                            lit_context += event.text
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                                    lit_context += part.text
-                except Exception as e:
-                    print(f"\nWarning: Literature search had issues: {e}")
+                # Steps 1 and 2 run concurrently and take as long as the slower one. The power step
+                # only sees effect sizes recorded by earlier searches; it is re-checked below when
+                # this search records new ones.
+                print(f"\n[Steps 1-2/4] Agent (Literature Specialist) and Agent (Power Specialist): "
+                      f"Searching for context and calculating sample size in parallel...", flush=True)
+                # Create a specific prompt for the literature agent based on the user's request
+                lit_prompt = types.Content(role="user", parts=[types.Part(text=f"Find key papers and effect sizes relevant to: {user_input}. Record the effect sizes you find.")])
+                # Create a prompt that asks for a standard power analysis based on the user's input
+                power_prompt = types.Content(role="user", parts=[types.Part(text=f"Perform a power analysis for this study design: {user_input}. If effect size is unknown, use the effect sizes already recorded from the literature for the topic (effect_topic), and only assume a medium effect size if none are recorded.")])
+                records_since = time.time()
+                wall_start = time.perf_counter()
+                lit_step, power_step = asyncio.run(run_steps_concurrently([
+                    ("Literature search", literature_runner, lit_session_id, lit_prompt),
+                    ("Power analysis", power_runner, power_session_id, power_prompt),
+                ], user_id=user_id))
+                wall_time = time.perf_counter() - wall_start
 
-                # Step 2: Power Analysis (Statistical Design)
-                print(f"\n\n[Step 2/3] Agent (Power Specialist): Calculating sample size...", flush=True)
-                power_context = ""
-                try:
-                    # Create a prompt that asks for a standard power analysis based on the user's input
-                    # We append a hint to extract parameters from the literature if possible, but for now we'll rely on the user's input or defaults
-                    power_prompt = types.Content(role="user", parts=[types.Part(text=f"Perform a power analysis for this study design: {user_input}. If effect size is unknown, assume a medium effect size.")])
-                    for event in power_runner.run(user_id=user_id, session_id=session_id, new_message=power_prompt):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                            power_context += event.text
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                                    power_context += part.text
-                except Exception as e:
-                    print(f"\nWarning: Power analysis had issues: {e}")
+                for number, step in ((1, lit_step), (2, power_step)):
+                    first_token = step["stats"]["first_token_seconds"]
+                    first_token = "no text" if first_token is None else f"first token {first_token:.1f}s"
+                    print(f"\n[Step {number}/4] {step['name']} ({step['elapsed']:.1f}s, {first_token}):", flush=True)
+                    print(step["text"], flush=True)
+                    if step["error"]:
+                        print(f"\nWarning: {step['name']} had issues: {step['error']}"
+                              f"{' (continuing with partial results)' if step['text'] else ''}")
+                print(f"\n[Timing] Literature search {lit_step['elapsed']:.1f}s, power analysis "
+                      f"{power_step['elapsed']:.1f}s, wall time {wall_time:.1f}s", flush=True)
+                lit_context = lit_step["text"]
+                power_context = power_step["text"]
+
+                # Counted across topics: the literature agent picks the topic names it records under
+                new_topics = get_effect_size_registry().topics_added_since(records_since)
+                if new_topics:
+                    recorded = sum(new_topics.values())
+                    topics = ", ".join(f"'{topic}' ({count})" for topic, count in new_topics.items())
+                    print(f"\n[Step 2/4] Agent (Power Specialist): Re-checking the power analysis against the "
+                          f"{recorded} effect sizes recorded meanwhile...", flush=True)
+                    try:
+                        recheck_prompt = types.Content(role="user", parts=[types.Part(text=f"While you worked, {recorded} effect sizes were recorded from the literature under these topics: {topics}. If your power analysis assumed an effect size that the request did not give and one of these topics matches the study, re-run it with that topic as effect_topic; otherwise repeat your result.")])
+                        collector = new_collector("Power re-check")
+                        text = collector.collect(power_runner.run(user_id=user_id, session_id=power_session_id, new_message=recheck_prompt))
+                        print(f"\n{collector.summary()}", flush=True)
+                        if text:
+                            power_context = text
+                    except Exception as e:
+                        print(f"\nWarning: Re-checking the power analysis had issues: {e}")
 
                 # Step 2.5: Human-in-the-Loop Feedback
                 print(f"\n[Step 2.5/4] Human-in-the-Loop: Reviewing Power Analysis...", flush=True)
@@ -149,169 +219,105 @@ If the user asks for a "proposal", "protocol", or "study design", initiate the p
                         # We create a new prompt that includes the previous context and the new adjustment
                         adjustment_prompt = types.Content(role="user", parts=[types.Part(text=f"The user wants to adjust the previous power analysis. Feedback: {adjustment_input}. Please re-calculate.")])
                         
-                        # Clear previous context to avoid duplication if we want, or just append. 
-                        # For a cleaner proposal, let's reset power_context and capture the new result.
-                        power_context = "" 
-                        for event in power_runner.run(user_id=user_id, session_id=session_id, new_message=adjustment_prompt):
-                            if hasattr(event, 'text'):
-                                print(event.text, end="", flush=True)
-                                power_context += event.text
-                            elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                                for part in event.content.parts:
-                                    if hasattr(part, 'text'):
-                                        print(part.text, end="", flush=True)
-                                        power_context += part.text
+                        # The new result replaces the previous power context
+                        collector = new_collector("Power re-calculation")
+                        power_context = collector.collect(power_runner.run(user_id=user_id, session_id=power_session_id, new_message=adjustment_prompt))
+                        print(f"\n{collector.summary()}", flush=True)
                     except Exception as e:
                         print(f"\nWarning: Re-calculation had issues: {e}")
 
                 # Step 3: Proposal Synthesis
                 print(f"\n\n[Step 3/4] Agent (Proposal Specialist): Synthesizing proposal...", flush=True)
-                proposal_text = ""
+                proposal_collector = new_collector("Proposal")
                 try:
-                    # Combine contexts into a prompt for the proposal agent
+                    # Combine the compacted contexts into a prompt for the proposal agent
                     synthesis_prompt = f"""
                     Please generate a research proposal based on the following:
                     
                     USER REQUEST: {user_input}
                     
                     LITERATURE FINDINGS:
-                    {lit_context}
+                    {compactor.compact("literature", lit_context)}
                     
                     POWER ANALYSIS RESULTS:
-                    {power_context}
+                    {compactor.compact("power", power_context)}
                     """
                     proposal_message = types.Content(role="user", parts=[types.Part(text=synthesis_prompt)])
                     
-                    for event in proposal_runner.run(user_id=user_id, session_id=session_id, new_message=proposal_message):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                            proposal_text += event.text
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                                    proposal_text += part.text
+                    proposal_collector.collect(proposal_runner.run(user_id=user_id, session_id=proposal_session_id, new_message=proposal_message))
                 except Exception as e:
                     print(f"\nError generating proposal: {e}")
+                # Whatever arrived before an error is still used for the review
+                proposal_text = proposal_collector.text
+                print(f"\n{proposal_collector.summary()}", flush=True)
 
                 # Step 4: Methodological Review (Criticism)
                 print(f"\n\n[Step 4/4] Agent (Methodological Reviewer): Critiquing proposal...", flush=True)
+                criticism_collector = new_collector("Methodological review")
                 try:
                     criticism_prompt = f"""
                     Please review the following research proposal for statistical rigor, bias, and methodological issues:
                     
-                    {proposal_text}
+                    {compactor.compact("proposal", proposal_text)}
                     """
                     criticism_message = types.Content(role="user", parts=[types.Part(text=criticism_prompt)])
                     
-                    for event in criticism_runner.run(user_id=user_id, session_id=session_id, new_message=criticism_message):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
+                    criticism_collector.collect(criticism_runner.run(user_id=user_id, session_id=criticism_session_id, new_message=criticism_message))
                 except Exception as e:
                     print(f"\nError in methodological review: {e}")
+                print(f"\n{criticism_collector.summary()}", flush=True)
                 
-                print("\n\n[Workflow Complete]")
+                print(f"\n\n[Context] Tokens handed between steps:\n{compactor.report()}", flush=True)
+                print("\n[Workflow Complete]")
 
 
             elif "power" in user_lower or "sample size" in user_lower:
                 # Delegate to power agent
                 print(f"Agent (Power Specialist): [Delegating...]", end="", flush=True)
-                print(f"\nDEBUG: Starting power_runner.run...", file=sys.stderr)
+                collector = new_collector("Power Specialist")
                 try:
-                    for event in power_runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
-                        print(f"\nDEBUG: Received event from power_runner: {type(event)}", file=sys.stderr)
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                        elif hasattr(event, 'parts'):
-                             for part in event.parts:
-                                 if hasattr(part, 'text'):
-                                     print(part.text, end="", flush=True)
-                    print(f"\nDEBUG: power_runner.run completed.", file=sys.stderr)
+                    collector.collect(power_runner.run(user_id=user_id, session_id=session_id, new_message=user_content))
                 except Exception as e:
-                    print(f"\nDEBUG: Error in power_runner.run: {e}", file=sys.stderr)
-                    import traceback
-                    traceback.print_exc(file=sys.stderr)
-                print()
+                    print(f"\nError in power analysis: {e}")
+                print(f"\n{collector.summary()}")
             elif any(keyword in user_lower for keyword in ["paper", "literature", "search", "study", "pubmed", "arxiv", "effect size"]):
                 # Delegate to literature agent
                 print(f"Agent (Literature Specialist): ", end="", flush=True)
+                collector = new_collector("Literature Specialist")
                 try:
-                    for event in literature_runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                        elif hasattr(event, 'parts'):
-                             for part in event.parts:
-                                 if hasattr(part, 'text'):
-                                     print(part.text, end="", flush=True)
+                    collector.collect(literature_runner.run(user_id=user_id, session_id=session_id, new_message=user_content))
                 except RuntimeError as e:
                     if "Attempted to exit cancel scope" in str(e):
-                        # Ignore known MCP cleanup error
+                        # Known MCP cleanup error of the per-session stdio transport
+                        # (LITERATURE_MCP_SHARED=0); the shared server does not raise it
                         pass
                     else:
                         raise e
-                print()
+                print(f"\n{collector.summary()}")
             elif any(keyword in user_lower for keyword in ["dataset", "sra", "ena", "geo", "microbiome data", "rnaseq data", "single cell", "cellxgene", "expression atlas"]):
                 # Delegate to biomarker agent
                 print(f"Agent (Biomarker Specialist): ", end="", flush=True)
+                collector = new_collector("Biomarker Specialist")
                 try:
-                    for event in biomarker_runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                        elif hasattr(event, 'parts'):
-                             for part in event.parts:
-                                 if hasattr(part, 'text'):
-                                     print(part.text, end="", flush=True)
+                    collector.collect(biomarker_runner.run(user_id=user_id, session_id=session_id, new_message=user_content))
                 except Exception as e:
                     print(f"\nError in biomarker search: {e}")
-                print()
+                print(f"\n{collector.summary()}")
             elif any(keyword in user_lower for keyword in ["kneaddata", "metaphlan", "humann", "process microbiome", "run pipeline"]):
                 # Delegate to microbiome agent
                 print(f"Agent (Microbiome Tool Runner): ", end="", flush=True)
+                collector = new_collector("Microbiome Tool Runner")
                 try:
-                    for event in microbiome_runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
-                        if hasattr(event, 'text'):
-                            print(event.text, end="", flush=True)
-                        elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                            for part in event.content.parts:
-                                if hasattr(part, 'text'):
-                                    print(part.text, end="", flush=True)
-                        elif hasattr(event, 'parts'):
-                             for part in event.parts:
-                                 if hasattr(part, 'text'):
-                                     print(part.text, end="", flush=True)
+                    collector.collect(microbiome_runner.run(user_id=user_id, session_id=session_id, new_message=user_content))
                 except Exception as e:
                     print(f"\nError in microbiome processing: {e}")
-                print()
+                print(f"\n{collector.summary()}")
             else:
                 # Handle with main agent
                 print(f"Agent (Lead): ", end="", flush=True)
-                for event in main_runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
-                    if hasattr(event, 'text'):
-                        print(event.text, end="", flush=True)
-                    elif hasattr(event, 'content') and hasattr(event.content, 'parts'):
-                        for part in event.content.parts:
-                            if hasattr(part, 'text'):
-                                print(part.text, end="", flush=True)
-                    elif hasattr(event, 'parts'):
-                         for part in event.parts:
-                             if hasattr(part, 'text'):
-                                 print(part.text, end="", flush=True)
+                collector = new_collector("Lead")
+                collector.collect(main_runner.run(user_id=user_id, session_id=session_id, new_message=user_content))
+                print(f"\n{collector.summary()}")
                 
         except KeyboardInterrupt:
             break
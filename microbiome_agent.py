@@ -1,9 +1,110 @@
+import asyncio
 import subprocess
 import os
+import time
 from google.adk import Agent
 from google.genai import types
+from tools.async_exec import CONCURRENCY_LIMITS, get_limiter, run_command_async
+from tools.microbiome_pipeline import (
+    run_microbiome_batch, kneaddata_output, humann2_outputs, bowtie2out_path, metaphlan2_invocation, sample_name
+)
+from tools.pipeline_state import PipelineState, tool_version
+from tools.resources import get_resource_manager, thread_args
+from tools.tool_logs import TOOL_LOG_TAIL_LINES, ToolLog, stream_command
 
-def run_kneaddata(input_file: str, output_dir: str, reference_db: str = None) -> str:
+# MetaPhlAn2 input types that are aligned with bowtie2 (and so leave a reusable alignment)
+_READ_INPUT_TYPES = ("fastq", "fasta", "multifastq", "multifasta")
+
+class _Checkpoint:
+    """
+    Checkpoint state of a single-tool run, kept in its output directory.
+    `command` is the logical command compared between runs.
+    """
+    def __init__(self, tool: str, inputs: list, outputs: list, command: list, state_dir: str):
+        self.state = PipelineState.for_directory(state_dir)
+        self.key = f"{tool}:{os.path.abspath(outputs[0])}"
+        self.inputs = inputs
+        self.outputs = outputs
+        self.command = command
+        self.version = lambda: tool_version(command[0])
+        self.previous = self.state.get(self.key) or {}
+        self.start = time.perf_counter()
+
+    def up_to_date(self) -> bool:
+        return self.state.is_up_to_date(self.key, self.inputs, self.outputs, self.command, self.version)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def record(self, status: str, extra: dict = None):
+        self.state.record(self.key, status, self.inputs, self.outputs, self.command, self.version, self.elapsed(), extra)
+
+def _plan_metaphlan2(input_file: str, output_file: str, input_type: str, command: list):
+    """
+    Returns the checkpoint of a MetaPhlAn2 run and, for read inputs, the path of the bowtie2
+    alignment kept next to the profile (None otherwise).
+    """
+    bowtie2out = bowtie2out_path(output_file) if input_type in _READ_INPUT_TYPES else None
+    outputs = [output_file] + ([bowtie2out] if bowtie2out else [])
+    return _Checkpoint("metaphlan2", [input_file], outputs, command, os.path.dirname(output_file)), bowtie2out
+
+def _metaphlan2_command(checkpoint: _Checkpoint, command: list, bowtie2out: str):
+    """
+    Profiles the saved bowtie2 alignment if it is still current for the same input and
+    MetaPhlAn2 version; otherwise aligns the reads and saves the alignment.
+
+    Returns:
+        (command to run, whether the alignment is reused)
+    """
+    if bowtie2out is None:
+        return command, False
+    reuse = checkpoint.state.output_is_current(checkpoint.key, checkpoint.inputs, bowtie2out, checkpoint.version)
+    return metaphlan2_invocation(command, bowtie2out, reuse), reuse
+
+def _finish_metaphlan2(checkpoint: _Checkpoint, output_file: str, bowtie2out: str, reuse: bool, threads: int) -> str:
+    """Records a successful MetaPhlAn2 run and describes it, including any time saved."""
+    elapsed = checkpoint.elapsed()
+    # Time of the last run that aligned the reads, to estimate what reusing the alignment saves
+    baseline = checkpoint.previous.get("baseline_elapsed") if reuse else elapsed
+    checkpoint.record("done", {"baseline_elapsed": baseline} if bowtie2out else None)
+    message = f"MetaPhlAn2 completed successfully with {threads} threads. Profile saved to {output_file}."
+    if reuse:
+        saved = f" (~{max(0.0, baseline - elapsed):.0f}s saved)" if baseline else ""
+        message += f" Reused the saved bowtie2 alignment {bowtie2out}{saved}."
+    elif bowtie2out:
+        message += f" Bowtie2 alignment saved to {bowtie2out} for re-profiling."
+    return message
+
+def _humann2_command(input_file: str, output_dir: str, taxonomic_profile: str = None):
+    """
+    Returns:
+        (command, inputs): the HUMAnN2 command, given the MetaPhlAn2 profile when it exists,
+        and the files the run reads.
+    """
+    command = ["humann2", "--input", input_file, "--output", output_dir]
+    if taxonomic_profile and os.path.exists(taxonomic_profile):
+        return command + ["--taxonomic-profile", taxonomic_profile], [input_file, taxonomic_profile]
+    return command, [input_file]
+
+def _taxonomic_profile_note(taxonomic_profile: str) -> str:
+    """Describes the HUMAnN2 pre-screen skipped by passing a MetaPhlAn2 profile."""
+    record = PipelineState.for_directory(os.path.dirname(taxonomic_profile)).get(
+        f"metaphlan2:{os.path.abspath(taxonomic_profile)}") or {}
+    # The pre-screen is a MetaPhlAn2 run on the same reads
+    baseline = record.get("baseline_elapsed")
+    saved = f" (~{baseline:.0f}s saved)" if baseline else ""
+    return f" Used the MetaPhlAn2 profile {taxonomic_profile}, skipping HUMAnN2's taxonomic pre-screen{saved}."
+
+def _tool_log(tool: str, input_file: str, output_dir: str) -> ToolLog:
+    """Rotating log `<output_dir>/logs/<tool>_<sample>.log` that also reports progress while the tool runs."""
+    sample = sample_name(input_file)
+    return ToolLog(f"{tool} {sample}", os.path.join(output_dir or ".", "logs", f"{tool}_{sample}.log"))
+
+def _allocate_async(tool: str, threads: int = None):
+    """Thread allocation for an async job, sharing the cores between the jobs the microbiome limiter lets run at once."""
+    return get_resource_manager().allocate(tool, threads, slots=CONCURRENCY_LIMITS["microbiome"])
+
+def run_kneaddata(input_file: str, output_dir: str, reference_db: str = None, threads: int = None) -> str:
     """
     Runs kneaddata on the input sequencing file for quality control and host decontamination.
     
@@ -11,6 +112,7 @@ def run_kneaddata(input_file: str, output_dir: str, reference_db: str = None) ->
         input_file: Path to the input FASTQ file.
         output_dir: Directory to save the output.
         reference_db: Path to the reference database for decontamination (optional).
+        threads: Threads to use (default: a share of the available cores for the jobs running at once).
         
     Returns:
         A message indicating success or failure, including the output directory.
@@ -21,20 +123,27 @@ def run_kneaddata(input_file: str, output_dir: str, reference_db: str = None) ->
         if reference_db:
             command.extend(["--reference-db", reference_db])
             
-        # Run the command
+        checkpoint = _Checkpoint("kneaddata", [input_file], [kneaddata_output(input_file, output_dir)], command, output_dir)
+        if checkpoint.up_to_date():
+            return f"Kneaddata output in {output_dir} is up to date (same input, parameters and version); skipped."
+            
+        # Run the command, streaming its output to the log
         # Note: In a real environment, we would check for the executable.
         # Here we assume it's in the PATH.
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        with get_resource_manager().allocate("kneaddata", threads) as threads, _tool_log("kneaddata", input_file, output_dir) as log:
+            stream_command(command + thread_args("kneaddata", threads), log)
+        checkpoint.record("done")
         
-        return f"Kneaddata completed successfully. Output stored in {output_dir}. Stdout: {result.stdout[:200]}..."
+        return f"Kneaddata completed successfully with {threads} threads. Output stored in {output_dir}. Progress: {log.summary()}"
     except subprocess.CalledProcessError as e:
-        return f"Error running kneaddata: {e.stderr}"
+        checkpoint.record("failed")
+        return f"Error running kneaddata (full log: {log.log_path}): {e.stderr}"
     except FileNotFoundError:
         return "Error: kneaddata executable not found in PATH."
     except Exception as e:
         return f"An unexpected error occurred: {e}"
 
-def run_metaphlan2(input_file: str, output_file: str, input_type: str = "fastq") -> str:
+def run_metaphlan2(input_file: str, output_file: str, input_type: str = "fastq", threads: int = None) -> str:
     """
     Runs MetaPhlAn2 on the input file for taxonomic profiling.
     
@@ -42,6 +151,7 @@ def run_metaphlan2(input_file: str, output_file: str, input_type: str = "fastq")
         input_file: Path to the input file (FASTQ or Bowtie2 output).
         output_file: Path to save the output profile.
         input_type: Type of input file ('fastq', 'bowtie2out', 'sam').
+        threads: Threads to use (default: a share of the available cores for the jobs running at once).
         
     Returns:
         A message indicating success or failure.
@@ -51,44 +161,180 @@ def run_metaphlan2(input_file: str, output_file: str, input_type: str = "fastq")
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
             
-        command = ["metaphlan2.py", input_file, "--input_type", input_type, "--nproc", "4"]
+        command = ["metaphlan2.py", input_file, "--input_type", input_type]
         
         # Capture output to file as metaphlan writes to stdout by default usually, 
         # but modern versions might have -o. We'll use stdout redirection pattern for safety if wrapper handles it,
         # but here we'll assume the command line tool accepts output file redirection or we handle it.
         # Actually metaphlan2 usually takes input and writes to stdout, so we redirect.
         
-        with open(output_file, "w") as outfile:
-            result = subprocess.run(command, stdout=outfile, stderr=subprocess.PIPE, text=True, check=True)
+        checkpoint, bowtie2out = _plan_metaphlan2(input_file, output_file, input_type, command)
+        if checkpoint.up_to_date():
+            return f"MetaPhlAn2 profile {output_file} is up to date (same input, parameters and version); skipped."
+        run_command, reuse = _metaphlan2_command(checkpoint, command, bowtie2out)
+
+        with get_resource_manager().allocate("metaphlan2", threads) as threads, open(output_file, "w") as outfile:
+            result = subprocess.run(run_command + thread_args("metaphlan2", threads), stdout=outfile,
+                                    stderr=subprocess.PIPE, text=True, check=True)
             
-        return f"MetaPhlAn2 completed successfully. Profile saved to {output_file}."
+        return _finish_metaphlan2(checkpoint, output_file, bowtie2out, reuse, threads)
     except subprocess.CalledProcessError as e:
+        checkpoint.record("failed")
         return f"Error running MetaPhlAn2: {e.stderr}"
     except FileNotFoundError:
         return "Error: metaphlan2.py executable not found in PATH."
     except Exception as e:
         return f"An unexpected error occurred: {e}"
 
-def run_humann2(input_file: str, output_dir: str) -> str:
+def run_humann2(input_file: str, output_dir: str, taxonomic_profile: str = None, threads: int = None) -> str:
     """
     Runs HUMAnN2 on the input file for functional profiling.
     
     Args:
         input_file: Path to the input file (FASTQ or taxonomic profile).
         output_dir: Directory to save the output.
+        taxonomic_profile: MetaPhlAn2 profile of the same reads; skips HUMAnN2's own pre-screen (optional).
+        threads: Threads to use (default: a share of the available cores for the jobs running at once).
         
     Returns:
         A message indicating success or failure.
     """
     try:
         os.makedirs(output_dir, exist_ok=True)
-        command = ["humann2", "--input", input_file, "--output", output_dir]
+        command, inputs = _humann2_command(input_file, output_dir, taxonomic_profile)
+        checkpoint = _Checkpoint("humann2", inputs, humann2_outputs(input_file, output_dir), command, output_dir)
+        if checkpoint.up_to_date():
+            return f"HUMAnN2 output in {output_dir} is up to date (same input, parameters and version); skipped."
+        
+        with get_resource_manager().allocate("humann2", threads) as threads, _tool_log("humann2", input_file, output_dir) as log:
+            stream_command(command + thread_args("humann2", threads), log)
+        checkpoint.record("done")
+        note = _taxonomic_profile_note(taxonomic_profile) if len(inputs) > 1 else ""
+        
+        return f"HUMAnN2 completed successfully with {threads} threads. Output stored in {output_dir}.{note} Progress: {log.summary()}"
+    except subprocess.CalledProcessError as e:
+        checkpoint.record("failed")
+        return f"Error running HUMAnN2 (full log: {log.log_path}): {e.stderr}"
+    except FileNotFoundError:
+        return "Error: humann2 executable not found in PATH."
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+async def run_kneaddata_async(input_file: str, output_dir: str, reference_db: str = None, threads: int = None,
+                              timeout: float = None) -> str:
+    """
+    Runs kneaddata on the input sequencing file for quality control and host decontamination,
+    without blocking other sessions. Output is streamed to a per-sample log and progress is
+    reported while it runs.
+    
+    Args:
+        input_file: Path to the input FASTQ file.
+        output_dir: Directory to save the output.
+        reference_db: Path to the reference database for decontamination (optional).
+        threads: Threads to use (default: a share of the available cores for the jobs running at once).
+        timeout: Seconds after which the run is stopped (optional).
+        
+    Returns:
+        A message indicating success or failure, including the output directory.
+    """
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        command = ["kneaddata", "--input", input_file, "--output", output_dir]
+        if reference_db:
+            command.extend(["--reference-db", reference_db])
+        checkpoint = _Checkpoint("kneaddata", [input_file], [kneaddata_output(input_file, output_dir)], command, output_dir)
+        if await asyncio.to_thread(checkpoint.up_to_date):
+            return f"Kneaddata output in {output_dir} is up to date (same input, parameters and version); skipped."
+        async with get_limiter("microbiome"):
+            with _allocate_async("kneaddata", threads) as threads, _tool_log("kneaddata", input_file, output_dir) as log:
+                await run_command_async(command + thread_args("kneaddata", threads), timeout=timeout, on_line=log,
+                                        on_stderr_line=log, max_lines=TOOL_LOG_TAIL_LINES)
+        await asyncio.to_thread(checkpoint.record, "done")
+        return f"Kneaddata completed successfully with {threads} threads. Output stored in {output_dir}. Progress: {log.summary()}"
+    except subprocess.CalledProcessError as e:
+        checkpoint.record("failed")
+        return f"Error running kneaddata (full log: {log.log_path}): {log.tail()}"
+    except asyncio.TimeoutError:
+        return f"Error: kneaddata timed out after {timeout} seconds."
+    except FileNotFoundError:
+        return "Error: kneaddata executable not found in PATH."
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+async def run_metaphlan2_async(input_file: str, output_file: str, input_type: str = "fastq", threads: int = None,
+                               timeout: float = None) -> str:
+    """
+    Runs MetaPhlAn2 on the input file for taxonomic profiling, without blocking other sessions.
+    
+    Args:
+        input_file: Path to the input file (FASTQ or Bowtie2 output).
+        output_file: Path to save the output profile.
+        input_type: Type of input file ('fastq', 'bowtie2out', 'sam').
+        threads: Threads to use (default: a share of the available cores for the jobs running at once).
+        timeout: Seconds after which the run is stopped (optional).
         
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+    Returns:
+        A message indicating success or failure.
+    """
+    try:
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        command = ["metaphlan2.py", input_file, "--input_type", input_type]
+        checkpoint, bowtie2out = _plan_metaphlan2(input_file, output_file, input_type, command)
+        if await asyncio.to_thread(checkpoint.up_to_date):
+            return f"MetaPhlAn2 profile {output_file} is up to date (same input, parameters and version); skipped."
+        run_command, reuse = await asyncio.to_thread(_metaphlan2_command, checkpoint, command, bowtie2out)
+        async with get_limiter("microbiome"):
+            with _allocate_async("metaphlan2", threads) as threads, open(output_file, "w") as outfile, \
+                    _tool_log("metaphlan2", input_file, output_dir) as log:
+                await run_command_async(run_command + thread_args("metaphlan2", threads), timeout=timeout,
+                                        stdout_file=outfile, on_stderr_line=log, max_lines=TOOL_LOG_TAIL_LINES)
+        return await asyncio.to_thread(_finish_metaphlan2, checkpoint, output_file, bowtie2out, reuse, threads)
+    except subprocess.CalledProcessError as e:
+        checkpoint.record("failed")
+        return f"Error running MetaPhlAn2: {e.stderr}"
+    except asyncio.TimeoutError:
+        return f"Error: MetaPhlAn2 timed out after {timeout} seconds."
+    except FileNotFoundError:
+        return "Error: metaphlan2.py executable not found in PATH."
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+async def run_humann2_async(input_file: str, output_dir: str, taxonomic_profile: str = None, threads: int = None,
+                            timeout: float = None) -> str:
+    """
+    Runs HUMAnN2 on the input file for functional profiling, without blocking other sessions.
+    Output is streamed to a per-sample log and progress is reported while it runs.
+    
+    Args:
+        input_file: Path to the input file (FASTQ or taxonomic profile).
+        output_dir: Directory to save the output.
+        taxonomic_profile: MetaPhlAn2 profile of the same reads; skips HUMAnN2's own pre-screen (optional).
+        threads: Threads to use (default: a share of the available cores for the jobs running at once).
+        timeout: Seconds after which the run is stopped (optional).
         
-        return f"HUMAnN2 completed successfully. Output stored in {output_dir}. Stdout: {result.stdout[:200]}..."
+    Returns:
+        A message indicating success or failure.
+    """
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        command, inputs = _humann2_command(input_file, output_dir, taxonomic_profile)
+        checkpoint = _Checkpoint("humann2", inputs, humann2_outputs(input_file, output_dir), command, output_dir)
+        if await asyncio.to_thread(checkpoint.up_to_date):
+            return f"HUMAnN2 output in {output_dir} is up to date (same input, parameters and version); skipped."
+        async with get_limiter("microbiome"):
+            with _allocate_async("humann2", threads) as threads, _tool_log("humann2", input_file, output_dir) as log:
+                await run_command_async(command + thread_args("humann2", threads), timeout=timeout, on_line=log,
+                                        on_stderr_line=log, max_lines=TOOL_LOG_TAIL_LINES)
+        await asyncio.to_thread(checkpoint.record, "done")
+        note = _taxonomic_profile_note(taxonomic_profile) if len(inputs) > 1 else ""
+        return f"HUMAnN2 completed successfully with {threads} threads. Output stored in {output_dir}.{note} Progress: {log.summary()}"
     except subprocess.CalledProcessError as e:
-        return f"Error running HUMAnN2: {e.stderr}"
+        checkpoint.record("failed")
+        return f"Error running HUMAnN2 (full log: {log.log_path}): {log.tail()}"
+    except asyncio.TimeoutError:
+        return f"Error: HUMAnN2 timed out after {timeout} seconds."
     except FileNotFoundError:
         return "Error: humann2 executable not found in PATH."
     except Exception as e:
@@ -98,13 +344,15 @@ def create_microbiome_agent(model_name: str) -> Agent:
     return Agent(
         name="microbiome_tool_runner",
         model=model_name,
-        tools=[run_kneaddata, run_metaphlan2, run_humann2],
+        # Async tools: long runs do not block the event loop shared by other sessions
+        tools=[run_kneaddata_async, run_metaphlan2_async, run_humann2_async, run_microbiome_batch],
         instruction="""You are a Microbiome Tool Runner.
 Your goal is to execute standard bioinformatics tools for microbiome data processing.
 You have access to:
 - `kneaddata`: For quality control and host decontamination of raw sequencing data.
 - `metaphlan2`: For taxonomic profiling of microbial communities.
 - `humann2`: For functional profiling (pathways and gene families).
+- `run_microbiome_batch`: Runs the whole pipeline for every sample in a manifest (CSV/TSV with `sample_id` and `fastq` columns), processing samples in parallel within a CPU/memory budget.
 
 When a user asks to process data:
 1. Identify which step of the pipeline is needed.
@@ -114,6 +362,11 @@ When a user asks to process data:
 2. Ask for necessary file paths if not provided.
 3. Execute the tool and report the results.
 
-If the user wants to run a full pipeline, you can run them sequentially: kneaddata -> metaphlan2 -> humann2.
+Leave `threads` unset unless the user asks for a specific number; it is then chosen from the available cores and the jobs already running.
+
+When running `humann2` on reads that already have a MetaPhlAn2 profile, pass it as `taxonomic_profile` so HUMAnN2 skips its own taxonomic pre-screen.
+
+If the user wants to run a full pipeline on a single file, you can run them sequentially: kneaddata -> metaphlan2 -> humann2.
+For several samples or a whole cohort, use `run_microbiome_batch` with a sample manifest instead.
 """
     )
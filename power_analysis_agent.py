@@ -1,15 +1,106 @@
+import asyncio
 import os
 from google.adk import Agent
 from google.adk.tools.function_tool import FunctionTool
+import re
+import scipy
 from tools.r_execution import RExecutionTool
-from tools.simulation_tool import run_simulation_power_analysis
+from tools import power_engine
+from tools.power_engine import power_analysis, format_power_htest
+from tools.result_cache import cached_call, cached_call_async, file_hash, r_package_versions
+from tools.simulation_tool import run_simulation_power_analysis_async
+from tools.power_search import run_power_search_async
+from tools.effect_sizes import get_effect_size_registry, lookup_effect_sizes
 
 # Initialize the R execution tool
 r_tool = RExecutionTool(working_dir=os.getcwd())
 
-def run_power_analysis(test_type: str, effect_size: float = None, n: int = None, alpha: float = 0.05, power: float = None, alternative: str = "two.sided", type: str = "two.sample") -> str:
+# Backend for analytical power calculations:
+#   "python" - in-process engine (tools/power_engine.py), no R round-trip
+#   "r"      - r_scripts/power_analysis.R via the R execution tool
+#   "verify" - Python engine, cross-checked against the R script
+POWER_ANALYSIS_BACKEND = os.environ.get("POWER_ANALYSIS_BACKEND", "python")
+
+_POWER_SCRIPT = os.path.join("r_scripts", "power_analysis.R")
+
+def _run_r_power_analysis(args: dict) -> str:
+    return r_tool.execute_script(_POWER_SCRIPT, args)
+
+def _parse_power_htest(text: str) -> dict:
+    """Extracts the numeric `name = value` lines from a printed power.htest."""
+    values = {}
+    for name, value in re.findall(r"^\s*([\w.]+) = ([-+\d.eE]+)\s*$", text, flags=re.MULTILINE):
+        values[name] = float(value)
+    return values
+
+def _cache_params(args: dict) -> dict:
+    """Everything that determines a power analysis result: inputs, backend and code versions."""
+    params = dict(args, alpha=0.05 if args["alpha"] is None else args["alpha"], backend=POWER_ANALYSIS_BACKEND)
+    if POWER_ANALYSIS_BACKEND != "r":
+        params["engine"] = file_hash(power_engine.__file__)
+        params["scipy"] = scipy.__version__
+    if POWER_ANALYSIS_BACKEND != "python":
+        params["script"] = file_hash(_POWER_SCRIPT)
+        params["r_packages"] = r_package_versions(r_tool, ["pwr", "argparser"])
+    return params
+
+def _python_power_analysis(args: dict) -> str:
+    try:
+        # A missing alpha falls back to the R script's argparser default
+        result = power_analysis(
+            args["test_type"],
+            effect_size=args["effect_size"],
+            n=args["n"],
+            alpha=0.05 if args["alpha"] is None else args["alpha"],
+            power=args["power"],
+            alternative=args["alternative"],
+            type=args["type"]
+        )
+        return format_power_htest(result)
+    except ValueError as e:
+        return f"Error: {e}"
+
+def _verified(output: str, r_output: str) -> str:
+    """Appends the outcome of cross-checking the Python result against the R script's."""
+    r_values = _parse_power_htest(r_output)
+    py_values = _parse_power_htest(output)
+    mismatches = [
+        name for name, value in py_values.items()
+        if name not in r_values or abs(r_values[name] - value) > 1e-6 * max(1.0, abs(value))
+    ]
+    if mismatches:
+        return output + f"WARNING: Python and R results differ for: {', '.join(mismatches)}\n"
+    return output + "Verified against R (pwr).\n"
+
+def _compute_power_analysis(args: dict) -> str:
+    if POWER_ANALYSIS_BACKEND == "r":
+        return _run_r_power_analysis(args)
+    output = _python_power_analysis(args)
+    if POWER_ANALYSIS_BACKEND == "verify" and not output.startswith("Error"):
+        output = _verified(output, _run_r_power_analysis(args))
+    return output
+
+async def _compute_power_analysis_async(args: dict, timeout: float = None) -> str:
+    if POWER_ANALYSIS_BACKEND == "r":
+        return await r_tool.execute_script_async(_POWER_SCRIPT, args, timeout=timeout)
+    output = await asyncio.to_thread(_python_power_analysis, args)
+    if POWER_ANALYSIS_BACKEND == "verify" and not output.startswith("Error"):
+        output = _verified(output, await r_tool.execute_script_async(_POWER_SCRIPT, args, timeout=timeout))
+    return output
+
+def _effect_size_from_topic(effect_size, effect_topic, test_type):
     """
-    Performs a statistical power analysis using R.
+    The pooled literature effect size for `effect_topic` when no effect_size is given, with
+    the line describing its source ("" otherwise). Raises ValueError if none is recorded.
+    """
+    if effect_size is not None or not effect_topic:
+        return effect_size, ""
+    effect_size, source = get_effect_size_registry().effect_size_for(effect_topic, test_type)
+    return effect_size, source + "\n"
+
+def run_power_analysis(test_type: str, effect_size: float = None, n: int = None, alpha: float = 0.05, power: float = None, alternative: str = "two.sided", type: str = "two.sample", effect_topic: str = None) -> str:
+    """
+    Performs a statistical power analysis (pwr-style closed-form calculation).
     
     Args:
         test_type: Type of test (t.test, anova, correlation, chisq, proportion).
@@ -19,11 +110,49 @@ def run_power_analysis(test_type: str, effect_size: float = None, n: int = None,
         power: Power of the test.
         alternative: Alternative hypothesis (two.sided, less, greater).
         type: Type of t-test (two.sample, one.sample, paired).
+        effect_topic: Research topic whose pooled literature effect size to use when effect_size is not given.
         
     Returns:
-        The output of the R power analysis.
+        The power analysis result, printed like R's power.htest output.
+    """
+    try:
+        effect_size, source = _effect_size_from_topic(effect_size, effect_topic, test_type)
+    except ValueError as e:
+        return f"Error: {e}"
+    args = {
+        "test_type": test_type,
+        "effect_size": effect_size,
+        "n": n,
+        "alpha": alpha,
+        "power": power,
+        "alternative": alternative,
+        "type": type
+    }
+    return source + cached_call("power_analysis", _cache_params(args), lambda: _compute_power_analysis(args))
+
+async def run_power_analysis_async(test_type: str, effect_size: float = None, n: int = None, alpha: float = 0.05, power: float = None, alternative: str = "two.sided", type: str = "two.sample", effect_topic: str = None, timeout: float = None) -> str:
+    """
+    Performs a statistical power analysis (pwr-style closed-form calculation) without
+    blocking other sessions.
+
+    Args:
+        test_type: Type of test (t.test, anova, correlation, chisq, proportion).
+        effect_size: Effect size (Cohen's d, f, r, w, h).
+        n: Sample size.
+        alpha: Significance level (default 0.05).
+        power: Power of the test.
+        alternative: Alternative hypothesis (two.sided, less, greater).
+        type: Type of t-test (two.sample, one.sample, paired).
+        effect_topic: Research topic whose pooled literature effect size to use when effect_size is not given.
+        timeout: Seconds after which an R calculation is stopped (optional).
+
+    Returns:
+        The power analysis result, printed like R's power.htest output.
     """
-    script_path = os.path.join("r_scripts", "power_analysis.R")
+    try:
+        effect_size, source = await asyncio.to_thread(_effect_size_from_topic, effect_size, effect_topic, test_type)
+    except ValueError as e:
+        return f"Error: {e}"
     args = {
         "test_type": test_type,
         "effect_size": effect_size,
@@ -33,11 +162,16 @@ def run_power_analysis(test_type: str, effect_size: float = None, n: int = None,
         "alternative": alternative,
         "type": type
     }
-    return r_tool.execute_script(script_path, args)
+    params = await asyncio.to_thread(_cache_params, args)
+    return source + await cached_call_async("power_analysis", params,
+                                            lambda: _compute_power_analysis_async(args, timeout))
 
 # Define the tools for the agent
-power_analysis_tool = FunctionTool(func=run_power_analysis)
-simulation_power_tool = FunctionTool(func=run_simulation_power_analysis)
+# The async variants keep long R runs and simulations off the event loop shared by sessions
+power_analysis_tool = FunctionTool(func=run_power_analysis_async)
+simulation_power_tool = FunctionTool(func=run_simulation_power_analysis_async)
+power_search_tool = FunctionTool(func=run_power_search_async)
+lookup_effect_sizes_tool = FunctionTool(func=lookup_effect_sizes)
 
 def create_power_analysis_agent(model: str = "gemini-2.0-flash-exp") -> Agent:
     """
@@ -46,12 +180,16 @@ def create_power_analysis_agent(model: str = "gemini-2.0-flash-exp") -> Agent:
     agent = Agent(
         name="power_analysis_agent",
         model=model,
-        tools=[power_analysis_tool, simulation_power_tool],
+        tools=[power_analysis_tool, simulation_power_tool, power_search_tool, lookup_effect_sizes_tool],
         instruction="""You are a specialized agent for statistical power analysis.
 Your goal is to help users determine the necessary sample size, power, or effect size for their experiments.
-You have access to two tools:
-1. `run_power_analysis`: For standard analytical power calculations (t-tests, correlations, etc.).
-2. `run_simulation_power_analysis`: For complex designs requiring simulation (mixed effects, clustered data, survival analysis).
+You have access to four tools:
+1. `run_power_analysis_async`: For standard analytical power calculations (t-tests, correlations, etc.).
+2. `run_simulation_power_analysis_async`: For complex designs requiring simulation (mixed effects, clustered data, survival analysis).
+3. `run_power_search_async`: For complex designs when the sample size (or minimal detectable effect) is unknown.
+   It searches for the minimal n reaching the target power in one call and returns the full power curve,
+   so do not call `run_simulation_power_analysis_async` repeatedly with different n.
+4. `lookup_effect_sizes`: Shows the effect sizes recorded from the literature for a topic and their pooled estimate.
 
 When a user asks for a power analysis, you should:
 1. Identify the type of statistical test or study design.
@@ -64,7 +202,11 @@ When a user asks for a power analysis, you should:
 
 If parameters are missing, ask the user for clarification. 
 Standard defaults are alpha=0.05 and power=0.8 if not specified, but it's good to confirm.
-For effect sizes, if the user doesn't know, explain Cohen's d conventions (small=0.2, medium=0.5, large=0.8 for t-tests).
+For effect sizes, if the user doesn't know, first check the effect sizes recorded from the literature:
+`lookup_effect_sizes` shows the studies and pooled estimate for a topic, and passing `effect_topic` instead of
+`effect_size` to `run_power_analysis_async` or `run_simulation_power_analysis_async` uses the pooled estimate, converted to
+the measure the test needs. Only if nothing is recorded, explain Cohen's d conventions (small=0.2, medium=0.5,
+large=0.8 for t-tests).
 
 IMPORTANT: When you run a simulation, the tool will return the path to the generated R script (e.g., "GENERATED_SCRIPT: ..."). 
 You MUST explicitly mention this file path in your final response to the user, so they can inspect the code. 
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest.mock import patch
+from tools import async_exec
+from tools.async_exec import run_command_async
+from tools.r_execution import RExecutionTool
+
+class TestAsyncExec(unittest.TestCase):
+
+    def test_streams_stdout_lines(self):
+        lines = []
+        code = "import sys\nfor i in range(3): print(f'line {i}', flush=True)\nsys.stderr.write('warn')"
+        result = asyncio.run(run_command_async([sys.executable, "-c", code], on_line=lines.append))
+        self.assertEqual(lines, ["line 0", "line 1", "line 2"])
+        self.assertEqual(result.stdout, "line 0\nline 1\nline 2\n")
+        self.assertEqual(result.stderr, "warn")
+
+    def test_nonzero_exit_raises(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(run_command_async([sys.executable, "-c", "raise SystemExit(3)"]))
+
+    def test_timeout_kills_process(self):
+        start = time.monotonic()
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run_command_async([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5))
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_cancellation_kills_process(self):
+        async def scenario():
+            task = asyncio.create_task(run_command_async([sys.executable, "-c", "import time; time.sleep(30)"]))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        start = time.monotonic()
+        asyncio.run(scenario())
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_failing_callback_kills_process(self):
+        pids = []
+        def on_line(line):
+            pids.append(int(line))
+            raise ValueError("bad line")
+        code = "import os, time; print(os.getpid(), flush=True); time.sleep(30)"
+        start = time.monotonic()
+        with self.assertRaises(ValueError):
+            asyncio.run(run_command_async([sys.executable, "-c", code], on_line=on_line))
+        self.assertLess(time.monotonic() - start, 10)
+        # Killed and reaped
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pids[0], 0)
+
+    def test_concurrency_limit(self):
+        code = "import time; time.sleep(0.5)"
+        async def scenario():
+            start = time.monotonic()
+            await asyncio.gather(*[run_command_async([sys.executable, "-c", code], kind="test") for _ in range(4)])
+            return time.monotonic() - start
+        with patch.dict(async_exec.CONCURRENCY_LIMITS, {"test": 2}):
+            elapsed = asyncio.run(scenario())
+        # Four 0.5s jobs, two at a time
+        self.assertGreaterEqual(elapsed, 1.0)
+
+    def test_r_fallback_without_pool(self):
+        tool = RExecutionTool(use_pool=False)
+        with patch("tools.r_execution.run_command_async") as mock_run:
+            mock_run.return_value = subprocess.CompletedProcess([], 0, stdout="[1] 2", stderr="")
+            result = asyncio.run(tool.execute_code_async("print(1 + 1)", timeout=5))
+        self.assertEqual(result, "[1] 2")
+        args, kwargs = mock_run.call_args
+        self.assertEqual(args[0], ["Rscript", "-e", "print(1 + 1)"])
+        self.assertEqual(kwargs["timeout"], 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from biomarker_agent import biomarker_cache_stats, create_biomarker_agent, search_sra_metadata, search_geo_metadata
+from tools.clients import ClientRegistry
+from tools.result_cache import ResultCache
+
+class StubEutils:
+    """Local stand-in for NCBI E-utilities: counts SRA searches and can be told to fail them."""
+    calls = []
+    sra_calls = []
+    study = "SRP000001"
+    fail = False
+
+    @staticmethod
+    def request(tool, limiter, db="gds", **params):
+        if db == "sra":
+            if tool == "esearch":
+                StubEutils.sra_calls.append(params["term"])
+                if StubEutils.fail:
+                    raise ConnectionError("SRA unavailable")
+                return {"IdList": ["1"], "Count": "1"}
+            return [{"Id": "1", "ExpXml": f'<Summary><Title>{StubEutils.sra_calls[-1]} study</Title></Summary>'
+                                          f'<Study acc="{StubEutils.study}"/>'}]
+        if tool == "esearch":
+            StubEutils.calls.append(("esearch", params["term"]))
+            return {"IdList": ["200012345"]}
+        StubEutils.calls.append(("esummary", params["id"]))
+        return [{"Id": params["id"], "Title": "Gut microbiome RNA-seq", "Accession": "GSE12345"}]
+
+class TestBiomarkerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = ResultCache(os.path.join(self.tmp.name, "queries.sqlite"), ttl=60, stale_ttl=600)
+        StubEutils.calls, StubEutils.sra_calls, StubEutils.study, StubEutils.fail = [], [], "SRP000001", False
+        registry = ClientRegistry()
+        for target, value in (("tools.result_cache.get_query_cache", lambda: self.cache),
+                              ("biomarker_agent.get_client_registry", lambda: registry),
+                              ("biomarker_agent._eutils", StubEutils.request)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeated_and_equivalent_queries_hit_the_cache(self):
+        first = search_sra_metadata("Gut Microbiome")
+        second = search_sra_metadata("  gut   microbiome ")
+        self.assertIn("SRP000001", first)
+        self.assertTrue(second.startswith("[CACHED RESULT from "))
+        self.assertTrue(second.endswith(first))
+        self.assertEqual(len(StubEutils.sra_calls), 1)
+
+        # Tools are cached separately
+        search_geo_metadata("gut microbiome")
+        search_geo_metadata("gut microbiome")
+        self.assertEqual(StubEutils.calls, [("esearch", "gut microbiome"), ("esummary", "200012345")])
+        stats = self.cache.stats()
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (2, 2, 2))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_agent_reports_cache_stats(self):
+        search_sra_metadata("gut microbiome")
+        search_sra_metadata("gut microbiome")
+        with patch("biomarker_agent.get_query_cache", lambda: self.cache):
+            self.assertIn("1 hits, 0 stale hits, 1 misses (hit rate 50%)", biomarker_cache_stats())
+        agent = create_biomarker_agent("gemini-2.0-flash")
+        self.assertIn(biomarker_cache_stats, agent.tools)
+
+    def test_stale_result_is_served_while_refreshing(self):
+        search_sra_metadata("gut microbiome")
+        StubEutils.study = "SRP000002"
+        with patch("tools.result_cache.time.time", return_value=time.time() + 120):
+            stale = search_sra_metadata("gut microbiome")
+            self.cache.wait_for_refreshes(5)
+            self.assertIn("stale; refreshing in the background", stale)
+            self.assertIn("SRP000001", stale)
+            refreshed = search_sra_metadata("gut microbiome")
+        self.assertIn("SRP000002", refreshed)
+        self.assertNotIn("stale", refreshed)
+        self.assertEqual(len(StubEutils.sra_calls), 2)
+        self.assertEqual(self.cache.stats()["refreshes"], 1)
+
+    def test_failures_are_not_cached_and_keep_the_stale_entry(self):
+        StubEutils.fail = True
+        self.assertIn("Error searching SRA", search_sra_metadata("gut microbiome"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+        StubEutils.fail = False
+        search_sra_metadata("gut microbiome")
+        StubEutils.fail = True
+        with patch("tools.result_cache.time.time", return_value=time.time() + 120):
+            search_sra_metadata("gut microbiome")
+            self.cache.wait_for_refreshes(5)
+            # Still stale, so each call retries the refresh
+            self.assertIn("SRP000001", search_sra_metadata("gut microbiome"))
+            self.cache.wait_for_refreshes(5)
+        self.assertEqual(self.cache.stats()["refresh_errors"], 2)
+
+    def test_entries_past_the_stale_window_are_fetched_again(self):
+        search_sra_metadata("gut microbiome")
+        with patch("tools.result_cache.time.time", return_value=time.time() + 700):
+            result = search_sra_metadata("gut microbiome")
+        self.assertFalse(result.startswith("[CACHED RESULT"))
+        self.assertEqual(len(StubEutils.sra_calls), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,97 +1,104 @@
-from biomarker_agent import search_sra_metadata, search_geo_metadata, search_cellxgene_data
+from biomarker_agent import (biomarker_client_stats, create_biomarker_agent, search_sra_metadata, search_geo_metadata,
+                             search_cellxgene_data)
+import json
 import unittest
 from unittest.mock import MagicMock, patch
+from tools.clients import ClientRegistry
+
+EXP_XML = ('<Summary><Title>Gut metagenome of patient {n}</Title><Platform instrument_model="NovaSeq">ILLUMINA</Platform>'
+           '<Statistics total_runs="2" total_spots="1000" total_bases="3000000000" load_done="true"/></Summary>'
+           '<Experiment acc="SRX{n}" ver="1" status="public" name="GSM{n}: gut"/><Study acc="SRP123" name="IBD cohort"/>'
+           '<Organism taxid="749906" ScientificName="gut metagenome"/><Library_descriptor><LIBRARY_STRATEGY>WGS</LIBRARY_STRATEGY>'
+           '<LIBRARY_SOURCE>METAGENOMIC</LIBRARY_SOURCE><LIBRARY_LAYOUT><PAIRED/></LIBRARY_LAYOUT></Library_descriptor>'
+           '<Bioproject>PRJNA1</Bioproject>')
+
+def sra_eutils(tool, limiter, **params):
+    """Stand-in for E-utilities on db=sra with 7 matching experiments."""
+    if tool == "esearch":
+        start, count = params["retstart"], params["retmax"]
+        return {"IdList": [str(n) for n in range(start, min(7, start + count))], "Count": "7"}
+    return [{"Id": n, "ExpXml": EXP_XML.format(n=n), "Runs": ""} for n in params["id"].split(",")]
 
 class TestBiomarkerTools(unittest.TestCase):
 
-    @patch('biomarker_agent.SRAweb')
-    def test_search_sra_metadata(self, mock_sraweb):
-        # Mock SRAweb instance and search_sra method
-        mock_db = MagicMock()
-        mock_sraweb.return_value = mock_db
-        
-        # Mock DataFrame return
-        mock_df = MagicMock()
-        mock_db.search_sra.return_value = mock_df
-        # Ensure df is not empty
-        mock_df.empty = False
-        
-        # Mock head() and to_string()
-        mock_head = MagicMock()
-        mock_df.head.return_value = mock_head
-        mock_head.to_string.return_value = "SRP12345  Test Study"
-        
-        result = search_sra_metadata("microbiome")
-        self.assertIn("SRP12345", result)
-        self.assertIn("Test Study", result)
+    def setUp(self):
+        # Exercise the remote calls themselves; caching is covered in test_biomarker_cache.py
+        # and every test gets its own clients
+        self.registry = registry = ClientRegistry()
+        for target, value in (('tools.result_cache.get_query_cache', lambda: None),
+                              ('biomarker_agent.get_client_registry', lambda: registry)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch('biomarker_agent._eutils', side_effect=sra_eutils)
+    def test_search_sra_metadata(self, mock_eutils):
+        page = json.loads(search_sra_metadata("gut microbiome"))
+        self.assertEqual(mock_eutils.call_args_list[0].kwargs["db"], "sra")
+        self.assertEqual((page["total"], len(page["rows"])), (7, 5))
+        self.assertEqual(page["rows"][0], {
+            "experiment": "SRX0", "study": "SRP123", "title": "Gut metagenome of patient 0", "organism": "gut metagenome",
+            "strategy": "WGS", "source": "METAGENOMIC", "layout": "PAIRED", "platform": "ILLUMINA",
+            "bioproject": "PRJNA1", "runs": 2, "gbases": 3.0,
+        })
+
+    @patch('biomarker_agent._eutils', side_effect=sra_eutils)
+    def test_cursor_returns_the_next_page(self, mock_eutils):
+        first = json.loads(search_sra_metadata("gut microbiome", page_size=5))
+        second = json.loads(search_sra_metadata("gut microbiome", cursor=first["next_cursor"], page_size=5))
+        self.assertEqual([row["experiment"] for row in second["rows"]], ["SRX5", "SRX6"])
+        self.assertEqual(second["offset"], 5)
+        self.assertIsNone(second["next_cursor"])
+        # Only the second page was requested for it
+        self.assertEqual(mock_eutils.call_args_list[2].kwargs["retstart"], 5)
+        self.assertEqual(mock_eutils.call_args_list[3].kwargs["id"], "5,6")
 
-    @patch('biomarker_agent.Entrez')
-    def test_search_geo_metadata(self, mock_entrez):
-        # Mock Entrez.esearch
-        mock_handle_search = MagicMock()
-        mock_entrez.esearch.return_value = mock_handle_search
-        mock_entrez.read.side_effect = [
-            {"IdList": ["12345"]}, # for esearch
-            [{"Id": "12345", "Title": "Test GEO Dataset", "Accession": "GSE12345"}] # for esummary
+        self.assertIn("cursor belongs to the search for 'gut microbiome'",
+                      search_sra_metadata("crohn", cursor=first["next_cursor"]))
+        self.assertIn("does not belong to a geo search", search_geo_metadata("gut microbiome", cursor=first["next_cursor"]))
+
+    def test_agent_reports_client_reuse(self):
+        self.assertEqual(biomarker_client_stats(), "No repository clients have been created yet.")
+        self.registry.register("sraweb", MagicMock)
+        for _ in range(2):
+            with self.registry.acquire("sraweb"):
+                pass
+        self.assertIn("sraweb: 1 created, 2 uses (reuse rate 50%)", biomarker_client_stats())
+        self.assertIn(biomarker_client_stats, create_biomarker_agent("gemini-2.0-flash").tools)
+
+    @patch('biomarker_agent._eutils')
+    def test_search_geo_metadata(self, mock_eutils):
+        mock_eutils.side_effect = [
+            {"IdList": ["12345"], "Count": "1"}, # for esearch
+            [{"Id": "12345", "Title": "Test GEO Dataset", "Accession": "GSE12345", "n_samples": 8,
+              "ExtRelations": [{"RelationType": "SRA", "TargetObject": "SRP999"}]}] # for esummary
         ]
-        
-        # Mock Entrez.esummary
-        mock_handle_summary = MagicMock()
-        mock_entrez.esummary.return_value = mock_handle_summary
-        
-        result = search_geo_metadata("cancer")
-        self.assertIn("GSE12345", result)
-        self.assertIn("Test GEO Dataset", result)
 
-    @patch('biomarker_agent.cellxgene_census')
-    def test_search_cellxgene_data(self, mock_census):
-        # Mock open_soma
-        mock_soma = MagicMock()
-        mock_census.open_soma.return_value = mock_soma
-        
-        # Mock dataframe chain: census["census_info"]["datasets"].read().concat().to_pandas()
-        mock_datasets = MagicMock()
-        
-        # Mock dictionary access for census["census_info"]
-        # When census["census_info"] is called, it returns a dict-like object (or just a mock)
-        # that contains "datasets".
-        
-        # If we make __getitem__ return a dict, then ["datasets"] works on that dict.
-        mock_soma.__getitem__.return_value = {"datasets": mock_datasets}
-        
-        mock_read = MagicMock()
-        mock_datasets.read.return_value = mock_read
-        mock_concat = MagicMock()
-        mock_read.concat.return_value = mock_concat
-        
-        # Mock pandas dataframe result
-        mock_df = MagicMock()
-        mock_concat.to_pandas.return_value = mock_df
-        
-        # Mock filtering
-        mock_filtered_df = MagicMock()
-        mock_filtered_df.empty = False
-        
-        mock_head = MagicMock()
-        mock_filtered_df.head.return_value = mock_head
-        mock_head.to_string.return_value = "dataset_id  dataset_title  collection_name\n123  Lung Cancer Single Cell  Test Collection"
-        
-        mock_series = MagicMock()
-        mock_series.str.contains.return_value = "some_mask"
-        
-        def getitem_side_effect(arg):
-            if arg == 'dataset_title':
-                return mock_series
-            else: # this is the mask
-                return mock_filtered_df
-                
-        mock_df.__getitem__.side_effect = getitem_side_effect
-        
-        mock_filtered_df.__getitem__.return_value = mock_filtered_df 
-        
-        result = search_cellxgene_data("Lung Cancer")
-        self.assertIn("Lung Cancer Single Cell", result)
-        self.assertIn("Test Collection", result)
+        page = json.loads(search_geo_metadata("cancer"))
+        self.assertEqual([call.args[0] for call in mock_eutils.call_args_list], ["esearch", "esummary"])
+        self.assertEqual(page["rows"], [{"accession": "GSE12345", "title": "Test GEO Dataset", "samples": 8,
+                                         "sra": ["SRP999"]}])
+        self.assertIsNone(page["next_cursor"])
+
+    def test_search_cellxgene_data(self):
+        # Searches run against the local catalog snapshot, not the census
+        catalog = MagicMock()
+        catalog.search.return_value = [{
+            "dataset_id": "123", "dataset_title": "Lung Cancer Single Cell", "collection_name": "Test Collection",
+            "tissue": "lung", "disease": "lung adenocarcinoma", "assay": "10x 3' v3", "cell_count": 5000, "score": 4.2,
+        }]
+        with patch('biomarker_agent.get_census_catalog', return_value=catalog):
+            page = json.loads(search_cellxgene_data("Lung Cancer"))
+        # One extra hit is requested to tell whether there is another page
+        catalog.search.assert_called_with("Lung Cancer", limit=6)
+        self.assertEqual(page["rows"][0]["title"], "Lung Cancer Single Cell")
+        self.assertEqual(page["rows"][0]["collection"], "Test Collection")
+        self.assertEqual(page["rows"][0]["disease"], "lung adenocarcinoma")
+        self.assertIsNone(page["next_cursor"])
+
+    @patch('biomarker_agent._eutils', return_value={"IdList": [], "Count": "0"})
+    def test_no_results(self, mock_eutils):
+        self.assertEqual(search_sra_metadata("nothing"), "No results found in SRA.")
 
 if __name__ == '__main__':
     unittest.main()
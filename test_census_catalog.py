@@ -0,0 +1,136 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import pandas as pd
+import pyarrow as pa
+from tools import census_catalog
+from tools.census_catalog import CensusCatalog, fetch_catalog
+from tools.clients import ClientRegistry
+
+def catalog_table(titles):
+    rows = len(titles)
+    return pa.table({
+        "dataset_id": [f"ds{i}" for i in range(rows)],
+        "dataset_title": titles,
+        "collection_name": ["Human Lung Cell Atlas", "Tabula Sapiens", "Pan-cancer atlas", "Gut atlas"][:rows],
+        "tissue": ["lung", "lung; blood; liver", "lung; breast", "intestine"][:rows],
+        "disease": ["normal", "normal", "lung adenocarcinoma; breast cancer", "Crohn disease"][:rows],
+        "assay": ["10x 3' v3", "Smart-seq2", "10x 5' v1", "10x 3' v2"][:rows],
+        "cell_count": [1000, 2000, 3000, 4000][:rows],
+    })
+
+TITLES = ["Core HLCA", "Tabula Sapiens - All Cells", "Tumor microenvironment of lung and breast cancer",
+          "Ileal Crohn's disease"]
+
+class TestCensusCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fetches = []
+        self.titles = list(TITLES)
+
+    def _catalog(self, **kwargs):
+        def fetch():
+            self.fetches.append(time.time())
+            return catalog_table(self.titles)
+        return CensusCatalog(self.tmp.name, fetch=fetch, **kwargs)
+
+    def test_snapshot_is_built_once_and_reused(self):
+        self.assertEqual(self._catalog().search("lung")[0]["dataset_id"], "ds2")
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "datasets.arrow")))
+        # A new process memory-maps the existing snapshot instead of opening the census
+        catalog = self._catalog()
+        catalog.search("crohn")
+        catalog.search("tabula")
+        self.assertEqual(len(self.fetches), 1)
+
+    def test_concurrent_first_searches_build_once(self):
+        release = threading.Event()
+        catalog = CensusCatalog(self.tmp.name, fetch=lambda: (self.fetches.append(1), release.wait(5),
+                                                              catalog_table(self.titles))[-1])
+        results = []
+        searches = [threading.Thread(target=lambda: results.append(catalog.search("lung")[0]["dataset_id"]))
+                    for _ in range(4)]
+        for search in searches:
+            search.start()
+        release.set()
+        for search in searches:
+            search.join(5)
+        self.assertEqual((results, len(self.fetches)), (["ds2"] * 4, 1))
+
+    def test_first_build_is_quick_and_completed_in_the_background(self):
+        quick = catalog_table(TITLES).drop(["tissue", "disease", "assay"]).append_column(
+            "tissue", pa.array([""] * 4)).append_column("disease", pa.array([""] * 4)).append_column(
+            "assay", pa.array([""] * 4))
+        catalog = self._catalog(quick_fetch=lambda: quick)
+        # Titles answer at once; the cell metadata terms arrive with the background refresh
+        self.assertEqual(catalog.search("tabula")[0]["dataset_id"], "ds1")
+        catalog.wait_for_refresh(5)
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(catalog.search("intestine")[0]["dataset_id"], "ds3")
+        self.assertTrue(catalog.metadata()["complete"])
+
+    def test_ranking_prefers_title_matches_and_all_terms(self):
+        catalog = self._catalog()
+        hits = catalog.search("lung cancer")
+        # Only ds2 matches both terms; title/collection matches beat tissue-only matches
+        self.assertEqual([hit["dataset_id"] for hit in hits], ["ds2", "ds0", "ds1"])
+        self.assertGreater(hits[0]["score"], hits[1]["score"])
+        self.assertEqual(hits[0]["disease"], "lung adenocarcinoma; breast cancer")
+        # Prefix matches and fields other than the title are searchable
+        self.assertEqual(catalog.search("smart")[0]["dataset_id"], "ds1")
+        self.assertEqual(catalog.search("intest")[0]["dataset_id"], "ds3")
+        self.assertEqual(catalog.search("zebrafish"), [])
+
+    def test_search_is_fast(self):
+        # 500 datasets
+        catalog = CensusCatalog(self.tmp.name, fetch=lambda: pa.table({
+            name: column * 125 for name, column in catalog_table(TITLES).to_pydict().items()}))
+        catalog.search("lung")
+        start = time.perf_counter()
+        for _ in range(100):
+            catalog.search("lung adenocarcinoma")
+        self.assertLess((time.perf_counter() - start) / 100, 0.01)
+
+    def test_stale_snapshot_serves_while_refreshing(self):
+        catalog = self._catalog(max_age=60)
+        catalog.search("lung")
+        self.titles[3] = "Ulcerative colitis atlas"
+        with patch("tools.census_catalog.time.time", return_value=time.time() + 120):
+            self.assertEqual(catalog.search("crohn")[0]["dataset_id"], "ds3")
+            catalog.wait_for_refresh(5)
+        self.assertEqual(len(self.fetches), 2)
+        self.assertEqual(catalog.search("colitis")[0]["dataset_id"], "ds3")
+        self.assertEqual(catalog.search("crohn")[0]["dataset_id"], "ds3")  # still matches the disease column
+
+    def test_fetch_catalog_reads_datasets_and_cell_terms(self):
+        census = MagicMock()
+        census.__enter__.return_value = census
+        datasets = pd.DataFrame({"dataset_id": ["a", "b"], "dataset_title": ["A", "B"],
+                                 "collection_name": ["C1", "C2"], "dataset_total_cell_count": [10, 20]})
+        obs = MagicMock()
+        obs.read.return_value = [pa.table({"dataset_id": ["a", "a", "b"], "tissue_general": ["lung", "lung", "blood"],
+                                           "disease": ["normal", "COVID-19", "normal"],
+                                           "assay": ["10x 3' v3"] * 3})]
+        census.__getitem__.side_effect = lambda key: {
+            "census_info": {"datasets": MagicMock(**{"read.return_value.concat.return_value.to_pandas.return_value": datasets})},
+            "census_data": {"homo_sapiens": MagicMock(obs=obs)},
+        }[key]
+        registry = ClientRegistry()
+        with patch.object(census_catalog, "cellxgene_census", MagicMock(**{"open_soma.return_value": census})) as module:
+            table = fetch_catalog("2025-01-30", registry=registry)
+            fetch_catalog("2025-01-30", obs_terms=False, registry=registry)
+        self.assertEqual(table.column("disease").to_pylist(), ["COVID-19; normal", "normal"])
+        self.assertEqual(table.column("cell_count").to_pylist(), [10, 20])
+        # One census handle, kept open between fetches until the registry closes it
+        module.open_soma.assert_called_once_with(census_version="2025-01-30")
+        census.close.assert_not_called()
+        registry.close_all()
+        census.close.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import threading
+import time
+import unittest
+from tools.clients import ClientRegistry
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class TestClientRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+        self.addCleanup(self.registry.close_all)
+
+    def test_clients_are_created_lazily_and_reused(self):
+        created = []
+        pool = self.registry.register("sra", lambda: created.append(FakeClient()) or created[-1], max_size=2)
+        self.assertEqual(created, [])
+        for _ in range(3):
+            with self.registry.acquire("sra") as client:
+                self.assertIs(client, created[0])
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["acquired"], stats["reused"], stats["in_use"]), (1, 3, 2, 0))
+        # Registering again keeps the existing pool
+        self.assertIs(self.registry.register("sra", FakeClient), pool)
+        with self.assertRaises(KeyError):
+            self.registry.acquire("unknown")
+
+    def test_pooled_clients_are_lent_to_one_caller_at_a_time(self):
+        pool = self.registry.register("sra", FakeClient, max_size=1)
+        lent = []
+        with pool.acquire() as first:
+            waiter = threading.Thread(target=lambda: lent.append(pool.acquire().__enter__()))
+            waiter.start()
+            time.sleep(0.05)
+            self.assertEqual(lent, [])  # waits for the only client
+        waiter.join(5)
+        self.assertEqual(lent, [first])
+        self.assertEqual((pool.stats()["created"], pool.stats()["waits"]), (1, 1))
+
+    def test_shared_client_is_handed_to_concurrent_callers(self):
+        pool = self.registry.register("census", FakeClient, shared=True)
+        with pool.acquire() as first, pool.acquire() as second:
+            self.assertIs(first, second)
+            self.assertEqual(pool.stats()["in_use"], 2)
+
+    def test_close_waits_for_clients_in_use(self):
+        pool = self.registry.register("census", FakeClient, shared=True)
+        with pool.acquire() as client:
+            self.registry.close("census")
+            self.assertFalse(client.closed)
+        self.assertTrue(client.closed)
+        # The next use opens a new client
+        with pool.acquire() as reopened:
+            self.assertIsNot(reopened, client)
+        self.assertEqual((pool.stats()["created"], pool.stats()["closed"]), (2, 1))
+
+if __name__ == '__main__':
+    unittest.main()
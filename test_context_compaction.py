@@ -0,0 +1,69 @@
+import unittest
+from tools.context_compaction import ContextCompactor, compact, count_tokens, key_facts, shorten
+
+FACTS = [
+    "1. Smith et al. (2023) Caffeine and sleep latency, doi:10.1016/j.sleep.2023.01.002",
+    "   Reported Cohen's d of 0.45 (95% CI 0.20-0.70) for sleep onset latency.",
+    "Recommended sample size: 64 per group (power = 0.8, alpha = 0.05).",
+]
+FILLER = "Background reading on sleep hygiene interventions covered many general considerations without numbers."
+
+LITERATURE_DUMP = "\n".join([FILLER] * 40 + FACTS[:2] + [FILLER] * 40 + FACTS[2:] + [FILLER] * 20)
+
+class TestContextCompaction(unittest.TestCase):
+
+    def test_text_within_budget_is_unchanged(self):
+        result = compact("\n".join(FACTS), budget=500)
+        self.assertEqual(result["text"], "\n".join(FACTS))
+        self.assertEqual(result["tokens_before"], result["tokens_after"])
+
+    def test_key_facts_survive_the_budget(self):
+        result = compact(LITERATURE_DUMP, budget=200)
+        self.assertLessEqual(result["tokens_after"], 200)
+        self.assertGreater(result["tokens_before"], 2500)
+        for fact in FACTS:
+            self.assertIn(fact.strip(), result["text"])
+        # Kept lines stay in their original order, and the omission is noted
+        self.assertLess(result["text"].index("Smith et al."), result["text"].index("Recommended sample size"))
+        self.assertIn("lines omitted]", result["text"].splitlines()[-1])
+
+    def test_single_long_line_is_shortened_at_a_sentence(self):
+        result = compact("The literature broadly suggests moderate benefits. " * 800, budget=1500)
+        self.assertLessEqual(result["tokens_after"], 1500)
+        self.assertGreater(result["tokens_after"], 1400)
+        kept, note = result["text"].splitlines()
+        self.assertTrue(kept.endswith("moderate benefits."))
+        self.assertEqual(note, "[Compacted from ~10200 tokens to the key facts; 1 line shortened, 0 lines omitted]")
+        # Facts still come first; only the remaining budget goes to the prose
+        result = compact("\n".join(["Background without numbers. " * 400] + FACTS), budget=200)
+        self.assertTrue(all(fact.strip() in result["text"] for fact in FACTS))
+        self.assertLessEqual(result["tokens_after"], 200)
+        self.assertIn("Background without numbers.", result["text"])
+        # Without a sentence end the cut falls between words
+        self.assertEqual(shorten("one two three four", 3), "one two...")
+
+    def test_key_facts_by_kind(self):
+        facts = key_facts(LITERATURE_DUMP)
+        self.assertEqual(facts["papers"], [FACTS[0].strip()])
+        self.assertEqual(facts["effect_sizes"], [FACTS[1].strip()])
+        self.assertEqual(facts["power"], [FACTS[2]])
+        power_htest = "     Two-sample t test power calculation \n              n = 63.76561\n          power = 0.8"
+        self.assertEqual(key_facts(power_htest)["power"], ["n = 63.76561", "power = 0.8"])
+
+    def test_metrics_per_step(self):
+        compactor = ContextCompactor({"literature": 200})
+        compactor.compact("literature", LITERATURE_DUMP)
+        self.assertEqual(compactor.compact("power", "n = 64"), "n = 64")
+        stats = compactor.stats()
+        self.assertEqual(stats["literature"]["compacted"], 1)
+        self.assertEqual(stats["literature"]["saved"], count_tokens(LITERATURE_DUMP) - stats["literature"]["tokens_after"])
+        # Steps without a budget pass through unchanged
+        self.assertEqual((stats["power"]["saved"], stats["power"]["budget"]), (0, None))
+        self.assertIn("literature: ", compactor.report())
+        # The key facts handed on are kept per step
+        self.assertEqual(stats["literature"]["facts"]["effect_sizes"], [FACTS[1].strip()])
+        self.assertEqual(compactor.facts("power")["power"], ["n = 64"])
+        self.assertIn("facts: 1 power, 1 effect sizes, 1 papers", compactor.report().splitlines()[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import json
+import math
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import literature_agent
+from power_analysis_agent import run_power_analysis
+from tools.effect_sizes import EffectSizeRegistry, extract_effect_sizes, from_d, lookup_effect_sizes, pool, to_d
+from tools.paper_search_stub import PAPERS
+from tools.result_cache import ResultCache
+from tools.simulation_tool import run_simulation_power_analysis
+
+class TestConversions(unittest.TestCase):
+
+    def test_measures_convert_to_d_and_back(self):
+        self.assertAlmostEqual(to_d("odds ratio", 2.0)[0], math.log(2) * math.sqrt(3) / math.pi)
+        self.assertAlmostEqual(to_d("r", 0.3)[0], 0.6 / math.sqrt(0.91))
+        self.assertAlmostEqual(to_d("Cohen's d", -0.4)[0], -0.4)
+        for measure, value in (("or", 2.0), ("hr", 0.7), ("r", 0.3), ("g", 0.5)):
+            self.assertAlmostEqual(from_d(measure, to_d(measure, value)[0]), value)
+        with self.assertRaises(ValueError):
+            to_d("auc", 0.8)
+        with self.assertRaises(ValueError):
+            to_d("hr", -1.0)
+
+    def test_variances_from_ci_or_n(self):
+        # A ratio CI is symmetric on the log scale
+        _, var_d = to_d("or", 2.0, 1.0, 4.0)
+        self.assertAlmostEqual(math.sqrt(var_d), math.log(4) / (2 * 1.959964) * math.sqrt(3) / math.pi, places=6)
+        self.assertAlmostEqual(to_d("d", 0.5, n=100)[1], 4 / 100 + 0.25 / 200)
+        self.assertIsNone(to_d("d", 0.5)[1])
+
+    def test_dersimonian_laird(self):
+        pooled = pool([(0.2, 0.04), (0.6, 0.04)])
+        self.assertAlmostEqual(pooled["d"], 0.4)
+        self.assertAlmostEqual(pooled["tau2"], 0.04)
+        self.assertAlmostEqual(pooled["i2"], 0.5)
+        self.assertAlmostEqual(pooled["ci_upper"] - pooled["d"], 1.959964 * 0.2, places=5)
+        # Homogeneous studies: no between-study variance
+        self.assertEqual(pool([(0.3, 0.01), (0.3, 0.02)])["tau2"], 0.0)
+        self.assertIsNone(pool([(0.3, None)]))
+
+    def test_extract_effect_sizes(self):
+        self.assertEqual(extract_effect_sizes("Smokers had higher odds of relapse (OR 1.8, 95% CI 1.2-2.7; n = 1,204)."),
+                         [{"measure": "or", "value": 1.8, "ci_lower": 1.2, "ci_upper": 2.7, "n": 1204}])
+        [effect] = extract_effect_sizes("In 310 patients, HR = 0.72 [0.60, 0.86] and the pooled Cohen's d of 0.32")[:1]
+        self.assertEqual((effect["measure"], effect["ci_upper"], effect["n"]), ("hr", 0.86, 310))
+        self.assertEqual(extract_effect_sizes("Samples were taken for 3 or 4 days (AUC 0.81)."), [])
+
+class TestEffectSizeRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.registry = EffectSizeRegistry(os.path.join(self.tmp.name, "effect_sizes.sqlite"))
+        cache = ResultCache(os.path.join(self.tmp.name, "results.sqlite"))
+        patcher = patch("tools.result_cache.get_default_cache", lambda: cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for target in ("power_analysis_agent.get_effect_size_registry", "tools.simulation_tool.get_effect_size_registry",
+                       "tools.effect_sizes.get_effect_size_registry", "literature_agent.get_effect_size_registry"):
+            patcher = patch(target, lambda: self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_pooled_estimate_is_kept_per_topic(self):
+        self.registry.add("Probiotics and alpha diversity", "10.1/a", "d", 0.2, n=None, ci_lower=-0.192, ci_upper=0.592)
+        pooled = self.registry.add("probiotics and alpha diversity", "10.1/b", "d", 0.6, ci_lower=0.208, ci_upper=0.992)
+        self.assertEqual((pooled["studies"], pooled["pooled_studies"]), (2, 2))
+        self.assertAlmostEqual(pooled["d"], 0.4, places=6)
+        # Re-recording a study replaces it
+        self.registry.add("probiotics and alpha diversity", "10.1/b", "d", 0.6, ci_lower=0.208, ci_upper=0.992)
+        # Topics match on their words, in any order
+        self.assertEqual(self.registry.pooled("alpha diversity probiotic")["studies"], 2)
+        self.assertIsNone(self.registry.pooled("statins"))
+        self.assertEqual([s["study_id"] for s in self.registry.studies("alpha diversity")], ["10.1/a", "10.1/b"])
+        lookup = json.loads(lookup_effect_sizes("probiotics alpha diversity"))
+        self.assertEqual((lookup["pooled"]["d"], len(lookup["studies"])), (0.4, 2))
+        self.assertIn("No effect sizes", lookup_effect_sizes("statins"))
+
+    def test_effect_size_for_power_calculations(self):
+        self.registry.add("statin mortality", "pmid:1", "hr", 0.8, ci_lower=0.7, ci_upper=0.914)
+        value, source = self.registry.effect_size_for("statin mortality", "survival")
+        self.assertAlmostEqual(value, 0.8, places=3)
+        self.assertIn("hr = 0.8", source)
+        # A protective HR is a negative d; t-tests take its magnitude
+        value, _ = self.registry.effect_size_for("statin mortality", "t.test")
+        self.assertAlmostEqual(value, -math.log(0.8) * math.sqrt(3) / math.pi, places=4)
+        with self.assertRaises(ValueError):
+            self.registry.effect_size_for("statin mortality", "proportion")
+
+    def test_studies_without_a_variance_are_reported_as_left_out(self):
+        self.registry.add("sleep latency", "10.1/a", "d", 0.4, ci_lower=0.2, ci_upper=0.6, origin="agent")
+        self.registry.add("sleep latency", "10.1/b", "d", 0.9, origin="agent")
+        value, source = self.registry.effect_size_for("sleep latency", "t.test")
+        self.assertEqual(value, 0.4)
+        self.assertIn("pooled from 1 studies: 1 recorded by the agent", source)
+        self.assertIn("1 recorded studies without a CI or n were left out", source)
+        # Without any variance the studies are averaged, and the source says so
+        self.registry.add("nap length", "10.1/c", "d", 0.2, origin="agent")
+        self.registry.add("nap length", "10.1/d", "d", 0.4, origin="agent")
+        value, source = self.registry.effect_size_for("nap length", "t.test")
+        self.assertAlmostEqual(value, 0.3)
+        self.assertIn("unweighted mean of 2 studies without a CI or n", source)
+
+    def test_opposite_directions_are_not_pooled_into_a_magnitude(self):
+        self.registry.add("statin mortality", "pmid:1", "hr", 0.8, ci_lower=0.7, ci_upper=0.914, origin="agent")
+        self.registry.add("statin mortality", "pmid:2", "hr", 1.25, ci_lower=1.094, ci_upper=1.429, origin="agent")
+        self.assertEqual(self.registry.pooled("statin mortality")["directions"], {"positive": 1, "negative": 1})
+        with self.assertRaisesRegex(ValueError, "opposite directions"):
+            self.registry.effect_size_for("statin mortality", "t.test")
+        # A ratio keeps its sign, so the pool is reported with the disagreement
+        value, source = self.registry.effect_size_for("statin mortality", "survival")
+        self.assertAlmostEqual(value, 1.0, places=3)
+        self.assertIn("2 recorded by the agent", source)
+        self.assertIn("disagree in direction", source)
+
+    def test_power_tools_use_the_registry(self):
+        self.registry.add("exercise depression", "10.1/x", "d", 0.5, ci_lower=0.3, ci_upper=0.7)
+        result = run_power_analysis(test_type="t.test", power=0.8, effect_topic="exercise and depression")
+        self.assertIn("d = 0.5", result.splitlines()[0])
+        self.assertIn("n = 63.76561", result)
+        self.assertIn("No effect sizes", run_power_analysis(test_type="t.test", power=0.8, effect_topic="yoga"))
+        result = run_simulation_power_analysis(design="mixed_effects", n=20, n_sims=20, effect_topic="exercise depression")
+        self.assertIn("d = 0.5", result.splitlines()[0])
+        self.assertIn("Estimated Power", result)
+        self.assertIn("Error", run_simulation_power_analysis(design="mixed_effects", n=20))
+
+    def test_literature_results_are_mined(self):
+        tool = SimpleNamespace(name="search_biorxiv")
+        response = {"structuredContent": {"result": PAPERS}}
+        with patch("literature_agent.get_paper_store", lambda: None):
+            literature_agent._store_papers(tool, {"query": "probiotic microbiome diversity"}, None, response)
+        [study] = self.registry.studies("probiotic microbiome")
+        self.assertEqual((study["study_id"], study["measure"], study["value"], study["design"], study["origin"]),
+                         ("10.1101/2024.02.01.578000", "d", 0.32, "meta-analysis", "abstract"))
+        # Mined effect sizes are candidates for the agent to review, not pooled
+        pooled = self.registry.pooled("probiotic microbiome")
+        self.assertEqual((pooled["studies"], pooled["candidates"]), (0, 1))
+        self.assertNotIn("d", pooled)
+        with self.assertRaisesRegex(ValueError, "1 unreviewed effect sizes mined from abstracts"):
+            self.registry.effect_size_for("probiotic microbiome", "t.test")
+        self.registry.add("probiotic microbiome diversity", "10.1/y", "d", 0.4, ci_lower=0.2, ci_upper=0.6, origin="agent")
+        value, source = self.registry.effect_size_for("probiotic microbiome", "t.test")
+        self.assertEqual(value, 0.4)
+        self.assertIn("pooled from 1 studies: 1 recorded by the agent", source)
+        self.assertIn("1 effect sizes mined from abstracts were not pooled", source)
+        with patch("tools.effect_sizes.EFFECT_SIZE_POOL_ABSTRACTS", True):
+            self.registry.add("probiotic microbiome diversity", "10.1/y", "d", 0.4, ci_lower=0.2, ci_upper=0.6, origin="agent")
+        pooled = self.registry.pooled("probiotic microbiome")
+        # The mined effect is included but, with no CI or n, not weighted into the pool
+        self.assertEqual((pooled["studies"], pooled["pooled_studies"], pooled["candidates"]), (2, 1, 0))
+        self.assertEqual(pooled["origins"], {"agent": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from google.genai import types
+from tools.event_stream import EventCollector, event_text, new_collector
+
+class ListSink:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(text)
+
+def content_event(*texts, author="agent"):
+    return SimpleNamespace(author=author, content=types.Content(role="model", parts=[types.Part(text=t) for t in texts]))
+
+class TestEventCollector(unittest.TestCase):
+
+    def test_text_from_every_event_shape(self):
+        self.assertEqual(event_text(types.Part(text="a")), "a")
+        self.assertEqual(event_text(content_event("b", "c")), "bc")
+        self.assertEqual(event_text(SimpleNamespace(parts=[types.Part(text="d")])), "d")
+        # Tool calls and other events without text
+        self.assertEqual(event_text(SimpleNamespace(text=None)), "")
+        self.assertEqual(event_text(SimpleNamespace(content=None)), "")
+
+    def test_sinks_share_the_same_strings(self):
+        first, second = ListSink(), ListSink()
+        collector = EventCollector("test", sinks=[first, second])
+        events = [content_event("Hello, "), SimpleNamespace(content=None), content_event("world")]
+        self.assertEqual(collector.collect(events), "Hello, world")
+        self.assertEqual(first.writes, ["Hello, ", "world"])
+        # Every sink is handed the very same string objects, no copies
+        self.assertTrue(all(a is b for a, b in zip(first.writes, second.writes)))
+        self.assertEqual((collector.stats()["events"], collector.stats()["chars"]), (3, 12))
+
+    def test_stream_timings(self):
+        collector = EventCollector("test")
+
+        def slow_events():
+            time.sleep(0.2)
+            yield content_event("x" * 400)
+            time.sleep(0.1)
+            yield content_event("y" * 400)
+
+        collector.collect(slow_events())
+        stats = collector.stats()
+        self.assertGreaterEqual(stats["first_token_seconds"], 0.2)
+        self.assertLess(stats["first_token_seconds"], stats["seconds"])
+        # 200 tokens over the ~0.1s between the first and last text
+        self.assertGreater(stats["tokens_per_second"], 500)
+        self.assertIn("first token 0.2s, 200 tokens", collector.summary())
+        self.assertIn("no text", EventCollector("idle").summary())
+
+    def test_partial_text_survives_a_timeout(self):
+        collector = EventCollector("test")
+
+        async def events():
+            yield content_event("partial")
+            await asyncio.sleep(10)
+            yield content_event("never")
+
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(collector.collect_async(events()), 0.2)
+
+        asyncio.run(run())
+        self.assertEqual(collector.text, "partial")
+
+    def test_transcript_and_event_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            transcript, log = os.path.join(tmp, "transcript.txt"), os.path.join(tmp, "events.jsonl")
+            with patch.dict(os.environ, {"AGENT_TRANSCRIPT": transcript, "AGENT_EVENT_LOG": log}), \
+                    patch("tools.event_stream._shared_sinks", None), patch("builtins.print") as mock_print:
+                collector = new_collector("Lead")
+                collector.collect([content_event("one "), content_event("two", author="lead")])
+                quiet = new_collector("Literature search", terminal=False)
+                quiet.collect([content_event("three")])
+                for sink in (collector.sinks[-1], collector.event_log):
+                    sink.close()
+            self.assertEqual([call.args[0] for call in mock_print.call_args_list], ["one ", "two"])
+            with open(transcript) as f:
+                self.assertEqual(f.read(), "one twothree")
+            with open(log) as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([(r["runner"], r["seq"], r["chars"]) for r in records],
+                             [("Lead", 1, 4), ("Lead", 2, 3), ("Literature search", 1, 5)])
+            self.assertEqual(records[1]["author"], "lead")
+
+if __name__ == '__main__':
+    unittest.main()
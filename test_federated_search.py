@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from biomarker_agent import (_federated_search, _merge_records, biomarker_client_stats, federated_search_stats,
+                             search_all_repositories)
+from tools.clients import ClientRegistry
+from tools.result_cache import ResultCache
+
+SRA_EXPERIMENTS = {
+    # id: (study, title, organism, strategy, experiment name)
+    "1": ("SRP100", "IBD gut metagenomes", "human gut metagenome", "WGS", "GSM1 of GSE100"),
+    "2": ("SRP100", "IBD gut metagenomes", "human gut metagenome", "WGS", "GSM2 of GSE100"),
+    "3": ("SRP200", "Crohn disease biopsies", "", "RNA-Seq", "biopsy 1"),
+}
+
+def stub_eutils(tool, limiter, db="gds", **params):
+    """Stand-in for E-utilities on db=sra and db=gds; each database answers once its gate is open."""
+    if tool == "esearch" and stub_eutils.barrier is not None:
+        stub_eutils.barrier.wait()
+    stub_eutils.gates[db].wait()
+    # Backends abandoned after a timeout stop when their test ends instead of calling on
+    # into the next test
+    if stub_eutils.finished.is_set():
+        raise RuntimeError("test finished")
+    if db == "sra":
+        if tool == "esearch":
+            return {"IdList": list(SRA_EXPERIMENTS), "Count": "3"}
+        summaries = []
+        for uid in params["id"].split(","):
+            study, title, organism, strategy, name = SRA_EXPERIMENTS[uid]
+            organism = f'<Organism ScientificName="{organism}"/>' if organism else ""
+            summaries.append({"Id": uid, "ExpXml": (
+                f'<Summary><Title>{title}</Title><Statistics total_runs="1"/></Summary>'
+                f'<Experiment acc="SRX{uid}" name="{name}"/><Study acc="{study}"/>{organism}'
+                f'<Library_descriptor><LIBRARY_STRATEGY>{strategy}</LIBRARY_STRATEGY></Library_descriptor>')})
+        return summaries
+    if tool == "esearch":
+        return {"IdList": ["200000100", "200000300"], "Count": "2"}
+    return [
+        {"Id": "200000300", "Accession": "GSE300", "title": "Ulcerative colitis mucosa", "taxon": "Homo sapiens",
+         "gdsType": "Expression profiling by high throughput sequencing", "n_samples": 40, "ExtRelations": []},
+        {"Id": "200000100", "Accession": "GSE100", "title": "IBD gut metagenomes", "n_samples": 2,
+         "ExtRelations": [{"RelationType": "SRA", "TargetObject": "SRP100"}]},
+    ]
+
+class TestFederatedSearch(unittest.TestCase):
+
+    def setUp(self):
+        stub_eutils.gates = {"sra": threading.Event(), "gds": threading.Event()}
+        for gate in stub_eutils.gates.values():
+            gate.set()
+        stub_eutils.barrier = None
+        stub_eutils.finished = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=6)
+        catalog = MagicMock()
+        catalog.search.return_value = [{
+            "dataset_id": "cxg1", "dataset_title": "Colon immune atlas in IBD", "collection_name": "Gut Cell Atlas",
+            "tissue": "colon", "disease": "Crohn disease", "assay": "10x 3' v3", "cell_count": 120000, "score": 3.1,
+        }]
+        registry = ClientRegistry()
+        for target, value in (("tools.result_cache.get_query_cache", lambda: None),
+                              ("biomarker_agent.get_client_registry", lambda: registry),
+                              ("biomarker_agent._eutils", stub_eutils),
+                              ("biomarker_agent.get_census_catalog", lambda: catalog),
+                              ("biomarker_agent.get_federated_executor", lambda: self.executor),
+                              ("biomarker_agent._federated_abandoned", {"abandoned": 0, "running": 0})):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Runs before the patches are undone: abandoned backends are released and stopped
+        self.addCleanup(self.executor.shutdown, wait=True)
+        self.addCleanup(self._finish)
+
+    def _finish(self):
+        stub_eutils.finished.set()
+        for gate in stub_eutils.gates.values():
+            gate.set()
+
+    def test_linked_geo_and_sra_records_are_merged_and_ranked_first(self):
+        result = json.loads(search_all_repositories("IBD microbiome"))
+        self.assertEqual(result["found"], {"SRA": 2, "GEO": 2, "Cell x Gene": 1})
+        self.assertEqual(len(result["rows"]), 4)
+        first = result["rows"][0]
+        self.assertEqual((first["accessions"], first["repositories"], first["title"]),
+                         (["SRP100", "GSE100"], ["SRA", "GEO"], "IBD gut metagenomes"))
+        self.assertTrue(first["details"].startswith("human gut metagenome; WGS; 2 runs"))
+        self.assertEqual(result["rows"][-1]["details"], "RNA-Seq; 1 run")
+
+    def test_backends_run_concurrently(self):
+        # The SRA and GEO searches only get past this barrier if both are in flight at once
+        stub_eutils.barrier = threading.Barrier(2, timeout=10)
+        result = _federated_search("IBD", timeout=30)
+        self.assertEqual(result.splitlines()[1:], [])
+        self.assertIn('"found":{"SRA":2,"GEO":2', result)
+
+    def test_backend_past_its_timeout_is_reported_and_counted(self):
+        # SRA never answers during the test, so the search returns without waiting for it
+        stub_eutils.gates["sra"].clear()
+        with patch.dict("biomarker_agent.FEDERATED_TIMEOUTS", {"sra": 0.1}):
+            result = _federated_search("IBD")
+        body, error = result.splitlines()
+        self.assertEqual(error, "Error searching SRA: no answer within 0.1s; results are incomplete.")
+        rows = json.loads(body)["rows"]
+        self.assertIn(["GSE100"], [row["accessions"] for row in rows])
+        self.assertNotIn("SRA", [repository for row in rows for repository in row["repositories"]])
+        self.assertEqual(federated_search_stats()["running"], 1)
+        self.assertIn("1 backend searches abandoned after a timeout, 1 still running", biomarker_client_stats())
+
+        # Once it answers, its thread is free again
+        stub_eutils.gates["sra"].set()
+        self.executor.shutdown(wait=True)
+        self.assertEqual(federated_search_stats()["abandoned"], 1)
+        self.assertEqual(federated_search_stats()["running"], 0)
+
+    def test_partial_results_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(os.path.join(tmp, "queries.sqlite"), ttl=60)
+            with patch("tools.result_cache.get_query_cache", lambda: cache):
+                stub_eutils.gates["sra"].clear()
+                with patch.dict("biomarker_agent.FEDERATED_TIMEOUTS", {"sra": 0.05}):
+                    search_all_repositories("IBD")
+                self.assertEqual(cache.stats()["entries"], 0)
+                stub_eutils.gates["sra"].set()
+                search_all_repositories("IBD")
+                self.assertTrue(search_all_repositories(" ibd ").startswith("[CACHED RESULT"))
+
+    def test_merge_ranks_by_reciprocal_rank_fusion(self):
+        rows = _merge_records({
+            "sra": [{"repository": "SRA", "accession": "SRP1", "title": "a", "details": "", "links": set()},
+                    {"repository": "SRA", "accession": "SRP2", "title": "b", "details": "", "links": {"GSE2"}}],
+            "geo": [{"repository": "GEO", "accession": "GSE1", "title": "c", "details": "", "links": set()},
+                    {"repository": "GEO", "accession": "GSE2", "title": "b", "details": "", "links": set()}],
+        })
+        # Found in both repositories beats first place in one
+        self.assertEqual([row["accessions"] for row in rows], [["SRP2", "GSE2"], ["SRP1"], ["GSE1"]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+from biomarker_agent import _search_geo
+from tools.clients import ClientRegistry
+from tools.rate_limiter import RateLimiter
+
+try:
+    from Bio import Entrez
+except ImportError:
+    Entrez = None
+
+ESEARCH = """<?xml version="1.0" encoding="UTF-8" ?>
+<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" "https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">
+<eSearchResult><Count>{count}</Count><RetMax>{retmax}</RetMax><RetStart>0</RetStart><QueryKey>1</QueryKey>
+<WebEnv>MCID_fake</WebEnv><IdList>{ids}</IdList><TranslationSet/><QueryTranslation>{term}</QueryTranslation></eSearchResult>
+"""
+
+ESUMMARY = """<?xml version="1.0" encoding="UTF-8" ?>
+<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary v1 20041029//EN" "https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20041029/esummary-v1.dtd">
+<eSummaryResult>{docs}</eSummaryResult>
+"""
+
+DOCSUM = """<DocSum><Id>{uid}</Id><Item Name="Accession" Type="String">GSE{uid}</Item>
+<Item Name="title" Type="String">Dataset {uid}</Item></DocSum>"""
+
+TOTAL = 12
+
+class FakeEntrez(BaseHTTPRequestHandler):
+    """Minimal E-utilities server: esearch over TOTAL hits, esummary by ID list or history."""
+    requests = []
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _respond(self, params):
+        tool = urlparse(self.path).path.rsplit("/", 1)[-1]
+        params = {k: v[0] for k, v in params.items()}
+        FakeEntrez.requests.append((tool, params))
+        uids = [str(200000000 + i) for i in range(TOTAL)]
+        if tool == "esearch.fcgi":
+            start, retmax = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+            body = ESEARCH.format(count=TOTAL, retmax=retmax, term=params["term"],
+                                  ids="".join(f"<Id>{uid}</Id>" for uid in uids[start:start + retmax]))
+        else:
+            if "id" in params:
+                selected = params["id"].split(",")
+            else:
+                start = int(params["retstart"])
+                selected = uids[start:start + int(params["retmax"])]
+            body = ESUMMARY.format(docs="".join(DOCSUM.format(uid=uid) for uid in selected))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body.encode("utf-8"))))
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def do_GET(self):
+        self._respond(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        self._respond(parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode()))
+
+    def log_message(self, *args):
+        pass
+
+@unittest.skipIf(Entrez is None, "biopython is not installed")
+class TestGeoSearch(unittest.TestCase):
+
+    def setUp(self):
+        FakeEntrez.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEntrez)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        base = f"http://127.0.0.1:{self.server.server_address[1]}/entrez/eutils"
+
+        self.registry = ClientRegistry()
+        self.addCleanup(self.registry.close_all)
+        for target, value in (("biomarker_agent.NCBI_EUTILS_URL", base),
+                              ("biomarker_agent.get_client_registry", lambda: self.registry),
+                              ("biomarker_agent.ncbi_rate_limiter", lambda: RateLimiter(1000))):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_summaries_are_fetched_in_one_batched_call(self):
+        page = json.loads(_search_geo("gut microbiome", retmax=5))
+        self.assertEqual([tool for tool, _ in FakeEntrez.requests], ["esearch.fcgi", "esummary.fcgi"])
+        self.assertEqual(FakeEntrez.requests[0][1]["usehistory"], "y")
+        self.assertEqual(len(FakeEntrez.requests[1][1]["id"].split(",")), 5)
+        self.assertEqual(page["rows"][4], {"accession": "GSE200000004", "title": "Dataset 200000004"})
+        self.assertEqual(page["total"], 12)
+
+        # The cursor fetches the next page on its own
+        FakeEntrez.requests = []
+        page = json.loads(_search_geo("gut microbiome", retmax=5, cursor=page["next_cursor"]))
+        self.assertEqual(FakeEntrez.requests[0][1]["retstart"], "5")
+        self.assertEqual(page["rows"][0]["accession"], "GSE200000005")
+
+    def test_requests_share_one_keep_alive_connection(self):
+        _search_geo("gut microbiome", retmax=5)
+        _search_geo("crohn disease", retmax=5)
+        http = self.registry.stats()["http"]
+        self.assertEqual((http["created"], http["acquired"]), (1, 4))
+        self.assertEqual((http["connections"], http["requests"]), (1, 4))
+        self.assertEqual(http["connection_reuse_rate"], 0.75)
+
+    def test_large_result_sets_are_paged_from_the_history_server(self):
+        with patch("biomarker_agent.GEO_ID_BATCH_SIZE", 4), patch("biomarker_agent.GEO_ESUMMARY_PAGE_SIZE", 5):
+            result = _search_geo("gut microbiome", retmax=12)
+        pages = [params for tool, params in FakeEntrez.requests if tool == "esummary.fcgi"]
+        self.assertEqual([(p["webenv"], p["query_key"], p["retstart"], p["retmax"]) for p in pages],
+                         [("MCID_fake", "1", "0", "5"), ("MCID_fake", "1", "5", "5"), ("MCID_fake", "1", "10", "2")])
+        page = json.loads(result)
+        self.assertEqual(len(page["rows"]), 12)
+        self.assertIsNone(page["next_cursor"])
+
+    def test_history_pages_start_at_the_cursor_offset(self):
+        with patch("biomarker_agent.GEO_ID_BATCH_SIZE", 2):
+            first = json.loads(_search_geo("gut microbiome", retmax=4))
+            second = json.loads(_search_geo("gut microbiome", retmax=4, cursor=first["next_cursor"]))
+        self.assertEqual([row["accession"] for row in second["rows"]],
+                         [f"GSE20000000{n}" for n in range(4, 8)])
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_calls_are_spaced_to_the_rate(self):
+        now = [0.0]
+        sleeps = []
+        def sleep(seconds):
+            sleeps.append(round(seconds, 6))
+            now[0] += seconds
+        limiter = RateLimiter(3, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire()
+        # The first call goes straight out, the rest wait a third of a second each
+        self.assertEqual(sleeps, [0.333333] * 3)
+        now[0] += 5
+        self.assertEqual(limiter.acquire(), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import literature_agent
+from tools.mcp_server import ManagedMcpServer
+
+# Any process listening on the port passes the readiness probe
+FAKE_SERVER = [sys.executable, "-m", "http.server", "{port}", "--bind", "{host}"]
+
+class TestManagedMcpServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _server(self, command=FAKE_SERVER, **kwargs):
+        server = ManagedMcpServer(command, log_path=os.path.join(self.tmp.name, "mcp.log"), **kwargs)
+        self.addCleanup(server.stop)
+        return server
+
+    def test_started_lazily_once_and_shared(self):
+        server = self._server()
+        self.assertFalse(server.running)
+        self.assertEqual(server.ensure_running(), f"http://127.0.0.1:{server.port}/mcp")
+        pid = server._process.pid
+        server.ensure_running()
+        self.assertEqual(server._process.pid, pid)
+        stats = server.stats()
+        self.assertEqual((stats["starts"], stats["restarts"], stats["running"]), (1, 0, True))
+        self.assertIsNotNone(stats["startup_seconds"])
+
+    def test_crashed_server_is_restarted_on_the_same_port(self):
+        server = self._server()
+        server.ensure_running()
+        server._process.kill()
+        server._process.wait()
+        url = server.ensure_running()
+        self.assertTrue(server.running)
+        self.assertEqual(url, f"http://127.0.0.1:{server.port}/mcp")
+        self.assertEqual((server.stats()["starts"], server.stats()["restarts"]), (2, 1))
+
+    def test_stop_terminates_the_process(self):
+        server = self._server()
+        server.ensure_running()
+        process = server._process
+        server.stop()
+        self.assertIsNotNone(process.poll())
+        self.assertFalse(server.running)
+
+    def test_startup_failures_report_the_server_output(self):
+        server = self._server([sys.executable, "-c", "import sys; print('no such module'); sys.exit(3)"])
+        with self.assertRaisesRegex(RuntimeError, "exited with code 3 during startup: no such module"):
+            server.ensure_running()
+        server = self._server([sys.executable, "-c", "import time; time.sleep(10)"], startup_timeout=0.3)
+        with self.assertRaisesRegex(RuntimeError, "did not start within 0.3s"):
+            server.ensure_running()
+        self.assertFalse(server.running)
+
+class TestLiteratureServerWiring(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = ManagedMcpServer(FAKE_SERVER, log_path=os.path.join(self.tmp.name, "mcp.log"))
+        self.addCleanup(self.server.stop)
+        patcher = patch("literature_agent.get_literature_mcp_server", lambda: self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_toolset_connects_to_the_shared_server(self):
+        with patch("literature_agent.LITERATURE_MCP_URL", None), patch("literature_agent.LITERATURE_MCP_SHARED", True):
+            params, header_provider = literature_agent._connection_params()
+        self.assertEqual(params.url, self.server.url)
+        self.assertFalse(self.server.running)
+        # Sessions start the server when they connect
+        self.assertEqual(asyncio.run(header_provider(None)), {})
+        self.assertTrue(self.server.running)
+
+    def test_tool_calls_are_timed(self):
+        for call_id, response in (("a", {"content": []}), ("b", {"isError": True})):
+            context = SimpleNamespace(function_call_id=call_id)
+            literature_agent._start_call_timer(None, {}, context)
+            literature_agent._record_call(None, {}, context, response)
+        stats = self.server.stats()
+        self.assertEqual((stats["calls"], stats["errors"]), (2, 1))
+        self.assertIsNotNone(stats["call_seconds_p95"])
+        self.assertIn("2 calls", literature_agent.literature_server_stats())
+
+    def test_agent_reports_server_stats(self):
+        agent = literature_agent.create_literature_agent("gemini-2.0-flash")
+        tools = [getattr(tool, "func", None) for tool in agent.tools]
+        self.assertIn(literature_agent.literature_server_stats, tools)
+        # Calling a function tool is not a server call
+        context = SimpleNamespace(function_call_id="local")
+        tool = SimpleNamespace(name="literature_server_stats")
+        literature_agent._start_call_timer(tool, {}, context)
+        literature_agent._record_call(tool, {}, context, {"result": "..."})
+        self.assertEqual(self.server.stats()["calls"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
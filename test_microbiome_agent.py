@@ -1,21 +1,29 @@
+import asyncio
+import subprocess
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 import os
-from microbiome_agent import run_kneaddata, run_metaphlan2, run_humann2
+from microbiome_agent import run_kneaddata, run_metaphlan2, run_humann2, run_humann2_async
+from tools.resources import ResourceManager
 
 class TestMicrobiomeAgent(unittest.TestCase):
 
-    @patch('subprocess.run')
-    def test_run_kneaddata(self, mock_run):
-        mock_run.return_value = MagicMock(stdout="Kneaddata output", returncode=0)
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.output_dir = os.path.join(tmp.name, "output_dir")
+
+    @patch('microbiome_agent.stream_command')
+    def test_run_kneaddata(self, mock_stream):
+        mock_stream.return_value = 0
         
-        result = run_kneaddata("input.fastq", "output_dir")
+        result = run_kneaddata("input.fastq", self.output_dir, threads=2)
         
         self.assertIn("Kneaddata completed successfully", result)
-        mock_run.assert_called_with(
-            ["kneaddata", "--input", "input.fastq", "--output", "output_dir"],
-            capture_output=True, text=True, check=True
-        )
+        args, kwargs = mock_stream.call_args
+        self.assertEqual(args[0], ["kneaddata", "--input", "input.fastq", "--output", self.output_dir, "--threads", "2"])
+        self.assertEqual(args[1].log_path, os.path.join(self.output_dir, "logs", "kneaddata_input.log"))
 
     @patch('subprocess.run')
     def test_run_metaphlan2(self, mock_run):
@@ -23,26 +31,41 @@ class TestMicrobiomeAgent(unittest.TestCase):
         
         # Mock open to avoid actual file creation
         with patch('builtins.open', unittest.mock.mock_open()) as mock_file:
-            result = run_metaphlan2("input.fastq", "output.txt")
+            result = run_metaphlan2("input.fastq", "output.txt", threads=4)
             
             self.assertIn("MetaPhlAn2 completed successfully", result)
             # Check if subprocess was called with stdout redirection
             # Note: checking stdout arg is tricky with mock_open, but we can check the command list
             args, kwargs = mock_run.call_args
-            self.assertEqual(args[0], ["metaphlan2.py", "input.fastq", "--input_type", "fastq", "--nproc", "4"])
+            self.assertEqual(args[0], ["metaphlan2.py", "input.fastq", "--input_type", "fastq",
+                                       "--bowtie2out", "output.bowtie2.bz2", "--nproc", "4"])
             self.assertTrue('stdout' in kwargs)
 
-    @patch('subprocess.run')
-    def test_run_humann2(self, mock_run):
-        mock_run.return_value = MagicMock(stdout="HUMAnN2 output", returncode=0)
+    @patch('microbiome_agent.stream_command')
+    def test_run_humann2(self, mock_stream):
+        mock_stream.return_value = 0
         
-        result = run_humann2("input.fastq", "output_dir")
+        with patch('microbiome_agent.get_resource_manager', return_value=ResourceManager(cpus=16, memory_gb=64)):
+            result = run_humann2("input.fastq", self.output_dir)
         
+        self.assertIn("HUMAnN2 completed successfully with 16 threads", result)
+        args, kwargs = mock_stream.call_args
+        self.assertEqual(args[0], ["humann2", "--input", "input.fastq", "--output", self.output_dir, "--threads", "16"])
+
+    @patch('microbiome_agent.run_command_async')
+    def test_run_humann2_async(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess([], 0, stdout="HUMAnN2 output", stderr="")
+
+        result = asyncio.run(run_humann2_async("input.fastq", self.output_dir, threads=8, timeout=60))
+
         self.assertIn("HUMAnN2 completed successfully", result)
-        mock_run.assert_called_with(
-            ["humann2", "--input", "input.fastq", "--output", "output_dir"],
-            capture_output=True, text=True, check=True
-        )
+        args, kwargs = mock_run.call_args
+        self.assertEqual(args[0], ["humann2", "--input", "input.fastq", "--output", self.output_dir, "--threads", "8"])
+        self.assertEqual(kwargs["timeout"], 60)
+        self.assertIsNotNone(kwargs["max_lines"])
+
+        mock_run.side_effect = asyncio.TimeoutError()
+        self.assertIn("timed out after 60 seconds", asyncio.run(run_humann2_async("input.fastq", self.output_dir, timeout=60)))
 
 if __name__ == '__main__':
     unittest.main()
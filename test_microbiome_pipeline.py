@@ -0,0 +1,193 @@
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from tools.microbiome_pipeline import MicrobiomeBatchScheduler, read_manifest, run_microbiome_batch
+from tools.pipeline_state import PipelineState
+
+# Stand-in for kneaddata/metaphlan2.py/humann2: logs its start/end time and thread flag, then sleeps
+FAKE_TOOL = """#!{python}
+import os, sys, time
+name = os.path.basename(sys.argv[0])
+if "--version" in sys.argv:
+    sys.exit(print(name, "v1.0"))
+threads = sys.argv[sys.argv.index("--threads" if "--threads" in sys.argv else "--nproc") + 1]
+start = time.time()
+if os.environ.get("FAIL_ON") and os.environ["FAIL_ON"] in " ".join(sys.argv) and name == "metaphlan2.py":
+    sys.exit("simulated failure")
+if "--bowtie2out" in sys.argv:
+    open(sys.argv[sys.argv.index("--bowtie2out") + 1], "w").write("alignment")
+# Profiling a saved alignment skips the slow bowtie2 step
+time.sleep(0.05 if "bowtie2out" in sys.argv else 0.6 if "s1" in " ".join(sys.argv) else 0.2)
+out = sys.argv[sys.argv.index("--output") + 1] if "--output" in sys.argv else None
+base = os.path.basename(sys.argv[2]).split(".")[0]
+if name == "kneaddata":
+    os.makedirs(out, exist_ok=True)
+    open(os.path.join(out, base + "_kneaddata.fastq"), "w").write("reads")
+elif name == "humann2":
+    os.makedirs(out, exist_ok=True)
+    for table in ("genefamilies", "pathabundance", "pathcoverage"):
+        open(os.path.join(out, f"{{base}}_{{table}}.tsv"), "w").write(table)
+with open(os.environ["FAKE_TOOL_LOG"], "a") as log:
+    log.write(f"{{name}} {{sys.argv[2] if name != 'metaphlan2.py' else sys.argv[1]}} {{threads}} {{start}} {{time.time()}}\\n")
+print("done")
+"""
+
+class TestMicrobiomePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        bin_dir = os.path.join(self.tmp.name, "bin")
+        os.makedirs(bin_dir)
+        for name in ("kneaddata", "metaphlan2.py", "humann2"):
+            path = os.path.join(bin_dir, name)
+            with open(path, "w") as f:
+                f.write(FAKE_TOOL.format(python=sys.executable))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        self.log = os.path.join(self.tmp.name, "calls.log")
+        self.env = patch.dict(os.environ, {"PATH": bin_dir + os.pathsep + os.environ["PATH"], "FAKE_TOOL_LOG": self.log})
+        self.env.start()
+        for i in range(3):
+            with open(os.path.join(self.tmp.name, f"s{i}.fastq.gz"), "w") as f:
+                f.write("raw reads")
+        self.manifest = os.path.join(self.tmp.name, "samples.tsv")
+        with open(self.manifest, "w") as f:
+            f.write("sample_id\tfastq\n" + "".join(f"s{i}\t{self.tmp.name}/s{i}.fastq.gz\n" for i in range(3)))
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def _calls(self):
+        with open(self.log) as f:
+            return [line.split() for line in f]
+
+    def test_read_manifest_validates_rows(self):
+        self.assertEqual([s["sample_id"] for s in read_manifest(self.manifest)], ["s0", "s1", "s2"])
+        bad = os.path.join(self.tmp.name, "bad.csv")
+        with open(bad, "w") as f:
+            f.write("sample_id,fastq\na,x.fastq\na,y.fastq\n")
+        with self.assertRaises(ValueError):
+            read_manifest(bad)
+
+    def test_samples_are_pipelined_within_thread_budget(self):
+        out = os.path.join(self.tmp.name, "out")
+        report = asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=4, memory_gb=64, max_jobs=2))
+
+        self.assertIn("3 completed", report)
+        self.assertIn("Throughput:", report)
+        calls = self._calls()
+        self.assertEqual(len(calls), 9)
+        # Jobs started together split the free threads; running jobs never exceed the budget
+        jobs = [(float(s), float(e), int(threads)) for _, _, threads, s, e in calls]
+        self.assertEqual(sorted(jobs)[0][2], 2)
+        for start, _, _ in jobs:
+            self.assertLessEqual(sum(t for s, e, t in jobs if s <= start < e), 4)
+        # kneaddata of one sample overlaps MetaPhlAn2 of another
+        knead = [(float(s), float(e)) for name, _, _, s, e in calls if name == "kneaddata"]
+        metaphlan = [(float(s), float(e)) for name, _, _, s, e in calls if name == "metaphlan2.py"]
+        self.assertTrue(any(ks < me and ms < ke for ks, ke in knead for ms, me in metaphlan))
+        # MetaPhlAn2 reads the kneaddata output and its profile is written per sample
+        self.assertTrue(any(arg.endswith(os.path.join("s0", "kneaddata", "s0_kneaddata.fastq")) for _, arg, _, _, _ in calls))
+        self.assertTrue(os.path.exists(os.path.join(out, "s0", "s0_metaphlan2.txt")))
+
+    def test_failed_step_skips_rest_of_sample_only(self):
+        with patch.dict(os.environ, {"FAIL_ON": "s1_kneaddata"}):
+            scheduler = MicrobiomeBatchScheduler(read_manifest(self.manifest), os.path.join(self.tmp.name, "out"),
+                                                 max_threads=3, max_jobs=3)
+            asyncio.run(scheduler.run())
+        statuses = {sid: [s.status for s in steps] for sid, steps in scheduler.pipelines.items()}
+        self.assertEqual(statuses["s1"], ["done", "failed", "skipped"])
+        self.assertEqual(statuses["s0"], ["done", "done", "done"])
+        self.assertIn("simulated failure", scheduler.report())
+        with open(os.path.join(self.tmp.name, "out", "s1", "logs", "metaphlan2.log")) as f:
+            self.assertIn("simulated failure", f.read())
+
+    def test_rerun_skips_up_to_date_steps_and_resumes_failures(self):
+        out = os.path.join(self.tmp.name, "out")
+        with patch.dict(os.environ, {"FAIL_ON": "s1_kneaddata"}):
+            asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=3))
+        self.assertEqual(len(self._calls()), 7)
+
+        # Only the failed sample's remaining steps run again
+        os.remove(self.log)
+        report = asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=3))
+        self.assertIn("3 completed", report)
+        self.assertIn("Steps skipped as up to date: 7", report)
+        self.assertEqual(sorted((c[0], c[1].split(os.sep)[-3]) for c in self._calls()),
+                         [("humann2", "s1"), ("metaphlan2.py", "s1")])
+
+        # A changed input re-runs that step and, through its rewritten output, the steps downstream
+        os.remove(self.log)
+        with open(os.path.join(self.tmp.name, "s2.fastq.gz"), "w") as f:
+            f.write("re-sequenced reads")
+        report = asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=3))
+        self.assertIn("Steps skipped as up to date: 6", report)
+        self.assertEqual(sorted(c[0] for c in self._calls()), ["humann2", "kneaddata", "metaphlan2.py"])
+        self.assertTrue(all("s2" in c[1] for c in self._calls()))
+
+    def test_each_step_is_checked_once(self):
+        out = os.path.join(self.tmp.name, "out")
+        asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=3))
+        checks = []
+        original = MicrobiomeBatchScheduler._up_to_date
+        def counting(scheduler, step):
+            checks.append(step.key)
+            return original(scheduler, step)
+        # One job at a time keeps ready steps waiting for many scheduling rounds
+        with patch.object(MicrobiomeBatchScheduler, "_up_to_date", counting):
+            asyncio.run(run_microbiome_batch(self.manifest, os.path.join(self.tmp.name, "fresh"), max_threads=1))
+            self.assertEqual(sorted(checks), sorted(set(checks)))
+            self.assertEqual(len(checks), 9)
+            checks.clear()
+            report = asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=3))
+        self.assertIn("Steps skipped as up to date: 9", report)
+        self.assertEqual(len(checks), 9)
+
+    def test_reprofiling_reuses_bowtie2_alignment(self):
+        out = os.path.join(self.tmp.name, "out")
+        scheduler = MicrobiomeBatchScheduler(read_manifest(self.manifest), out, max_threads=3)
+        asyncio.run(scheduler.run())
+        profile = os.path.join(out, "s0", "s0_metaphlan2.txt")
+        self.assertTrue(os.path.exists(os.path.join(out, "s0", "s0_metaphlan2.bowtie2.bz2")))
+        # HUMAnN2 is given the MetaPhlAn2 profile instead of re-screening the reads
+        humann2 = scheduler.pipelines["s0"][2].command
+        self.assertEqual(humann2[humann2.index("--taxonomic-profile") + 1], profile)
+
+        # A lost profile is recomputed from the saved alignment, not from the reads
+        os.remove(self.log)
+        os.remove(profile)
+        report = asyncio.run(run_microbiome_batch(self.manifest, out, max_threads=3))
+        calls = self._calls()
+        self.assertEqual([(c[0], os.path.basename(c[1])) for c in calls if c[0] == "metaphlan2.py"],
+                         [("metaphlan2.py", "s0_metaphlan2.bowtie2.bz2")])
+        self.assertIn("s0_metaphlan2.txt", os.listdir(os.path.join(out, "s0")))
+        self.assertIn("profiled the saved bowtie2 alignment", report)
+
+    def test_memory_budget_limits_concurrency(self):
+        scheduler = MicrobiomeBatchScheduler(read_manifest(self.manifest), os.path.join(self.tmp.name, "out"),
+                                             max_threads=8, memory_gb=20, max_jobs=8)
+        asyncio.run(scheduler.run())
+        humann = sorted((float(s), float(e)) for name, _, _, s, e in self._calls() if name == "humann2")
+        # HUMAnN2 needs 16 GB by default, so two of them never run at once within 20 GB
+        self.assertTrue(all(later[0] >= earlier[1] - 0.05 for earlier, later in zip(humann, humann[1:])))
+
+class TestPipelineState(unittest.TestCase):
+
+    def test_writers_sharing_a_state_file_keep_each_others_steps(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            reads = os.path.join(tmp, "reads.fastq")
+            with open(reads, "w") as f:
+                f.write("reads")
+            first, second = PipelineState.for_directory(tmp), PipelineState.for_directory(tmp)
+            first.record("k:a", "done", [reads], [], ["a"], "v1")
+            second.record("k:b", "done", [reads], [], ["b"], "v1")
+            for state in (PipelineState.for_directory(tmp), second):
+                self.assertEqual((state.status("k:a"), state.status("k:b")), ("done", "done"))
+            self.assertTrue(PipelineState.for_directory(tmp).is_up_to_date("k:a", [reads], [], ["a"], "v1"))
+
+if __name__ == '__main__':
+    unittest.main()
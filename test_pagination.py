@@ -0,0 +1,28 @@
+import json
+import unittest
+from tools.pagination import decode_cursor, encode_cursor, page_json
+
+class TestPagination(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor("sra", "gut microbiome", 25)
+        self.assertEqual(decode_cursor(cursor, "sra"), ("gut microbiome", 25))
+        with self.assertRaises(ValueError):
+            decode_cursor(cursor, "geo")
+        with self.assertRaises(ValueError):
+            decode_cursor("not a cursor", "sra")
+
+    def test_page_json_is_compact(self):
+        text = page_json("geo", "ibd", [{"accession": "GSE1", "taxon": None, "sra": []}], offset=0, total=3)
+        self.assertNotIn(" ", text)
+        page = json.loads(text)
+        self.assertEqual(page["rows"], [{"accession": "GSE1"}])
+        self.assertEqual(decode_cursor(page["next_cursor"], "geo"), ("ibd", 1))
+
+    def test_last_page_has_no_cursor(self):
+        self.assertIsNone(json.loads(page_json("geo", "ibd", [{"accession": "GSE1"}], offset=2, total=3))["next_cursor"])
+        self.assertIsNone(json.loads(page_json("cellxgene", "ibd", [{"dataset_id": "a"}], 0, has_more=False))["next_cursor"])
+        self.assertIsNotNone(json.loads(page_json("cellxgene", "ibd", [{"dataset_id": "a"}], 0, has_more=True))["next_cursor"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import literature_agent
+from tools.effect_sizes import EffectSizeRegistry
+from tools.mcp_server import ManagedMcpServer
+from tools.paper_search_stub import PAPERS
+from tools.paper_store import PaperStore, extract_papers, paper_ids
+
+STUB_SERVER = [sys.executable, "-m", "tools.paper_search_stub", "--host", "{host}", "--port", "{port}"]
+
+def response(papers):
+    """A literature tool response as the MCP toolset returns it."""
+    return {"content": [{"type": "text", "text": json.dumps(paper)} for paper in papers],
+            "structuredContent": {"result": papers}}
+
+class TestPaperStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = PaperStore(os.path.join(self.tmp.name, "papers.sqlite"))
+
+    def test_identifiers_are_normalized(self):
+        self.assertEqual(paper_ids({"source": "arxiv", "paper_id": "2401.01234v2", "doi": ""}),
+                         {"doi": None, "pmid": None, "arxiv_id": "2401.01234"})
+        self.assertEqual(paper_ids({"source": "semantic", "doi": "https://doi.org/10.48550/arXiv.2401.01234"})["arxiv_id"],
+                         "2401.01234")
+        self.assertEqual(paper_ids({"source": "google_scholar", "url": "https://pubmed.ncbi.nlm.nih.gov/38012345/"})["pmid"],
+                         "38012345")
+
+    def test_duplicates_across_sources_are_merged(self):
+        self.assertEqual(self.store.add(PAPERS), 4)
+        # The arXiv preprint again, found via Semantic Scholar with its arXiv DOI
+        self.assertEqual(self.store.add([{"source": "semantic", "title": "Deep learning for single-cell biomarkers",
+                                          "doi": "10.48550/arXiv.2401.01234", "citations": 7}]), 0)
+        self.assertEqual(self.store.stats()["papers"], 4)
+        [paper] = self.store.search("gut microbiome inflammatory")
+        self.assertEqual(paper["sources"], ["pubmed", "semantic"])
+        # Empty fields are filled in from the other source, existing ones are kept
+        self.assertEqual(paper["citations"], 42)
+        self.assertTrue(paper["abstract"].startswith("Metagenomic"))
+        [paper] = self.store.search("single-cell biomarker", source="semantic")
+        self.assertEqual((paper["paper_id"], paper["citations"]), ("2401.01234v2", 7))
+
+    def test_paper_linking_separate_rows_collapses_them(self):
+        self.store.add([{"source": "semantic", "title": "Fecal calprotectin and gut microbiome shifts",
+                         "doi": "10.1000/calpro.2024", "citations": 3},
+                        {"source": "pubmed", "paper_id": "39000001", "title": "Fecal calprotectin & the gut microbiome",
+                         "abstract": "Calprotectin tracked dysbiosis."}])
+        self.assertEqual(self.store.stats()["papers"], 2)
+        # Google Scholar knows both the DOI and the PubMed ID
+        self.assertEqual(self.store.add([{"source": "google_scholar", "title": "Fecal calprotectin and gut microbiome",
+                                          "doi": "10.1000/calpro.2024",
+                                          "url": "https://pubmed.ncbi.nlm.nih.gov/39000001/"}]), 0)
+        self.assertEqual(self.store.stats()["papers"], 1)
+        [paper] = self.store.search("calprotectin")
+        self.assertEqual(paper["sources"], ["google_scholar", "pubmed", "semantic"])
+        self.assertEqual((paper["title"], paper["citations"], paper["abstract"]),
+                         ("Fecal calprotectin and gut microbiome shifts", 3, "Calprotectin tracked dysbiosis."))
+        # The surviving row is found by either identifier
+        self.store.add([{"source": "pubmed", "paper_id": "39000001", "title": "Fecal calprotectin"}])
+        self.assertEqual(self.store.stats()["papers"], 1)
+
+    def test_full_text_search(self):
+        self.store.add(PAPERS)
+        # Stemmed words from title and abstract, best title match first
+        titles = [paper["title"] for paper in self.store.search("single cell atlases")]
+        self.assertEqual(titles, ["Deep learning for single-cell biomarker discovery"])
+        titles = [paper["title"] for paper in self.store.search("single-cell")]
+        self.assertEqual(len(titles), 2)
+        self.assertEqual([p["paper_id"] for p in self.store.search("cohen's d", source="biorxiv")],
+                         ["10.1101/2024.02.01.578000"])
+        self.assertEqual(self.store.search("single-cell", source="biorxiv"), [])
+        self.assertEqual(self.store.search("!!"), [])
+
+    def test_answers_only_complete_and_fresh_searches(self):
+        self.store.add(PAPERS)
+        self.assertEqual(len(self.store.answer("colitis", 1, source="pubmed")), 1)
+        self.assertIsNone(self.store.answer("colitis", 5, source="pubmed"))
+        self.store.max_age = 60
+        with patch("tools.paper_store.time.time", return_value=time.time() + 120):
+            self.assertIsNone(self.store.answer("colitis", 1, source="pubmed"))
+        stats = self.store.stats()
+        self.assertEqual((stats["local_hits"], stats["remote_searches"]), (1, 2))
+
+    def test_extract_papers(self):
+        self.assertEqual(extract_papers(response(PAPERS[:2])), PAPERS[:2])
+        self.assertEqual(extract_papers({"content": [{"type": "text", "text": json.dumps(PAPERS[0])}]}), [PAPERS[0]])
+        self.assertEqual(extract_papers({"isError": True, "content": [{"type": "text", "text": "timeout"}]}), [])
+
+class TestLiteratureStoreCallbacks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = PaperStore(os.path.join(self.tmp.name, "papers.sqlite"))
+        self.server = ManagedMcpServer(STUB_SERVER, log_path=os.path.join(self.tmp.name, "mcp.log"))
+        self.addCleanup(self.server.stop)
+        registry = EffectSizeRegistry(os.path.join(self.tmp.name, "effect_sizes.sqlite"))
+        for target, value in (("literature_agent.get_paper_store", lambda: self.store),
+                              ("literature_agent.get_literature_mcp_server", lambda: self.server),
+                              ("literature_agent.get_effect_size_registry", lambda: registry)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _call(self, tool, args, remote):
+        """Runs a tool call through the agent's callbacks as the ADK does."""
+        context = SimpleNamespace(function_call_id=str(time.monotonic()))
+        tool = SimpleNamespace(name=tool)
+        result = None
+        for callback in (literature_agent._serve_from_store, literature_agent._start_call_timer):
+            result = callback(tool, args, context)
+            if result is not None:
+                break
+        if result is None:
+            result = remote(tool.name, args)
+        for callback in (literature_agent._store_papers, literature_agent._record_call):
+            callback(tool, args, context, result)
+        return result
+
+    def test_repeated_search_is_served_locally(self):
+        calls = []
+        def remote(name, args):
+            calls.append(name)
+            return response(PAPERS[:1])
+        first = self._call("literature_search_pubmed", {"query": "gut microbiome", "max_results": 1}, remote)
+        second = self._call("literature_search_pubmed", {"query": "microbiome of the gut", "max_results": 1}, remote)
+        self.assertEqual(calls, ["literature_search_pubmed"])
+        self.assertNotIn("served_from", first)
+        self.assertEqual(second["served_from"], "local paper store")
+        self.assertEqual(second["result"][0]["paper_id"], "38012345")
+        # Only the remote call was timed as a server call
+        self.assertEqual(self.server.stats()["calls"], 1)
+        # Other sources, larger requests and extra options still go to the server
+        self._call("literature_search_arxiv", {"query": "gut microbiome", "max_results": 1}, remote)
+        self._call("literature_search_pubmed", {"query": "gut microbiome", "max_results": 5}, remote)
+        self._call("literature_search_pubmed", {"query": "gut microbiome", "max_results": 1, "sort": "date"}, remote)
+        self.assertEqual(len(calls), 4)
+        self.assertIn("1 searches answered locally", literature_agent.paper_store_stats())
+        agent = literature_agent.create_literature_agent("gemini-2.0-flash")
+        self.assertIn(literature_agent.paper_store_stats, [getattr(tool, "func", None) for tool in agent.tools])
+
+    def test_stub_server_end_to_end(self):
+        from google.adk.tools.mcp_tool import McpToolset, StreamableHTTPConnectionParams
+        log_path = os.path.join(self.tmp.name, "stub_calls.jsonl")
+        with patch.dict(os.environ, {"PAPER_SEARCH_STUB_LOG": log_path}):
+            url = self.server.ensure_running()
+
+        async def search_twice():
+            toolset = McpToolset(connection_params=StreamableHTTPConnectionParams(url=url))
+            try:
+                tools = {tool.name: tool for tool in await toolset.get_tools()}
+                def remote(name, args):
+                    return asyncio.run_coroutine_threadsafe(
+                        tools[name].run_async(args=args, tool_context=None), loop).result()
+                loop = asyncio.get_running_loop()
+                args = {"query": "inflammatory bowel disease", "max_results": 1}
+                return [await asyncio.to_thread(self._call, name, args, remote)
+                        for name in ("search_pubmed", "search_pubmed", "search_semantic")]
+            finally:
+                await toolset.close()
+
+        first, second, semantic = asyncio.run(search_twice())
+        self.assertEqual(first["structuredContent"]["result"][0]["paper_id"], "38012345")
+        self.assertEqual(second["served_from"], "local paper store")
+        with open(log_path) as f:
+            self.assertEqual([json.loads(line)["tool"] for line in f], ["search_pubmed", "search_semantic"])
+        # The Semantic Scholar copy of the PubMed paper was merged into it
+        self.assertEqual(self.store.stats()["papers"], 1)
+        self.assertEqual(self.store.search("inflammatory bowel")[0]["sources"], ["pubmed", "semantic"])
+
+if __name__ == '__main__':
+    unittest.main()
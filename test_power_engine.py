@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+import numpy as np
+from tools.power_engine import pwr_t_test, pwr_r_test, pwr_p_test, format_power_htest
+from tools.result_cache import ResultCache
+import power_analysis_agent
+from power_analysis_agent import run_power_analysis, run_power_analysis_async
+
+class TestPowerEngine(unittest.TestCase):
+
+    def setUp(self):
+        # Results are cached in a throwaway store, not the repository's .cache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cache = ResultCache(os.path.join(self.tmp.name, "results.sqlite"))
+        patcher = patch("tools.result_cache.get_default_cache", lambda: cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # Reference values printed by the R pwr package
+
+    def test_t_test_sample_size_matches_r(self):
+        result = pwr_t_test(d=0.5, power=0.8, sig_level=0.05)
+        self.assertIn("n = 63.76561", format_power_htest(result))
+        self.assertIn("NOTE: n is number in *each* group", format_power_htest(result))
+
+    def test_r_and_p_tests_match_r(self):
+        self.assertIn("n = 84.07364", format_power_htest(pwr_r_test(r=0.3, power=0.8)))
+        self.assertIn("n = 196.2215", format_power_htest(pwr_p_test(h=0.2, power=0.8)))
+
+    def test_power_round_trip(self):
+        n = pwr_t_test(d=0.3, power=0.9, type="paired", alternative="greater")["n"]
+        power = pwr_t_test(n=n, d=0.3, type="paired", alternative="greater")["power"]
+        self.assertAlmostEqual(power, 0.9, places=4)
+
+    def test_grid_is_solved_in_one_call(self):
+        grid = pwr_t_test(d=np.array([0.2, 0.5, 0.8]), power=np.array([[0.8], [0.9]]))
+        self.assertEqual(grid["n"].shape, (2, 3))
+        self.assertAlmostEqual(grid["n"][0, 1], 63.76561, places=4)
+        self.assertTrue(np.all(np.diff(grid["n"], axis=1) < 0))
+
+    def test_sample_size_beyond_the_default_interval(self):
+        # pwr widens the n interval (extendInt = "upX") instead of returning NA
+        n = pwr_t_test(d=0.0001, power=0.8)["n"]
+        self.assertAlmostEqual(n / 1.569772e9, 1.0, places=5)
+        self.assertAlmostEqual(pwr_t_test(n=n, d=0.0001)["power"], 0.8, places=4)
+
+    def test_unsolvable_analysis_is_an_uncached_error(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(os.path.join(tmp, "results.sqlite"))
+            with patch("tools.result_cache.get_default_cache", lambda: cache):
+                result = run_power_analysis(test_type="t.test", effect_size=0.0, power=0.8)
+            self.assertEqual(result, "Error: no solution in range for n")
+            self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_tool_uses_python_engine(self):
+        result = run_power_analysis(test_type="t.test", effect_size=0.5, power=0.8, alpha=0.05)
+        self.assertIn("n = 63.76561", result)
+        self.assertIn("Error", run_power_analysis(test_type="anova", effect_size=0.25, power=0.8))
+
+    def test_async_tool(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(os.path.join(tmp, "results.sqlite"))
+            with patch("tools.result_cache.get_default_cache", lambda: cache):
+                result = asyncio.run(run_power_analysis_async(test_type="t.test", effect_size=0.5, power=0.8))
+                self.assertIn("n = 63.76561", result)
+                # Same cache entry as the sync tool
+                self.assertTrue(run_power_analysis(test_type="t.test", effect_size=0.5, power=0.8).endswith(result))
+            # R runs go through the non-blocking R execution path
+            with patch.object(power_analysis_agent, "POWER_ANALYSIS_BACKEND", "r"), \
+                    patch("tools.result_cache.get_default_cache", lambda: None), \
+                    patch("power_analysis_agent.r_package_versions", lambda tool, packages: {}), \
+                    patch.object(power_analysis_agent.r_tool, "execute_script_async",
+                                 AsyncMock(return_value="n = 63.76561")) as mock_run:
+                result = asyncio.run(run_power_analysis_async(test_type="t.test", effect_size=0.5, power=0.8, timeout=5))
+            self.assertEqual(result, "n = 63.76561")
+            self.assertEqual(mock_run.call_args.kwargs["timeout"], 5)
+
+    def test_agent_instruction_lists_every_tool(self):
+        agent = power_analysis_agent.create_power_analysis_agent("gemini-2.0-flash")
+        self.assertIn("four tools", agent.instruction)
+        for number, tool in enumerate(agent.tools, start=1):
+            self.assertIn(f"{number}. `{tool.name}`", agent.instruction)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import asyncio
+import unittest
+from tools.power_search import PowerSearch, run_power_search, run_power_search_async
+
+class TestPowerSearch(unittest.TestCase):
+
+    def test_minimal_n_brackets_target(self):
+        search = PowerSearch("clustered", target_power=0.8, max_sims=1000, cluster_size=10)
+        n = search.search_n(effect_size=0.4)
+        self.assertIsNotNone(n)
+        self.assertGreaterEqual(search.candidates[(n, 0.4)].power, 0.8)
+        self.assertLess(search.candidates[(n - 1, 0.4)].power, 0.8)
+
+    def test_budget_is_spent_near_target(self):
+        search = PowerSearch("poisson", target_power=0.8, max_sims=1000)
+        n = search.search_n(effect_size=1.5)
+        budgets = {key[0]: c.n_sims for key, c in search.candidates.items()}
+        self.assertEqual(budgets[4], 100)
+        self.assertEqual(max(budgets.values()), budgets[n])
+        self.assertLess(search.total_sims, 1000 * len(search.candidates))
+
+    def test_tool_output(self):
+        result = run_power_search("survival", n=150, max_sims=500)
+        self.assertIn("Minimal detectable effect", result)
+        self.assertIn("Total simulations", result)
+        self.assertIn("Error", run_power_search("survival"))
+
+    def test_async_tool_leaves_the_event_loop_free(self):
+        async def scenario():
+            ticks = 0
+            search = asyncio.create_task(run_power_search_async("poisson", effect_size=1.5, max_sims=500))
+            while not search.done():
+                ticks += 1
+                await asyncio.sleep(0)
+            return await search, ticks
+
+        result, ticks = asyncio.run(scenario())
+        self.assertIn("Minimal sample size", result)
+        # Other coroutines kept running while the search was in progress
+        self.assertGreater(ticks, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,38 @@
+import asyncio
+import os
+import tempfile
+import time
 import unittest
 from unittest.mock import MagicMock, patch, AsyncMock
 from google.genai import types
-from main_agent import main
+from main_agent import main, run_steps_concurrently
+from tools.effect_sizes import EffectSizeRegistry
+
+def _async_events(*texts, delay=0.0):
+    async def run_async(**kwargs):
+        for text in texts:
+            await asyncio.sleep(delay)
+            yield types.Part(text=text)
+    return run_async
 
 class TestProposalFlow(unittest.TestCase):
+
+    def setUp(self):
+        # The workflow reads the effect sizes recorded during a run from a throwaway registry
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.registry = EffectSizeRegistry(os.path.join(self.tmp.name, "effect_sizes.sqlite"))
+        patcher = patch("main_agent.get_effect_size_registry", lambda: self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch('builtins.input')
     @patch('builtins.print')
     @patch('main_agent.Runner')
     @patch('main_agent.InMemorySessionService')
     def test_proposal_workflow(self, mock_session_service_cls, mock_runner, mock_print, mock_input):
         # Setup mocks
-        mock_input.side_effect = ["Create a research proposal for a study on caffeine and sleep", "exit"]
+        mock_input.side_effect = ["Create a research proposal for a study on caffeine and sleep", "yes", "exit"]
         
         # Mock session service instance and async create_session
         mock_session_service = mock_session_service_cls.return_value
@@ -20,39 +42,84 @@ class TestProposalFlow(unittest.TestCase):
         mock_power_runner = MagicMock()
         mock_lit_runner = MagicMock()
         mock_proposal_runner = MagicMock()
-        mock_main_runner = MagicMock()
+        mock_criticism_runner = MagicMock()
         
-        # Configure runner.run to return dummy events
-        mock_lit_runner.run.return_value = [types.Part(text="Literature context found.")]
-        mock_power_runner.run.return_value = [types.Part(text="Power analysis calculated.")]
+        # Literature and power run concurrently through run_async; the later steps use run
+        mock_lit_runner.run_async = _async_events("Literature context found.")
+        mock_power_runner.run_async = _async_events("Power analysis calculated.")
         mock_proposal_runner.run.return_value = [types.Part(text="# Research Proposal\n\nTitle: Caffeine and Sleep...")]
+        mock_criticism_runner.run.return_value = [types.Part(text="Looks rigorous.")]
         
-        # Mock Runner constructor to return specific mocks based on agent name
-        # We need to return different runners based on the order of instantiation in main()
-        # Order in main: Power, Literature, Proposal, Main
-        mock_runner.side_effect = [mock_power_runner, mock_lit_runner, mock_proposal_runner, mock_main_runner]
+        # Mock Runner constructor to return specific mocks in the order of instantiation in main():
+        # Power, Literature, Proposal, Biomarker, Criticism, Microbiome, Main
+        mock_runner.side_effect = [mock_power_runner, mock_lit_runner, mock_proposal_runner, MagicMock(),
+                                   mock_criticism_runner, MagicMock(), MagicMock()]
 
         # Run main
-        try:
-            main()
-        except StopIteration:
-            pass
+        main()
 
         # Verify flow
-        # 1. Check if "proposal" keyword triggered the workflow
-        # We can check if the specific print statements for the workflow were called
         print_calls = [str(call) for call in mock_print.mock_calls]
         workflow_started = any("Initiating Research Proposal Generation Workflow" in call for call in print_calls)
         self.assertTrue(workflow_started, "Proposal workflow did not start")
+        self.assertTrue(any("[Timing]" in call for call in print_calls), "Step timings were not reported")
 
-        # 2. Verify Literature Agent was called
-        self.assertTrue(mock_lit_runner.run.called, "Literature agent was not called")
-        
-        # 3. Verify Power Agent was called
-        self.assertTrue(mock_power_runner.run.called, "Power agent was not called")
-        
-        # 4. Verify Proposal Agent was called
+        # The proposal prompt combines both concurrently gathered contexts
         self.assertTrue(mock_proposal_runner.run.called, "Proposal agent was not called")
+        prompt = mock_proposal_runner.run.call_args.kwargs["new_message"].parts[0].text
+        self.assertIn("Literature context found.", prompt)
+        self.assertIn("Power analysis calculated.", prompt)
+        self.assertTrue(mock_criticism_runner.run.called, "Criticism agent was not called")
+        # Proposal and review run in fresh sessions of their own, and token savings are reported
+        self.assertEqual(mock_proposal_runner.run.call_args.kwargs["session_id"], "session_1_proposal_1")
+        self.assertEqual(mock_criticism_runner.run.call_args.kwargs["session_id"], "session_1_criticism_1")
+        self.assertTrue(any("[Context] Tokens handed between steps" in call for call in print_calls))
+
+    @patch('builtins.input')
+    @patch('builtins.print')
+    @patch('main_agent.Runner')
+    @patch('main_agent.InMemorySessionService')
+    def test_power_is_rechecked_after_new_effect_sizes(self, mock_session_service_cls, mock_runner, mock_print, mock_input):
+        mock_input.side_effect = ["Create a research proposal for a study on exercise and depression", "yes", "exit"]
+        mock_session_service_cls.return_value.create_session = AsyncMock()
+        mock_power_runner, mock_lit_runner, mock_proposal_runner = MagicMock(), MagicMock(), MagicMock()
+
+        async def literature_run_async(**kwargs):
+            self.registry.add("exercise depression", "10.1/x", "d", 0.5, ci_lower=0.3, ci_upper=0.7, origin="agent")
+            yield types.Part(text="Recorded d = 0.5.")
+
+        mock_lit_runner.run_async = literature_run_async
+        mock_power_runner.run_async = _async_events("Assumed a medium effect size.")
+        mock_power_runner.run.return_value = [types.Part(text="With the recorded d = 0.5, n = 64 per group.")]
+        mock_proposal_runner.run.return_value = [types.Part(text="# Research Proposal")]
+        mock_runner.side_effect = [mock_power_runner, mock_lit_runner, mock_proposal_runner, MagicMock(),
+                                   MagicMock(), MagicMock(), MagicMock()]
+
+        main()
+
+        recheck = mock_power_runner.run.call_args.kwargs
+        self.assertEqual(recheck["session_id"], "session_1_power")
+        self.assertIn("1 effect sizes were recorded from the literature under these topics: 'exercise depression' (1)",
+                      recheck["new_message"].parts[0].text)
+        prompt = mock_proposal_runner.run.call_args.kwargs["new_message"].parts[0].text
+        self.assertIn("n = 64 per group", prompt)
+        self.assertNotIn("Assumed a medium effect size", prompt)
+
+    def test_steps_run_concurrently_with_partial_results(self):
+        fast, slow = MagicMock(), MagicMock()
+        fast.run_async = _async_events("a", "b", delay=0.2)
+        slow.run_async = _async_events("partial", "never", delay=0.6)
+        start = time.perf_counter()
+        fast_step, slow_step = asyncio.run(run_steps_concurrently(
+            [("fast", fast, "s1", None), ("slow", slow, "s2", None)], user_id="u", timeout=1.0))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(fast_step["text"], "ab")
+        self.assertIsNone(fast_step["error"])
+        self.assertEqual(slow_step["text"], "partial")
+        self.assertIn("timed out", slow_step["error"])
+        # Bounded by the slowest step, not the sum
+        self.assertLess(elapsed, 1.5)
 
 if __name__ == '__main__':
     unittest.main()
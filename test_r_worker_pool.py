@@ -0,0 +1,112 @@
+import asyncio
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from tools.r_execution import RExecutionTool
+from tools import async_exec
+from tools.r_worker_pool import RWorker, RWorkerPool, RWorkerError, RWorkerCancelled, _r_string
+
+# Stands in for worker.R: reads a job and never answers it
+HANGING_WORKER = "import sys, time\nsys.stdin.readline()\nprint('busy', flush=True)\ntime.sleep(60)"
+
+class HangingWorker(RWorker):
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, "-c", HANGING_WORKER], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.jobs_run = 0
+        self.last_used = 0.0
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+
+class TestRWorkerPool(unittest.TestCase):
+
+    def test_r_string_escaping(self):
+        self.assertEqual(_r_string('print("hi")'), '"print(\\"hi\\")"')
+        self.assertEqual(_r_string("a\\b\nc"), '"a\\\\b\\nc"')
+
+    @patch('subprocess.run')
+    def test_falls_back_to_one_shot_when_pool_fails(self, mock_run):
+        mock_run.return_value = MagicMock(stdout="one-shot output", returncode=0)
+        pool = MagicMock()
+        pool.run_script.side_effect = RWorkerError("R worker exited unexpectedly")
+
+        tool = RExecutionTool(working_dir=os.getcwd(), pool=pool)
+        result = tool.execute_script("r_scripts/power_analysis.R", {"test_type": "t.test", "n": None})
+
+        self.assertEqual(result, "one-shot output")
+        args, kwargs = mock_run.call_args
+        self.assertEqual(args[0], ["Rscript", "r_scripts/power_analysis.R", "--test_type", "t.test"])
+
+    def test_pool_error_status_is_reported(self):
+        pool = MagicMock()
+        pool.run_code.return_value = subprocess.CompletedProcess("", 1, stdout="partial", stderr="Error: boom")
+
+        tool = RExecutionTool(working_dir=os.getcwd(), pool=pool)
+        result = tool.execute_code("stop('boom')")
+
+        self.assertIn("Error executing R code", result)
+        self.assertIn("Error: boom", result)
+
+    def test_cancelled_job_kills_its_worker(self):
+        worker = HangingWorker()
+        pool = RWorkerPool(size=1)
+        cancel = threading.Event()
+        with patch.object(pool, "_spawn", return_value=worker):
+            threading.Timer(0.3, cancel.set).start()
+            with self.assertRaises(RWorkerCancelled):
+                pool.run_code("Sys.sleep(60)", cancel=cancel)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(pool._n_workers, 0)
+
+    def test_cancelling_the_caller_frees_the_limiter_after_the_worker(self):
+        worker = HangingWorker()
+        pool = RWorkerPool(size=1)
+        tool = RExecutionTool(working_dir=os.getcwd(), pool=pool)
+        started = threading.Event()
+        call = worker.call
+
+        def call_and_signal(*args, **kwargs):
+            started.set()
+            return call(*args, **kwargs)
+
+        async def scenario():
+            task = asyncio.create_task(tool.execute_code_async("Sys.sleep(60)"))
+            await asyncio.to_thread(started.wait)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The slot is only given back once the worker is gone
+            self.assertFalse(worker.is_alive())
+            return async_exec.get_limiter("r")._value
+
+        with patch.object(pool, "_spawn", return_value=worker), patch.object(worker, "call", call_and_signal):
+            self.assertEqual(asyncio.run(scenario()), max(1, async_exec.CONCURRENCY_LIMITS["r"]))
+
+    @unittest.skipIf(shutil.which("Rscript") is None, "Rscript not installed")
+    def test_warm_worker_reuse(self):
+        pool = RWorkerPool(size=1, max_jobs_per_worker=2)
+        try:
+            tool = RExecutionTool(working_dir=os.getcwd(), pool=pool)
+            self.assertIn('[1] "Hello from R"', tool.execute_code('print("Hello from R")'))
+            output = tool.execute_script(os.path.join("r_scripts", "power_analysis.R"), {
+                "test_type": "t.test",
+                "effect_size": 0.5,
+                "power": 0.8,
+                "alpha": 0.05
+            })
+            self.assertIn("n = 63.76561", output)
+            # The worker survives a script that calls quit(status = 1)
+            output = tool.execute_script(os.path.join("r_scripts", "power_analysis.R"), {"test_type": "anova"})
+            self.assertIn("Error executing R script", output)
+            self.assertEqual(pool.health_check(), 1)
+        finally:
+            pool.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
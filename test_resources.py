@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from tools.resources import (
+    ResourceManager, available_cpus, available_memory_gb, cgroup_cpu_limit, cgroup_memory_limit, thread_args
+)
+
+class TestResources(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.tmp.name, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_cgroup_v2_limits(self):
+        # docker run --cpus 2.5 --memory 8g
+        self._write("cpu.max", "250000 100000\n")
+        self._write("memory.max", str(8 * 1024 ** 3))
+        self.assertEqual(cgroup_cpu_limit(self.tmp.name), 2.5)
+        self.assertEqual(cgroup_memory_limit(self.tmp.name), 8 * 1024 ** 3)
+        with patch("os.sched_getaffinity", return_value=set(range(64))), patch.dict(os.environ, {"MICROBIOME_CPUS": ""}):
+            self.assertEqual(available_cpus(self.tmp.name), 2)
+        with patch.dict(os.environ, {"MICROBIOME_MEMORY_GB": ""}):
+            self.assertLessEqual(available_memory_gb(self.tmp.name), 8)
+
+    def test_cgroup_unlimited_and_v1(self):
+        self._write("cpu.max", "max 100000")
+        self._write("memory.max", "max")
+        self.assertIsNone(cgroup_cpu_limit(self.tmp.name))
+        self.assertIsNone(cgroup_memory_limit(self.tmp.name))
+
+        v1 = os.path.join(self.tmp.name, "v1")
+        self._write("v1/cpu/cpu.cfs_quota_us", "400000")
+        self._write("v1/cpu/cpu.cfs_period_us", "100000")
+        self._write("v1/memory/memory.limit_in_bytes", "9223372036854771712")
+        self.assertEqual(cgroup_cpu_limit(v1), 4)
+        self.assertIsNone(cgroup_memory_limit(v1))
+
+    def test_environment_overrides_detection(self):
+        with patch.dict(os.environ, {"MICROBIOME_CPUS": "12", "MICROBIOME_MEMORY_GB": "48"}):
+            self.assertEqual(available_cpus(self.tmp.name), 12)
+            self.assertEqual(available_memory_gb(self.tmp.name), 48)
+
+    def test_threads_are_shared_between_concurrent_jobs(self):
+        manager = ResourceManager(cpus=64, memory_gb=256)
+        with manager.allocate("humann2") as first:
+            self.assertEqual(first, 64)
+        # With a concurrency limit of 4 every job gets a quarter of the cores
+        with manager.allocate("kneaddata", slots=4) as a, manager.allocate("metaphlan2", slots=4) as b:
+            self.assertEqual((a, b), (16, 16))
+            self.assertEqual(manager.allocated, 32)
+        with manager.allocate("humann2", threads=8) as explicit:
+            self.assertEqual(explicit, 8)
+        self.assertEqual(manager.allocated, 0)
+        # Jobs beyond the core count still get one thread
+        with manager.allocate("humann2"), manager.allocate("humann2") as second, manager.allocate("humann2") as third:
+            self.assertEqual((second, third), (1, 1))
+
+    def test_thread_args(self):
+        self.assertEqual(thread_args("metaphlan2", 8), ["--nproc", "8"])
+        self.assertEqual(thread_args("humann2", 8), ["--threads", "8"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from tools.result_cache import ResultCache, cached_call, normalize_params
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "results.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_equivalent_params_share_a_key(self):
+        a = ResultCache.make_key("power_analysis", {"effect_size": 0.50, "n": 64.0, "type": " two.sample"})
+        b = ResultCache.make_key("power_analysis", {"type": "two.sample", "n": 64, "effect_size": 0.5})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, ResultCache.make_key("power_analysis", {"effect_size": 0.5, "n": 65, "type": "two.sample"}))
+        self.assertEqual(normalize_params({"alpha": 0.05, "seed": None}), {"alpha": "0.05", "seed": None})
+
+    def test_hit_is_flagged_and_skips_compute(self):
+        cache = ResultCache(self.path)
+        calls = []
+        compute = lambda: calls.append(1) or "power = 0.8\n"
+        first = cached_call("power_analysis", {"n": 64}, compute, cache=cache)
+        second = cached_call("power_analysis", {"n": 64}, compute, cache=cache)
+        self.assertEqual(first, "power = 0.8\n")
+        self.assertTrue(second.startswith("[CACHED RESULT from "))
+        self.assertTrue(second.endswith("power = 0.8\n"))
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_not_cached(self):
+        cache = ResultCache(self.path)
+        cached_call("simulation_power", {"n": 1}, lambda: "GENERATED_SCRIPT: x.R\n\nError: bad design", cache=cache)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_ttl_expiry(self):
+        cache = ResultCache(self.path, ttl=10)
+        cache.put("k", "value")
+        self.assertIsNotNone(cache.get("k"))
+        with patch("tools.result_cache.time.time", return_value=time.time() + 11):
+            self.assertIsNone(cache.get("k"))
+
+    def test_lru_eviction_by_size(self):
+        cache = ResultCache(self.path, max_bytes=25)
+        cache.put("a", "x" * 10)
+        cache.put("b", "x" * 10)
+        cache.get("a")
+        cache.put("c", "x" * 10)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+if __name__ == '__main__':
+    unittest.main()
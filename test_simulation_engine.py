@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+from tools.simulation_engine import simulate_power, simulate_tests, DESIGNS
+
+class TestSimulationEngine(unittest.TestCase):
+
+    def test_type_one_error_is_controlled(self):
+        null_effects = {"mixed_effects": 0.0, "clustered": 0.0, "poisson": 1.0, "survival": 1.0}
+        for design in DESIGNS:
+            result = simulate_power(design, null_effects[design], n=40, n_sims=2000, cluster_size=5)
+            self.assertEqual(result["n_successful"], 2000)
+            self.assertLess(abs(result["power"] - 0.05), 0.02, design)
+
+    def test_power_increases_with_effect(self):
+        weak = simulate_power("survival", 0.8, n=100, n_sims=500)["power"]
+        strong = simulate_power("survival", 0.5, n=100, n_sims=500)["power"]
+        self.assertGreater(strong, weak)
+
+    def test_replicates_do_not_depend_on_run_length(self):
+        _, short, _ = simulate_tests("poisson", 1.3, n=30, start=0, count=50)
+        _, offset, _ = simulate_tests("poisson", 1.3, n=30, start=20, count=200)
+        np.testing.assert_allclose(short[20:], offset[:30])
+
+    def test_precision_target_stops_early(self):
+        result = simulate_power("poisson", 2.0, n=60, n_sims=5000, precision=0.01)
+        self.assertLess(result["n_used"], 5000)
+        self.assertLessEqual((result["ci"][1] - result["ci"][0]) / 2, 0.01)
+
+        capped = simulate_power("poisson", 1.2, n=60, n_sims=300, precision=0.001, ci_method="clopper_pearson")
+        self.assertEqual(capped["n_used"], 300)
+
+    def test_unknown_design(self):
+        with self.assertRaises(ValueError):
+            simulate_power("crossover", 0.5, n=20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,26 @@
+import asyncio
 import os
 import sys
-from tools.simulation_tool import run_simulation_power_analysis
+import tempfile
+import time
+from unittest.mock import AsyncMock, patch
+from tools.result_cache import ResultCache
+from tools.simulation_tool import (SimulationPowerTool, collect_generated_scripts, run_simulation_power_analysis,
+                                   run_simulation_power_analysis_async)
+
+_tmp = _cache_patch = None
+
+def setup_module():
+    # Results are cached in a throwaway store, not the repository's .cache
+    global _tmp, _cache_patch
+    _tmp = tempfile.TemporaryDirectory()
+    cache = ResultCache(os.path.join(_tmp.name, "results.sqlite"))
+    _cache_patch = patch("tools.result_cache.get_default_cache", lambda: cache)
+    _cache_patch.start()
+
+def teardown_module():
+    _cache_patch.stop()
+    _tmp.cleanup()
 
 def test_simulation_tool():
     """
@@ -54,5 +74,60 @@ def test_simulation_tool():
     except Exception as e:
         print(f"FAIL: Error running clustered simulation: {e}")
 
+def test_identical_parameters_reuse_script():
+    tool = SimulationPowerTool(working_dir=os.getcwd())
+    first = tool.write_script("poisson", 1.5, 40, n_sims=200, seed=7)
+    second = tool.write_script("poisson", 1.5, 40, n_sims=200, seed=7)
+    other = tool.write_script("poisson", 1.5, 41, n_sims=200, seed=7)
+    try:
+        assert first == second
+        assert first != other
+        with open(first) as f:
+            content = f.read()
+        assert "argv$n <- 40" in content
+        assert "parse_args" not in content
+    finally:
+        for path in {first, other}:
+            os.remove(path)
+
+def test_retention_policy():
+    with tempfile.TemporaryDirectory() as gen_dir:
+        now = time.time()
+        for i, age_days in enumerate([40, 3, 2, 1]):
+            path = os.path.join(gen_dir, f"simulation_x_{i}.R")
+            with open(path, "w") as f:
+                f.write("x" * 100)
+            os.utime(path, (now - age_days * 86400, now - age_days * 86400))
+        # The 40-day-old file is past the age limit, then the oldest go until 200 bytes remain
+        removed = collect_generated_scripts(gen_dir, max_bytes=200, max_age=30 * 86400)
+        assert removed == 2
+        assert sorted(os.listdir(gen_dir)) == ["simulation_x_2.R", "simulation_x_3.R"]
+
+def test_async_tool_shares_results_with_the_sync_tool():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(os.path.join(tmp, "results.sqlite"))
+        args = dict(design="poisson", effect_size=1.5, n=40, n_sims=20)
+        with patch("tools.result_cache.get_default_cache", lambda: cache):
+            result = asyncio.run(run_simulation_power_analysis_async(**args))
+            assert "Estimated Power" in result
+            assert run_simulation_power_analysis(**args).endswith(result)
+        assert asyncio.run(run_simulation_power_analysis_async(design="poisson", effect_size=1.5)).startswith("Error")
+
+def test_async_r_backend_does_not_block():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(os.path.join(tmp, "results.sqlite"))
+        with patch("tools.result_cache.get_default_cache", lambda: cache), \
+                patch("tools.simulation_tool.SIMULATION_BACKEND", "r"), \
+                patch("tools.simulation_tool.r_package_versions", lambda tool, packages: {}), \
+                patch("tools.r_execution.RExecutionTool.execute_script") as blocking, \
+                patch("tools.r_execution.RExecutionTool.execute_script_async",
+                      AsyncMock(return_value="Estimated Power: 0.81")) as mock_run:
+            result = asyncio.run(run_simulation_power_analysis_async(
+                design="survival", effect_size=0.7, n=60, n_sims=10, timeout=30))
+        assert result.endswith("Estimated Power: 0.81")
+        assert "GENERATED_SCRIPT: " in result
+        blocking.assert_not_called()
+        assert mock_run.call_args.kwargs["timeout"] == 30
+
 if __name__ == "__main__":
     test_simulation_tool()
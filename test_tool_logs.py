@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from tools.tool_logs import ToolLog, parse_progress, stream_command
+
+# A chatty tool that reports progress, logs many lines and then fails
+CHATTY_TOOL = """
+import sys
+print("Initial number of reads ( input.fastq ): 1,500", flush=True)
+print("Decontaminating ...", flush=True)
+for i in range(500):
+    print("detail", i)
+sys.exit("bowtie2 index missing")
+"""
+
+class TestToolLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_parse_progress(self):
+        self.assertEqual(parse_progress("Running diamond ........"), {"step": "Running diamond"})
+        self.assertEqual(parse_progress("Total reads after trimming ( s1.fastq ): 12,345"),
+                         {"reads": 12345, "label": "Total reads after trimming"})
+        self.assertIsNone(parse_progress("Unaligned reads after nucleotide alignment: 45.1 %"))
+        self.assertIsNone(parse_progress("some other line"))
+
+    def test_stream_command_logs_every_line_and_keeps_tail(self):
+        events = []
+        log_path = os.path.join(self.tmp.name, "logs", "kneaddata_s1.log")
+        with ToolLog("kneaddata s1", log_path, on_progress=events.append, tail_lines=5) as log:
+            with self.assertRaises(subprocess.CalledProcessError) as ctx:
+                stream_command([sys.executable, "-c", CHATTY_TOOL], log)
+
+        # Progress arrives as parsed events; only the tail is kept in memory
+        self.assertEqual([e.get("reads") or e.get("step") for e in events], [1500, "Decontaminating"])
+        self.assertEqual(ctx.exception.stderr.splitlines()[-1], "bowtie2 index missing")
+        self.assertEqual(len(ctx.exception.stderr.splitlines()), 5)
+        self.assertIn("last step: Decontaminating", log.summary())
+        with open(log_path) as f:
+            self.assertEqual(len(f.readlines()), 503)
+
+    def test_log_rotates(self):
+        log_path = os.path.join(self.tmp.name, "humann2.log")
+        with patch("tools.tool_logs.TOOL_LOG_MAX_BYTES", 1000), patch("tools.tool_logs.TOOL_LOG_BACKUPS", 2):
+            log = ToolLog("humann2 s1", log_path, on_progress=None)
+        with log:
+            for i in range(200):
+                log(f"line {i}")
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["humann2.log", "humann2.log.1", "humann2.log.2"])
+        self.assertLessEqual(os.path.getsize(log_path), 1000)
+
+if __name__ == '__main__':
+    unittest.main()
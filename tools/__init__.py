@@ -1 +1,2 @@
 from .r_execution import RExecutionTool
+from .r_worker_pool import RWorkerPool
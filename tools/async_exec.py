@@ -0,0 +1,109 @@
+"""
+Non-blocking subprocess execution for long-running tools (R, kneaddata, MetaPhlAn2, HUMAnN2).
+
+Commands run with asyncio.create_subprocess_exec, so a 20-minute HUMAnN2 job does not
+freeze the event loop that ADK runners and other sessions share. Output is streamed
+line by line, jobs can be cancelled or given a timeout (the process is killed in both
+cases), and the number of concurrent jobs of each kind is capped by a semaphore. With
+`max_lines`, only the tail of each stream is kept, so memory stays bounded for chatty tools.
+"""
+import asyncio
+import collections
+import os
+import subprocess
+import weakref
+from typing import Callable, Deque, IO, List, Optional
+
+# Maximum number of concurrently running jobs per kind
+CONCURRENCY_LIMITS = {
+    "r": int(os.environ.get("ASYNC_R_CONCURRENCY", "2")),
+    "microbiome": int(os.environ.get("ASYNC_MICROBIOME_CONCURRENCY", "2")),
+}
+
+# Semaphores are bound to an event loop, so keep one set per loop
+_limiters = weakref.WeakKeyDictionary()
+
+
+def get_limiter(kind: str) -> asyncio.Semaphore:
+    """Returns the semaphore limiting concurrent `kind` jobs on the running event loop."""
+    limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    if kind not in limiters:
+        limiters[kind] = asyncio.Semaphore(max(1, CONCURRENCY_LIMITS.get(kind, 1)))
+    return limiters[kind]
+
+
+async def _read_lines(stream: asyncio.StreamReader, lines: Deque[str], on_line: Optional[Callable[[str], None]]):
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        text = line.decode("utf-8", errors="replace")
+        lines.append(text)
+        if on_line is not None:
+            on_line(text.rstrip("\n"))
+
+
+async def run_command_async(
+    command: List[str],
+    cwd: Optional[str] = None,
+    timeout: Optional[float] = None,
+    stdout_file: Optional[IO] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    kind: Optional[str] = None,
+    check: bool = True,
+    on_stderr_line: Optional[Callable[[str], None]] = None,
+    max_lines: Optional[int] = None
+) -> subprocess.CompletedProcess:
+    """
+    Runs a command without blocking the event loop.
+
+    Args:
+        command: Executable and arguments.
+        cwd: Working directory.
+        timeout: Seconds before the process is killed and asyncio.TimeoutError is raised.
+        stdout_file: Open file to write stdout to instead of capturing it.
+        on_line: Called with each stdout line as it arrives.
+        kind: Concurrency class ("r", "microbiome"); the job waits for a free slot first.
+        check: Raise CalledProcessError on a non-zero exit status, like subprocess.run(check=True).
+        on_stderr_line: Called with each stderr line as it arrives.
+        max_lines: Keep only the last `max_lines` lines of each stream in the result (default: all).
+
+    Returns:
+        A CompletedProcess with the captured (or, with max_lines, the last lines of) stdout and stderr.
+        Raises FileNotFoundError if the executable does not exist. If the calling task is
+        cancelled, or anything else raises (e.g. an on_line callback), the process is killed
+        before the exception propagates.
+    """
+    if kind is not None:
+        async with get_limiter(kind):
+            return await run_command_async(command, cwd, timeout, stdout_file, on_line, None, check,
+                                           on_stderr_line, max_lines)
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        cwd=cwd,
+        stdout=stdout_file if stdout_file is not None else asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout_lines = collections.deque(maxlen=max_lines)
+    stderr_lines = collections.deque(maxlen=max_lines)
+    readers = [_read_lines(process.stderr, stderr_lines, on_stderr_line)]
+    if stdout_file is None:
+        readers.append(_read_lines(process.stdout, stdout_lines, on_line))
+
+    async def communicate():
+        await asyncio.gather(*readers)
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(communicate(), timeout)
+    finally:
+        # Timeout, cancellation or a failing callback: never leave the process running
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    result = subprocess.CompletedProcess(command, returncode, "".join(stdout_lines), "".join(stderr_lines))
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command, output=result.stdout, stderr=result.stderr)
+    return result
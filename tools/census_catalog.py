@@ -0,0 +1,288 @@
+"""
+Local, memory-mapped snapshot of the CZ Cell x Gene Census dataset catalog.
+
+Searching the census used to open the SOMA census and load `census_info/datasets` into
+pandas on every query. Instead, the catalog (dataset id, title, collection, plus the
+tissues, diseases and assays of each dataset's cells) is snapshotted to an Arrow IPC file,
+memory-mapped on load and indexed in memory with an inverted index, so searches are
+ranked dictionary lookups that never touch the network. The census is only opened to
+(re)build the snapshot, which happens on first use and, once the snapshot is older than
+CELLXGENE_CATALOG_MAX_AGE_DAYS, in the background while the old snapshot keeps serving.
+The first build reads the dataset table only (titles and collections) under a lock shared
+by concurrent first searches; the tissue/disease/assay terms, which take a scan of every
+cell's metadata, are added by a background refresh.
+The census handle is opened once per census version and kept in the client registry
+(tools/clients.py) until it is closed there.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+
+from tools.clients import ClientRegistry, get_client_registry
+
+try:
+    import cellxgene_census
+except ImportError:
+    cellxgene_census = None
+
+CATALOG_DIR = os.environ.get("CELLXGENE_CATALOG_DIR", os.path.join(".cache", "cellxgene"))
+CATALOG_MAX_AGE = float(os.environ.get("CELLXGENE_CATALOG_MAX_AGE_DAYS", "7")) * 24 * 3600
+CENSUS_VERSION = os.environ.get("CELLXGENE_CENSUS_VERSION", "stable")
+# Whether snapshots include per-dataset tissue/disease/assay terms (requires scanning cell metadata)
+CATALOG_OBS_TERMS = os.environ.get("CELLXGENE_CATALOG_OBS_TERMS", "1") == "1"
+
+COLUMNS = ("dataset_id", "dataset_title", "collection_name", "tissue", "disease", "assay", "cell_count")
+
+# How much a query term found in each field counts towards a dataset's score
+FIELD_WEIGHTS = {"dataset_title": 3.0, "collection_name": 2.0, "tissue": 1.5, "disease": 1.5, "assay": 1.0}
+
+# Cell metadata columns scanned for the tissue, disease and assay terms
+_OBS_TERMS = {"tissue": "tissue_general", "disease": "disease", "assay": "assay"}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def census_client(census_version: str = CENSUS_VERSION, registry: Optional[ClientRegistry] = None):
+    """Lends the shared handle of a census version, opening it on first use."""
+    registry = registry or get_client_registry()
+    return registry.register(f"census:{census_version}",
+                             lambda: cellxgene_census.open_soma(census_version=census_version),
+                             shared=True).acquire()
+
+
+def fetch_catalog(census_version: str = CENSUS_VERSION, obs_terms: bool = CATALOG_OBS_TERMS,
+                  registry: Optional[ClientRegistry] = None) -> pa.Table:
+    """
+    Reads the dataset catalog from the census (through the shared census handle).
+
+    Returns:
+        An Arrow table with COLUMNS; tissue, disease and assay are "; "-joined term lists
+        (empty when `obs_terms` is off).
+    """
+    if cellxgene_census is None:
+        raise RuntimeError("cellxgene_census is not installed")
+    terms = defaultdict(lambda: defaultdict(set))
+    with census_client(census_version, registry) as census:
+        datasets = census["census_info"]["datasets"].read().concat().to_pandas()
+        if obs_terms:
+            for organism in census["census_data"].keys():
+                obs = census["census_data"][organism].obs
+                # Deduplicate chunk by chunk so memory stays bounded by the number of distinct terms
+                for chunk in obs.read(column_names=["dataset_id"] + list(_OBS_TERMS.values())):
+                    unique = chunk.to_pandas().drop_duplicates()
+                    for field, column in _OBS_TERMS.items():
+                        for dataset_id, term in zip(unique["dataset_id"], unique[column]):
+                            terms[dataset_id][field].add(str(term))
+    columns = {name: [] for name in COLUMNS}
+    cell_counts = datasets["dataset_total_cell_count"] if "dataset_total_cell_count" in datasets else [0] * len(datasets)
+    for dataset_id, title, collection, cells in zip(datasets["dataset_id"], datasets["dataset_title"],
+                                                    datasets["collection_name"], cell_counts):
+        columns["dataset_id"].append(str(dataset_id))
+        columns["dataset_title"].append(str(title))
+        columns["collection_name"].append(str(collection))
+        for field in _OBS_TERMS:
+            columns[field].append("; ".join(sorted(terms[dataset_id][field])))
+        columns["cell_count"].append(int(cells))
+    return pa.table(columns)
+
+
+class CensusCatalog:
+    """
+    Snapshot of the census dataset catalog with a ranked full-text search.
+
+    Args:
+        directory: Where `datasets.arrow` and its `catalog.json` metadata are kept.
+        max_age: Seconds after which the snapshot is refreshed in the background.
+        fetch: Returns a fresh catalog table (default: fetch_catalog, which opens the census).
+        quick_fetch: Returns a cheaper, incomplete table for the first build, completed by a
+                     background refresh with `fetch` (default: fetch_catalog without the cell
+                     metadata terms, when they are configured; None builds with `fetch`).
+    """
+    def __init__(self, directory: str = CATALOG_DIR, max_age: float = CATALOG_MAX_AGE,
+                 fetch: Callable[[], pa.Table] = fetch_catalog,
+                 quick_fetch: Optional[Callable[[], pa.Table]] = None):
+        self.directory = directory
+        self.path = os.path.join(directory, "datasets.arrow")
+        self.meta_path = os.path.join(directory, "catalog.json")
+        self.max_age = max_age
+        self.fetch = fetch
+        if quick_fetch is None and fetch is fetch_catalog and CATALOG_OBS_TERMS:
+            quick_fetch = lambda: fetch_catalog(obs_terms=False)
+        self.quick_fetch = quick_fetch
+        self._lock = threading.Lock()
+        # Serializes the synchronous first build, so concurrent first searches build once
+        self._build_lock = threading.Lock()
+        self._complete = True
+        self._loaded_mtime = None
+        self._table = None
+        self._postings = {}
+        self._refresh_thread = None
+        self._last_attempt = 0.0
+        self._built_at = 0.0
+
+    def refresh(self, quick: bool = False):
+        """Fetches the catalog (with quick_fetch if `quick`) and atomically replaces the snapshot."""
+        quick = quick and self.quick_fetch is not None
+        table = (self.quick_fetch if quick else self.fetch)()
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(f"{self.path}.{suffix}", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(f"{self.path}.{suffix}", self.path)
+        with open(f"{self.meta_path}.{suffix}", "w") as f:
+            json.dump({"built_at": time.time(), "census_version": CENSUS_VERSION, "datasets": table.num_rows,
+                       "complete": not quick}, f)
+        os.replace(f"{self.meta_path}.{suffix}", self.meta_path)
+
+    def metadata(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_stale(self) -> bool:
+        return time.time() - self._built_at > self.max_age
+
+    def refresh_in_background(self) -> bool:
+        """
+        Starts a background refresh unless one is already running or one was started in
+        the last hour (so an unreachable census is not retried on every search).
+        """
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return False
+            if time.time() - self._last_attempt < min(self.max_age, 3600):
+                return False
+            self._last_attempt = time.time()
+            self._refresh_thread = threading.Thread(target=self._refresh_quietly, daemon=True)
+            self._refresh_thread.start()
+            return True
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[System] Cell x Gene catalog refresh failed, keeping the old snapshot: {e}", flush=True)
+
+    def wait_for_refresh(self, timeout: Optional[float] = None):
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _load(self):
+        """Memory-maps the snapshot (building it first if there is none) and indexes it."""
+        if not os.path.exists(self.path):
+            with self._build_lock:
+                if not os.path.exists(self.path):
+                    self.refresh(quick=True)
+        mtime = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            # Zero-copy: the table's buffers point into the mapped file
+            table = pa.ipc.open_file(pa.memory_map(self.path, "r")).read_all()
+            weights = defaultdict(dict)
+            fields = {name: table.column(name).to_pylist() for name in FIELD_WEIGHTS}
+            for row in range(table.num_rows):
+                for name, weight in FIELD_WEIGHTS.items():
+                    for token in tokenize(fields[name][row] or ""):
+                        weights[token][row] = weights[token].get(row, 0.0) + weight
+            # Each posting holds the term's BM25-style contribution: rarer terms (idf) and more
+            # heavily weighted fields count more, with diminishing returns for repeats
+            total = max(1, table.num_rows)
+            postings = {}
+            for token, rows in weights.items():
+                idf = math.log(1 + total / len(rows))
+                field_weights = np.fromiter(rows.values(), dtype=np.float64, count=len(rows))
+                postings[token] = (np.fromiter(rows.keys(), dtype=np.int64, count=len(rows)),
+                                   idf * field_weights * 2.2 / (field_weights + 1.2))
+            self._table, self._postings, self._loaded_mtime = table, postings, mtime
+            metadata = self.metadata()
+            self._built_at = metadata.get("built_at", 0.0)
+            self._complete = metadata.get("complete", True)
+
+    @staticmethod
+    def _matches(postings: Dict[str, Any], token: str) -> List[str]:
+        """Index terms for a query token: the token itself, else (for 3+ characters) terms it prefixes."""
+        if token in postings:
+            return [token]
+        if len(token) < 3:
+            return []
+        return [term for term in postings if term.startswith(token)]
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Ranked search over title, collection, tissue, disease and assay.
+
+        Datasets are scored BM25-style (rarer terms and title/collection matches count more)
+        and scaled by the fraction of query terms they match, so datasets matching every
+        term come first.
+
+        Returns:
+            Up to `limit` catalog rows, best first, each with a "score".
+        """
+        self._load()
+        if self.is_stale() or not self._complete:
+            self.refresh_in_background()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            table, postings = self._table, self._postings
+        scores = np.zeros(table.num_rows)
+        matched = np.zeros(table.num_rows)
+        for token in tokens:
+            terms = self._matches(postings, token)
+            if len(terms) == 1:
+                rows, term_scores = postings[terms[0]]
+            elif terms:
+                # A prefix matching several terms counts once per dataset, at its best term
+                best = np.zeros(table.num_rows)
+                for term in terms:
+                    term_rows, term_scores = postings[term]
+                    best[term_rows] = np.maximum(best[term_rows], term_scores)
+                rows = np.flatnonzero(best)
+                term_scores = best[rows]
+            else:
+                continue
+            scores[rows] += term_scores
+            matched[rows] += 1
+        scores *= matched / len(tokens)
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Best first; ties keep catalog order
+        ranked = [(scores[row], int(row)) for row in candidates[np.lexsort((candidates, -scores[candidates]))]]
+        results = []
+        for score, row in ranked:
+            record = table.slice(row, 1).to_pylist()[0]
+            record["score"] = round(float(score), 3)
+            results.append(record)
+        return results
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_census_catalog() -> CensusCatalog:
+    """Returns the process-wide catalog snapshot (configured by the CELLXGENE_CATALOG_* variables)."""
+    global _default_catalog
+    with _default_catalog_lock:
+        if _default_catalog is None:
+            _default_catalog = CensusCatalog()
+        return _default_catalog
@@ -0,0 +1,229 @@
+"""
+Shared, lazily created clients for the remote data repositories.
+
+The biomarker tools used to build a client per call: a new connection (and TLS handshake)
+for every E-utilities request and a census handle that was opened and never closed. The
+registry creates each client on first use and hands the same ones out afterwards:
+
+- shared clients (the keep-alive HTTP session, the census handle) are used by all threads
+  at once;
+- pooled clients (for libraries whose clients are not thread-safe) are lent to one thread
+  at a time, up to the pool size.
+
+Clients stay open until `close` / `close_all` (also run at interpreter exit); the next
+use after that opens new ones. `stats()` reports how often clients, and the HTTP
+session's connections, were reused.
+"""
+import atexit
+import contextlib
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+except ImportError:
+    requests = None
+
+# Connections kept alive per host by the shared HTTP session
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+# Retries (with backoff) of connection errors and 429/5xx responses
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "30"))
+
+
+def http_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES) -> "requests.Session":
+    """A requests session that keeps up to `pool_size` connections per host alive."""
+    if requests is None:
+        raise RuntimeError("requests is not installed")
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session_connection_stats(session: "requests.Session") -> Dict[str, int]:
+    """Connections opened and requests sent over the session's connection pools."""
+    stats = {"connections": 0, "requests": 0}
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                stats["connections"] += pool.num_connections
+                stats["requests"] += pool.num_requests
+    return stats
+
+
+class ClientPool:
+    """
+    Lazily created clients of one kind.
+
+    Args:
+        name: Name in the registry, for reporting.
+        factory: Creates a client.
+        close: Closes a client (default: its `close()` method, if any).
+        max_size: Pooled clients: most clients lent out at once; further callers wait.
+        shared: Hand one client to all callers at once instead of lending them out.
+        inspect: Returns numeric counters for a live client, summed into `stats()`.
+    """
+    def __init__(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]] = None,
+                 max_size: int = 1, shared: bool = False,
+                 inspect: Optional[Callable[[Any], Dict[str, int]]] = None):
+        self.name = name
+        self.factory = factory
+        self._close_client = close or (lambda client: getattr(client, "close", lambda: None)())
+        self.max_size = max(1, max_size)
+        self.shared = shared
+        self.inspect = inspect
+        self._cond = threading.Condition()
+        self._clients = []
+        self._idle = []
+        self._users = {}
+        self._retiring = {}
+        self.counters = {"created": 0, "acquired": 0, "waits": 0, "closed": 0}
+
+    def _checkout(self) -> Any:
+        with self._cond:
+            self.counters["acquired"] += 1
+            if self.shared:
+                if not self._clients:
+                    self._clients.append(self._create())
+                client = self._clients[0]
+            else:
+                if not self._idle and len(self._clients) >= self.max_size:
+                    self.counters["waits"] += 1
+                    while not self._idle and len(self._clients) >= self.max_size:
+                        self._cond.wait()
+                if self._idle:
+                    client = self._idle.pop()
+                else:
+                    client = self._create()
+                    self._clients.append(client)
+            self._users[id(client)] = self._users.get(id(client), 0) + 1
+            return client
+
+    def _checkin(self, client: Any):
+        with self._cond:
+            self._users[id(client)] -= 1
+            if self._users[id(client)] == 0:
+                del self._users[id(client)]
+                if id(client) in self._retiring:
+                    del self._retiring[id(client)]
+                    self._close_quietly(client)
+                elif not self.shared:
+                    self._idle.append(client)
+            self._cond.notify()
+
+    def _create(self) -> Any:
+        client = self.factory()
+        self.counters["created"] += 1
+        return client
+
+    def _close_quietly(self, client: Any):
+        self.counters["closed"] += 1
+        try:
+            self._close_client(client)
+        except Exception as e:
+            print(f"[System] Closing {self.name} client failed: {e}", flush=True)
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Lends a client (creating it on first use) for the duration of the block."""
+        client = self._checkout()
+        try:
+            yield client
+        finally:
+            self._checkin(client)
+
+    def close(self):
+        """Closes idle clients now and clients in use as soon as they are handed back."""
+        with self._cond:
+            for client in self._clients:
+                if id(client) in self._users:
+                    self._retiring[id(client)] = client
+                else:
+                    self._close_quietly(client)
+            self._clients, self._idle = [], []
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self.counters)
+            stats["open"] = len(self._clients) + len(self._retiring)
+            stats["in_use"] = sum(self._users.values())
+            live = self._clients + list(self._retiring.values())
+        stats["reused"] = stats["acquired"] - stats["created"]
+        stats["reuse_rate"] = stats["reused"] / stats["acquired"] if stats["acquired"] else 0.0
+        if self.inspect is not None:
+            for client in live:
+                for key, value in self.inspect(client).items():
+                    stats[key] = stats.get(key, 0) + value
+            if "connections" in stats and "requests" in stats:
+                reused = max(0, stats["requests"] - stats["connections"])
+                stats["connection_reuse_rate"] = reused / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+class ClientRegistry:
+    """Named client pools, registered by the modules that use them."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def register(self, name: str, factory: Callable[[], Any], **options) -> ClientPool:
+        """
+        Registers a client pool (see ClientPool for the options) unless one with that name
+        exists, and returns the pool.
+        """
+        with self._lock:
+            if name not in self._pools:
+                self._pools[name] = ClientPool(name, factory, **options)
+            return self._pools[name]
+
+    def acquire(self, name: str):
+        with self._lock:
+            pool = self._pools.get(name)
+        if pool is None:
+            raise KeyError(f"No client registered as {name!r}")
+        return pool.acquire()
+
+    def http(self):
+        """Lends the shared keep-alive HTTP session."""
+        return self.register("http", http_session, shared=True, inspect=session_connection_stats).acquire()
+
+    def close(self, name: str):
+        with self._lock:
+            pool = self._pools.get(name)
+        if pool is not None:
+            pool.close()
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {name: pool.stats() for name, pool in pools.items()}
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    """Returns the process-wide client registry; its clients are closed at exit."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ClientRegistry()
+            atexit.register(_default_registry.close_all)
+        return _default_registry
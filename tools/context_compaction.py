@@ -0,0 +1,185 @@
+"""
+Token-budgeted compaction of specialist output passed between orchestration steps.
+
+The proposal workflow hands the literature findings and power analysis to the proposal
+agent, and the proposal to the reviewer. Pasted verbatim, a long literature dump inflates
+every later prompt. Each hand-off is therefore compacted to a per-step token budget:
+text within budget passes unchanged; longer text keeps its key facts (papers with their
+identifiers, effect sizes, sample sizes, power and design parameters) in their original
+order, fills the rest of the budget with the leading prose (cutting the first line that
+does not fit at a sentence boundary) and notes what was omitted.
+
+Token counts are estimated at CONTEXT_CHARS_PER_TOKEN characters per token (about 4 for
+Gemini models on English text), which avoids a tokenizer round-trip per step.
+"""
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, List
+from tools.effect_sizes import extract_effect_sizes
+
+CONTEXT_CHARS_PER_TOKEN = float(os.environ.get("CONTEXT_CHARS_PER_TOKEN", "4"))
+
+# Default token budget per hand-off; CONTEXT_BUDGET_<STEP> overrides it
+DEFAULT_BUDGETS = {"literature": 1500, "power": 800, "proposal": 3000}
+
+_FACT_PATTERNS = {
+    "power": re.compile(
+        r"^\s*(?:n|d|r|h|f|power|sig\.level|alpha|effect[ _]size)\s*[=:]|estimated power|sample size|per group"
+        r"|GENERATED_SCRIPT|\bpower\b.*\d|\bn\s*=\s*\d", re.IGNORECASE),
+    "effect_sizes": re.compile(r"effect size|cohen|hedges|odds ratio|hazard ratio|risk ratio|\b(?:OR|HR|RR)\b"),
+    "papers": re.compile(r"10\.\d{4,9}/\S+|\bPMID:?\s*\d+|arXiv:?\s*\d{4}\.\d{4,5}|et al\.|\(\d{4}\)", re.IGNORECASE),
+}
+_MAX_FACT_CHARS = 400
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)")
+
+
+def count_tokens(text: str) -> int:
+    """Estimated number of tokens in `text`."""
+    return math.ceil(len(text or "") / CONTEXT_CHARS_PER_TOKEN)
+
+
+def fact_kind(line: str) -> str:
+    """The kind of key fact a line states ("power", "effect_sizes", "papers"), or "" for prose."""
+    for kind, pattern in _FACT_PATTERNS.items():
+        if pattern.search(line) or (kind == "effect_sizes" and extract_effect_sizes(line)):
+            return kind
+    return ""
+
+
+def key_facts(text: str) -> Dict[str, List[str]]:
+    """The lines of `text` stating papers, effect sizes or sample size/power facts, by kind."""
+    facts = {kind: [] for kind in _FACT_PATTERNS}
+    for line in (text or "").splitlines():
+        kind = fact_kind(line)
+        if kind and line.strip() not in facts[kind]:
+            facts[kind].append(line.strip())
+    return facts
+
+
+def shorten(line: str, budget: int) -> str:
+    """
+    The start of `line` within `budget` estimated tokens, cut after its last whole sentence
+    (or its last whole word, marked "..."); "" if not even a word fits.
+    """
+    limit = int(budget * CONTEXT_CHARS_PER_TOKEN)
+    if len(line) <= limit:
+        return line
+    ends = [match.end() for match in _SENTENCE_END.finditer(line, 0, limit + 1)]
+    if ends:
+        return line[:ends[-1]]
+    cut = line[:max(limit - 3, 0)].rsplit(None, 1)[0] if " " in line[:max(limit - 3, 0)] else ""
+    return cut + "..." if cut else ""
+
+
+def compact(text: str, budget: int) -> Dict[str, Any]:
+    """
+    Compacts `text` to at most `budget` estimated tokens.
+
+    Key-fact lines are kept first (sample size/power, then effect sizes, then papers),
+    then other lines from the top; the first of those that does not fit is shortened to
+    the remaining budget. Kept lines stay in their original order.
+
+    Returns:
+        A dict with the compacted "text", "tokens_before", "tokens_after" and the "facts"
+        found (see key_facts()).
+    """
+    text = text or ""
+    tokens_before = count_tokens(text)
+    facts = key_facts(text)
+    if tokens_before <= budget:
+        return {"text": text, "tokens_before": tokens_before, "tokens_after": tokens_before, "facts": facts}
+
+    lines = [line.rstrip() for line in text.splitlines()]
+    note = f"[Compacted from ~{tokens_before} tokens to the key facts; {{}}{{}} lines omitted]"
+    remaining = budget - count_tokens(note.format("1 line shortened, ", len(lines)))
+    priority = {"power": 0, "effect_sizes": 1, "papers": 2, "": 3}
+    order = sorted((i for i, line in enumerate(lines) if line.strip()),
+                   key=lambda i: (priority[fact_kind(lines[i])], i))
+    kept = set()
+    cut = None
+    for i in order:
+        line = lines[i].strip()
+        kind = fact_kind(line)
+        if len(line) > _MAX_FACT_CHARS and kind:
+            lines[i] = line = line[:_MAX_FACT_CHARS] + "..."
+        cost = count_tokens(line + "\n")
+        if cost > remaining and not kind and cut is None:
+            # Prose is cut rather than dropped, so a reply of a few long paragraphs keeps its start
+            cut = i
+            short = shorten(line, remaining - 1)
+            if short:
+                lines[i] = line = short
+                cost = count_tokens(line + "\n")
+        if cost <= remaining:
+            kept.add(i)
+            remaining -= cost
+    omitted = sum(1 for i, line in enumerate(lines) if line.strip() and i not in kept)
+    shortened = "1 line shortened, " if cut in kept else ""
+    compacted = "\n".join([lines[i].strip() for i in sorted(kept)] + [note.format(shortened, omitted)])
+    return {"text": compacted, "tokens_before": tokens_before, "tokens_after": count_tokens(compacted),
+            "facts": facts}
+
+
+class ContextCompactor:
+    """
+    Compacts hand-offs between orchestration steps to per-step token budgets and keeps
+    metrics of the tokens saved and the key facts (see key_facts()) handed on per step.
+
+    Args:
+        budgets: Token budget per step name; steps without one are passed through unchanged.
+    """
+    def __init__(self, budgets: Dict[str, int] = None):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self._lock = threading.Lock()
+        self.metrics = {}
+
+    def compact(self, step: str, text: str) -> str:
+        budget = self.budgets.get(step)
+        result = compact(text, budget) if budget is not None else \
+            {"text": text or "", "tokens_before": count_tokens(text), "tokens_after": count_tokens(text),
+             "facts": key_facts(text)}
+        with self._lock:
+            metrics = self.metrics.setdefault(step, {"calls": 0, "compacted": 0, "tokens_before": 0,
+                                                     "tokens_after": 0, "facts": {kind: [] for kind in _FACT_PATTERNS}})
+            for kind, facts in result["facts"].items():
+                metrics["facts"][kind].extend(fact for fact in facts if fact not in metrics["facts"][kind])
+            metrics["calls"] += 1
+            metrics["compacted"] += int(result["tokens_after"] < result["tokens_before"])
+            metrics["tokens_before"] += result["tokens_before"]
+            metrics["tokens_after"] += result["tokens_after"]
+        return result["text"]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Metrics per step, with the key facts found in its hand-offs under "facts"."""
+        with self._lock:
+            return {step: dict(metrics, saved=metrics["tokens_before"] - metrics["tokens_after"],
+                               budget=self.budgets.get(step),
+                               facts={kind: list(facts) for kind, facts in metrics["facts"].items()})
+                    for step, metrics in self.metrics.items()}
+
+    def facts(self, step: str) -> Dict[str, List[str]]:
+        """The key facts handed on by `step` so far, by kind."""
+        return self.stats().get(step, {}).get("facts", {kind: [] for kind in _FACT_PATTERNS})
+
+    def report(self) -> str:
+        """One line per step: tokens before and after compaction, tokens saved and key facts kept."""
+        lines = []
+        for step, metrics in self.stats().items():
+            saved = metrics["saved"]
+            share = saved / metrics["tokens_before"] if metrics["tokens_before"] else 0.0
+            facts = ", ".join(f"{len(found)} {kind.replace('_', ' ')}" for kind, found in metrics["facts"].items())
+            lines.append(f"{step}: {metrics['tokens_before']} -> {metrics['tokens_after']} tokens "
+                         f"(saved {saved}, {share:.0%}; budget {metrics['budget']}; facts: {facts})")
+        return "\n".join(lines)
+
+
+def budgets_from_env() -> Dict[str, int]:
+    """DEFAULT_BUDGETS with CONTEXT_BUDGET_<STEP> overrides (0 disables compaction of a step)."""
+    budgets = {}
+    for step, default in DEFAULT_BUDGETS.items():
+        budget = int(os.environ.get(f"CONTEXT_BUDGET_{step.upper()}", str(default)))
+        if budget > 0:
+            budgets[step] = budget
+    return budgets
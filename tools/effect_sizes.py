@@ -0,0 +1,466 @@
+"""
+Registry of effect sizes reported in the literature, pooled per topic for power analysis.
+
+Effect sizes (study, measure, value, 95% CI, n, design) are recorded by the literature
+agent and mined from the abstracts of the papers its searches return. Every measure is
+converted to Cohen's d with the usual meta-analysis approximations (Borenstein et al.,
+Introduction to Meta-Analysis, ch. 7):
+
+    odds ratio:     d = ln(OR) * sqrt(3) / pi
+    risk/hazard ratio: treated like an odds ratio (rare events), d = ln(ratio) * sqrt(3) / pi
+    correlation:    d = 2r / sqrt(1 - r^2)
+
+Study variances come from the CI when one is given, else from n. When a topic gets a new
+effect size its DerSimonian-Laird random-effects estimate is recomputed and stored, so the
+power tools read a pooled value (converted to the measure a test needs) by topic without
+another literature search or LLM pass.
+
+Effect sizes mined from abstracts are kept as candidates: they are listed with the topic's
+studies but only pooled with EFFECT_SIZE_POOL_ABSTRACTS=1, since a regex cannot tell which
+outcome or direction (exposure vs. control) a ratio refers to. The agent reviews them and
+records the ones that fit with record_effect_size.
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from tools.paper_store import fts_query, paper_ids
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS effect_sizes (
+    id INTEGER PRIMARY KEY,
+    topic_key TEXT NOT NULL,
+    study_id TEXT NOT NULL,
+    measure TEXT NOT NULL,
+    value REAL NOT NULL,
+    ci_lower REAL,
+    ci_upper REAL,
+    n INTEGER,
+    design TEXT NOT NULL DEFAULT '',
+    outcome TEXT NOT NULL DEFAULT '',
+    origin TEXT NOT NULL DEFAULT '',
+    d REAL NOT NULL,
+    var_d REAL,
+    added_at REAL NOT NULL,
+    UNIQUE (topic_key, study_id, measure, outcome)
+);
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    topic_key TEXT NOT NULL UNIQUE,
+    topic TEXT NOT NULL,
+    pooled TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5(
+    topic, content='topics', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS topics_ai AFTER INSERT ON topics BEGIN
+    INSERT INTO topics_fts(rowid, topic) VALUES (new.id, new.topic);
+END;
+"""
+
+_Z95 = 1.959963984540054
+_LOGIT_SCALE = math.sqrt(3) / math.pi
+
+MEASURE_ALIASES = {
+    "d": "d", "cohen's d": "d", "cohens d": "d", "smd": "d", "standardized mean difference": "d",
+    "g": "g", "hedges' g": "g", "hedges g": "g",
+    "or": "or", "odds ratio": "or",
+    "rr": "rr", "risk ratio": "rr", "relative risk": "rr", "rate ratio": "rr",
+    "hr": "hr", "hazard ratio": "hr",
+    "r": "r", "correlation": "r", "pearson's r": "r",
+}
+RATIO_MEASURES = ("or", "rr", "hr")
+
+# Pool effect sizes mined from abstracts along with the ones the agent recorded
+EFFECT_SIZE_POOL_ABSTRACTS = os.environ.get("EFFECT_SIZE_POOL_ABSTRACTS", "0") == "1"
+
+_ORIGIN_LABELS = {"agent": "recorded by the agent", "abstract": "mined from abstracts", "": "added directly"}
+
+# Measure each power calculation takes as its effect size
+TARGET_MEASURES = {
+    "t.test": "d", "correlation": "r",
+    "mixed_effects": "d", "clustered": "d", "poisson": "rr", "survival": "hr",
+}
+
+
+def normalize_measure(measure: str) -> str:
+    """
+    Raises:
+        ValueError: For measures that cannot be converted to Cohen's d.
+    """
+    key = " ".join(str(measure).lower().replace("’", "'").split())
+    if key not in MEASURE_ALIASES:
+        raise ValueError(f"Unsupported effect size measure '{measure}'; use one of d, g, or, rr, hr, r.")
+    return MEASURE_ALIASES[key]
+
+
+def to_d(measure: str, value: float, ci_lower: Optional[float] = None, ci_upper: Optional[float] = None,
+         n: Optional[int] = None) -> Tuple[float, Optional[float]]:
+    """
+    Converts an effect size to Cohen's d.
+
+    Returns:
+        (d, variance of d); the variance is None when neither a CI nor n is known.
+
+    Raises:
+        ValueError: For unsupported measures or values outside the measure's range.
+    """
+    measure = normalize_measure(measure)
+    has_ci = ci_lower is not None and ci_upper is not None and ci_lower < ci_upper
+    if measure in RATIO_MEASURES:
+        if value <= 0 or (has_ci and ci_lower <= 0):
+            raise ValueError(f"A {measure.upper()} must be positive.")
+        d = math.log(value) * _LOGIT_SCALE
+        if has_ci:
+            se = (math.log(ci_upper) - math.log(ci_lower)) / (2 * _Z95)
+            return d, (se * _LOGIT_SCALE) ** 2
+    elif measure == "r":
+        if not -1 < value < 1 or (has_ci and not -1 < ci_lower < ci_upper < 1):
+            raise ValueError("A correlation must lie strictly between -1 and 1.")
+        d = 2 * value / math.sqrt(1 - value ** 2)
+        var_r = None
+        if has_ci:
+            var_r = ((math.atanh(ci_upper) - math.atanh(ci_lower)) / (2 * _Z95)) ** 2 * (1 - value ** 2) ** 2
+        elif n and n > 1:
+            var_r = (1 - value ** 2) ** 2 / (n - 1)
+        return d, None if var_r is None else 4 * var_r / (1 - value ** 2) ** 3
+    else:
+        d = value
+        if has_ci:
+            return d, ((ci_upper - ci_lower) / (2 * _Z95)) ** 2
+    # Two equal groups of n/2
+    return d, (4 / n + d ** 2 / (2 * n)) if n and n > 0 else None
+
+
+def from_d(measure: str, d: float) -> float:
+    """Converts Cohen's d to `measure` (the inverse of to_d())."""
+    measure = normalize_measure(measure)
+    if measure in RATIO_MEASURES:
+        return math.exp(d / _LOGIT_SCALE)
+    if measure == "r":
+        return d / math.sqrt(d ** 2 + 4)
+    return d
+
+
+def pool(effects: Iterable[Tuple[float, float]]) -> Optional[Dict[str, float]]:
+    """
+    DerSimonian-Laird random-effects estimate from (d, variance) pairs.
+
+    Returns:
+        d, its 95% CI, tau2 (between-study variance) and I2, or None without effects.
+    """
+    effects = [(d, v) for d, v in effects if v is not None and v > 0]
+    if not effects:
+        return None
+    weights = [1 / v for _, v in effects]
+    fixed = sum(w * d for w, (d, _) in zip(weights, effects)) / sum(weights)
+    q = sum(w * (d - fixed) ** 2 for w, (d, _) in zip(weights, effects))
+    df = len(effects) - 1
+    c = sum(weights) - sum(w ** 2 for w in weights) / sum(weights)
+    tau2 = max(0.0, (q - df) / c) if c > 0 else 0.0
+    random_weights = [1 / (v + tau2) for _, v in effects]
+    d = sum(w * d for w, (d, _) in zip(random_weights, effects)) / sum(random_weights)
+    se = math.sqrt(1 / sum(random_weights))
+    return {
+        "d": d, "ci_lower": d - _Z95 * se, "ci_upper": d + _Z95 * se,
+        "tau2": tau2, "i2": max(0.0, (q - df) / q) if q > 0 else 0.0,
+    }
+
+
+def topic_key(topic: str) -> str:
+    return " ".join(re.findall(r"\w+", str(topic).lower()))
+
+
+_NUMBER = r"(-?\d+(?:\.\d+)?)"
+_CI = rf"(?:\s*[\(\[,;]\s*(?:95\s*%\s*(?:CI|confidence interval)[:,]?\s*)?{_NUMBER}\s*(?:-|–|—|to|,)\s*{_NUMBER}\s*[\)\]]?)?"
+_EFFECT = re.compile(
+    r"(?P<measure>Cohen[’']?s d|Hedges[’']? g|standardi[sz]ed mean difference|SMD|odds ratio|\bOR\b|hazard ratio"
+    r"|\bHR\b|risk ratio|relative risk|rate ratio|\bRR\b|\br(?=\s*=))"
+    rf"(?:\s*\([A-Z]+\))?\s*(?:of|=|:|was|were)?\s*{_NUMBER}{_CI}",
+    re.IGNORECASE,
+)
+_SAMPLE_SIZE = re.compile(r"\b[nN]\s*=\s*(\d[\d,]*)|\b(\d[\d,]*)\s+(?:patients|participants|subjects|individuals"
+                          r"|children|adults|women|men|cases|samples)\b")
+_DESIGNS = (("meta-analysis", r"meta-?analys|systematic review"), ("rct", r"randomi[sz]ed|\btrials?\b"),
+            ("cohort", r"\bcohort|prospective|longitudinal"), ("case-control", r"case-control"),
+            ("cross-sectional", r"cross-sectional"))
+
+
+def study_design(text: str) -> str:
+    """Study design named in a title or abstract ("" if none is recognized)."""
+    for design, pattern in _DESIGNS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return design
+    return ""
+
+
+def extract_effect_sizes(text: str) -> List[Dict[str, Any]]:
+    """
+    Effect sizes stated in free text, e.g. "pooled Cohen's d of 0.32" or
+    "OR 1.8 (95% CI 1.2-2.7)"; n is the first sample size mentioned.
+    """
+    sample = _SAMPLE_SIZE.search(text)
+    n = int((sample.group(1) or sample.group(2)).replace(",", "")) if sample else None
+    effects = []
+    for match in _EFFECT.finditer(text):
+        measure = match.group("measure")
+        # Upper-case abbreviations only, so "or 1.5" in a sentence is not an odds ratio
+        if len(measure) == 2 and not measure.isupper():
+            continue
+        values = [float(v) if v is not None else None for v in match.group(2, 3, 4)]
+        effects.append({"measure": normalize_measure(measure), "value": values[0], "ci_lower": values[1],
+                        "ci_upper": values[2], "n": n})
+    return effects
+
+
+class EffectSizeRegistry:
+    """SQLite registry of effect sizes with pooled estimates per topic."""
+    def __init__(self, path: str = os.path.join(".cache", "effect_sizes.sqlite")):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, topic: str, study_id: str, measure: str, value: float, ci_lower: Optional[float] = None,
+            ci_upper: Optional[float] = None, n: Optional[int] = None, design: str = "", outcome: str = "",
+            origin: str = "") -> Dict[str, Any]:
+        """
+        Records an effect size (replacing an earlier one for the same topic, study, measure
+        and outcome) and recomputes the topic's pooled estimate.
+
+        Returns:
+            The topic's pooled estimate (see pooled()).
+
+        Raises:
+            ValueError: For an empty topic or study, or an unsupported or invalid effect size.
+        """
+        key = topic_key(topic)
+        if not key or not str(study_id).strip():
+            raise ValueError("An effect size needs a topic and a study ID.")
+        measure = normalize_measure(measure)
+        d, var_d = to_d(measure, value, ci_lower, ci_upper, n)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO effect_sizes (topic_key, study_id, measure, value, ci_lower, ci_upper, n, "
+                "design, outcome, origin, d, var_d, added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, str(study_id).strip(), measure, value, ci_lower, ci_upper, n, design or "", outcome or "",
+                 origin or "", d, var_d, time.time()))
+            return self._update_pooled(conn, key, topic)
+
+    def _update_pooled(self, conn: sqlite3.Connection, key: str, topic: str) -> Dict[str, Any]:
+        rows = conn.execute("SELECT d, var_d, n, origin FROM effect_sizes WHERE topic_key = ?", (key,)).fetchall()
+        included = [row for row in rows if EFFECT_SIZE_POOL_ABSTRACTS or row[3] != "abstract"]
+        pooled = pool((d, var_d) for d, var_d, _, _ in included) or {}
+        # pool() leaves out studies without a variance; with none left, all are averaged
+        used = [row for row in included if row[1]] or included
+        origins = {}
+        for _, _, _, origin in used:
+            origins[origin] = origins.get(origin, 0) + 1
+        pooled.update(topic=topic, studies=len(included), pooled_studies=sum(1 for _, v, _, _ in included if v),
+                      n=sum(n or 0 for _, v, n, _ in included if v), origins=origins,
+                      candidates=len(rows) - len(included),
+                      directions={"positive": sum(1 for d, _, _, _ in used if d > 0),
+                                  "negative": sum(1 for d, _, _, _ in used if d < 0)})
+        if included and not pooled["pooled_studies"]:
+            # No study has a CI or n: fall back to the unweighted mean
+            pooled["d"] = sum(d for d, _, _, _ in included) / len(included)
+        conn.execute("INSERT INTO topics (topic_key, topic, pooled, updated_at) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT(topic_key) DO UPDATE SET pooled = excluded.pooled, updated_at = excluded.updated_at",
+                     (key, topic, json.dumps(pooled), time.time()))
+        return pooled
+
+    def topics_added_since(self, since: float) -> Dict[str, int]:
+        """
+        Topics that got effect sizes entering their pooled estimates at or after `since` (a
+        time.time() value), with the number of such effect sizes per topic.
+        """
+        query = ("SELECT t.topic, COUNT(*) FROM effect_sizes e JOIN topics t ON t.topic_key = e.topic_key "
+                 "WHERE e.added_at >= ?")
+        if not EFFECT_SIZE_POOL_ABSTRACTS:
+            query += " AND e.origin != 'abstract'"
+        with self._connect() as conn:
+            return dict(conn.execute(query + " GROUP BY t.topic ORDER BY t.topic", (since,)).fetchall())
+
+    def add_from_papers(self, topic: str, papers: Iterable[Dict[str, Any]]) -> int:
+        """
+        Records the effect sizes stated in the papers' abstracts under `topic`, as candidates
+        that are not pooled (unless EFFECT_SIZE_POOL_ABSTRACTS is set).
+
+        Returns:
+            The number of effect sizes recorded.
+        """
+        added = 0
+        for paper in papers:
+            ids = paper_ids(paper)
+            study_id = ids["doi"] or (ids["pmid"] and f"pmid:{ids['pmid']}") or \
+                (ids["arxiv_id"] and f"arxiv:{ids['arxiv_id']}") or paper.get("title")
+            text = str(paper.get("abstract") or "")
+            for effect in extract_effect_sizes(text):
+                try:
+                    self.add(topic, study_id, design=study_design(f"{paper.get('title', '')} {text}"),
+                             origin="abstract", **effect)
+                except ValueError:
+                    continue
+                added += 1
+        return added
+
+    def _match_topic(self, conn: sqlite3.Connection, topic: str) -> Optional[Tuple[str, str, str]]:
+        row = conn.execute("SELECT topic_key, topic, pooled FROM topics WHERE topic_key = ?",
+                           (topic_key(topic),)).fetchone()
+        match = fts_query(topic)
+        if row is None and match:
+            # The stored topic most similar to one containing every query word
+            row = conn.execute(
+                "SELECT topics.topic_key, topics.topic, topics.pooled FROM topics_fts "
+                "JOIN topics ON topics.id = topics_fts.rowid WHERE topics_fts MATCH ? "
+                "ORDER BY bm25(topics_fts) LIMIT 1", (match,)).fetchone()
+        return row
+
+    def pooled(self, topic: str) -> Optional[Dict[str, Any]]:
+        """
+        Precomputed pooled estimate for the stored topic best matching `topic`: d with its
+        95% CI, tau2, I2, the number of studies included and of those weighted into the pool
+        (by origin and direction; studies without a CI or n are only averaged when no study
+        has one), their total n, and the number of unpooled candidates. There is no "d" when only candidates
+        are recorded. None if no topic matches.
+        """
+        with self._connect() as conn:
+            row = self._match_topic(conn, topic)
+        return json.loads(row[2]) if row else None
+
+    def studies(self, topic: str) -> List[Dict[str, Any]]:
+        """The effect sizes recorded for the stored topic best matching `topic`."""
+        columns = ("study_id", "measure", "value", "ci_lower", "ci_upper", "n", "design", "outcome", "origin", "d")
+        with self._connect() as conn:
+            row = self._match_topic(conn, topic)
+            if row is None:
+                return []
+            rows = conn.execute(f"SELECT {', '.join(columns)} FROM effect_sizes WHERE topic_key = ? ORDER BY id",
+                                (row[0],)).fetchall()
+        return [dict(zip(columns, values)) for values in rows]
+
+    def effect_size_for(self, topic: str, target: str) -> Tuple[float, str]:
+        """
+        The pooled effect size for `topic` in the measure a power calculation takes
+        (see TARGET_MEASURES), with a line describing where it comes from.
+
+        Raises:
+            ValueError: No effect size is recorded for the topic, or none can be derived for `target`.
+        """
+        if target not in TARGET_MEASURES:
+            raise ValueError(f"No recorded effect size can be used for '{target}'.")
+        pooled = self.pooled(topic)
+        if pooled is None:
+            raise ValueError(f"No effect sizes are recorded for '{topic}'.")
+        if "d" not in pooled:
+            raise ValueError(f"Only {pooled['candidates']} unreviewed effect sizes mined from abstracts are recorded "
+                             f"for '{pooled['topic']}'; check them with lookup_effect_sizes and record the ones that "
+                             f"fit with record_effect_size.")
+        measure = TARGET_MEASURES[target]
+        directions = pooled.get("directions", {})
+        mixed = directions.get("positive") and directions.get("negative")
+        if mixed and measure not in RATIO_MEASURES:
+            # The magnitude of a pool of opposite effects means nothing
+            raise ValueError(f"The effect sizes recorded for '{pooled['topic']}' point in opposite directions "
+                             f"({directions['positive']} positive, {directions['negative']} negative); give "
+                             f"effect_size directly or re-record them with one direction.")
+        # Power for d and r depends on the magnitude only
+        d = pooled["d"] if measure in RATIO_MEASURES else abs(pooled["d"])
+        value = round(from_d(measure, d), 4)
+        ci = (f", 95% CI {from_d(measure, pooled['ci_lower']):.3g} to {from_d(measure, pooled['ci_upper']):.3g}"
+              if "ci_lower" in pooled and measure in RATIO_MEASURES else
+              f", d 95% CI {pooled['ci_lower']:.3g} to {pooled['ci_upper']:.3g}" if "ci_lower" in pooled else "")
+        spread = f", I2 {pooled['i2']:.0%}" if "i2" in pooled else ""
+        origins = ", ".join(f"{count} {_ORIGIN_LABELS.get(origin, origin)}"
+                            for origin, count in sorted(pooled.get("origins", {}).items()))
+        notes = ""
+        if pooled["pooled_studies"]:
+            basis = f"pooled from {pooled['pooled_studies']} studies"
+            left_out = pooled["studies"] - pooled["pooled_studies"]
+            if left_out:
+                notes += f" {left_out} recorded studies without a CI or n were left out."
+        else:
+            basis = f"unweighted mean of {pooled['studies']} studies without a CI or n"
+        if mixed:
+            notes += f" Studies disagree in direction ({directions['positive']} above, {directions['negative']} below the null)."
+        if pooled.get("candidates"):
+            notes += f" {pooled['candidates']} effect sizes mined from abstracts were not pooled."
+        return value, (f"Effect size from the literature registry for '{pooled['topic']}': {measure} = {value:g} "
+                       f"({basis}: {origins}; total n {pooled['n']}{ci}{spread}).{notes}")
+
+
+_effect_size_registry = None
+_effect_size_registry_lock = threading.Lock()
+
+
+def get_effect_size_registry() -> EffectSizeRegistry:
+    """
+    Returns the process-wide effect size registry.
+
+    Configured via environment variables:
+        EFFECT_SIZE_REGISTRY_PATH: SQLite file (default .cache/effect_sizes.sqlite).
+    """
+    global _effect_size_registry
+    with _effect_size_registry_lock:
+        if _effect_size_registry is None:
+            _effect_size_registry = EffectSizeRegistry(
+                path=os.environ.get("EFFECT_SIZE_REGISTRY_PATH", os.path.join(".cache", "effect_sizes.sqlite")))
+        return _effect_size_registry
+
+
+def record_effect_size(topic: str, study_id: str, measure: str, value: float, ci_lower: float = None,
+                       ci_upper: float = None, n: int = None, design: str = "", outcome: str = "") -> str:
+    """
+    Records an effect size reported by a study so power analyses can use it by topic.
+
+    Args:
+        topic: Short research topic, e.g. "probiotics alpha diversity".
+        study_id: DOI, PMID or another identifier of the study.
+        measure: d (Cohen's d / SMD), g (Hedges' g), or (odds ratio), rr (risk ratio), hr (hazard ratio) or r.
+        value: The reported effect size, oriented like the topic's other studies (exposure vs. control; invert a
+               ratio reported the other way round).
+        ci_lower: Lower bound of the 95% confidence interval, if reported.
+        ci_upper: Upper bound of the 95% confidence interval, if reported.
+        n: Total sample size, if reported.
+        design: Study design (rct, cohort, case-control, cross-sectional, meta-analysis).
+        outcome: Outcome the effect size refers to.
+
+    Returns:
+        The topic's updated pooled estimate.
+    """
+    try:
+        pooled = get_effect_size_registry().add(topic, study_id, measure, value, ci_lower, ci_upper, n, design,
+                                                outcome, origin="agent")
+    except ValueError as e:
+        return f"Error: {e}"
+    ci = f" (95% CI {pooled['ci_lower']:.3f} to {pooled['ci_upper']:.3f})" if "ci_lower" in pooled else ""
+    candidates = f"; {pooled['candidates']} mined from abstracts not pooled" if pooled["candidates"] else ""
+    return f"Recorded. Pooled d for '{topic}' is {pooled['d']:.3f}{ci} over {pooled['studies']} studies{candidates}."
+
+
+def lookup_effect_sizes(topic: str) -> str:
+    """
+    Looks up the effect sizes recorded from the literature for a topic.
+
+    Args:
+        topic: Research topic, e.g. "probiotics alpha diversity".
+
+    Returns:
+        Compact JSON with the pooled estimate (as Cohen's d, with 95% CI, tau2 and I2) and the studies.
+    """
+    registry = get_effect_size_registry()
+    pooled = registry.pooled(topic)
+    if pooled is None:
+        return f"No effect sizes are recorded for '{topic}'."
+    pooled = {k: round(v, 4) if isinstance(v, float) else v for k, v in pooled.items()}
+    studies = [{k: v for k, v in study.items() if v not in (None, "")} for study in registry.studies(topic)]
+    return json.dumps({"pooled": pooled, "studies": studies}, separators=(",", ":"))
@@ -0,0 +1,182 @@
+"""
+Streaming consumer for specialist runner events.
+
+Every runner reply is consumed by an EventCollector: the text of each event is extracted
+once, the same string is handed to each sink (the terminal, an optional transcript file)
+and kept as a reference in a chunk list that is joined once when the full text is needed,
+so long streamed replies cost linear time instead of the quadratic `text += part.text`.
+The collector times the stream (time to first text, tokens per second) and can record
+every event, with its timing, to a JSON-lines event log.
+
+Configured via environment variables:
+    AGENT_TRANSCRIPT: File receiving all streamed agent text (default: none).
+    AGENT_EVENT_LOG: JSON-lines file with one record per runner event (default: none).
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional
+from tools.context_compaction import count_tokens
+
+
+def event_text(event) -> str:
+    """Extracts the text carried by a runner event."""
+    if hasattr(event, 'text'):
+        return event.text or ""
+    if hasattr(event, 'content') and hasattr(event.content, 'parts'):
+        return "".join(part.text or "" for part in event.content.parts if hasattr(part, 'text'))
+    if hasattr(event, 'parts'):
+        return "".join(part.text or "" for part in event.parts if hasattr(part, 'text'))
+    return ""
+
+
+class TerminalSink:
+    """Prints streamed text as it arrives."""
+    def write(self, text: str):
+        print(text, end="", flush=True)
+
+
+class FileSink:
+    """Appends streamed text to a file, flushed per write so it can be followed live."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, text: str):
+        with self._lock:
+            self._file.write(text)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class EventLog:
+    """JSON-lines log with one record per runner event: runner, sequence number, seconds since the stream started and text size."""
+    def __init__(self, path: str):
+        self._sink = FileSink(path)
+
+    def record(self, entry: Dict[str, Any]):
+        self._sink.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def close(self):
+        self._sink.close()
+
+
+class EventCollector:
+    """
+    Consumes one runner reply.
+
+    Args:
+        name: Runner label used in timings and the event log.
+        sinks: Objects with a write(text) method receiving each piece of text as it arrives.
+        event_log: Optional EventLog receiving a record per event.
+    """
+    def __init__(self, name: str, sinks: Iterable[Any] = (), event_log: Optional[EventLog] = None):
+        self.name = name
+        self.sinks = list(sinks)
+        self.event_log = event_log
+        self._chunks: List[str] = []
+        self._text = None
+        self.events = 0
+        self.chars = 0
+        self.start = time.perf_counter()
+        self.first_text_at = None
+        self.last_text_at = None
+
+    def feed(self, event) -> str:
+        """Handles one event and returns its text."""
+        now = time.perf_counter()
+        self.events += 1
+        text = event_text(event)
+        if text:
+            if self.first_text_at is None:
+                self.first_text_at = now
+            self.last_text_at = now
+            self._chunks.append(text)
+            self._text = None
+            self.chars += len(text)
+            for sink in self.sinks:
+                sink.write(text)
+        if self.event_log is not None:
+            self.event_log.record({"runner": self.name, "seq": self.events, "elapsed": round(now - self.start, 4),
+                                   "chars": len(text), "author": getattr(event, "author", None)})
+        return text
+
+    def collect(self, events: Iterable[Any]) -> str:
+        """Consumes a synchronous event stream and returns its text."""
+        for event in events:
+            self.feed(event)
+        return self.text
+
+    async def collect_async(self, events: AsyncIterable[Any]) -> str:
+        """Consumes an asynchronous event stream and returns its text."""
+        async for event in events:
+            self.feed(event)
+        return self.text
+
+    @property
+    def text(self) -> str:
+        """All text received so far (joined once per change)."""
+        if self._text is None:
+            self._text = "".join(self._chunks)
+        return self._text
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        tokens = count_tokens(self.text)
+        # Generation rate after the first text; a single chunk counts from the start
+        generating = (self.last_text_at - self.first_text_at) if self.first_text_at is not None else 0.0
+        window = generating if generating > 0 else elapsed
+        return {
+            "runner": self.name,
+            "events": self.events,
+            "chars": self.chars,
+            "tokens": tokens,
+            "seconds": elapsed,
+            "first_token_seconds": None if self.first_text_at is None else self.first_text_at - self.start,
+            "tokens_per_second": tokens / window if tokens and window > 0 else None,
+        }
+
+    def summary(self) -> str:
+        """One-line timing of the reply."""
+        stats = self.stats()
+        if stats["first_token_seconds"] is None:
+            return f"[Timing] {self.name}: no text in {stats['seconds']:.1f}s ({stats['events']} events)"
+        return (f"[Timing] {self.name}: first token {stats['first_token_seconds']:.1f}s, {stats['tokens']} tokens "
+                f"in {stats['seconds']:.1f}s ({stats['tokens_per_second']:.0f} tokens/s, {stats['events']} events)")
+
+
+_shared_sinks = None
+_shared_sinks_lock = threading.Lock()
+
+
+def _get_shared_sinks():
+    """The transcript sink and event log configured by AGENT_TRANSCRIPT/AGENT_EVENT_LOG (opened once, closed at exit)."""
+    global _shared_sinks
+    with _shared_sinks_lock:
+        if _shared_sinks is None:
+            transcript = os.environ.get("AGENT_TRANSCRIPT")
+            event_log = os.environ.get("AGENT_EVENT_LOG")
+            _shared_sinks = (FileSink(transcript) if transcript else None, EventLog(event_log) if event_log else None)
+            for sink in _shared_sinks:
+                if sink is not None:
+                    atexit.register(sink.close)
+        return _shared_sinks
+
+
+def new_collector(name: str, terminal: bool = True) -> EventCollector:
+    """
+    An EventCollector for one runner reply with the configured sinks: the terminal (unless
+    `terminal` is False, e.g. for steps run concurrently), AGENT_TRANSCRIPT and AGENT_EVENT_LOG.
+    """
+    transcript, event_log = _get_shared_sinks()
+    sinks = [TerminalSink()] if terminal else []
+    if transcript is not None:
+        sinks.append(transcript)
+    return EventCollector(name, sinks=sinks, event_log=event_log)
@@ -0,0 +1,174 @@
+"""
+A long-lived MCP server process shared by all agent sessions.
+
+Launching the MCP server over stdio ties a server process to every toolset session, so
+each literature request paid the server's cold start (importing every search backend)
+and its teardown. Instead, the server runs once over streamable HTTP and sessions connect
+to it. The process is started on first use and probed until it accepts connections. If it
+has died it is restarted on the next use, and it is stopped at exit. Startup times and
+per-call latencies are recorded for `stats()`.
+"""
+import atexit
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# paper-search-mcp's FastMCP server, served over streamable HTTP on FASTMCP_HOST/FASTMCP_PORT
+DEFAULT_COMMAND = [sys.executable, "-c",
+                   "from paper_search_mcp.server import mcp; mcp.run(transport='streamable-http')"]
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class ManagedMcpServer:
+    """
+    Runs an MCP server process on a fixed local port and keeps it running.
+
+    Args:
+        command: Server command line; "{host}" and "{port}" are substituted, and the
+            FASTMCP_HOST/FASTMCP_PORT environment variables are set as well.
+        host: Interface to serve on.
+        port: Port to serve on (default: a free port, kept across restarts).
+        path: URL path of the MCP endpoint.
+        startup_timeout: Seconds to wait for the server to accept connections.
+        log_path: File receiving the server's output.
+    """
+    def __init__(self, command: Optional[List[str]] = None, host: str = "127.0.0.1", port: Optional[int] = None,
+                 path: str = "/mcp", startup_timeout: float = 30.0,
+                 log_path: str = os.path.join(".cache", "literature_mcp.log")):
+        self.host = host
+        self.port = port or free_port(host)
+        self.command = [part.format(host=self.host, port=self.port) for part in (command or DEFAULT_COMMAND)]
+        self.url = f"http://{host}:{self.port}{path}"
+        self.startup_timeout = startup_timeout
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._process = None
+        self.counters = {"starts": 0, "restarts": 0, "calls": 0, "errors": 0}
+        self.startup_seconds = []
+        self.call_seconds = []
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _accepting(self) -> bool:
+        try:
+            with socket.create_connection((self.host, self.port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def _log_tail(self, lines: int = 20) -> str:
+        try:
+            with open(self.log_path, "r", errors="replace") as f:
+                return "".join(f.readlines()[-lines:]).strip()
+        except OSError:
+            return ""
+
+    def ensure_running(self) -> str:
+        """
+        Starts the server if it is not running (restarting it if it died) and returns its URL.
+
+        Raises:
+            RuntimeError: The server exited or did not accept connections within startup_timeout.
+        """
+        with self._lock:
+            if self.running:
+                return self.url
+            if self._process is not None:
+                self.counters["restarts"] += 1
+                print(f"[System] Literature MCP server exited with code {self._process.returncode}; restarting.",
+                      flush=True)
+            self._start()
+            return self.url
+
+    def _start(self):
+        started = time.monotonic()
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        env = dict(os.environ, FASTMCP_HOST=self.host, FASTMCP_PORT=str(self.port))
+        with open(self.log_path, "ab") as log:
+            self._process = subprocess.Popen(self.command, stdin=subprocess.DEVNULL, stdout=log,
+                                             stderr=subprocess.STDOUT, env=env)
+        self.counters["starts"] += 1
+        # Readiness: the server accepts connections once its HTTP app is up
+        while not self._accepting():
+            if self._process.poll() is not None:
+                raise RuntimeError(f"MCP server exited with code {self._process.returncode} during startup: "
+                                   f"{self._log_tail()}")
+            if time.monotonic() - started > self.startup_timeout:
+                self._terminate()
+                raise RuntimeError(f"MCP server did not start within {self.startup_timeout:g}s: {self._log_tail()}")
+            time.sleep(0.05)
+        self.startup_seconds.append(time.monotonic() - started)
+
+    def _terminate(self):
+        process, self._process = self._process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def stop(self):
+        """Stops the server; the next ensure_running() starts it again."""
+        with self._lock:
+            self._terminate()
+
+    def record_call(self, seconds: float, error: bool = False):
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["errors"] += int(error)
+            self.call_seconds.append(seconds)
+            del self.call_seconds[:-1000]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["running"] = self.running
+            stats["url"] = self.url
+            stats["startup_seconds"] = round(self.startup_seconds[-1], 3) if self.startup_seconds else None
+            calls = sorted(self.call_seconds)
+        stats["call_seconds_mean"] = round(sum(calls) / len(calls), 3) if calls else None
+        stats["call_seconds_p95"] = round(calls[min(len(calls) - 1, int(0.95 * len(calls)))], 3) if calls else None
+        return stats
+
+
+_literature_server = None
+_literature_server_lock = threading.Lock()
+
+
+def get_literature_mcp_server() -> ManagedMcpServer:
+    """
+    Returns the process-wide paper-search MCP server (not started until first use); it is
+    stopped at exit.
+
+    Configured via environment variables:
+        LITERATURE_MCP_COMMAND: Server command line, with optional {host}/{port} placeholders
+            (default: paper-search-mcp over streamable HTTP).
+        LITERATURE_MCP_PORT: Local port (default: a free port).
+        LITERATURE_MCP_STARTUP_TIMEOUT: Seconds to wait for the server to come up (default 30).
+    """
+    global _literature_server
+    with _literature_server_lock:
+        if _literature_server is None:
+            command = os.environ.get("LITERATURE_MCP_COMMAND")
+            _literature_server = ManagedMcpServer(
+                command=shlex.split(command) if command else None,
+                port=int(os.environ.get("LITERATURE_MCP_PORT", "0")) or None,
+                startup_timeout=float(os.environ.get("LITERATURE_MCP_STARTUP_TIMEOUT", "30")),
+            )
+            atexit.register(_literature_server.stop)
+        return _literature_server
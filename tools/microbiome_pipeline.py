@@ -0,0 +1,393 @@
+"""
+Batch scheduler for the kneaddata -> MetaPhlAn2 -> HUMAnN2 pipeline over a cohort.
+
+Every sample in the manifest contributes a chain of three steps. Ready steps from all
+samples share one pool bounded by a global thread and memory budget, so kneaddata of
+sample k+1 runs while MetaPhlAn2 of sample k is still going. Threads are divided between
+the jobs started together instead of giving every job a fixed count, and steps further
+down the pipeline are started first so samples finish (and free disk) early.
+
+Progress is checkpointed in `<output_dir>/.pipeline_state.json` (tools/pipeline_state.py):
+re-running a cohort skips steps whose inputs, parameters, tool version and outputs are
+unchanged, retries failed steps, and re-runs downstream steps whose inputs were rewritten.
+
+MetaPhlAn2 keeps its bowtie2 alignment next to each profile; when a profile has to be
+recomputed (new MetaPhlAn2 options, deleted profile) from unchanged reads, the saved
+alignment is profiled instead of re-aligning. HUMAnN2 is given the MetaPhlAn2 profile
+(--taxonomic-profile) so it skips its own MetaPhlAn2 pre-screen.
+
+Each step's output is streamed to `<output_dir>/<sample_id>/logs/<step>.log` (rotating,
+tools/tool_logs.py) and its progress is printed while it runs.
+"""
+import asyncio
+import csv
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional
+from tools.async_exec import run_command_async
+from tools.pipeline_state import PipelineState, tool_version
+from tools.resources import get_resource_manager, thread_args
+from tools.tool_logs import TOOL_LOG_TAIL_LINES, ToolLog
+
+STEPS = ("kneaddata", "metaphlan2", "humann2")
+
+# Rough peak memory per job in GB, used to keep concurrent jobs within the memory budget
+STEP_MEMORY_GB = {
+    "kneaddata": float(os.environ.get("KNEADDATA_MEMORY_GB", "4")),
+    "metaphlan2": float(os.environ.get("METAPHLAN2_MEMORY_GB", "3")),
+    "humann2": float(os.environ.get("HUMANN2_MEMORY_GB", "16")),
+}
+
+
+def read_manifest(manifest_path: str) -> List[Dict[str, str]]:
+    """
+    Reads a sample manifest: a CSV or TSV file with `sample_id` and `fastq` columns.
+
+    Returns:
+        One dict per sample, in manifest order.
+    """
+    with open(manifest_path, "r", newline="") as f:
+        dialect = csv.excel_tab if manifest_path.endswith((".tsv", ".txt")) else csv.excel
+        rows = list(csv.DictReader(f, dialect=dialect))
+    samples = []
+    seen = set()
+    for line, row in enumerate(rows, start=2):
+        sample_id = (row.get("sample_id") or "").strip()
+        fastq = (row.get("fastq") or "").strip()
+        if not sample_id or not fastq:
+            raise ValueError(f"{manifest_path}:{line}: each row needs sample_id and fastq")
+        if sample_id in seen:
+            raise ValueError(f"{manifest_path}:{line}: duplicate sample_id {sample_id}")
+        seen.add(sample_id)
+        samples.append({"sample_id": sample_id, "fastq": fastq})
+    return samples
+
+
+def _strip_extensions(filename: str) -> str:
+    for suffix in (".gz", ".bz2", ".fastq", ".fq", ".fasta", ".fa", ".sam", ".tsv", ".txt"):
+        if filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+    return filename
+
+
+def sample_name(input_file: str) -> str:
+    """The sample name tools derive from an input file, e.g. "s1" for "reads/s1.fastq.gz"."""
+    return _strip_extensions(os.path.basename(input_file))
+
+
+def kneaddata_output(input_file: str, output_dir: str) -> str:
+    """The cleaned reads kneaddata writes for `input_file` (named after the input)."""
+    return os.path.join(output_dir, f"{sample_name(input_file)}_kneaddata.fastq")
+
+
+def humann2_outputs(input_file: str, output_dir: str) -> List[str]:
+    """The gene family, pathway abundance and pathway coverage tables HUMAnN2 writes for `input_file`."""
+    base = os.path.join(output_dir, sample_name(input_file))
+    return [f"{base}_genefamilies.tsv", f"{base}_pathabundance.tsv", f"{base}_pathcoverage.tsv"]
+
+
+def bowtie2out_path(profile_file: str) -> str:
+    """Where the bowtie2 alignment behind a MetaPhlAn2 profile is kept."""
+    return f"{os.path.splitext(profile_file)[0]}.bowtie2.bz2"
+
+
+def metaphlan2_invocation(command: List[str], bowtie2out: str, reuse: bool) -> List[str]:
+    """
+    Turns a MetaPhlAn2 command on reads (`metaphlan2.py <reads> --input_type <type> ...`)
+    into the one to run: profile the saved alignment if `reuse`, otherwise align and save it.
+    """
+    if reuse:
+        return [command[0], bowtie2out, "--input_type", "bowtie2out"] + command[4:]
+    # MetaPhlAn2 refuses to overwrite an existing --bowtie2out file
+    if os.path.exists(bowtie2out):
+        os.remove(bowtie2out)
+    return command + ["--bowtie2out", bowtie2out]
+
+
+class _Step:
+    def __init__(self, sample_id: str, name: str, command: List[str], inputs: List[str], outputs: List[str],
+                 stdout_file: Optional[str] = None, bowtie2out: Optional[str] = None):
+        self.sample_id = sample_id
+        self.name = name
+        self.command = command
+        self.inputs = inputs
+        self.outputs = outputs
+        self.stdout_file = stdout_file
+        self.bowtie2out = bowtie2out
+        self.status = "pending"  # pending, running, done, up-to-date, failed, skipped
+        self.checked = False  # checkpoint compared once the step became ready
+        self.threads = 0
+        self.elapsed = 0.0
+        self.saved = 0.0
+        self.reused_alignment = False
+        self.error = None
+        self.log_path = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.sample_id}/{self.name}"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "up-to-date")
+
+    @property
+    def memory_gb(self) -> float:
+        return STEP_MEMORY_GB[self.name]
+
+    def thread_args(self) -> List[str]:
+        return thread_args(self.name, self.threads)
+
+
+def _sample_steps(sample: Dict[str, str], output_dir: str, reference_db: Optional[str]) -> List[_Step]:
+    """Builds the kneaddata -> MetaPhlAn2 -> HUMAnN2 chain for one sample."""
+    sample_id = sample["sample_id"]
+    sample_dir = os.path.join(output_dir, sample_id)
+    kneaddata_dir = os.path.join(sample_dir, "kneaddata")
+    clean_fastq = kneaddata_output(sample["fastq"], kneaddata_dir)
+
+    kneaddata = ["kneaddata", "--input", sample["fastq"], "--output", kneaddata_dir]
+    if reference_db:
+        kneaddata.extend(["--reference-db", reference_db])
+    profile = os.path.join(sample_dir, f"{sample_id}_metaphlan2.txt")
+    bowtie2out = bowtie2out_path(profile)
+    humann2_dir = os.path.join(sample_dir, "humann2")
+    humann2 = ["humann2", "--input", clean_fastq, "--output", humann2_dir, "--taxonomic-profile", profile]
+    return [
+        _Step(sample_id, "kneaddata", kneaddata, [sample["fastq"]], [clean_fastq]),
+        _Step(sample_id, "metaphlan2", ["metaphlan2.py", clean_fastq, "--input_type", "fastq"], [clean_fastq],
+              [profile, bowtie2out], stdout_file=profile, bowtie2out=bowtie2out),
+        _Step(sample_id, "humann2", humann2, [clean_fastq, profile], humann2_outputs(clean_fastq, humann2_dir)),
+    ]
+
+
+class MicrobiomeBatchScheduler:
+    """
+    Runs the per-sample pipelines of a cohort under a global resource budget.
+
+    Args:
+        samples: Rows from read_manifest().
+        output_dir: Root output directory; each sample gets its own subdirectory.
+        max_threads: Total threads shared by all running jobs (default: available cores,
+            respecting container limits).
+        memory_gb: Total memory budget in GB (default: available memory, unlimited if unknown).
+        max_jobs: Maximum concurrently running jobs (default: one per 4 threads).
+        reference_db: kneaddata decontamination database (optional).
+        timeout: Per-job timeout in seconds (optional).
+    """
+    def __init__(self, samples: List[Dict[str, str]], output_dir: str, max_threads: Optional[int] = None,
+                 memory_gb: Optional[float] = None, max_jobs: Optional[int] = None,
+                 reference_db: Optional[str] = None, timeout: Optional[float] = None):
+        resources = get_resource_manager()
+        self.output_dir = output_dir
+        self.max_threads = max(1, max_threads or resources.cpus)
+        self.memory_gb = memory_gb if memory_gb is not None else resources.memory_gb
+        self.max_jobs = max(1, min(max_jobs or self.max_threads // 4, self.max_threads))
+        self.timeout = timeout
+        self.pipelines = {s["sample_id"]: _sample_steps(s, output_dir, reference_db) for s in samples}
+        self.state = PipelineState.for_directory(output_dir)
+        self.elapsed = 0.0
+
+    def _ready(self) -> List[_Step]:
+        """Next pending step of every sample whose previous steps are done, most advanced first."""
+        ready = []
+        for steps in self.pipelines.values():
+            for step in steps:
+                if step.finished:
+                    continue
+                if step.status == "pending":
+                    ready.append(step)
+                break
+        return sorted(ready, key=lambda step: -STEPS.index(step.name))
+
+    def _skip_rest(self, failed: _Step):
+        for step in self.pipelines[failed.sample_id]:
+            if step.status == "pending":
+                step.status = "skipped"
+
+    async def _execute(self, step: _Step):
+        start = time.perf_counter()
+        os.makedirs(os.path.join(self.output_dir, step.sample_id), exist_ok=True)
+        version = lambda: tool_version(step.command[0])
+        previous = self.state.get(step.key) or {}
+        step.log_path = os.path.join(self.output_dir, step.sample_id, "logs", f"{step.name}.log")
+        log = ToolLog(f"{step.name} {step.sample_id}", step.log_path)
+        try:
+            command = step.command
+            if step.bowtie2out:
+                step.reused_alignment = await asyncio.to_thread(self.state.output_is_current, step.key, step.inputs,
+                                                                step.bowtie2out, version)
+                command = metaphlan2_invocation(command, step.bowtie2out, step.reused_alignment)
+            command = command + step.thread_args()
+            if step.stdout_file:
+                os.makedirs(os.path.dirname(step.stdout_file), exist_ok=True)
+                with open(step.stdout_file, "w") as outfile:
+                    await run_command_async(command, timeout=self.timeout, stdout_file=outfile,
+                                            on_stderr_line=log, max_lines=TOOL_LOG_TAIL_LINES)
+            else:
+                await run_command_async(command, timeout=self.timeout, on_line=log, on_stderr_line=log,
+                                        max_lines=TOOL_LOG_TAIL_LINES)
+            step.status = "done"
+        except subprocess.CalledProcessError as e:
+            step.error = log.tail().strip()[-500:] or f"exit status {e.returncode}"
+        except asyncio.TimeoutError:
+            step.error = f"timed out after {self.timeout} seconds"
+        except FileNotFoundError:
+            step.error = f"{step.command[0]} executable not found in PATH"
+        except Exception as e:
+            step.error = str(e)
+        finally:
+            log.close()
+        if step.status != "done":
+            step.status = "failed"
+            self._skip_rest(step)
+        step.elapsed = time.perf_counter() - start
+        extra = None
+        if step.bowtie2out:
+            # Time of the last full (aligning) run, to estimate what reusing the alignment saves
+            baseline = previous.get("baseline_elapsed") if step.reused_alignment else step.elapsed
+            extra = {"baseline_elapsed": baseline}
+            if step.reused_alignment and baseline and step.status == "done":
+                step.saved = max(0.0, baseline - step.elapsed)
+        elif step.name == "humann2" and step.status == "done":
+            # The skipped pre-screen is a MetaPhlAn2 run on the same reads
+            metaphlan2 = self.state.get(f"{step.sample_id}/metaphlan2") or {}
+            step.saved = metaphlan2.get("baseline_elapsed") or 0.0
+        await asyncio.to_thread(self.state.record, step.key, step.status, step.inputs, step.outputs, step.command,
+                                version, step.elapsed, extra)
+
+    def _up_to_date(self, step: _Step) -> bool:
+        return self.state.is_up_to_date(step.key, step.inputs, step.outputs, step.command,
+                                        lambda: tool_version(step.command[0]))
+
+    async def run(self):
+        """Runs every sample's pipeline to completion (or failure)."""
+        start = time.perf_counter()
+        # Query tool versions for the checkpoint up front, off the event loop
+        await asyncio.gather(*(asyncio.to_thread(tool_version, executable)
+                               for executable in ("kneaddata", "metaphlan2.py", "humann2")))
+        running = {}
+        free_threads = self.max_threads
+        free_memory = self.memory_gb
+        while True:
+            ready = self._ready()
+            # Each step is compared with its checkpoint once, when it becomes ready (its inputs
+            # are final then); stat/hash work runs in threads, off the event loop
+            unchecked = [step for step in ready if not step.checked]
+            current = await asyncio.gather(*(asyncio.to_thread(self._up_to_date, step) for step in unchecked))
+            reused = False
+            for step, up_to_date in zip(unchecked, current):
+                step.checked = True
+                if up_to_date:
+                    step.status = "up-to-date"
+                    reused = True
+            ready = [step for step in ready if step.status == "pending"]
+            slots = self.max_jobs - len(running)
+            launch = []
+            for step in ready:
+                if len(launch) >= slots or free_threads - len(launch) <= 0:
+                    break
+                # Jobs that do not fit the memory budget wait, unless nothing else is running
+                if free_memory is None or step.memory_gb <= free_memory or not (running or launch):
+                    launch.append(step)
+                    if free_memory is not None:
+                        free_memory -= step.memory_gb
+            # Split the free threads between the jobs started together
+            for i, step in enumerate(launch):
+                step.threads = max(1, free_threads // (len(launch) - i))
+                free_threads -= step.threads
+                step.status = "running"
+                running[asyncio.ensure_future(self._execute(step))] = step
+            if reused and not launch:
+                # Skipping steps may have made the next steps of those samples ready
+                continue
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step = running.pop(task)
+                free_threads += step.threads
+                if free_memory is not None:
+                    free_memory += step.memory_gb
+        self.elapsed = time.perf_counter() - start
+
+    def report(self) -> str:
+        """Per-sample status, per-step timings and cohort throughput."""
+        completed = [sid for sid, steps in self.pipelines.items() if all(s.finished for s in steps)]
+        reused = sum(s.status == "up-to-date" for steps in self.pipelines.values() for s in steps)
+        saved = sum(s.saved for steps in self.pipelines.values() for s in steps)
+        lines = [
+            "=== Microbiome Batch Pipeline ===",
+            f"Samples: {len(self.pipelines)} ({len(completed)} completed, {len(self.pipelines) - len(completed)} incomplete)",
+            f"Budget: {self.max_threads} threads, "
+            f"{'unlimited' if self.memory_gb is None else f'{self.memory_gb:g} GB'} memory, up to {self.max_jobs} concurrent jobs",
+            f"Wall time: {self.elapsed:.1f}s",
+            f"Steps skipped as up to date: {reused}",
+            f"Time saved by reusing bowtie2 alignments and MetaPhlAn2 profiles: {saved:.1f}s",
+        ]
+        if self.elapsed > 0:
+            lines.append(f"Throughput: {len(completed) / self.elapsed * 3600:.2f} samples/hour")
+        for name in STEPS:
+            durations = [steps[STEPS.index(name)].elapsed for steps in self.pipelines.values()
+                         if steps[STEPS.index(name)].status == "done"]
+            if durations:
+                lines.append(f"{name}: {len(durations)} runs, mean {sum(durations) / len(durations):.1f}s")
+        lines.append("")
+        for sample_id, steps in self.pipelines.items():
+            statuses = ", ".join(f"{s.name}={s.status}" + (f" ({s.threads} threads, {s.elapsed:.1f}s)" if s.status == "done" else "")
+                                 for s in steps)
+            lines.append(f"{sample_id}: {statuses}")
+            details = []
+            for step in steps:
+                if step.reused_alignment and step.status == "done":
+                    details.append(f"{step.name} profiled the saved bowtie2 alignment (~{step.saved:.1f}s saved)")
+                elif step.name == "humann2" and step.saved:
+                    details.append(f"humann2 used the MetaPhlAn2 profile, skipping its pre-screen (~{step.saved:.1f}s saved)")
+            if details:
+                lines.append("  " + "; ".join(details))
+            for step in steps:
+                if step.error:
+                    lines.append(f"  {step.name} error: {step.error}")
+                    lines.append(f"  {step.name} log: {step.log_path}")
+        lines.append("=================================")
+        return "\n".join(lines) + "\n"
+
+
+async def run_microbiome_batch(
+    manifest: str,
+    output_dir: str,
+    max_threads: int = None,
+    memory_gb: float = None,
+    max_jobs: int = None,
+    reference_db: str = None,
+    timeout: float = None
+) -> str:
+    """
+    Runs kneaddata -> MetaPhlAn2 -> HUMAnN2 for every sample in a manifest, scheduling
+    steps from different samples in parallel within a shared CPU and memory budget.
+
+    Args:
+        manifest: CSV/TSV file with `sample_id` and `fastq` columns.
+        output_dir: Directory for the outputs (one subdirectory per sample).
+        max_threads: Total threads to use across all jobs (default: available cores, respecting container limits).
+        memory_gb: Total memory budget in GB (default: available memory).
+        max_jobs: Maximum number of jobs running at once (default: one per 4 threads).
+        reference_db: Reference database for kneaddata decontamination (optional).
+        timeout: Seconds after which a single job is stopped (optional).
+
+    Returns:
+        A report with each sample's status, per-step timings and throughput.
+    """
+    try:
+        samples = read_manifest(manifest)
+    except (OSError, ValueError) as e:
+        return f"Error reading manifest: {e}"
+    if not samples:
+        return f"Error reading manifest: {manifest} lists no samples"
+    scheduler = MicrobiomeBatchScheduler(samples, output_dir, max_threads=max_threads, memory_gb=memory_gb,
+                                         max_jobs=max_jobs, reference_db=reference_db, timeout=timeout)
+    print(f"\n[System] Starting microbiome batch pipeline ({len(samples)} samples)...", flush=True)
+    await scheduler.run()
+    print("[System] Microbiome batch pipeline completed.", flush=True)
+    return scheduler.report()
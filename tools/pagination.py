@@ -0,0 +1,59 @@
+"""
+Cursor paging and compact JSON pages for the repository search tools.
+
+A search tool returns one page of rows plus an opaque `next_cursor`; passing the cursor
+back returns the next page of the same search, fetched on its own (earlier pages are not
+requested again). The cursor carries the repository, the query and the offset, so it
+cannot be replayed against a different search. Rows are serialized without empty fields
+or whitespace to keep what is fed back to the model small.
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def encode_cursor(repository: str, query: str, offset: int) -> str:
+    payload = json.dumps([repository, query, offset], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, repository: str) -> Tuple[str, int]:
+    """
+    Returns (query, offset) of a cursor issued by `repository`.
+
+    Raises:
+        ValueError: The cursor is malformed or was issued by another repository's search.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_repository, query, offset = json.loads(payload)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError(f"invalid cursor {cursor!r}") from None
+    if cursor_repository != repository or not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"the cursor does not belong to a {repository} search")
+    return query, offset
+
+
+def compact(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops empty fields."""
+    return {key: value for key, value in row.items() if value not in (None, "", [], {})}
+
+
+def page_json(repository: str, query: str, rows: List[Dict[str, Any]], offset: int,
+              total: Optional[int] = None, has_more: Optional[bool] = None) -> str:
+    """
+    One page of results as compact JSON.
+
+    Args:
+        total: Number of matches, if the repository reports it.
+        has_more: Whether another page exists (default: derived from `total`).
+    """
+    if has_more is None:
+        has_more = total is not None and offset + len(rows) < total
+    page = {"repository": repository, "query": query, "offset": offset}
+    if total is not None:
+        page["total"] = total
+    page["rows"] = [compact(row) for row in rows]
+    page["next_cursor"] = encode_cursor(repository, query, offset + len(rows)) if has_more and rows else None
+    return json.dumps(page, separators=(",", ":"), ensure_ascii=False)
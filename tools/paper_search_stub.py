@@ -0,0 +1,105 @@
+"""
+Local stand-in for the paper-search MCP server, for tests and offline runs.
+
+Serves the same search tools as paper-search-mcp (search_arxiv, search_pubmed, ...) over
+streamable HTTP, answering from a small canned corpus (or a JSON list of papers given by
+PAPER_SEARCH_STUB_PAPERS) instead of the remote services. Every call is appended to the
+PAPER_SEARCH_STUB_LOG file as a JSON line, so tests can tell which searches reached the
+server. Point the literature agent at it with:
+
+    LITERATURE_MCP_COMMAND="python -m tools.paper_search_stub --host {host} --port {port}"
+"""
+import argparse
+import json
+import os
+import re
+from typing import Dict, List
+
+try:
+    from mcp.server.fastmcp import FastMCP as MCPServer
+except ImportError:  # mcp >= 2 renamed FastMCP
+    from mcp.server.mcpserver import MCPServer
+
+SOURCES = ["arxiv", "pubmed", "biorxiv", "medrxiv", "google_scholar", "semantic"]
+
+PAPERS = [
+    {"paper_id": "38012345", "source": "pubmed", "doi": "10.1038/s41586-023-00001-1",
+     "title": "Gut microbiome signatures of inflammatory bowel disease activity",
+     "authors": "A. Smith; B. Jones", "abstract": "Metagenomic sequencing of stool from 1,200 patients "
+     "identifies microbial biomarkers of Crohn's disease flares (AUC 0.81).",
+     "url": "https://pubmed.ncbi.nlm.nih.gov/38012345/", "published_date": "2023-11-02"},
+    {"paper_id": "abc123", "source": "semantic", "doi": "10.1038/S41586-023-00001-1",
+     "title": "Gut microbiome signatures of inflammatory bowel disease activity",
+     "authors": "A. Smith; B. Jones", "abstract": "", "citations": 42,
+     "url": "https://www.semanticscholar.org/paper/abc123", "published_date": "2023-11-02"},
+    {"paper_id": "2401.01234v2", "source": "arxiv", "doi": "",
+     "title": "Deep learning for single-cell biomarker discovery",
+     "authors": "C. Lee", "abstract": "A transformer model over single-cell RNA-seq atlases ranks "
+     "candidate biomarkers for lung adenocarcinoma.", "url": "http://arxiv.org/abs/2401.01234v2",
+     "pdf_url": "http://arxiv.org/pdf/2401.01234v2", "published_date": "2024-01-05"},
+    {"paper_id": "10.1101/2024.02.01.578000", "source": "biorxiv", "doi": "10.1101/2024.02.01.578000",
+     "title": "Effect sizes of microbiome interventions: a meta-analysis",
+     "authors": "D. Kim; E. Park", "abstract": "Across 58 randomized trials, probiotic interventions shifted "
+     "alpha diversity with a pooled Cohen's d of 0.32.",
+     "url": "https://www.biorxiv.org/content/10.1101/2024.02.01.578000v1", "published_date": "2024-02-01"},
+    {"paper_id": "37999999", "source": "pubmed", "doi": "10.1016/j.cell.2023.09.001",
+     "title": "Single-cell atlas of the inflamed colon in ulcerative colitis",
+     "authors": "F. Garcia", "abstract": "Single-cell RNA-seq of 60 colon biopsies maps inflammatory "
+     "fibroblast states in ulcerative colitis.", "url": "https://pubmed.ncbi.nlm.nih.gov/37999999/",
+     "published_date": "2023-10-12"},
+]
+
+_WORD = re.compile(r"\w+")
+
+
+def search(papers: List[Dict], source: str, query: str, max_results: int) -> List[Dict]:
+    """Papers of `source` mentioning any word of the query, most matching words first."""
+    words = set(_WORD.findall(query.lower()))
+    scored = []
+    for paper in papers:
+        if paper.get("source") != source:
+            continue
+        text = set(_WORD.findall(f"{paper.get('title', '')} {paper.get('abstract', '')}".lower()))
+        if words & text:
+            scored.append((-len(words & text), paper))
+    return [paper for _, paper in sorted(scored, key=lambda item: item[0])][:max_results]
+
+
+def create_server(papers: List[Dict], log_path: str = None) -> MCPServer:
+    server = MCPServer("paper_search_stub")
+
+    def add_search_tool(source: str):
+        async def search_source(query: str, max_results: int = 10) -> List[Dict]:
+            if log_path:
+                with open(log_path, "a") as log:
+                    log.write(json.dumps({"tool": f"search_{source}", "query": query,
+                                          "max_results": max_results}) + "\n")
+            return search(papers, source, query, max_results)
+        search_source.__doc__ = f"Search academic papers from {source} (canned stand-in results)."
+        server.tool(name=f"search_{source}")(search_source)
+
+    for source in SOURCES:
+        add_search_tool(source)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=os.environ.get("FASTMCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FASTMCP_PORT", "8000")))
+    args = parser.parse_args()
+
+    papers = PAPERS
+    if os.environ.get("PAPER_SEARCH_STUB_PAPERS"):
+        with open(os.environ["PAPER_SEARCH_STUB_PAPERS"]) as f:
+            papers = json.load(f)
+    server = create_server(papers, log_path=os.environ.get("PAPER_SEARCH_STUB_LOG"))
+    try:
+        server.run("streamable-http", host=args.host, port=args.port)
+    except TypeError:  # FastMCP (mcp 1.x) reads host and port from its settings
+        server.settings.host, server.settings.port = args.host, args.port
+        server.run("streamable-http")
+
+
+if __name__ == "__main__":
+    main()
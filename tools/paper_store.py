@@ -0,0 +1,300 @@
+"""
+Local store and full-text index of papers returned by the literature tools.
+
+Every paper a `literature_*` tool returns is persisted to SQLite and indexed with FTS5
+(title, abstract, authors; porter-stemmed, BM25-ranked). Papers are deduplicated across
+sources by DOI, PubMed ID and arXiv ID (falling back to the normalized title), so the same
+paper found on PubMed and Semantic Scholar is one row listing both sources. Searches that
+the store can answer in full from papers fetched within PAPER_STORE_MAX_AGE_DAYS are
+served locally instead of going out to arXiv/PubMed/bioRxiv through the MCP server.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id INTEGER PRIMARY KEY,
+    doi TEXT,
+    pmid TEXT,
+    arxiv_id TEXT,
+    title_key TEXT,
+    title TEXT NOT NULL DEFAULT '',
+    abstract TEXT NOT NULL DEFAULT '',
+    authors TEXT NOT NULL DEFAULT '',
+    sources TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_doi ON papers(doi);
+CREATE INDEX IF NOT EXISTS papers_pmid ON papers(pmid);
+CREATE INDEX IF NOT EXISTS papers_arxiv_id ON papers(arxiv_id);
+CREATE INDEX IF NOT EXISTS papers_title_key ON papers(title_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, authors, content='papers', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts(rowid, title, abstract, authors) VALUES (new.id, new.title, new.abstract, new.authors);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors)
+        VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+    INSERT INTO papers_fts(rowid, title, abstract, authors) VALUES (new.id, new.title, new.abstract, new.authors);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors)
+        VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+END;
+"""
+
+_ID_COLUMNS = ("doi", "pmid", "arxiv_id")
+_DOI = re.compile(r"10\.\d{4,9}/\S+", re.IGNORECASE)
+_ARXIV_DOI = re.compile(r"^10\.48550/arxiv\.(.+)$", re.IGNORECASE)
+_ARXIV_ID = re.compile(r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?", re.IGNORECASE)
+_PUBMED_URL = re.compile(r"pubmed\.ncbi\.nlm\.nih\.gov/(\d+)")
+_ARXIV_URL = re.compile(r"arxiv\.org/(?:abs|pdf)/([^\s?#]+?)(?:\.pdf)?(?:[?#]|$)")
+_WORD = re.compile(r"\w+")
+_STOPWORDS = frozenset("a an and are as at by for from in into is of on or the to with".split())
+
+
+def paper_ids(paper: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Normalized DOI, PubMed ID and arXiv ID of a paper-search-mcp paper dict (None if unknown)."""
+    source = str(paper.get("source") or "").lower()
+    paper_id = str(paper.get("paper_id") or "").strip()
+    urls = " ".join(str(paper.get(field) or "") for field in ("url", "pdf_url"))
+    doi = _DOI.search(str(paper.get("doi") or ""))
+    doi = doi.group(0).rstrip(".").lower() if doi else None
+    pmid = paper_id if source == "pubmed" and paper_id.isdigit() else None
+    pmid = pmid or next(iter(_PUBMED_URL.findall(urls)), None)
+    arxiv_id = None
+    if doi and _ARXIV_DOI.match(doi):
+        arxiv_id = _ARXIV_DOI.match(doi).group(1)
+    elif source == "arxiv" and paper_id:
+        arxiv_id = paper_id
+    elif _ARXIV_URL.search(urls):
+        arxiv_id = _ARXIV_URL.search(urls).group(1)
+    if arxiv_id:
+        match = _ARXIV_ID.fullmatch(arxiv_id.lower())
+        arxiv_id = match.group(1) if match else arxiv_id.lower()
+    return {"doi": doi, "pmid": pmid, "arxiv_id": arxiv_id}
+
+
+def title_key(title: str) -> Optional[str]:
+    """Normalized title used to match papers without shared identifiers (long titles only)."""
+    key = " ".join(_WORD.findall(str(title or "").lower()))
+    return key if len(key) >= 20 else None
+
+
+def extract_papers(response: Any) -> List[Dict[str, Any]]:
+    """
+    Paper dicts in a literature tool response: an MCP CallToolResult dump whose structured
+    content or text content holds a paper, a list of papers or a search_papers result.
+    """
+    if not isinstance(response, dict) or response.get("isError"):
+        return []
+    payloads = []
+    structured = response.get("structuredContent")
+    if structured is not None:
+        payloads.append(structured)
+    else:
+        for item in response.get("content") or []:
+            if isinstance(item, dict) and item.get("type") == "text":
+                try:
+                    payloads.append(json.loads(item.get("text") or ""))
+                except ValueError:
+                    continue
+    papers = []
+    while payloads:
+        payload = payloads.pop(0)
+        if isinstance(payload, list):
+            payloads[:0] = payload
+        elif isinstance(payload, dict):
+            if "title" in payload:
+                papers.append(payload)
+            else:
+                payloads[:0] = [payload[key] for key in ("result", "papers") if key in payload]
+    return papers
+
+
+def _fill_empty(paper: Dict[str, Any], other: Dict[str, Any]):
+    """Copies the fields of `other` that are empty or missing in `paper`."""
+    for field, value in other.items():
+        if value not in (None, "", [], {}) and paper.get(field) in (None, "", [], {}):
+            paper[field] = value
+
+
+def fts_query(query: str) -> str:
+    """An FTS5 query matching documents that contain every word of `query` (stopwords aside)."""
+    return " ".join(f'"{word}"' for word in _WORD.findall(query.lower()) if word not in _STOPWORDS)
+
+
+class PaperStore:
+    """
+    SQLite paper store with an FTS5 index.
+
+    Args:
+        path: Database file.
+        max_age: Seconds a stored paper counts when answering searches locally.
+    """
+    def __init__(self, path: str = os.path.join(".cache", "papers.sqlite"), max_age: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        self.counters = {"local_hits": 0, "remote_searches": 0, "added": 0, "merged": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _find(self, conn: sqlite3.Connection, ids: Dict[str, Optional[str]], key: Optional[str]) -> List[tuple]:
+        """Rows sharing any identifier with a paper (without one, its title), oldest first."""
+        clauses = [(f"{column} = ?", ids[column]) for column in _ID_COLUMNS if ids[column]]
+        select = "SELECT id, doi, pmid, arxiv_id, sources, data FROM papers WHERE "
+        rows = []
+        if clauses:
+            rows = conn.execute(select + " OR ".join(clause for clause, _ in clauses) + " ORDER BY id",
+                                [value for _, value in clauses]).fetchall()
+        if not rows and key:
+            rows = conn.execute(select + "title_key = ? ORDER BY id", (key,)).fetchall()
+        return rows
+
+    def add(self, papers: Iterable[Dict[str, Any]], source: Optional[str] = None) -> int:
+        """
+        Stores papers, merging each into the existing rows it shares an identifier with
+        (empty fields are filled in, sources are combined). A paper linking rows stored
+        separately, e.g. one known by its DOI and one by its PubMed ID, collapses them
+        into the oldest.
+
+        Returns:
+            The number of papers that were not in the store yet.
+        """
+        added = 0
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            for paper in papers:
+                paper = dict(paper)
+                paper.setdefault("source", source)
+                if not paper.get("title"):
+                    continue
+                ids, key = paper_ids(paper), title_key(paper["title"])
+                paper_sources = set(str(s).lower() for s in (paper.get("source"), source) if s)
+                existing = self._find(conn, ids, key)
+                if not existing:
+                    conn.execute(
+                        "INSERT INTO papers (doi, pmid, arxiv_id, title_key, title, abstract, authors, sources, data, "
+                        "fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (ids["doi"], ids["pmid"], ids["arxiv_id"], key, paper["title"], paper.get("abstract") or "",
+                         str(paper.get("authors") or ""), json.dumps(sorted(paper_sources)),
+                         json.dumps(paper, default=str), now))
+                    added += 1
+                    continue
+                # The oldest row keeps its fields; the others and the new paper fill the gaps
+                merged, sources = {}, set(paper_sources)
+                row_ids = {column: None for column in _ID_COLUMNS}
+                for _, doi, pmid, arxiv_id, row_sources, data in existing:
+                    for column, value in zip(_ID_COLUMNS, (doi, pmid, arxiv_id)):
+                        row_ids[column] = row_ids[column] or value
+                    sources |= set(json.loads(row_sources))
+                    _fill_empty(merged, json.loads(data))
+                _fill_empty(merged, paper)
+                merged_ids = paper_ids(merged)
+                row_id, duplicates = existing[0][0], [row[0] for row in existing[1:]]
+                if duplicates:
+                    conn.execute(f"DELETE FROM papers WHERE id IN ({', '.join('?' * len(duplicates))})", duplicates)
+                conn.execute(
+                    "UPDATE papers SET doi = ?, pmid = ?, arxiv_id = ?, title = ?, abstract = ?, authors = ?, "
+                    "sources = ?, data = ?, fetched_at = ? WHERE id = ?",
+                    tuple(row_ids[column] or ids[column] or merged_ids[column] for column in _ID_COLUMNS) +
+                    (merged["title"], merged.get("abstract") or "", str(merged.get("authors") or ""),
+                     json.dumps(sorted(sources)), json.dumps(merged, default=str), now, row_id))
+                self.counters["merged"] += 1 + len(duplicates)
+            self.counters["added"] += added
+        return added
+
+    def search(self, query: str, limit: int = 10, source: Optional[str] = None,
+               max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Papers containing every word of the query, best BM25 match first (title matches
+        weigh most). Each paper carries the "sources" it was found in.
+
+        Args:
+            source: Only papers found in this source (e.g. "pubmed").
+            max_age: Only papers fetched within this many seconds (default: no limit).
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = ("SELECT papers.data, papers.sources FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid "
+               "WHERE papers_fts MATCH ?")
+        params = [match]
+        if source:
+            sql += " AND EXISTS (SELECT 1 FROM json_each(papers.sources) WHERE value = ?)"
+            params.append(source.lower())
+        if max_age is not None:
+            sql += " AND papers.fetched_at >= ?"
+            params.append(time.time() - max_age)
+        sql += " ORDER BY bm25(papers_fts, 5.0, 1.0, 0.5) LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        papers = []
+        for data, sources in rows:
+            paper = json.loads(data)
+            paper["sources"] = json.loads(sources)
+            papers.append(paper)
+        return papers
+
+    def answer(self, query: str, wanted: int, source: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Answers a search locally if the store holds at least `wanted` matching papers
+        fetched within max_age; otherwise returns None and the search goes remote.
+        """
+        papers = self.search(query, limit=wanted, source=source, max_age=self.max_age)
+        with self._lock:
+            if len(papers) >= wanted > 0:
+                self.counters["local_hits"] += 1
+                return papers
+            self.counters["remote_searches"] += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            papers = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        with self._lock:
+            stats = dict(self.counters)
+        searches = stats["local_hits"] + stats["remote_searches"]
+        stats["papers"] = papers
+        stats["local_hit_rate"] = stats["local_hits"] / searches if searches else 0.0
+        return stats
+
+
+_paper_store = None
+_paper_store_lock = threading.Lock()
+
+
+def get_paper_store() -> Optional[PaperStore]:
+    """
+    Returns the process-wide paper store, or None if disabled.
+
+    Configured via environment variables:
+        PAPER_STORE_PATH: SQLite file (default .cache/papers.sqlite).
+        PAPER_STORE_MAX_AGE_DAYS: Age after which stored papers no longer answer searches
+            locally (default 30; 0 disables the store).
+    """
+    global _paper_store
+    with _paper_store_lock:
+        if _paper_store is None:
+            max_age_days = float(os.environ.get("PAPER_STORE_MAX_AGE_DAYS", "30"))
+            if max_age_days <= 0:
+                return None
+            _paper_store = PaperStore(
+                path=os.environ.get("PAPER_STORE_PATH", os.path.join(".cache", "papers.sqlite")),
+                max_age=max_age_days * 24 * 3600,
+            )
+        return _paper_store
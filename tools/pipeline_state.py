@@ -0,0 +1,207 @@
+"""
+Checkpoint state for microbiome pipeline steps.
+
+Each completed step is recorded with the signature (size and mtime, optionally a SHA-256)
+of its inputs and outputs, its parameters and the version of the tool that ran it. A step
+is up to date when all of these still match, so re-runs skip finished work, re-run failed
+steps, and re-run a downstream step only when an upstream output it reads has changed.
+
+Several checkpoints (tools running in the same output directory, other processes) may share
+a state file: each write re-reads it under an exclusive lock on `<state file>.lock` and
+replaces only the entry of the step being recorded.
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+STATE_FILE = ".pipeline_state.json"
+
+# Hash file contents instead of trusting size and mtime (slower, survives copies and touches)
+PIPELINE_CHECKSUMS = os.environ.get("PIPELINE_CHECKSUMS", "0") == "1"
+
+
+def _file_signature(path: str, checksum: bool) -> Dict[str, Any]:
+    stat = os.stat(path)
+    signature = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    if checksum:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        signature = {"size": stat.st_size, "sha256": digest.hexdigest()}
+    return signature
+
+
+def path_signature(path: str, checksum: bool = PIPELINE_CHECKSUMS) -> Optional[Dict[str, Any]]:
+    """
+    Signature of a file, or of every file under a directory.
+
+    Returns:
+        None if the path does not exist.
+    """
+    if os.path.isfile(path):
+        return _file_signature(path, checksum)
+    if os.path.isdir(path):
+        files = {}
+        for root, _, names in os.walk(path):
+            for name in names:
+                # The state file, its lock and in-progress writes
+                if name.startswith(STATE_FILE):
+                    continue
+                full = os.path.join(root, name)
+                files[os.path.relpath(full, path)] = _file_signature(full, checksum)
+        return {"files": files}
+    return None
+
+
+_tool_versions = {}
+_tool_versions_lock = threading.Lock()
+
+
+def tool_version(executable: str) -> str:
+    """First line of `executable --version`, queried once per process."""
+    with _tool_versions_lock:
+        if executable not in _tool_versions:
+            try:
+                result = subprocess.run([executable, "--version"], capture_output=True, text=True, timeout=60)
+                lines = (result.stdout + result.stderr).strip().splitlines()
+                _tool_versions[executable] = lines[0] if lines else "unknown"
+            except (OSError, subprocess.SubprocessError):
+                _tool_versions[executable] = "unavailable"
+        return _tool_versions[executable]
+
+
+class PipelineState:
+    """
+    JSON checkpoint file mapping step keys to their last recorded run.
+
+    Args:
+        path: State file, usually `<output_dir>/.pipeline_state.json`.
+        checksum: Compare file contents by SHA-256 rather than size and mtime.
+    """
+    def __init__(self, path: str, checksum: bool = PIPELINE_CHECKSUMS):
+        self.path = path
+        self.checksum = checksum
+        self._lock = threading.Lock()
+        self._steps = self._load()
+
+    @classmethod
+    def for_directory(cls, directory: str, checksum: bool = PIPELINE_CHECKSUMS) -> "PipelineState":
+        return cls(os.path.join(directory or ".", STATE_FILE), checksum)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as f:
+                steps = json.load(f).get("steps", {})
+            return steps if isinstance(steps, dict) else {}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the state file across processes and PipelineState instances."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"steps": self._steps}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _signatures(self, paths: List[str]) -> Optional[Dict[str, Any]]:
+        signatures = {}
+        for path in paths:
+            signature = path_signature(path, self.checksum)
+            if signature is None:
+                return None
+            signatures[os.path.abspath(path)] = signature
+        return signatures
+
+    def status(self, key: str) -> Optional[str]:
+        record = self._steps.get(key)
+        return record["status"] if record else None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._steps.get(key)
+
+    def output_is_current(self, key: str, inputs: List[str], output: str,
+                          version: Union[str, Callable[[], str]]) -> bool:
+        """
+        True if `output` is still exactly as a completed run of `key` with the current inputs
+        and tool version left it, whatever that run's other parameters were. Used to reuse
+        intermediates such as MetaPhlAn2's bowtie2 alignment across re-profiling runs.
+        """
+        record = self._steps.get(key)
+        if not record or record["status"] != "done":
+            return False
+        recorded = record["outputs"].get(os.path.abspath(output))
+        if recorded is None or recorded != path_signature(output, self.checksum):
+            return False
+        if record["version"] != (version() if callable(version) else version):
+            return False
+        return record["inputs"] == self._signatures(inputs)
+
+    def is_up_to_date(self, key: str, inputs: List[str], outputs: List[str], params: List[str],
+                      version: Union[str, Callable[[], str]]) -> bool:
+        """
+        True if `key` last completed with the same parameters and tool version, its inputs
+        are unchanged and its outputs are still as it left them. `version` may be a callable
+        so the tool is only queried when there is a completed run to compare against.
+        """
+        record = self._steps.get(key)
+        if not record or record["status"] != "done" or record["params"] != list(params):
+            return False
+        if record["version"] != (version() if callable(version) else version):
+            return False
+        current_inputs = self._signatures(inputs)
+        current_outputs = self._signatures(outputs)
+        if current_inputs is None or current_outputs is None:
+            return False
+        return record["inputs"] == current_inputs and record["outputs"] == current_outputs
+
+    def record(self, key: str, status: str, inputs: List[str], outputs: List[str], params: List[str],
+               version: Union[str, Callable[[], str]], elapsed: float = 0.0, extra: Optional[Dict[str, Any]] = None):
+        """
+        Records a finished ("done") or "failed" run of a step, with any `extra` fields.
+        Nothing is recorded if an input is missing, since such a run could never be checked
+        for staleness.
+        """
+        input_signatures = self._signatures(inputs)
+        if input_signatures is None:
+            return
+        output_signatures = {}
+        if status == "done":
+            for path in outputs:
+                signature = path_signature(path, self.checksum)
+                if signature is not None:
+                    output_signatures[os.path.abspath(path)] = signature
+        entry = {
+            "status": status,
+            "params": list(params),
+            "version": version() if callable(version) else version,
+            "inputs": input_signatures,
+            "outputs": output_signatures,
+            "elapsed": round(elapsed, 3),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **(extra or {}),
+        }
+        with self._lock, self._file_lock():
+            # Keep the steps other writers recorded since this state was loaded
+            steps = self._load()
+            steps[key] = entry
+            self._steps = steps
+            self._save()
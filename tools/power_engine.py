@@ -0,0 +1,351 @@
+"""
+In-process analytical power engine.
+
+Python port of the closed-form power calculations used by r_scripts/power_analysis.R
+(`pwr.t.test`, `pwr.r.test` and `pwr.p.test` from the R `pwr` package). All functions
+are vectorized: any of n, effect size, sig_level and power may be arrays, and a whole
+grid is solved in one call. Roots are found with a port of R's `uniroot` (Brent's
+zeroin, same interval and tolerance as `pwr`) so results match the R output to the
+printed precision.
+"""
+import numpy as np
+from scipy import stats
+
+_EPS = np.finfo(float).eps
+_UNIROOT_TOL = _EPS ** 0.25
+# Largest sample size searched for when the default interval does not bracket the root
+_MAX_UPPER = 1e15
+
+
+def _zeroin(f, lower, upper, tol=_UNIROOT_TOL, maxiter=1000):
+    """
+    Vectorized port of R's `R_zeroin2` (the algorithm behind `uniroot`).
+
+    Every element follows exactly the same iterates as the scalar R implementation;
+    converged elements are frozen while the others keep iterating.
+
+    Returns:
+        Array of roots; NaN where f(lower) and f(upper) do not have opposite signs.
+    """
+    a, b = np.broadcast_arrays(np.asarray(lower, dtype=float), np.asarray(upper, dtype=float))
+    a, b = a.copy(), b.copy()
+    with np.errstate(all="ignore"):
+        fa = np.broadcast_to(f(a), a.shape).astype(float)
+        fb = np.broadcast_to(f(b), b.shape).astype(float)
+        c, fc = a.copy(), fa.copy()
+
+        root = np.full(a.shape, np.nan)
+        bracketed = ~(np.isnan(fa) | np.isnan(fb) | (fa * fb > 0))
+        at_lower = bracketed & (fa == 0)
+        at_upper = bracketed & ~at_lower & (fb == 0)
+        root[at_lower] = a[at_lower]
+        root[at_upper] = b[at_upper]
+        active = bracketed & ~at_lower & ~at_upper
+
+        for _ in range(maxiter + 1):
+            if not active.any():
+                break
+            prev_step = b - a
+
+            swap = active & (np.abs(fc) < np.abs(fb))
+            a = np.where(swap, b, a)
+            b = np.where(swap, c, b)
+            c = np.where(swap, a, c)
+            fa = np.where(swap, fb, fa)
+            fb = np.where(swap, fc, fb)
+            fc = np.where(swap, fa, fc)
+
+            tol_act = 2 * _EPS * np.abs(b) + tol / 2
+            new_step = (c - b) / 2
+
+            converged = active & ((np.abs(new_step) <= tol_act) | (fb == 0))
+            root[converged] = b[converged]
+            active = active & ~converged
+            if not active.any():
+                break
+
+            # Linear (secant) or inverse quadratic interpolation, as in zeroin.c
+            cb = c - b
+            t1 = fb / fa
+            p_lin, q_lin = cb * t1, 1.0 - t1
+            q_quad = fa / fc
+            t1_quad = fb / fc
+            t2_quad = fb / fa
+            p_quad = t2_quad * (cb * q_quad * (q_quad - t1_quad) - (b - a) * (t1_quad - 1.0))
+            q_quad = (q_quad - 1.0) * (t1_quad - 1.0) * (t2_quad - 1.0)
+            linear = a == c
+            p = np.where(linear, p_lin, p_quad)
+            q = np.where(linear, q_lin, q_quad)
+            q = np.where(p > 0, -q, q)
+            p = np.abs(p)
+
+            try_interp = (np.abs(prev_step) >= tol_act) & (np.abs(fa) > np.abs(fb))
+            accept = (
+                try_interp
+                & (p < 0.75 * cb * q - np.abs(tol_act * q) / 2)
+                & (p < np.abs(prev_step * q / 2))
+            )
+            new_step = np.where(accept, p / q, new_step)
+            too_small = np.abs(new_step) < tol_act
+            new_step = np.where(too_small, np.where(new_step > 0, tol_act, -tol_act), new_step)
+
+            a = np.where(active, b, a)
+            fa = np.where(active, fb, fa)
+            b = np.where(active, b + new_step, b)
+            fb = np.where(active, np.broadcast_to(f(b), b.shape), fb)
+
+            same_sign = active & (((fb > 0) & (fc > 0)) | ((fb < 0) & (fc < 0)))
+            c = np.where(same_sign, a, c)
+            fc = np.where(same_sign, fa, fc)
+
+        # Elements that did not converge within maxiter return the last iterate, like uniroot
+        root[active] = b[active]
+    return root
+
+
+def _check_alternative(alternative):
+    if alternative not in ("two.sided", "less", "greater"):
+        raise ValueError(f"'arg' should be one of \"two.sided\", \"less\", \"greater\"")
+
+
+def _check_one_missing(names, values):
+    missing = [v is None for v in values]
+    if sum(missing) != 1:
+        raise ValueError(f"exactly one of {', '.join(names[:-1])}, and {names[-1]} must be None")
+
+
+def _solve(power_fn, params, target, interval, extend_upper=False):
+    """
+    Solves power_fn(**params) == params['power'] for the parameter `target` over `interval`.
+
+    With `extend_upper` (used for sample sizes, like `uniroot(extendInt = "upX")` in `pwr`),
+    elements whose power is still below the target at the upper end are retried with the
+    upper end widened tenfold until the root is bracketed or _MAX_UPPER is reached.
+    """
+    lower, upper = interval
+    fixed = {k: np.asarray(v, dtype=float) for k, v in params.items() if k != target}
+    shape = np.broadcast_shapes(*(v.shape for v in fixed.values()), np.shape(lower), np.shape(upper))
+    power = fixed.pop("power")
+
+    def objective(x):
+        return power_fn(**{target: x}, **fixed) - power
+
+    lower = np.broadcast_to(np.asarray(lower, dtype=float), shape)
+    upper = np.broadcast_to(np.asarray(upper, dtype=float), shape).copy()
+    root = _zeroin(objective, lower, upper)
+    while extend_upper:
+        with np.errstate(all="ignore"):
+            short = np.isnan(root) & (np.broadcast_to(objective(upper), shape) < 0) & (upper < _MAX_UPPER)
+        if not short.any():
+            break
+        upper = np.where(short, upper * 10, upper)
+        root = np.where(short, _zeroin(objective, lower, upper), root)
+    return root
+
+
+def _scalarize(result):
+    return {k: (v.item() if isinstance(v, np.ndarray) and v.ndim == 0 else v) for k, v in result.items()}
+
+
+def t_test_power(n, d, sig_level, type="two.sample", alternative="two.sided"):
+    """Power of a t-test (the `p.body` of `pwr.t.test`)."""
+    tsample = 2 if type == "two.sample" else 1
+    n, d, sig_level = (np.asarray(x, dtype=float) for x in (n, d, sig_level))
+    nu = (n - 1) * tsample
+    ncp = np.sqrt(n / tsample) * d
+    with np.errstate(all="ignore"):
+        if alternative == "two.sided":
+            qu = stats.t.isf(sig_level / 2, nu)
+            return stats.nct.sf(qu, nu, ncp) + stats.nct.cdf(-qu, nu, ncp)
+        if alternative == "less":
+            qu = stats.t.ppf(sig_level, nu)
+            return stats.nct.cdf(qu, nu, ncp)
+        qu = stats.t.isf(sig_level, nu)
+        return stats.nct.sf(qu, nu, ncp)
+
+
+def r_test_power(n, r, sig_level, alternative="two.sided"):
+    """Power of a correlation test (the `p.body` of `pwr.r.test`, arctanh approximation)."""
+    n, r, sig_level = (np.asarray(x, dtype=float) for x in (n, r, sig_level))
+    with np.errstate(all="ignore"):
+        if alternative == "two.sided":
+            ttt = stats.t.isf(sig_level / 2, n - 2)
+            rc = np.sqrt(ttt ** 2 / (ttt ** 2 + n - 2))
+            zr = np.arctanh(r) + r / (2 * (n - 1))
+            zrc = np.arctanh(rc)
+            return stats.norm.cdf((zr - zrc) * np.sqrt(n - 3)) + stats.norm.cdf((-zr - zrc) * np.sqrt(n - 3))
+        if alternative == "less":
+            r = -r
+        ttt = stats.t.isf(sig_level, n - 2)
+        rc = np.sqrt(ttt ** 2 / (ttt ** 2 + n - 2))
+        zr = np.arctanh(r) + r / (2 * (n - 1))
+        zrc = np.arctanh(rc)
+        return stats.norm.cdf((zr - zrc) * np.sqrt(n - 3))
+
+
+def p_test_power(h, n, sig_level, alternative="two.sided"):
+    """Power of a one-proportion test (the `p.body` of `pwr.p.test`, arcsine transformation)."""
+    h, n, sig_level = (np.asarray(x, dtype=float) for x in (h, n, sig_level))
+    with np.errstate(all="ignore"):
+        if alternative == "two.sided":
+            return (stats.norm.sf(stats.norm.isf(sig_level / 2) - h * np.sqrt(n))
+                    + stats.norm.cdf(stats.norm.ppf(sig_level / 2) - h * np.sqrt(n)))
+        if alternative == "less":
+            return stats.norm.cdf(stats.norm.ppf(sig_level) - h * np.sqrt(n))
+        return stats.norm.sf(stats.norm.isf(sig_level) - h * np.sqrt(n))
+
+
+def pwr_t_test(n=None, d=None, sig_level=0.05, power=None, type="two.sample", alternative="two.sided"):
+    """
+    Power calculations for t-tests of means (one sample, two samples and paired samples).
+    Equivalent to `pwr::pwr.t.test`. Exactly one of n, d, sig_level and power must be None.
+
+    Returns:
+        A dict with n, d, sig.level, power, alternative, method and note.
+    """
+    _check_alternative(alternative)
+    if type not in ("two.sample", "one.sample", "paired"):
+        raise ValueError("'arg' should be one of \"two.sample\", \"one.sample\", \"paired\"")
+    _check_one_missing(["n", "d", "power", "sig_level"], [n, d, power, sig_level])
+    if alternative == "two.sided" and d is not None:
+        d = np.abs(d)
+
+    def power_fn(n, d, sig_level):
+        return t_test_power(n, d, sig_level, type=type, alternative=alternative)
+
+    params = {"n": n, "d": d, "sig_level": sig_level, "power": power}
+    if power is None:
+        power = power_fn(n, d, sig_level)
+    elif n is None:
+        n = _solve(power_fn, params, "n", (2 + 1e-10, 1e9), extend_upper=True)
+    elif d is None:
+        interval = {"two.sided": (1e-7, 10), "less": (-10, 5), "greater": (-5, 10)}[alternative]
+        d = _solve(power_fn, params, "d", interval)
+    else:
+        sig_level = _solve(power_fn, params, "sig_level", (1e-10, 1 - 1e-10))
+
+    method = {"two.sample": "Two-sample", "one.sample": "One-sample", "paired": "Paired"}[type] + " t test power calculation"
+    note = {"two.sample": "n is number in *each* group", "paired": "n is number of *pairs*"}.get(type)
+    return _scalarize({
+        "n": np.asarray(n, dtype=float), "d": np.asarray(d, dtype=float),
+        "sig.level": np.asarray(sig_level, dtype=float), "power": np.asarray(power, dtype=float),
+        "alternative": alternative, "method": method, "note": note,
+    })
+
+
+def pwr_r_test(n=None, r=None, sig_level=0.05, power=None, alternative="two.sided"):
+    """
+    Power calculations for a correlation test. Equivalent to `pwr::pwr.r.test`.
+    Exactly one of n, r, sig_level and power must be None.
+    """
+    _check_alternative(alternative)
+    _check_one_missing(["n", "r", "power", "sig_level"], [n, r, power, sig_level])
+    if alternative == "two.sided" and r is not None:
+        r = np.abs(r)
+
+    def power_fn(n, r, sig_level):
+        return r_test_power(n, r, sig_level, alternative=alternative)
+
+    params = {"n": n, "r": r, "sig_level": sig_level, "power": power}
+    if power is None:
+        power = power_fn(n, r, sig_level)
+    elif n is None:
+        n = _solve(power_fn, params, "n", (4 + 1e-10, 1e9), extend_upper=True)
+    elif r is None:
+        interval = (1e-10, 1 - 1e-10) if alternative == "two.sided" else (-1 + 1e-10, 1 - 1e-10)
+        r = _solve(power_fn, params, "r", interval)
+    else:
+        sig_level = _solve(power_fn, params, "sig_level", (1e-10, 1 - 1e-10))
+
+    return _scalarize({
+        "n": np.asarray(n, dtype=float), "r": np.asarray(r, dtype=float),
+        "sig.level": np.asarray(sig_level, dtype=float), "power": np.asarray(power, dtype=float),
+        "alternative": alternative,
+        "method": "approximate correlation power calculation (arctangh transformation)", "note": None,
+    })
+
+
+def pwr_p_test(h=None, n=None, sig_level=0.05, power=None, alternative="two.sided"):
+    """
+    Power calculations for a one-proportion test. Equivalent to `pwr::pwr.p.test`.
+    Exactly one of h, n, sig_level and power must be None.
+    """
+    _check_alternative(alternative)
+    _check_one_missing(["h", "n", "power", "sig_level"], [h, n, power, sig_level])
+    if alternative == "two.sided" and h is not None:
+        h = np.abs(h)
+
+    def power_fn(h, n, sig_level):
+        return p_test_power(h, n, sig_level, alternative=alternative)
+
+    params = {"h": h, "n": n, "sig_level": sig_level, "power": power}
+    if power is None:
+        power = power_fn(h, n, sig_level)
+    elif n is None:
+        n = _solve(power_fn, params, "n", (2 + 1e-10, 1e9), extend_upper=True)
+    elif h is None:
+        interval = {"two.sided": (1e-10, 10), "less": (-10, 5), "greater": (-5, 10)}[alternative]
+        h = _solve(power_fn, params, "h", interval)
+    else:
+        sig_level = _solve(power_fn, params, "sig_level", (1e-10, 1 - 1e-10))
+
+    return _scalarize({
+        "h": np.asarray(h, dtype=float), "n": np.asarray(n, dtype=float),
+        "sig.level": np.asarray(sig_level, dtype=float), "power": np.asarray(power, dtype=float),
+        "alternative": alternative,
+        "method": "proportion power calculation for binomial distribution (arcsine transformation)", "note": None,
+    })
+
+
+def _format_value(value) -> str:
+    """Formats a value like R's `format(x, digits = 7)`."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, np.ndarray):
+        return ", ".join(_format_value(v) for v in value.ravel().tolist())
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "NA"
+    return f"{value:.7g}"
+
+
+def format_power_htest(result: dict) -> str:
+    """
+    Renders a result dict the way R prints a `power.htest` object.
+    """
+    lines = [f"\n     {result['method']} \n"]
+    for name, value in result.items():
+        if name in ("method", "note"):
+            continue
+        lines.append(f"{name:>15} = {_format_value(value)}")
+    text = "\n".join(lines) + "\n"
+    if result.get("note"):
+        text += f"\nNOTE: {result['note']}\n\n"
+    else:
+        text += "\n"
+    return text
+
+
+def power_analysis(test_type: str, effect_size=None, n=None, alpha=0.05, power=None,
+                   alternative: str = "two.sided", type: str = "two.sample") -> dict:
+    """
+    Dispatches to the pwr-style calculation used by r_scripts/power_analysis.R for `test_type`.
+
+    Raises:
+        ValueError: For unsupported test types, invalid argument combinations, or when no
+            value of the missing parameter reaches the requested power within its range.
+    """
+    if test_type == "t.test":
+        result = pwr_t_test(n=n, d=effect_size, sig_level=alpha, power=power, type=type, alternative=alternative)
+    elif test_type == "anova":
+        raise ValueError("ANOVA support requires number of groups (k). Not fully implemented in this simple template yet.")
+    elif test_type == "correlation":
+        result = pwr_r_test(n=n, r=effect_size, sig_level=alpha, power=power, alternative=alternative)
+    elif test_type == "proportion":
+        result = pwr_p_test(h=effect_size, n=n, sig_level=alpha, power=power, alternative=alternative)
+    else:
+        raise ValueError(f"Unknown test type: {test_type}")
+    unsolved = [name for name, value in result.items()
+                if not isinstance(value, str) and value is not None and np.any(np.isnan(value))]
+    if unsolved:
+        raise ValueError(f"no solution in range for {', '.join(unsolved)}")
+    return result
@@ -0,0 +1,261 @@
+"""
+Sample-size and minimal-detectable-effect search for simulation-based designs.
+
+Candidates are evaluated with the vectorized engine in blocks of replicates. Each
+candidate keeps receiving blocks only while its Monte Carlo confidence interval still
+contains the target power, so clearly under- or over-powered points are settled after a
+single block and the budget is spent near the target. All candidates share the same
+seed, i.e. common random numbers, which keeps the estimated power curve monotone and
+the comparisons between neighbouring candidates sharp.
+"""
+import asyncio
+import math
+import time
+from typing import Optional
+import numpy as np
+from tools.simulation_engine import BLOCK_SIZE, simulate_tests, wilson_interval
+
+# Effect size with no effect, and the default far end of the search range, per design
+_NULL_EFFECT = {"mixed_effects": 0.0, "clustered": 0.0, "poisson": 1.0, "survival": 1.0}
+_FAR_EFFECT = {"mixed_effects": 2.0, "clustered": 2.0, "poisson": 5.0, "survival": 0.1}
+# Ratio measures are searched on the log scale
+_RATIO_DESIGNS = ("poisson", "survival")
+
+
+class _Candidate:
+    def __init__(self, value):
+        self.value = value
+        self.n_successful = 0
+        self.n_rejected = 0
+        self.n_sims = 0
+
+    @property
+    def power(self) -> float:
+        return self.n_rejected / self.n_successful if self.n_successful else float("nan")
+
+    def interval(self, confidence):
+        lower, upper = wilson_interval(self.n_rejected, self.n_successful, confidence)
+        return float(lower), float(upper)
+
+
+class PowerSearch:
+    """
+    Adaptive search over sample size (or effect size) for a target power.
+
+    Args:
+        design: Study design (mixed_effects, clustered, poisson, survival).
+        target_power: Power to reach (default 0.8).
+        max_sims: Maximum replicates spent on any single candidate.
+        confidence: Confidence level of the Monte Carlo intervals.
+    """
+    def __init__(self, design: str, target_power: float = 0.8, alpha: float = 0.05, max_sims: int = 2000,
+                 confidence: float = 0.95, n_timepoints: int = 3, cluster_size: int = 20, icc: float = 0.05,
+                 seed: int = 12345):
+        self.design = design
+        self.target_power = target_power
+        self.alpha = alpha
+        self.max_sims = max(BLOCK_SIZE, max_sims)
+        self.confidence = confidence
+        self.design_args = {"n_timepoints": n_timepoints, "cluster_size": cluster_size, "icc": icc, "seed": seed}
+        self.candidates = {}
+
+    def evaluate(self, n: int, effect_size: float) -> _Candidate:
+        """
+        Runs replicate blocks for one (n, effect_size) candidate until its confidence
+        interval excludes the target power or the per-candidate budget is spent.
+        """
+        key = (n, effect_size)
+        candidate = self.candidates.setdefault(key, _Candidate(key))
+        while candidate.n_sims < self.max_sims:
+            if candidate.n_successful:
+                lower, upper = candidate.interval(self.confidence)
+                if lower > self.target_power or upper < self.target_power:
+                    break
+            count = min(BLOCK_SIZE, self.max_sims - candidate.n_sims)
+            _, _, p_value = simulate_tests(self.design, effect_size, n, start=candidate.n_sims, count=count,
+                                           **self.design_args)
+            valid = ~np.isnan(p_value)
+            candidate.n_sims += count
+            candidate.n_successful += int(valid.sum())
+            candidate.n_rejected += int((p_value[valid] < self.alpha).sum())
+        return candidate
+
+    def _reaches_target(self, candidate: _Candidate) -> bool:
+        return candidate.power >= self.target_power
+
+    def search_n(self, effect_size: float, n_min: int = 4, n_max: int = 5000) -> Optional[int]:
+        """
+        Finds the smallest n whose estimated power reaches the target.
+        Doubles n from n_min until the target is reached, then bisects the bracket.
+
+        Returns:
+            The minimal n, or None if n_max is underpowered.
+        """
+        low, high = None, n_min
+        while not self._reaches_target(self.evaluate(high, effect_size)):
+            if high >= n_max:
+                return None
+            low, high = high, min(2 * high, n_max)
+        if low is None:
+            return high
+        while high - low > 1:
+            mid = (low + high) // 2
+            if self._reaches_target(self.evaluate(mid, effect_size)):
+                high = mid
+            else:
+                low = mid
+        return high
+
+    def search_effect(self, n: int, effect_min: Optional[float] = None, effect_max: Optional[float] = None,
+                      tolerance: float = 0.01) -> Optional[float]:
+        """
+        Finds the minimal detectable effect at sample size n: the effect closest to the null
+        (within `tolerance`, relative for ratio measures) whose estimated power reaches the target.
+
+        Returns:
+            The minimal detectable effect, or None if even effect_max is underpowered.
+        """
+        near = _NULL_EFFECT[self.design] if effect_min is None else effect_min
+        far = _FAR_EFFECT[self.design] if effect_max is None else effect_max
+        ratio = self.design in _RATIO_DESIGNS
+        to_scale = math.log if ratio else (lambda x: x)
+        from_scale = math.exp if ratio else (lambda x: x)
+
+        if not self._reaches_target(self.evaluate(n, far)):
+            return None
+        low, high = to_scale(near), to_scale(far)
+        while abs(high - low) > tolerance:
+            mid = round(from_scale((low + high) / 2), 6)
+            if self._reaches_target(self.evaluate(n, mid)):
+                high = to_scale(mid)
+            else:
+                low = to_scale(mid)
+        return round(from_scale(high), 6)
+
+    def curve(self):
+        """
+        Returns:
+            One row per evaluated candidate: (n, effect_size, n_sims, power, ci_lower, ci_upper).
+        """
+        rows = []
+        for (n, effect_size), candidate in sorted(self.candidates.items()):
+            lower, upper = candidate.interval(self.confidence)
+            rows.append((n, effect_size, candidate.n_sims, candidate.power, lower, upper))
+        return rows
+
+    @property
+    def total_sims(self) -> int:
+        return sum(c.n_sims for c in self.candidates.values())
+
+
+def run_power_search(
+    design: str,
+    effect_size: float = None,
+    n: int = None,
+    target_power: float = 0.8,
+    alpha: float = 0.05,
+    n_timepoints: int = 3,
+    cluster_size: int = 20,
+    icc: float = 0.05,
+    max_sims: int = 2000,
+    n_min: int = 4,
+    n_max: int = 5000
+) -> str:
+    """
+    Searches for the minimal sample size (give effect_size) or the minimal detectable
+    effect (give n) that reaches the target power, using simulation with adaptive budgets.
+
+    Args:
+        design: Study design (mixed_effects, clustered, poisson, survival)
+        effect_size: Effect size to detect; leave empty to search for the minimal detectable effect
+        n: Sample size (subjects or clusters); leave empty to search for the minimal sample size
+        target_power: Power to reach (default: 0.8)
+        alpha: Significance level (default: 0.05)
+        n_timepoints: Number of timepoints for repeated measures (default: 3)
+        cluster_size: Cluster size for clustered designs (default: 20)
+        icc: Intra-cluster correlation for clustered designs (default: 0.05)
+        max_sims: Maximum simulations per candidate point (default: 2000)
+        n_min: Smallest sample size to consider (default: 4)
+        n_max: Largest sample size to consider (default: 5000)
+
+    Returns:
+        The recommended sample size or effect, the simulated power curve with 95% Monte
+        Carlo confidence intervals, and the total number of simulations used.
+    """
+    if (effect_size is None) == (n is None):
+        return "Error: provide exactly one of effect_size (to search n) or n (to search the effect size)."
+    if design not in _NULL_EFFECT:
+        return f"Error: Unknown design type: {design}"
+
+    print(f"\n[System] Starting power search (Design: {design}, Target power: {target_power})...", flush=True)
+    start_time = time.perf_counter()
+    search = PowerSearch(design, target_power=target_power, alpha=alpha, max_sims=max_sims,
+                         n_timepoints=n_timepoints, cluster_size=cluster_size, icc=icc)
+    if n is None:
+        answer = search.search_n(effect_size, n_min=n_min, n_max=n_max)
+        summary = (f"Minimal sample size: {answer}" if answer is not None
+                   else f"Target power not reached with n <= {n_max}.")
+    else:
+        answer = search.search_effect(n)
+        summary = (f"Minimal detectable effect: {answer}" if answer is not None
+                   else "Target power not reached within the searched effect range.")
+    elapsed = time.perf_counter() - start_time
+    print("[System] Power search completed.", flush=True)
+
+    lines = [
+        "=== Simulation-Based Power Search ===",
+        f"Design: {design}",
+        f"Target power: {target_power:.3f}",
+        f"Alpha: {alpha:.3f}",
+        summary,
+        "",
+        "Power curve (95% Monte Carlo CI):",
+        f"{'n':>8} {'effect':>10} {'sims':>6} {'power':>7} {'ci_low':>7} {'ci_high':>7}",
+    ]
+    for row_n, row_effect, sims, power, lower, upper in search.curve():
+        lines.append(f"{row_n:>8} {row_effect:>10.4g} {sims:>6} {power:>7.3f} {lower:>7.3f} {upper:>7.3f}")
+    lines += [
+        "",
+        f"Total simulations: {search.total_sims} across {len(search.candidates)} candidates ({elapsed:.2f}s)",
+        "=====================================",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+async def run_power_search_async(
+    design: str,
+    effect_size: float = None,
+    n: int = None,
+    target_power: float = 0.8,
+    alpha: float = 0.05,
+    n_timepoints: int = 3,
+    cluster_size: int = 20,
+    icc: float = 0.05,
+    max_sims: int = 2000,
+    n_min: int = 4,
+    n_max: int = 5000
+) -> str:
+    """
+    Searches for the minimal sample size (give effect_size) or the minimal detectable
+    effect (give n) that reaches the target power, without blocking other sessions.
+
+    Args:
+        design: Study design (mixed_effects, clustered, poisson, survival)
+        effect_size: Effect size to detect; leave empty to search for the minimal detectable effect
+        n: Sample size (subjects or clusters); leave empty to search for the minimal sample size
+        target_power: Power to reach (default: 0.8)
+        alpha: Significance level (default: 0.05)
+        n_timepoints: Number of timepoints for repeated measures (default: 3)
+        cluster_size: Cluster size for clustered designs (default: 20)
+        icc: Intra-cluster correlation for clustered designs (default: 0.05)
+        max_sims: Maximum simulations per candidate point (default: 2000)
+        n_min: Smallest sample size to consider (default: 4)
+        n_max: Largest sample size to consider (default: 5000)
+
+    Returns:
+        The recommended sample size or effect, the simulated power curve with 95% Monte
+        Carlo confidence intervals, and the total number of simulations used.
+    """
+    # The search is CPU-bound Python/NumPy, so it runs in a worker thread
+    return await asyncio.to_thread(run_power_search, design, effect_size, n, target_power, alpha, n_timepoints,
+                                   cluster_size, icc, max_sims, n_min, n_max)
@@ -1,13 +1,93 @@
+import asyncio
 import subprocess
 import os
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, List
+from tools.async_exec import get_limiter, run_command_async
+from tools.r_worker_pool import RWorkerPool, RWorkerError, RWorkerTimeout, get_default_pool
 
 class RExecutionTool:
     """
     A tool to execute R scripts or commands.
+
+    Jobs are routed through a pool of warm R workers when one is available
+    (see tools/r_worker_pool.py) and fall back to a one-shot `Rscript` process otherwise.
     """
-    def __init__(self, working_dir: str = "."):
+    def __init__(self, working_dir: str = ".", pool: Optional[RWorkerPool] = None, use_pool: bool = True):
         self.working_dir = working_dir
+        self.pool = pool
+        self.use_pool = use_pool
+
+    def _get_pool(self) -> Optional[RWorkerPool]:
+        if not self.use_pool:
+            return None
+        return self.pool if self.pool is not None else get_default_pool()
+
+    def _run(self, command: List[str], pool_job) -> subprocess.CompletedProcess:
+        """
+        Runs a job on the worker pool, falling back to the one-shot subprocess `command`.
+        Raises CalledProcessError on a non-zero exit status, like subprocess.run(check=True).
+        """
+        pool = self._get_pool()
+        result = None
+        if pool is not None:
+            try:
+                result = pool_job(pool)
+            except RWorkerError:
+                result = None
+        if result is None:
+            return subprocess.run(
+                command,
+                cwd=self.working_dir,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, command, output=result.stdout, stderr=result.stderr)
+        return result
+
+    async def _run_async(self, command: List[str], pool_job, timeout: Optional[float]) -> subprocess.CompletedProcess:
+        """
+        Non-blocking counterpart of _run. Pool jobs run in a thread; when the caller is
+        cancelled, the worker running the job is killed and the limiter slot is held until it
+        is. The fallback is an asyncio subprocess, killed on cancellation.
+        Raises asyncio.TimeoutError if the job exceeds `timeout`.
+        """
+        async with get_limiter("r"):
+            pool = self._get_pool()
+            result = None
+            if pool is not None:
+                cancel = threading.Event()
+                job = asyncio.ensure_future(asyncio.to_thread(pool_job, pool, timeout, cancel))
+                try:
+                    result = await asyncio.shield(job)
+                except asyncio.CancelledError:
+                    cancel.set()
+                    # The job thread returns once its worker is killed
+                    await asyncio.wait({job})
+                    if not job.cancelled():
+                        job.exception()
+                    raise
+                except RWorkerTimeout:
+                    raise asyncio.TimeoutError()
+                except RWorkerError:
+                    result = None
+            if result is None:
+                return await run_command_async(command, cwd=self.working_dir, timeout=timeout)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, command, output=result.stdout, stderr=result.stderr)
+        return result
+
+    @staticmethod
+    def _script_args(args: Optional[Dict[str, Any]]) -> List[str]:
+        script_args = []
+        if args:
+            for key, value in args.items():
+                if value is not None:
+                    script_args.append(f"--{key}")
+                    script_args.append(str(value))
+        return script_args
 
     def execute_script(self, script_path: str, args: Optional[Dict[str, Any]] = None) -> str:
         """
@@ -21,21 +101,13 @@ class RExecutionTool:
         Returns:
             The stdout output of the R script execution.
         """
-        command = ["Rscript", script_path]
-        
-        if args:
-            for key, value in args.items():
-                if value is not None:
-                    command.append(f"--{key}")
-                    command.append(str(value))
+        script_args = self._script_args(args)
+        command = ["Rscript", script_path] + script_args
 
         try:
-            result = subprocess.run(
+            result = self._run(
                 command,
-                cwd=self.working_dir,
-                capture_output=True,
-                text=True,
-                check=True
+                lambda pool: pool.run_script(script_path, script_args, cwd=self.working_dir)
             )
             return result.stdout
         except subprocess.CalledProcessError as e:
@@ -46,23 +118,59 @@ class RExecutionTool:
     def execute_code(self, r_code: str) -> str:
         """
         Executes a snippet of R code directly.
-        
+
         Args:
             r_code: The R code to execute.
-            
+
         Returns:
             The stdout output.
         """
         try:
-            result = subprocess.run(
+            result = self._run(
                 ["Rscript", "-e", r_code],
-                cwd=self.working_dir,
-                capture_output=True,
-                text=True,
-                check=True
+                lambda pool: pool.run_code(r_code, cwd=self.working_dir)
             )
             return result.stdout
         except subprocess.CalledProcessError as e:
              return f"Error executing R code:\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
         except Exception as e:
             return f"An unexpected error occurred: {str(e)}"
+
+    async def execute_script_async(self, script_path: str, args: Optional[Dict[str, Any]] = None,
+                                   timeout: Optional[float] = None) -> str:
+        """
+        Executes an R script without blocking the event loop.
+        Same arguments and output as execute_script, plus a timeout in seconds.
+        """
+        script_args = self._script_args(args)
+        try:
+            result = await self._run_async(
+                ["Rscript", script_path] + script_args,
+                lambda pool, t, c: pool.run_script(script_path, script_args, cwd=self.working_dir, timeout=t, cancel=c),
+                timeout
+            )
+            return result.stdout
+        except subprocess.CalledProcessError as e:
+            return f"Error executing R script:\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
+        except asyncio.TimeoutError:
+            return f"Error executing R script: timed out after {timeout} seconds"
+        except Exception as e:
+            return f"An unexpected error occurred: {str(e)}"
+
+    async def execute_code_async(self, r_code: str, timeout: Optional[float] = None) -> str:
+        """
+        Executes a snippet of R code without blocking the event loop.
+        """
+        try:
+            result = await self._run_async(
+                ["Rscript", "-e", r_code],
+                lambda pool, t, c: pool.run_code(r_code, cwd=self.working_dir, timeout=t, cancel=c),
+                timeout
+            )
+            return result.stdout
+        except subprocess.CalledProcessError as e:
+            return f"Error executing R code:\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
+        except asyncio.TimeoutError:
+            return f"Error executing R code: timed out after {timeout} seconds"
+        except Exception as e:
+            return f"An unexpected error occurred: {str(e)}"
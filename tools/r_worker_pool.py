@@ -0,0 +1,319 @@
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "r_scripts", "worker.R")
+STATUS_PREFIX = "@@RWORKER"
+# Seconds between checks for cancellation while a job runs
+CANCEL_POLL_INTERVAL = 0.1
+
+
+class RWorkerError(Exception):
+    """Raised when a pooled R worker cannot run a job (crash, timeout, protocol error)."""
+
+
+class RWorkerTimeout(RWorkerError):
+    """Raised when a job does not finish within its timeout; the worker is killed."""
+
+
+class RWorkerCancelled(RWorkerError):
+    """Raised when a job is cancelled while it runs or waits for a worker; the worker is killed."""
+
+
+def _r_string(value: str) -> str:
+    """Quotes a Python string as an R string literal."""
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+class RWorker:
+    """
+    A single long-lived R process running r_scripts/worker.R.
+    Jobs are sent as one R call per line on stdin; the worker answers with a status line.
+    """
+    def __init__(self, worker_script: str = WORKER_SCRIPT, cwd: str = "."):
+        self.process = subprocess.Popen(
+            ["Rscript", worker_script],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self.jobs_run = 0
+        self.last_used = time.monotonic()
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def call(self, expression: str, token: str, timeout: Optional[float] = None,
+             cancel: Optional[threading.Event] = None) -> int:
+        """
+        Sends one R expression to the worker and waits for its status line, or until
+        `cancel` is set (RWorkerCancelled).
+
+        Returns:
+            The exit status reported by the worker (0 on success).
+        """
+        try:
+            self.process.stdin.write(expression + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RWorkerError(f"R worker is not accepting jobs: {e}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if cancel is not None and cancel.is_set():
+                raise RWorkerCancelled("R job was cancelled")
+            wait = remaining if cancel is None else min(CANCEL_POLL_INTERVAL, remaining or CANCEL_POLL_INTERVAL)
+            try:
+                line = self._lines.get(timeout=wait)
+            except queue.Empty:
+                if remaining is not None and remaining <= wait:
+                    raise RWorkerTimeout(f"R worker did not answer within {timeout} seconds")
+                continue
+            if line is None:
+                raise RWorkerError("R worker exited unexpectedly")
+            if not line.startswith(STATUS_PREFIX):
+                # Stray output (e.g. from forked mclapply children) is not part of the protocol.
+                continue
+            parts = line.split(maxsplit=3)
+            if parts[1] == "?":
+                raise RWorkerError(f"R worker rejected job: {parts[3].strip() if len(parts) > 3 else ''}")
+            if parts[1] == token:
+                self.last_used = time.monotonic()
+                return int(parts[2])
+
+    def ping(self, timeout: float = 10.0) -> bool:
+        """Health check: returns True if the worker answers a no-op job in time."""
+        if not self.is_alive():
+            return False
+        token = uuid.uuid4().hex
+        try:
+            return self.call(f".rworker_ping({_r_string(token)})", token, timeout=timeout) == 0
+        except RWorkerError:
+            return False
+
+    def close(self):
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class RWorkerPool:
+    """
+    A pool of warm R worker processes that keep pwr/argparser/lme4/survival attached.
+
+    Workers are started lazily up to `size`, health-checked before reuse when idle for
+    longer than `health_check_interval`, and recycled after `max_jobs_per_worker` jobs.
+    """
+    def __init__(
+        self,
+        size: int = 2,
+        max_jobs_per_worker: int = 100,
+        job_timeout: Optional[float] = None,
+        startup_timeout: float = 60.0,
+        health_check_interval: float = 30.0,
+        worker_script: str = WORKER_SCRIPT,
+    ):
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self.health_check_interval = health_check_interval
+        self.worker_script = worker_script
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._n_workers = 0
+        self._closed = False
+
+    def _spawn(self) -> RWorker:
+        worker = RWorker(self.worker_script)
+        if not worker.ping(timeout=self.startup_timeout):
+            worker.close()
+            raise RWorkerError("R worker failed to start")
+        return worker
+
+    def _acquire(self, cancel: Optional[threading.Event] = None) -> RWorker:
+        if self._closed:
+            raise RWorkerError("R worker pool is shut down")
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise RWorkerCancelled("R job was cancelled before it started")
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_spawn = self._n_workers < self.size
+                    if can_spawn:
+                        self._n_workers += 1
+                if can_spawn:
+                    try:
+                        return self._spawn()
+                    except Exception:
+                        with self._lock:
+                            self._n_workers -= 1
+                        raise
+                try:
+                    # Poll so that a slot freed by a discarded worker is noticed.
+                    worker = self._idle.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+
+            idle_for = time.monotonic() - worker.last_used
+            if worker.is_alive() and (idle_for < self.health_check_interval or worker.ping()):
+                return worker
+            self._discard(worker)
+
+    def _release(self, worker: RWorker):
+        worker.jobs_run += 1
+        if self._closed or not worker.is_alive() or worker.jobs_run >= self.max_jobs_per_worker:
+            self._discard(worker)
+        else:
+            self._idle.put(worker)
+
+    def _discard(self, worker: RWorker):
+        worker.close()
+        with self._lock:
+            self._n_workers -= 1
+
+    def _run(self, job_args: str, cwd: str, timeout: Optional[float] = None,
+             cancel: Optional[threading.Event] = None) -> subprocess.CompletedProcess:
+        worker = self._acquire(cancel)
+        token = uuid.uuid4().hex
+        out_fd, out_path = tempfile.mkstemp(prefix="rworker_", suffix=".out")
+        err_fd, err_path = tempfile.mkstemp(prefix="rworker_", suffix=".err")
+        os.close(out_fd)
+        os.close(err_fd)
+        try:
+            expression = (
+                f".rworker_run({_r_string(token)}, {_r_string(out_path)}, {_r_string(err_path)}, "
+                f"{_r_string(os.path.abspath(cwd))}, {job_args})"
+            )
+            try:
+                status = worker.call(expression, token, timeout=self.job_timeout if timeout is None else timeout,
+                                     cancel=cancel)
+            except RWorkerError:
+                worker.process.kill()
+                self._discard(worker)
+                raise
+            self._release(worker)
+            with open(out_path, "r") as f:
+                stdout = f.read()
+            with open(err_path, "r") as f:
+                stderr = f.read()
+            return subprocess.CompletedProcess(args=expression, returncode=status, stdout=stdout, stderr=stderr)
+        finally:
+            os.remove(out_path)
+            os.remove(err_path)
+
+    def run_script(self, script_path: str, args: Optional[List[str]] = None, cwd: str = ".",
+                   timeout: Optional[float] = None,
+                   cancel: Optional[threading.Event] = None) -> subprocess.CompletedProcess:
+        """
+        Runs an R script on a warm worker, as `Rscript script_path args...` would.
+        `timeout` overrides the pool's job_timeout for this job. Setting `cancel` kills the
+        worker running the job (RWorkerCancelled); a new one is started for the next job.
+
+        Returns:
+            A CompletedProcess with the script's exit status, stdout and stderr.
+        """
+        r_args = ", ".join(_r_string(str(a)) for a in (args or []))
+        script = os.path.abspath(os.path.join(cwd, script_path))
+        return self._run(f"script = {_r_string(script)}, args = c({r_args})", cwd, timeout, cancel)
+
+    def run_code(self, r_code: str, cwd: str = ".", timeout: Optional[float] = None,
+                 cancel: Optional[threading.Event] = None) -> subprocess.CompletedProcess:
+        """
+        Runs a snippet of R code on a warm worker, as `Rscript -e r_code` would.
+        """
+        return self._run(f"code = {_r_string(r_code)}", cwd, timeout, cancel)
+
+    def health_check(self) -> int:
+        """
+        Pings every idle worker, dropping the ones that do not answer.
+
+        Returns:
+            The number of healthy idle workers.
+        """
+        healthy = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker.ping():
+                healthy.append(worker)
+            else:
+                self._discard(worker)
+        for worker in healthy:
+            self._idle.put(worker)
+        return len(healthy)
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(worker)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> Optional[RWorkerPool]:
+    """
+    Returns the process-wide R worker pool, or None if pooling is disabled.
+
+    Configured via environment variables:
+        R_WORKER_POOL_SIZE: Number of warm workers (default 2, 0 disables the pool).
+        R_WORKER_MAX_JOBS: Jobs per worker before it is recycled (default 100).
+        R_WORKER_JOB_TIMEOUT: Seconds to wait for a job before killing the worker (default: no limit).
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            size = int(os.environ.get("R_WORKER_POOL_SIZE", "2"))
+            if size <= 0 or shutil.which("Rscript") is None:
+                return None
+            timeout = os.environ.get("R_WORKER_JOB_TIMEOUT")
+            _default_pool = RWorkerPool(
+                size=size,
+                max_jobs_per_worker=int(os.environ.get("R_WORKER_MAX_JOBS", "100")),
+                job_timeout=float(timeout) if timeout else None,
+            )
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
@@ -0,0 +1,62 @@
+"""
+Client-side request rate limiting for remote APIs.
+
+NCBI E-utilities allow 3 requests per second per client without an API key and 10 with
+one (NCBI_API_KEY). Every E-utilities call made by the agent, from any thread, waits on
+the shared limiter so background cache refreshes and concurrent sessions cannot push the
+process over the limit.
+"""
+import os
+import threading
+import time
+from typing import Callable
+
+
+class RateLimiter:
+    """
+    Spaces calls to at most `rate` per second across all threads.
+
+    Args:
+        rate: Maximum calls per second.
+        clock: Monotonic clock (injectable for tests).
+        sleep: Sleep function (injectable for tests).
+    """
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.interval = 1.0 / rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self) -> float:
+        """
+        Waits for the next free slot.
+
+        Returns:
+            The number of seconds waited.
+        """
+        with self._lock:
+            now = self._clock()
+            wait = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+_ncbi_limiter = None
+_ncbi_limiter_lock = threading.Lock()
+
+
+def ncbi_rate_limiter() -> RateLimiter:
+    """
+    Returns the process-wide limiter for NCBI E-utilities: 10 requests/s with NCBI_API_KEY,
+    3 without. NCBI_MAX_RPS overrides the rate.
+    """
+    global _ncbi_limiter
+    with _ncbi_limiter_lock:
+        if _ncbi_limiter is None:
+            default = "10" if os.environ.get("NCBI_API_KEY") else "3"
+            _ncbi_limiter = RateLimiter(float(os.environ.get("NCBI_MAX_RPS", default)))
+        return _ncbi_limiter
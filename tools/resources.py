@@ -0,0 +1,154 @@
+"""
+CPU and memory detection and per-job thread allocation for the microbiome tools.
+
+os.cpu_count() reports the host's cores even inside a container limited to a few of
+them, so the limits are read from the CPU affinity mask and from cgroups (v2 `cpu.max` /
+`memory.max`, v1 `cpu.cfs_quota_us` / `memory.limit_in_bytes`), as set by
+`docker run --cpus/--memory`. Jobs that are not given an explicit thread count get a fair
+share of the cores for the number of jobs running at the same time.
+"""
+import contextlib
+import os
+import threading
+from typing import Iterator, List, Optional
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# cgroup v1 reports "no limit" as a huge number rather than "max"
+_UNLIMITED_BYTES = 1 << 60
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(cgroup_root: str = CGROUP_ROOT) -> Optional[float]:
+    """CPU quota in cores from cgroup v2 or v1, or None if unlimited or unknown."""
+    cpu_max = _read(os.path.join(cgroup_root, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit(cgroup_root: str = CGROUP_ROOT) -> Optional[int]:
+    """Memory limit in bytes from cgroup v2 or v1, or None if unlimited or unknown."""
+    for path in (os.path.join(cgroup_root, "memory.max"), os.path.join(cgroup_root, "memory", "memory.limit_in_bytes")):
+        limit = _read(path)
+        if limit and limit != "max" and int(limit) < _UNLIMITED_BYTES:
+            return int(limit)
+    return None
+
+
+def available_cpus(cgroup_root: str = CGROUP_ROOT) -> int:
+    """
+    Cores this process may use: the affinity mask capped by the cgroup CPU quota.
+    MICROBIOME_CPUS overrides the detection.
+    """
+    if os.environ.get("MICROBIOME_CPUS"):
+        return max(1, int(os.environ["MICROBIOME_CPUS"]))
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_limit(cgroup_root)
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def available_memory_gb(cgroup_root: str = CGROUP_ROOT) -> Optional[float]:
+    """
+    Memory this process may use in GB: physical memory capped by the cgroup limit, or None
+    if neither can be read. MICROBIOME_MEMORY_GB overrides the detection.
+    """
+    if os.environ.get("MICROBIOME_MEMORY_GB"):
+        return float(os.environ["MICROBIOME_MEMORY_GB"])
+    limits = []
+    try:
+        limits.append(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"))
+    except (AttributeError, ValueError, OSError):
+        pass
+    cgroup_limit = cgroup_memory_limit(cgroup_root)
+    if cgroup_limit is not None:
+        limits.append(cgroup_limit)
+    return round(min(limits) / 1024 ** 3, 1) if limits else None
+
+
+def thread_args(tool: str, threads: int) -> List[str]:
+    """The thread option of a tool: MetaPhlAn2 takes --nproc, kneaddata and HUMAnN2 --threads."""
+    return ["--nproc" if tool == "metaphlan2" else "--threads", str(threads)]
+
+
+class ResourceManager:
+    """
+    Hands out threads to concurrently running tool jobs.
+
+    Args:
+        cpus: Cores to share (default: available_cpus()).
+        memory_gb: Memory budget in GB (default: available_memory_gb()).
+    """
+    def __init__(self, cpus: Optional[int] = None, memory_gb: Optional[float] = None):
+        self.cpus = cpus or available_cpus()
+        self.memory_gb = memory_gb if memory_gb is not None else available_memory_gb()
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    @property
+    def allocated(self) -> int:
+        with self._lock:
+            return sum(self._jobs.values())
+
+    @contextlib.contextmanager
+    def allocate(self, tool: str, threads: Optional[int] = None, slots: Optional[int] = None) -> Iterator[int]:
+        """
+        Reserves threads for one job while the block runs and yields the count.
+
+        Args:
+            tool: Tool name, for bookkeeping.
+            threads: Explicit thread count; used as is.
+            slots: Number of jobs expected to run side by side (e.g. a concurrency limit).
+                Otherwise the jobs already running plus this one.
+
+        A job without `threads` gets the cores divided by the number of concurrent jobs,
+        but never more than are still free and never fewer than one.
+        """
+        with self._lock:
+            if threads is None:
+                free = self.cpus - sum(self._jobs.values())
+                share = self.cpus // max(slots or 1, len(self._jobs) + 1)
+                threads = max(1, min(share, free))
+            token = (tool, object())
+            self._jobs[token] = threads
+        try:
+            yield threads
+        finally:
+            with self._lock:
+                del self._jobs[token]
+
+    def describe(self) -> str:
+        memory = "unknown" if self.memory_gb is None else f"{self.memory_gb:g} GB"
+        return f"{self.cpus} cores, {memory} memory"
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_resource_manager() -> ResourceManager:
+    """Returns the process-wide resource manager, detecting the limits on first use."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = ResourceManager()
+        return _default_manager
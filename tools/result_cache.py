@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    params TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalizes a parameter set so equivalent calls map to the same cache key:
+    whole floats become ints (64.0 == 64), other floats use their shortest repr
+    (0.50 == 0.5) and strings are stripped.
+    """
+    normalized = {}
+    for key, value in params.items():
+        if isinstance(value, bool) or value is None:
+            normalized[key] = value
+        elif isinstance(value, (int, float)):
+            value = float(value)
+            normalized[key] = int(value) if value.is_integer() else repr(value)
+        elif isinstance(value, str):
+            normalized[key] = value.strip()
+        elif isinstance(value, dict):
+            normalized[key] = normalize_params(value)
+        else:
+            normalized[key] = str(value)
+    return normalized
+
+
+_file_hashes = {}
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents, memoized on (path, mtime, size)."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    marker = (path, stat.st_mtime_ns, stat.st_size)
+    if marker not in _file_hashes:
+        with open(path, "rb") as f:
+            _file_hashes[marker] = hashlib.sha256(f.read()).hexdigest()
+    return _file_hashes[marker]
+
+
+class ResultCache:
+    """
+    Persistent, content-addressed cache of tool results backed by SQLite.
+
+    Entries are keyed by a hash of the normalized parameter set (plus anything else
+    that determines the result, such as script hashes and package versions), expire
+    after `ttl` seconds and are evicted least-recently-used once the stored values
+    exceed `max_bytes`. With `stale_ttl`, expired entries are kept that much longer
+    and can still be served as stale (see cached_query()).
+    """
+    def __init__(self, path: str = ".cache/results.sqlite", max_bytes: int = 64 * 1024 * 1024,
+                 ttl: Optional[float] = 30 * 24 * 3600, stale_ttl: float = 0.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.counters = dict.fromkeys(("hits", "stale_hits", "misses", "refreshes", "refresh_errors"), 0)
+        self._refreshing = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(namespace: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"namespace": namespace, "params": normalize_params(params)}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_stale(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Tuple[str, float]]:
+        """
+        Returns:
+            (value, created_at) for a live entry (or, with `allow_stale`, an expired entry
+            still within `stale_ttl`), or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl + self.stale_ttl:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.counters["misses"] += 1
+                return None
+            stale = self.ttl is not None and now - row[1] > self.ttl
+            if stale and not allow_stale:
+                self.counters["misses"] += 1
+                return None
+            self.counters["stale_hits" if stale else "hits"] += 1
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+
+    def put(self, key: str, value: str, namespace: str = "", params: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, namespace, params, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, json.dumps(normalize_params(params or {}), sort_keys=True), value, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl - self.stale_ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+
+    def refresh_in_background(self, key: str, compute: Callable[[], str], namespace: str = "",
+                              params: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Recomputes an entry on a daemon thread and stores the result unless it is an error.
+
+        Returns:
+            False if a refresh of `key` is already running.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            thread = threading.Thread(target=self._refresh, args=(key, compute, namespace, params), daemon=True)
+            self._refreshing[key] = thread
+        thread.start()
+        return True
+
+    def _refresh(self, key: str, compute: Callable[[], str], namespace: str, params: Optional[Dict[str, Any]]):
+        try:
+            result = compute()
+            failed = _is_error(result)
+            if not failed:
+                self.put(key, result, namespace=namespace, params=params)
+        except Exception:
+            failed = True
+        with self._lock:
+            self.counters["refresh_errors" if failed else "refreshes"] += 1
+            self._refreshing.pop(key, None)
+
+    def wait_for_refreshes(self, timeout: Optional[float] = None):
+        """Blocks until the background refreshes running now have finished."""
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM results")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock, self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes, "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl, **counters,
+                "hit_rate": (counters["hits"] + counters["stale_hits"]) / lookups if lookups else 0.0}
+
+
+def cached_header(key: str, created_at: float, stale: bool = False) -> str:
+    """The line prepended to a result served from the cache."""
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(created_at))
+    note = ", stale; refreshing in the background" if stale else ""
+    return f"[CACHED RESULT from {stamp}, key {key[:12]}{note}]\n"
+
+
+_r_versions = {}
+
+
+def r_package_versions(r_tool, packages: Iterable[str]) -> Dict[str, str]:
+    """
+    Installed versions of R and the given packages, queried once per process.
+    Packages that are missing (or an unavailable R) are reported as "NA".
+    """
+    packages = tuple(sorted(packages))
+    if packages not in _r_versions:
+        names = ", ".join(f'"{p}"' for p in packages)
+        code = (f'v <- sapply(c({names}), function(p) tryCatch(as.character(packageVersion(p)), '
+                f'error = function(e) "NA")); cat(paste0(names(v), "=", v), '
+                f'paste0("R=", getRversion()), sep = "\\n")')
+        output = r_tool.execute_code(code)
+        versions = dict.fromkeys(packages, "NA")
+        versions["R"] = "NA"
+        for line in output.splitlines():
+            name, sep, version = line.strip().partition("=")
+            if sep and name in versions:
+                versions[name] = version
+        _r_versions[packages] = versions
+    return _r_versions[packages]
+
+
+def _is_error(result: str) -> bool:
+    return any(line.startswith("Error") for line in result.splitlines())
+
+
+def cached_call(namespace: str, params: Dict[str, Any], compute: Callable[[], str],
+                cache: Optional[ResultCache] = None) -> str:
+    """
+    Returns the cached result for (namespace, params) if there is one, prefixed with
+    the cached_header() flag; otherwise runs compute() and stores its result.
+    Error results are never cached.
+    """
+    cache = get_default_cache() if cache is None else cache
+    if cache is None:
+        return compute()
+    key = cache.make_key(namespace, params)
+    hit = cache.get(key)
+    if hit is not None:
+        value, created_at = hit
+        return cached_header(key, created_at) + value
+    result = compute()
+    if not _is_error(result):
+        cache.put(key, result, namespace=namespace, params=params)
+    return result
+
+
+async def cached_call_async(namespace: str, params: Dict[str, Any], compute: Callable[[], Awaitable[str]],
+                            cache: Optional[ResultCache] = None) -> str:
+    """
+    cached_call() for coroutines: the cache is read and written in a thread and
+    compute() is awaited, so the event loop is never blocked.
+    """
+    cache = get_default_cache() if cache is None else cache
+    if cache is None:
+        return await compute()
+    key = cache.make_key(namespace, params)
+    hit = await asyncio.to_thread(cache.get, key)
+    if hit is not None:
+        value, created_at = hit
+        return cached_header(key, created_at) + value
+    result = await compute()
+    if not _is_error(result):
+        await asyncio.to_thread(cache.put, key, result, namespace=namespace, params=params)
+    return result
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[ResultCache]:
+    """
+    Returns the process-wide result cache, or None if caching is disabled.
+
+    Configured via environment variables:
+        RESULT_CACHE_PATH: SQLite file (default .cache/results.sqlite).
+        RESULT_CACHE_MAX_MB: Size limit before LRU eviction (default 64).
+        RESULT_CACHE_TTL: Entry lifetime in seconds (default 30 days, 0 disables the cache).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl = float(os.environ.get("RESULT_CACHE_TTL", str(30 * 24 * 3600)))
+            if ttl <= 0:
+                return None
+            _default_cache = ResultCache(
+                path=os.environ.get("RESULT_CACHE_PATH", os.path.join(".cache", "results.sqlite")),
+                max_bytes=int(float(os.environ.get("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+                ttl=ttl,
+            )
+        return _default_cache
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a free-text search query."""
+    return " ".join(query.lower().split())
+
+
+def cached_query(namespace: str, params: Dict[str, Any], compute: Callable[[], str],
+                 cache: Optional[ResultCache] = None) -> str:
+    """
+    cached_call() for remote searches, with stale-while-revalidate: an entry past its TTL
+    but within the cache's `stale_ttl` is returned at once, flagged as stale, while a
+    background refresh replaces it for the next call.
+    """
+    cache = get_query_cache() if cache is None else cache
+    if cache is None:
+        return compute()
+    key = cache.make_key(namespace, params)
+    hit = cache.get(key, allow_stale=True)
+    if hit is not None:
+        value, created_at = hit
+        stale = cache.is_stale(created_at)
+        if stale:
+            cache.refresh_in_background(key, compute, namespace, params)
+        return cached_header(key, created_at, stale) + value
+    result = compute()
+    if not _is_error(result):
+        cache.put(key, result, namespace=namespace, params=params)
+    return result
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[ResultCache]:
+    """
+    Returns the process-wide cache for remote repository searches, or None if disabled.
+
+    Configured via environment variables:
+        QUERY_CACHE_PATH: SQLite file (default .cache/queries.sqlite).
+        QUERY_CACHE_MAX_MB: Size limit before LRU eviction (default 16).
+        QUERY_CACHE_TTL: Seconds a result is fresh (default 1 day, 0 disables the cache).
+        QUERY_CACHE_STALE: Further seconds a result is served stale while it is refreshed (default 7 days).
+    """
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            ttl = float(os.environ.get("QUERY_CACHE_TTL", str(24 * 3600)))
+            if ttl <= 0:
+                return None
+            _query_cache = ResultCache(
+                path=os.environ.get("QUERY_CACHE_PATH", os.path.join(".cache", "queries.sqlite")),
+                max_bytes=int(float(os.environ.get("QUERY_CACHE_MAX_MB", "16")) * 1024 * 1024),
+                ttl=ttl,
+                stale_ttl=float(os.environ.get("QUERY_CACHE_STALE", str(7 * 24 * 3600))),
+            )
+        return _query_cache
@@ -0,0 +1,431 @@
+"""
+Vectorized Monte Carlo engine for simulation-based power analysis.
+
+Simulates the four designs of r_scripts/simulation_power.R (mixed_effects, clustered,
+poisson, survival) with all replicates of a block generated as one NumPy array, and
+tests them with closed-form or batched estimators that reproduce the R model fits:
+
+- mixed_effects: random-intercept model with balanced time points. The time:treatment
+  coefficient is estimated within subjects (difference of per-subject slopes), which is
+  what lmer's GLS estimate reduces to for this design; t-test on n*(T-1)-2 df.
+- clustered: balanced random-intercept model with cluster-level treatment, tested by a
+  t-test on cluster means (n_clusters - 2 df), equivalent to the lmer fit whenever the
+  cluster variance estimate is not on the boundary (singular fits).
+- poisson: Poisson GLM with a binary covariate. The IRLS solution is closed form
+  (log ratio of group means, Wald SE sqrt(1/sum_1 + 1/sum_0)), so no iterations are needed.
+- survival: Cox model Wald test, fitted for all replicates at once by batched
+  Newton-Raphson on the partial likelihood.
+
+Random numbers are drawn per block of BLOCK_SIZE replicates from independent streams
+(one per block and variable), unit-major, so the first k units of a replicate are the
+same for any sample size n >= k and a replicate does not depend on how many others are
+run. This gives common random numbers across candidate designs.
+"""
+import os
+import time
+from typing import Optional
+import numpy as np
+from scipy import stats
+
+BLOCK_SIZE = 100
+DESIGNS = ("mixed_effects", "clustered", "poisson", "survival")
+
+
+def _rng(seed: int, block: int, stream: int) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block, stream)))
+
+
+def _units_first(draws: np.ndarray) -> np.ndarray:
+    """Converts unit-major draws (n, reps, ...) to replicate-major (reps, n, ...)."""
+    return np.moveaxis(draws, 0, 1)
+
+
+def _generate(design, effect_size, n, size, seed, block, n_timepoints, cluster_size, icc):
+    """
+    Generates one block of `size` replicate datasets.
+
+    Returns:
+        A dict of arrays with a leading replicate axis.
+    """
+    treatment = _units_first(_rng(seed, block, 0).random((n, size)) < 0.5).astype(float)
+    if design == "mixed_effects":
+        time_points = np.arange(n_timepoints, dtype=float)
+        subject_effect = _units_first(_rng(seed, block, 1).standard_normal((n, size)))
+        noise = _units_first(_rng(seed, block, 2).standard_normal((n, size, n_timepoints)))
+        y = subject_effect[:, :, None] + effect_size * treatment[:, :, None] * time_points + noise
+        return {"y": y, "treatment": treatment, "time": time_points}
+    if design == "clustered":
+        cluster_effect = _units_first(_rng(seed, block, 1).standard_normal((n, size))) * np.sqrt(icc)
+        individual = _units_first(_rng(seed, block, 2).standard_normal((n, size, cluster_size))) * np.sqrt(1 - icc)
+        y = (cluster_effect + effect_size * treatment)[:, :, None] + individual
+        return {"y": y, "treatment": treatment}
+    if design == "poisson":
+        rate = np.exp(np.log(5) + np.log(effect_size) * treatment)
+        y = _units_first(_rng(seed, block, 1).poisson(_units_first(rate))).astype(float)
+        return {"y": y, "treatment": treatment}
+    if design == "survival":
+        hazard = np.exp(np.log(0.1) + np.log(effect_size) * treatment)
+        event_time = _units_first(_rng(seed, block, 1).standard_exponential((n, size))) / hazard
+        censor_time = _units_first(_rng(seed, block, 2).standard_exponential((n, size))) / 0.05
+        return {
+            "time": np.minimum(event_time, censor_time),
+            "event": (event_time <= censor_time).astype(float),
+            "treatment": treatment,
+        }
+    raise ValueError(f"Unknown design type: {design}")
+
+
+def _test_mixed_effects(data):
+    y, treatment, time_points = data["y"], data["treatment"], data["time"]
+    n, n_timepoints = y.shape[1], y.shape[2]
+    centered_time = time_points - time_points.mean()
+    stt = np.sum(centered_time ** 2)
+    n1 = treatment.sum(axis=1)
+    n0 = n - n1
+    slopes = (y @ centered_time) / stt
+    with np.errstate(all="ignore"):
+        slope1 = (slopes * treatment).sum(axis=1) / n1
+        slope0 = (slopes * (1 - treatment)).sum(axis=1) / n0
+        group_slope = np.where(treatment == 1, slope1[:, None], slope0[:, None])
+        resid = y - y.mean(axis=2, keepdims=True) - group_slope[:, :, None] * centered_time
+        df = n * (n_timepoints - 1) - 2
+        sigma2 = np.sum(resid ** 2, axis=(1, 2)) / df
+        estimate = slope1 - slope0
+        statistic = estimate / np.sqrt(sigma2 / stt * (1 / n1 + 1 / n0))
+        p_value = 2 * stats.t.sf(np.abs(statistic), df)
+    invalid = (n1 == 0) | (n0 == 0) | (df <= 0)
+    return estimate, statistic, np.where(invalid, np.nan, p_value)
+
+
+def _test_clustered(data):
+    y, treatment = data["y"], data["treatment"]
+    n = y.shape[1]
+    means = y.mean(axis=2)
+    n1 = treatment.sum(axis=1)
+    n0 = n - n1
+    with np.errstate(all="ignore"):
+        mean1 = (means * treatment).sum(axis=1) / n1
+        mean0 = (means * (1 - treatment)).sum(axis=1) / n0
+        group_mean = np.where(treatment == 1, mean1[:, None], mean0[:, None])
+        df = n - 2
+        pooled_var = np.sum((means - group_mean) ** 2, axis=1) / df
+        estimate = mean1 - mean0
+        statistic = estimate / np.sqrt(pooled_var * (1 / n1 + 1 / n0))
+        p_value = 2 * stats.t.sf(np.abs(statistic), df)
+    invalid = (n1 == 0) | (n0 == 0) | (df <= 0)
+    return estimate, statistic, np.where(invalid, np.nan, p_value)
+
+
+def _test_poisson(data):
+    y, treatment = data["y"], data["treatment"]
+    n1 = treatment.sum(axis=1)
+    n0 = y.shape[1] - n1
+    sum1 = (y * treatment).sum(axis=1)
+    sum0 = (y * (1 - treatment)).sum(axis=1)
+    with np.errstate(all="ignore"):
+        estimate = np.log(sum1 / n1) - np.log(sum0 / n0)
+        statistic = estimate / np.sqrt(1 / sum1 + 1 / sum0)
+        p_value = 2 * stats.norm.sf(np.abs(statistic))
+    # A group without events drives the GLM estimate to -/+Inf with a huge SE (p ~ 1)
+    p_value = np.where((sum1 == 0) | (sum0 == 0), 1.0, p_value)
+    invalid = (n1 == 0) | (n0 == 0)
+    return estimate, statistic, np.where(invalid, np.nan, p_value)
+
+
+def _cox_terms(beta, x, event):
+    """Log partial likelihood, score and information for a binary covariate (x sorted by time)."""
+    w = np.exp(beta[:, None] * x)
+    s0 = np.cumsum(w[:, ::-1], axis=1)[:, ::-1]
+    s1 = np.cumsum((w * x)[:, ::-1], axis=1)[:, ::-1]
+    ratio = s1 / s0
+    loglik = np.sum(event * (beta[:, None] * x - np.log(s0)), axis=1)
+    score = np.sum(event * (x - ratio), axis=1)
+    information = np.sum(event * (ratio - ratio ** 2), axis=1)
+    return loglik, score, information
+
+
+def _test_survival(data, max_iter=20, eps=1e-9):
+    order = np.argsort(data["time"], axis=1)
+    x = np.take_along_axis(data["treatment"], order, axis=1)
+    event = np.take_along_axis(data["event"], order, axis=1)
+    beta = np.zeros(x.shape[0])
+    with np.errstate(all="ignore"):
+        loglik, score, information = _cox_terms(beta, x, event)
+        for _ in range(max_iter):
+            step = np.where(information > 0, score / information, 0.0)
+            new_beta = beta + step
+            new_loglik, new_score, new_information = _cox_terms(new_beta, x, event)
+            # Step halving, as in coxph, when the partial likelihood does not improve
+            for _ in range(10):
+                worse = new_loglik < loglik
+                if not worse.any():
+                    break
+                step = np.where(worse, step / 2, step)
+                new_beta = beta + step
+                new_loglik, new_score, new_information = _cox_terms(new_beta, x, event)
+            converged = np.abs(new_loglik - loglik) <= eps * np.abs(new_loglik)
+            beta, loglik, score, information = new_beta, new_loglik, new_score, new_information
+            if converged.all():
+                break
+        statistic = beta * np.sqrt(information)
+        p_value = 2 * stats.norm.sf(np.abs(statistic))
+    n1 = x.sum(axis=1)
+    invalid = (n1 == 0) | (n1 == x.shape[1]) | (event.sum(axis=1) == 0)
+    # Separation (all events in one arm) gives an infinite coefficient with zero information
+    p_value = np.where(~np.isfinite(statistic) | (information <= 0), 1.0, p_value)
+    return beta, statistic, np.where(invalid, np.nan, p_value)
+
+
+_TESTS = {
+    "mixed_effects": _test_mixed_effects,
+    "clustered": _test_clustered,
+    "poisson": _test_poisson,
+    "survival": _test_survival,
+}
+
+
+def simulate_tests(design, effect_size, n, start=0, count=BLOCK_SIZE, n_timepoints=3,
+                   cluster_size=20, icc=0.05, seed=12345):
+    """
+    Simulates and tests replicates [start, start + count).
+
+    Returns:
+        (estimate, statistic, p_value) arrays of length `count`; p_value is NaN for
+        replicates where the model cannot be fitted (dropped like R's NA results).
+    """
+    if design not in DESIGNS:
+        raise ValueError(f"Unknown design type: {design}")
+    outputs = []
+    first_block, last_block = start // BLOCK_SIZE, (start + count - 1) // BLOCK_SIZE
+    for block in range(first_block, last_block + 1):
+        data = _generate(design, effect_size, n, BLOCK_SIZE, seed, block, n_timepoints, cluster_size, icc)
+        outputs.append(_TESTS[design](data))
+    estimate, statistic, p_value = (np.concatenate(parts) for parts in zip(*outputs))
+    offset = start - first_block * BLOCK_SIZE
+    window = slice(offset, offset + count)
+    return estimate[window], statistic[window], p_value[window]
+
+
+def wilson_interval(successes, trials, confidence: float = 0.95):
+    """
+    Wilson score interval for a binomial proportion (vectorized).
+
+    Returns:
+        (lower, upper) bounds; (0, 1) where there are no trials.
+    """
+    successes = np.asarray(successes, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    z = stats.norm.isf((1 - confidence) / 2)
+    with np.errstate(all="ignore"):
+        p = successes / trials
+        denominator = 1 + z ** 2 / trials
+        center = (p + z ** 2 / (2 * trials)) / denominator
+        half_width = z * np.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    lower = np.where(trials > 0, np.clip(center - half_width, 0, 1), 0.0)
+    upper = np.where(trials > 0, np.clip(center + half_width, 0, 1), 1.0)
+    return lower, upper
+
+
+def clopper_pearson_interval(successes, trials, confidence: float = 0.95):
+    """
+    Exact (Clopper-Pearson) interval for a binomial proportion (vectorized).
+    """
+    successes = np.asarray(successes, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    tail = (1 - confidence) / 2
+    with np.errstate(all="ignore"):
+        lower = np.where(successes > 0, stats.beta.ppf(tail, successes, trials - successes + 1), 0.0)
+        upper = np.where(successes < trials, stats.beta.isf(tail, successes + 1, trials - successes), 1.0)
+    return np.nan_to_num(lower, nan=0.0), np.nan_to_num(upper, nan=1.0)
+
+
+_INTERVALS = {"wilson": wilson_interval, "clopper_pearson": clopper_pearson_interval}
+
+
+def simulate_power(design: str, effect_size: float, n: int, n_sims: int = 1000, alpha: float = 0.05,
+                   n_timepoints: int = 3, cluster_size: int = 20, icc: float = 0.05, seed: int = 12345,
+                   precision: Optional[float] = None, chunk_size: int = BLOCK_SIZE, ci_method: str = "wilson",
+                   confidence: float = 0.95) -> dict:
+    """
+    Estimates power for one of the simulation_power.R designs with the vectorized engine.
+
+    Args:
+        precision: Target half-width of the Monte Carlo confidence interval. When set,
+                   replicates are run in chunks of `chunk_size` and stopped as soon as the
+                   interval is tight enough; `n_sims` is the hard cap.
+        ci_method: Interval used for the stopping rule and report ("wilson" or "clopper_pearson").
+
+    Returns:
+        A dict with the design parameters, replicates used, successful/rejected counts,
+        power and its confidence interval.
+    """
+    if ci_method not in _INTERVALS:
+        raise ValueError(f"Unknown ci_method: {ci_method}")
+    start_time = time.perf_counter()
+    chunk = n_sims if precision is None else max(1, chunk_size)
+    n_used = n_successful = n_rejected = 0
+    lower, upper = 0.0, 1.0
+    while n_used < n_sims:
+        count = min(chunk, n_sims - n_used)
+        _, _, p_value = simulate_tests(design, effect_size, n, start=n_used, count=count, n_timepoints=n_timepoints,
+                                       cluster_size=cluster_size, icc=icc, seed=seed)
+        valid = ~np.isnan(p_value)
+        n_used += count
+        n_successful += int(valid.sum())
+        n_rejected += int((p_value[valid] < alpha).sum())
+        lower, upper = (float(x) for x in _INTERVALS[ci_method](n_rejected, n_successful, confidence))
+        if precision is not None and n_successful and (upper - lower) / 2 <= precision:
+            break
+    return {
+        "design": design,
+        "effect_size": effect_size,
+        "n": n,
+        "n_sims": n_sims,
+        "n_used": n_used,
+        "alpha": alpha,
+        "n_timepoints": n_timepoints,
+        "cluster_size": cluster_size,
+        "icc": icc,
+        "seed": seed,
+        "n_successful": n_successful,
+        "n_rejected": n_rejected,
+        "power": n_rejected / n_successful if n_successful else float("nan"),
+        "ci": (lower, upper),
+        "ci_method": ci_method,
+        "confidence": confidence,
+        "precision": precision,
+        "elapsed": time.perf_counter() - start_time,
+    }
+
+
+def format_simulation_results(result: dict) -> str:
+    """
+    Renders engine results in the same layout as r_scripts/simulation_power.R.
+    """
+    power = result["power"]
+    n_successful = result["n_successful"]
+    mc_se = np.sqrt(power * (1 - power) / n_successful) if n_successful else float("nan")
+    lines = [
+        f"Ran {result['n_used']} simulations with the vectorized Python engine in {result['elapsed']:.2f}s.",
+        "",
+        "=== Simulation-Based Power Analysis Results ===",
+        f"Design: {result['design']}",
+        f"Sample size: {result['n']}",
+    ]
+    if result["design"] == "mixed_effects":
+        lines.append(f"Time points: {result['n_timepoints']}")
+    elif result["design"] == "clustered":
+        lines.append(f"Cluster size: {result['cluster_size']}")
+        lines.append(f"ICC: {result['icc']:.3f}")
+    lines += [
+        f"Effect size: {result['effect_size']:.3f}",
+        f"Alpha: {result['alpha']:.3f}",
+        f"Number of simulations: {result['n_sims']}",
+        f"Replicates used: {result['n_used']} of {result['n_sims']}",
+        f"Successful simulations: {n_successful}",
+        "",
+        f"Estimated Power: {power:.3f} ({power * 100:.1f}%)",
+        f"Monte Carlo SE: {mc_se:.4f}",
+        f"{result['confidence'] * 100:.0f}% CI ({result['ci_method']}): [{result['ci'][0]:.3f}, {result['ci'][1]:.3f}]",
+    ]
+    if result["precision"] is not None:
+        half_width = (result["ci"][1] - result["ci"][0]) / 2
+        status = "reached" if half_width <= result["precision"] else "not reached (capped at n_sims)"
+        lines.append(f"Precision target: CI half-width <= {result['precision']:.4f}, {status}")
+    lines.append("===============================================")
+    return "\n".join(lines) + "\n"
+
+
+_R_CROSS_CHECK_MODELS = {
+    "mixed_effects": ('lmer(y ~ time * treatment + (1 | id), data = s)', "time:treatment", "t value"),
+    "clustered": ('lmer(y ~ treatment + (1 | id), data = s)', "treatment", "t value"),
+    "poisson": ('glm(y ~ treatment, data = s, family = poisson())', "treatment", "z value"),
+    "survival": ('coxph(Surv(time, event) ~ treatment, data = s)', "treatment", "z"),
+}
+
+
+def _cross_check_rows(design, data, index, rep):
+    """CSV rows (rep, id, y, time, treatment, event) for one replicate dataset."""
+    treatment = data["treatment"][index]
+    rows = []
+    for unit in range(treatment.shape[0]):
+        if design in ("mixed_effects", "clustered"):
+            y = data["y"][index][unit]
+            times = data["time"] if design == "mixed_effects" else np.zeros(y.shape[0])
+            values = [(y[j], times[j], 0.0) for j in range(y.shape[0])]
+        elif design == "poisson":
+            values = [(data["y"][index][unit], 0.0, 0.0)]
+        else:
+            values = [(0.0, data["time"][index][unit], data["event"][index][unit])]
+        for y_value, time_value, event in values:
+            rows.append(f"{rep},{unit},{float(y_value)!r},{float(time_value)!r},{int(treatment[unit])},{int(event)}")
+    return rows
+
+
+def cross_check_with_r(r_tool, design, effect_size, n, n_checks, n_sims=1000, n_timepoints=3,
+                       cluster_size=20, icc=0.05, seed=12345, alpha=0.05, work_dir="generated_scripts") -> str:
+    """
+    Re-fits a random subset of replicates with the original R models (lme4/glm/coxph)
+    and compares their test statistics and decisions with the vectorized engine.
+
+    Returns:
+        A short report of the agreement between the two backends.
+    """
+    picker = np.random.default_rng(seed)
+    reps = np.sort(picker.choice(n_sims, size=min(n_checks, n_sims), replace=False))
+    rows = ["rep,id,y,time,treatment,event"]
+    python_stats = {}
+    for rep in reps:
+        block, index = divmod(int(rep), BLOCK_SIZE)
+        data = _generate(design, effect_size, n, BLOCK_SIZE, seed, block, n_timepoints, cluster_size, icc)
+        _, statistic, p_value = _TESTS[design](data)
+        if np.isnan(p_value[index]):
+            continue
+        python_stats[int(rep)] = (statistic[index], p_value[index] < alpha)
+        rows.extend(_cross_check_rows(design, data, index, int(rep)))
+
+    os.makedirs(work_dir, exist_ok=True)
+    data_path = os.path.abspath(os.path.join(work_dir, f"cross_check_{design}_{seed}.csv"))
+    with open(data_path, "w") as f:
+        f.write("\n".join(rows) + "\n")
+
+    model, term, stat_column = _R_CROSS_CHECK_MODELS[design]
+    r_code = f"""
+suppressPackageStartupMessages({{library(lme4); library(survival)}})
+d <- read.csv("{data_path}")
+d$id <- factor(d$id)
+for (r in unique(d$rep)) {{
+  s <- d[d$rep == r, ]
+  fit <- tryCatch({model}, error = function(e) NULL)
+  if (is.null(fit)) next
+  co <- summary(fit)$coefficients
+  cat(sprintf("CHECK %d %.10g\\n", r, co["{term}", "{stat_column}"]))
+}}
+"""
+    output = r_tool.execute_code(r_code)
+    os.remove(data_path)
+
+    if design == "mixed_effects":
+        critical = stats.t.isf(alpha / 2, n * (n_timepoints - 1) - 2)
+    elif design == "clustered":
+        critical = stats.t.isf(alpha / 2, n - 2)
+    else:
+        critical = stats.norm.isf(alpha / 2)
+
+    differences = []
+    agreements = 0
+    for line in output.splitlines():
+        if not line.startswith("CHECK "):
+            continue
+        _, rep, r_statistic = line.split()
+        if int(rep) not in python_stats:
+            continue
+        statistic, rejected = python_stats[int(rep)]
+        r_statistic = float(r_statistic)
+        differences.append(abs(abs(r_statistic) - abs(statistic)))
+        agreements += int(rejected == (abs(r_statistic) >= critical))
+    if not differences:
+        return f"R cross-check failed: no replicates could be compared.\n{output}"
+    return (f"R cross-check: {len(differences)} replicates re-fitted in R, "
+            f"max |statistic| difference {max(differences):.2e}, "
+            f"decisions agree in {agreements}/{len(differences)}.\n")
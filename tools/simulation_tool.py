@@ -1,16 +1,92 @@
+import asyncio
+import hashlib
 import os
+import time
 from typing import Optional
+import numpy as np
+from tools import simulation_engine
 from tools.r_execution import RExecutionTool
+from tools.effect_sizes import get_effect_size_registry
+from tools.result_cache import cached_call, cached_call_async, file_hash, r_package_versions
+from tools.simulation_engine import simulate_power, format_simulation_results, cross_check_with_r
+
+# Backend for simulation-based power analysis:
+#   "python" - vectorized NumPy engine (tools/simulation_engine.py)
+#   "r"      - the generated R script (lme4/glm/coxph fits per replicate)
+SIMULATION_BACKEND = os.environ.get("SIMULATION_BACKEND", "python")
+
+# Generated scripts are content-addressed; the directory is pruned to these limits
+GENERATED_SCRIPTS_DIR = "generated_scripts"
+GENERATED_SCRIPTS_MAX_MB = float(os.environ.get("GENERATED_SCRIPTS_MAX_MB", "50"))
+GENERATED_SCRIPTS_MAX_AGE_DAYS = float(os.environ.get("GENERATED_SCRIPTS_MAX_AGE_DAYS", "30"))
+
+# Template path -> ((mtime, size), lines before the argparser block, lines after it)
+_templates = {}
+
+def _load_template(template_path: str):
+    """
+    Returns the template split around its argparser block, re-reading the file only
+    when its mtime or size changes.
+    """
+    stat = os.stat(template_path)
+    marker = (stat.st_mtime_ns, stat.st_size)
+    cached = _templates.get(template_path)
+    if cached is None or cached[0] != marker:
+        with open(template_path, "r") as f:
+            lines = f.read().splitlines()
+        start_idx = next(i for i, line in enumerate(lines) if "library(argparser)" in line)
+        end_idx = next(i for i, line in enumerate(lines) if i > start_idx and "parse_args(p" in line)
+        cached = (marker, lines[:start_idx], lines[end_idx + 1:])
+        _templates[template_path] = cached
+    return cached[1], cached[2]
+
+def collect_generated_scripts(gen_dir: str = GENERATED_SCRIPTS_DIR, max_bytes: Optional[float] = None,
+                              max_age: Optional[float] = None, keep=()) -> int:
+    """
+    Applies the retention policy to the generated scripts directory: files not used for
+    more than `max_age` seconds are removed, then the least recently used files until the
+    directory fits in `max_bytes`. Paths in `keep` are never removed.
+
+    Returns:
+        The number of files removed.
+    """
+    max_bytes = GENERATED_SCRIPTS_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    max_age = GENERATED_SCRIPTS_MAX_AGE_DAYS * 24 * 3600 if max_age is None else max_age
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    for entry in os.scandir(gen_dir):
+        # In-progress writes (*.tmp) belong to other callers
+        if not entry.is_file() or entry.name.endswith(".tmp") or os.path.abspath(entry.path) in keep:
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries) + sum(os.path.getsize(path) for path in keep if os.path.exists(path))
+    now = time.time()
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
 
 class SimulationPowerTool:
     """
-    A tool to execute simulation-based power analysis using R.
+    A tool to execute simulation-based power analysis using the vectorized Python engine or R.
     """
-    def __init__(self, working_dir: str = "."):
+    def __init__(self, working_dir: str = ".", backend: Optional[str] = None):
         self.working_dir = working_dir
+        self.backend = backend or SIMULATION_BACKEND
         self.r_tool = RExecutionTool(working_dir=working_dir)
 
-    def run_simulation_power(
+    def write_script(
         self,
         design: str,
         effect_size: float,
@@ -20,28 +96,21 @@ class SimulationPowerTool:
         n_timepoints: Optional[int] = None,
         cluster_size: Optional[int] = None,
         icc: Optional[float] = None,
-        seed: int = 12345
+        seed: int = 12345,
+        precision: Optional[float] = None,
+        chunk_size: int = 100,
+        ci_method: str = "wilson"
     ) -> str:
         """
-        Performs simulation-based power analysis using R.
-        Generates a standalone R script for reproducibility and transparency.
+        Writes the standalone R script for a parameter set, with the template's argparser
+        block replaced by hardcoded parameters. Scripts are named by a hash of their
+        content, so identical parameter sets reuse the same file.
+
+        Returns:
+            The path of the script.
         """
-        import time
-        import shutil
-        
-        # Ensure generated_scripts directory exists
-        gen_dir = "generated_scripts"
-        os.makedirs(gen_dir, exist_ok=True)
-        
-        timestamp = int(time.time())
-        script_filename = f"simulation_{design}_{timestamp}.R"
-        script_path = os.path.join(gen_dir, script_filename)
-        
-        # Read the template script
-        template_path = os.path.join("r_scripts", "simulation_power.R")
-        with open(template_path, "r") as f:
-            template_content = f.read()
-            
+        head, tail = _load_template(os.path.join("r_scripts", "simulation_power.R"))
+
         # Create parameter list definition
         params_code = f"""
 # --- Parameters set by Agent ---
@@ -53,78 +122,117 @@ argv$n_sims <- {n_sims}
 argv$alpha <- {alpha}
 argv$seed <- {seed}
 """
-        if n_timepoints is not None:
-            params_code += f'argv$n_timepoints <- {n_timepoints}\n'
-        else:
-             params_code += 'argv$n_timepoints <- 3\n'
-             
-        if cluster_size is not None:
-            params_code += f'argv$cluster_size <- {cluster_size}\n'
-        else:
-            params_code += 'argv$cluster_size <- 20\n'
-            
-        if icc is not None:
-            params_code += f'argv$icc <- {icc}\n'
-        else:
-            params_code += 'argv$icc <- 0.05\n'
-            
+        params_code += f'argv$n_timepoints <- {3 if n_timepoints is None else n_timepoints}\n'
+        params_code += f'argv$cluster_size <- {20 if cluster_size is None else cluster_size}\n'
+        params_code += f'argv$icc <- {0.05 if icc is None else icc}\n'
+        params_code += f'argv$precision <- {"NA" if precision is None else precision}\n'
+        params_code += f'argv$chunk_size <- {chunk_size}\n'
+        params_code += f'argv$ci_method <- "{ci_method}"\n'
         params_code += "# -----------------------------\n"
+        content = "\n".join(head + [params_code] + tail)
 
-        # Replace argparser section with hardcoded parameters
-        # We assume the argparser section ends around line 26 with "argv <- parse_args(p)"
-        # A safer way is to identify the block to replace.
-        # Looking at the file, lines 9-26 are the argparser block.
-        
-        # Split content into lines
-        lines = template_content.splitlines()
-        
-        # Find start and end of argparser block
-        start_idx = -1
-        end_idx = -1
-        for i, line in enumerate(lines):
-            if "library(argparser)" in line:
-                start_idx = i
-            if "argv <- parse_args(p)" in line:
-                end_idx = i
-                break
-        
-        if start_idx != -1 and end_idx != -1:
-            # Replace the block
-            new_lines = lines[:start_idx] + [params_code] + lines[end_idx+1:]
-            new_content = "\n".join(new_lines)
+        os.makedirs(GENERATED_SCRIPTS_DIR, exist_ok=True)
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        script_path = os.path.join(GENERATED_SCRIPTS_DIR, f"simulation_{design}_{digest}.R")
+        if os.path.exists(script_path):
+            # Reuse; refresh the mtime so retention treats it as recently used
+            os.utime(script_path)
         else:
-            # Fallback: just prepend params and comment out argparser lines if found, 
-            # or just append params if variable names match. 
-            # But argv is created by parse_args. 
-            # Let's just use the template as is but override argv after parse_args? 
-            # No, that requires running with dummy args.
-            # Let's stick to replacement if possible, or just write a new script that sources the functions.
-            # Actually, the replacement logic above is risky if file changes.
-            # Let's try to be robust.
-            pass 
-            # For now, let's assume the file structure is stable as we just viewed it.
-            new_lines = lines[:start_idx] + [params_code] + lines[end_idx+1:]
-            new_content = "\n".join(new_lines)
-
-        # Write the new script
-        with open(script_path, "w") as f:
-            f.write(new_content)
-            
-        # Execute the NEW script
-        # We don't need to pass args since they are hardcoded
-        result = self.r_tool.execute_script(script_path, args=None)
-        
+            # Write under a unique name first so concurrent callers never see a partial file
+            tmp_path = f"{script_path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, script_path)
+            collect_generated_scripts(keep=[script_path])
+        return script_path
+
+    def run_simulation_power(
+        self,
+        design: str,
+        effect_size: float,
+        n: int,
+        n_sims: int = 1000,
+        alpha: float = 0.05,
+        n_timepoints: Optional[int] = None,
+        cluster_size: Optional[int] = None,
+        icc: Optional[float] = None,
+        seed: int = 12345,
+        cross_check: int = 0,
+        precision: Optional[float] = None,
+        chunk_size: int = 100,
+        ci_method: str = "wilson"
+    ) -> str:
+        """
+        Performs simulation-based power analysis.
+        Generates a standalone R script for reproducibility and transparency; with the
+        "python" backend the estimate comes from the vectorized engine and the script is
+        kept as an R reference implementation of the same design.
+
+        Args:
+            cross_check: Number of randomly chosen replicates to re-fit with the R models
+                         to verify the Python engine (python backend only, default 0).
+            precision: Target half-width of the power confidence interval. Replicates run in
+                       chunks of `chunk_size` and stop once it is reached, capped at n_sims.
+            ci_method: Confidence interval for the stopping rule ("wilson" or "clopper_pearson").
+        """
+        script_path = self.write_script(design, effect_size, n, n_sims, alpha, n_timepoints, cluster_size, icc,
+                                        seed, precision, chunk_size, ci_method)
+
+        if self.backend == "r":
+            # Execute the NEW script
+            # We don't need to pass args since they are hardcoded
+            result = self.r_tool.execute_script(script_path, args=None)
+            return f"GENERATED_SCRIPT: {os.path.abspath(script_path)}\n\n{result}"
+
+        design_args = {
+            "design": design,
+            "effect_size": effect_size,
+            "n": n,
+            "n_timepoints": 3 if n_timepoints is None else n_timepoints,
+            "cluster_size": 20 if cluster_size is None else cluster_size,
+            "icc": 0.05 if icc is None else icc,
+            "seed": seed,
+        }
+        try:
+            result = format_simulation_results(simulate_power(
+                n_sims=n_sims,
+                alpha=alpha,
+                precision=precision,
+                chunk_size=chunk_size,
+                ci_method=ci_method,
+                **design_args
+            ))
+        except ValueError as e:
+            return f"GENERATED_SCRIPT: {os.path.abspath(script_path)}\n\nError: {e}"
+        if cross_check > 0:
+            result += cross_check_with_r(self.r_tool, n_checks=cross_check, n_sims=n_sims, alpha=alpha, **design_args)
         return f"GENERATED_SCRIPT: {os.path.abspath(script_path)}\n\n{result}"
 
+    async def run_simulation_power_async(self, timeout: Optional[float] = None, **kwargs) -> str:
+        """
+        Non-blocking run_simulation_power (same arguments, plus a timeout in seconds for the
+        R backend). R runs use the async R execution path; the Python engine runs in a thread.
+        """
+        if self.backend == "r":
+            script_args = {k: v for k, v in kwargs.items() if k != "cross_check"}
+            script_path = await asyncio.to_thread(self.write_script, **script_args)
+            result = await self.r_tool.execute_script_async(script_path, args=None, timeout=timeout)
+            return f"GENERATED_SCRIPT: {os.path.abspath(script_path)}\n\n{result}"
+        return await asyncio.to_thread(self.run_simulation_power, **kwargs)
+
 def run_simulation_power_analysis(
     design: str,
-    effect_size: float,
-    n: int,
+    effect_size: float = None,
+    n: int = None,
     n_sims: int = 1000,
     alpha: float = 0.05,
     n_timepoints: int = 3,
     cluster_size: int = 20,
-    icc: float = 0.05
+    icc: float = 0.05,
+    cross_check: int = 0,
+    precision: float = None,
+    ci_method: str = "wilson",
+    effect_topic: str = None
 ) -> str:
     """
     Performs simulation-based power analysis.
@@ -133,26 +241,115 @@ def run_simulation_power_analysis(
         design: Study design (mixed_effects, clustered, poisson, survival)
         effect_size: Effect size (Cohen's d for mixed_effects, rate ratio for poisson, hazard ratio for survival)
         n: Sample size (subjects or clusters depending on design)
-        n_sims: Number of simulations (default: 1000)
+        n_sims: Maximum number of simulations (default: 1000)
         alpha: Significance level (default: 0.05)
         n_timepoints: Number of timepoints for repeated measures (default: 3)
         cluster_size: Cluster size for clustered designs (default: 20)
         icc: Intra-cluster correlation for clustered designs (default: 0.05)
+        cross_check: Number of replicates to re-fit in R to verify the fast engine (default: 0)
+        precision: Stop early once the power CI half-width is at most this value, e.g. 0.01 (default: run all n_sims)
+        ci_method: Confidence interval for early stopping: wilson or clopper_pearson (default: wilson)
+        effect_topic: Research topic whose pooled literature effect size to use when effect_size is not given
         
     Returns:
         Simulation results including estimated power.
     """
+    try:
+        tool, args, params, source = _simulation_request(
+            design, effect_size, n, n_sims, alpha, n_timepoints, cluster_size, icc, cross_check, precision,
+            ci_method, effect_topic)
+    except ValueError as e:
+        return f"Error: {e}"
     print(f"\n[System] Starting simulation-based power analysis (Design: {design}, N: {n}, Sims: {n_sims})...", flush=True)
-    tool = SimulationPowerTool(working_dir=os.getcwd())
-    result = tool.run_simulation_power(
-        design=design,
-        effect_size=effect_size,
-        n=n,
-        n_sims=n_sims,
-        alpha=alpha,
-        n_timepoints=n_timepoints,
-        cluster_size=cluster_size,
-        icc=icc
-    )
+    result = cached_call("simulation_power", params, lambda: tool.run_simulation_power(**args))
     print("[System] Simulation completed.", flush=True)
-    return result
+    return source + result
+
+async def run_simulation_power_analysis_async(
+    design: str,
+    effect_size: float = None,
+    n: int = None,
+    n_sims: int = 1000,
+    alpha: float = 0.05,
+    n_timepoints: int = 3,
+    cluster_size: int = 20,
+    icc: float = 0.05,
+    cross_check: int = 0,
+    precision: float = None,
+    ci_method: str = "wilson",
+    effect_topic: str = None,
+    timeout: float = None
+) -> str:
+    """
+    Performs simulation-based power analysis without blocking other sessions.
+
+    Args:
+        design: Study design (mixed_effects, clustered, poisson, survival)
+        effect_size: Effect size (Cohen's d for mixed_effects, rate ratio for poisson, hazard ratio for survival)
+        n: Sample size (subjects or clusters depending on design)
+        n_sims: Maximum number of simulations (default: 1000)
+        alpha: Significance level (default: 0.05)
+        n_timepoints: Number of timepoints for repeated measures (default: 3)
+        cluster_size: Cluster size for clustered designs (default: 20)
+        icc: Intra-cluster correlation for clustered designs (default: 0.05)
+        cross_check: Number of replicates to re-fit in R to verify the fast engine (default: 0)
+        precision: Stop early once the power CI half-width is at most this value, e.g. 0.01 (default: run all n_sims)
+        ci_method: Confidence interval for early stopping: wilson or clopper_pearson (default: wilson)
+        effect_topic: Research topic whose pooled literature effect size to use when effect_size is not given
+        timeout: Seconds after which an R simulation is stopped (optional)
+
+    Returns:
+        Simulation results including estimated power.
+    """
+    try:
+        tool, args, params, source = await asyncio.to_thread(
+            _simulation_request, design, effect_size, n, n_sims, alpha, n_timepoints, cluster_size, icc,
+            cross_check, precision, ci_method, effect_topic)
+    except ValueError as e:
+        return f"Error: {e}"
+    print(f"\n[System] Starting simulation-based power analysis (Design: {design}, N: {n}, Sims: {n_sims})...", flush=True)
+    result = await cached_call_async("simulation_power", params,
+                                     lambda: tool.run_simulation_power_async(timeout=timeout, **args))
+    print("[System] Simulation completed.", flush=True)
+    return source + result
+
+def _simulation_request(design, effect_size, n, n_sims, alpha, n_timepoints, cluster_size, icc, cross_check,
+                        precision, ci_method, effect_topic):
+    """
+    Resolves a simulation request into (tool, run arguments, cache parameters, effect size
+    source line). Raises ValueError for incomplete requests.
+    """
+    if n is None:
+        raise ValueError("n (the sample size) is required.")
+    source = ""
+    if effect_size is None:
+        if not effect_topic:
+            raise ValueError("give effect_size or an effect_topic with recorded effect sizes.")
+        effect_size, source = get_effect_size_registry().effect_size_for(effect_topic, design)
+        source += "\n"
+    tool = SimulationPowerTool(working_dir=os.getcwd())
+    args = {
+        "design": design,
+        "effect_size": effect_size,
+        "n": n,
+        "n_sims": n_sims,
+        "alpha": alpha,
+        "n_timepoints": n_timepoints,
+        "cluster_size": cluster_size,
+        "icc": icc,
+        "seed": 12345,
+        "cross_check": cross_check,
+        "precision": precision,
+        "chunk_size": 100,
+        "ci_method": ci_method
+    }
+    # Everything that determines the result: inputs, backend, template and code versions
+    params = dict(args, backend=tool.backend, script=file_hash(os.path.join("r_scripts", "simulation_power.R")))
+    if tool.backend != "r":
+        params["engine"] = file_hash(simulation_engine.__file__)
+        params["numpy"] = np.__version__
+    if tool.backend == "r" or cross_check > 0:
+        params["r_packages"] = r_package_versions(tool.r_tool, ["lme4", "survival"])
+    # Scripts are content-addressed, so this also restores the script a cached result refers to
+    tool.write_script(**{k: v for k, v in args.items() if k != "cross_check"})
+    return tool, args, params, source
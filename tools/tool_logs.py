@@ -0,0 +1,151 @@
+"""
+Streaming log capture and progress reporting for long-running microbiome tools.
+
+Tool output is consumed line by line as it is produced: every line goes to a rotating
+per-sample log file, only the last few lines are kept in memory (for error messages),
+and lines that mark progress (a new pipeline step, a read count) are turned into
+progress events and reported while the job is still running. Memory use is bounded
+however much a tool logs.
+"""
+import logging
+import logging.handlers
+import os
+import re
+import subprocess
+import time
+from collections import deque
+from typing import Any, Callable, Dict, IO, List, Optional
+
+# Log file size before rotation, number of rotated files kept, and lines kept in memory
+TOOL_LOG_MAX_BYTES = int(float(os.environ.get("TOOL_LOG_MAX_MB", "10")) * 1024 * 1024)
+TOOL_LOG_BACKUPS = int(os.environ.get("TOOL_LOG_BACKUPS", "3"))
+TOOL_LOG_TAIL_LINES = int(os.environ.get("TOOL_LOG_TAIL_LINES", "50"))
+
+# Step announcements, e.g. "Running diamond ........" or "Decontaminating ..."
+_STEP_PATTERN = re.compile(r"^\s*((?:Running|Computing|Decontaminating|Aligning|Creating|Processing)\b.*?)[\s.]*$")
+# Read counts, e.g. "Initial number of reads ( in.fastq ): 1234567"
+_READS_PATTERN = re.compile(r"^\s*(.*?\breads?\b.*?)\s*(?:\([^)]*\))?\s*:\s*([\d,]+)\s*$", re.IGNORECASE)
+
+
+def parse_progress(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses a progress line from kneaddata, MetaPhlAn2 or HUMAnN2.
+
+    Returns:
+        {"step": ...} for a step announcement, {"reads": ..., "label": ...} for a read
+        count, or None for any other line.
+    """
+    match = _READS_PATTERN.match(line)
+    if match:
+        return {"reads": int(match.group(2).replace(",", "")), "label": match.group(1)}
+    match = _STEP_PATTERN.match(line)
+    if match:
+        return {"step": match.group(1)}
+    return None
+
+
+def format_elapsed(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def print_progress(event: Dict[str, Any]):
+    """Default progress reporter: one console line per event."""
+    if "reads" in event:
+        detail = f"{event['label']}: {event['reads']:,}"
+    else:
+        detail = event["step"]
+    print(f"[{event['tool']} {format_elapsed(event['elapsed'])}] {detail}", flush=True)
+
+
+class ToolLog:
+    """
+    Line sink for one tool run; call it with each output line.
+
+    Args:
+        tool: Label shown in progress events, e.g. "humann2 sample1".
+        log_path: Log file; rotated at TOOL_LOG_MAX_MB, keeping TOOL_LOG_BACKUPS old files.
+        on_progress: Called with each progress event (default: print it).
+        tail_lines: Number of most recent lines kept in memory.
+    """
+    def __init__(self, tool: str, log_path: str, on_progress: Optional[Callable[[Dict[str, Any]], None]] = print_progress,
+                 tail_lines: int = TOOL_LOG_TAIL_LINES):
+        self.tool = tool
+        self.log_path = log_path
+        self.on_progress = on_progress
+        directory = os.path.dirname(log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=TOOL_LOG_MAX_BYTES, backupCount=TOOL_LOG_BACKUPS, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self._tail = deque(maxlen=tail_lines)
+        self.line_count = 0
+        self.step = None
+        self.reads = None
+        self.start = time.perf_counter()
+
+    def __call__(self, line: str):
+        line = line.rstrip("\n")
+        self.line_count += 1
+        self._tail.append(line)
+        self._handler.handle(logging.makeLogRecord({"msg": line, "args": None}))
+        event = parse_progress(line)
+        if event is None:
+            return
+        if "step" in event:
+            self.step = event["step"]
+        else:
+            self.reads = (event["label"], event["reads"])
+        event.update(tool=self.tool, elapsed=time.perf_counter() - self.start)
+        if self.on_progress is not None:
+            self.on_progress(event)
+
+    def tail(self) -> str:
+        """The most recent output lines."""
+        return "\n".join(self._tail)
+
+    def summary(self) -> str:
+        """One-line description of the run's progress and where its full log is."""
+        parts = []
+        if self.step:
+            parts.append(f"last step: {self.step}")
+        if self.reads:
+            parts.append(f"{self.reads[0]}: {self.reads[1]:,}")
+        parts.append(f"{self.line_count} log lines in {self.log_path}")
+        return "; ".join(parts)
+
+    def close(self):
+        self._handler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_command(command: List[str], log: ToolLog, stdout_file: Optional[IO] = None) -> int:
+    """
+    Runs a command, feeding its output to `log` line by line as it is produced. With
+    `stdout_file`, stdout is written there and only stderr goes to the log.
+
+    Returns:
+        The exit status (0). Raises CalledProcessError with the log's tail as stderr on a
+        non-zero exit, and FileNotFoundError if the executable does not exist.
+    """
+    with subprocess.Popen(
+        command,
+        stdout=stdout_file if stdout_file is not None else subprocess.PIPE,
+        stderr=subprocess.PIPE if stdout_file is not None else subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        errors="replace",
+    ) as process:
+        for line in process.stderr if stdout_file is not None else process.stdout:
+            log(line)
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command, stderr=log.tail())
+    return returncode